@@ -1,3 +1,365 @@
-from django.test import TestCase
+import os
+import tempfile
+from datetime import timedelta
 
-# Create your tests here.
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory
+
+from api import views
+from scanner.exposure import refresh_exposure
+from scanner.fingerprints import fingerprint_cache
+from scanner.identity import update_identities
+from scanner.ingest import save_scan_results, save_topology
+from scanner.models import CorrelationReport, ScanTask, TrafficCapture
+from scanner.tracing import refresh_hcf_table
+
+
+def endpoints(response):
+    return sorted((row['ip_address'], row['port']) for row in response.data['data'])
+
+
+def scan(results):
+    """保存一次扫描的结果并合并到当前暴露面"""
+    task = ScanTask.objects.create(name='暴露面任务', target='10.0.0.0/24', scan_type='SYN_SCAN')
+    save_scan_results(task, results)
+    refresh_exposure(task)
+    return task
+
+
+class ScanResultsApiTest(TestCase):
+    """扫描结果API过滤测试"""
+
+    def setUp(self):
+        self.factory = APIRequestFactory()
+        self.task = ScanTask.objects.create(name='API任务', target='10.0.0.0/16', scan_type='SYN_SCAN')
+        save_scan_results(self.task, [
+            {'ip_address': '10.0.0.1', 'port': 22, 'state': 'open'},
+            {'ip_address': '10.0.0.200', 'port': 80, 'state': 'open'},
+            {'ip_address': '10.0.1.5', 'port': 443, 'state': 'closed'},
+            {'ip_address': '2001:db8::1', 'port': 8080, 'state': 'open'},
+        ])
+
+    def _get(self, **params):
+        return views.scan_results_api(self.factory.get('/api/results/', params))
+
+    def test_cidr_and_port_filters(self):
+        """测试按网段、端口规格组合过滤"""
+        response = self._get(cidr='10.0.0.0/24')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(endpoints(response), [('10.0.0.1', 22), ('10.0.0.200', 80)])
+        self.assertEqual(response.data['total'], 2)
+
+        self.assertEqual(endpoints(self._get(ports='80, 400-500')), [('10.0.0.200', 80), ('10.0.1.5', 443)])
+        self.assertEqual(endpoints(self._get(cidr='10.0.0.0/16', ports='1-100,443', state='open')),
+                         [('10.0.0.1', 22), ('10.0.0.200', 80)])
+        self.assertEqual(endpoints(self._get(cidr='2001:db8::/64', task_id=self.task.id)), [('2001:db8::1', 8080)])
+
+    def test_malformed_filters_rejected(self):
+        """测试格式错误的网段、端口规格和状态返回400"""
+        for params in ({'cidr': 'not-a-network'}, {'cidr': '10.0.0.0/33'}, {'ports': '80-'},
+                       {'ports': 'http'}, {'ports': '100-10'}, {'ports': ','}, {'state': 'bogus'}):
+            with self.subTest(params=params):
+                response = self._get(**params)
+                self.assertEqual(response.status_code, 400)
+                self.assertFalse(response.data['success'])
+
+
+class ExposureApiTest(TestCase):
+    """当前暴露面API测试"""
+
+    def setUp(self):
+        self.factory = APIRequestFactory()
+        self.first = scan([
+            {'ip_address': '10.0.0.1', 'port': 22, 'state': 'open', 'service': 'ssh'},
+            {'ip_address': '10.0.0.1', 'port': 80, 'state': 'open', 'service': 'http'},
+            {'ip_address': '10.0.0.2', 'port': 443, 'state': 'open', 'service': 'https'},
+        ])
+        self.second = scan([
+            {'ip_address': '10.0.0.1', 'port': 22, 'state': 'open', 'service': 'openssh'},
+            {'ip_address': '10.0.0.1', 'port': 80, 'state': 'closed'},
+        ])
+
+    def _get(self, **params):
+        return views.exposure_api(self.factory.get('/api/exposure/', params))
+
+    def test_snapshot_after_two_tasks(self):
+        """测试默认只返回开放端口，每个端点是最近一次观测的状态"""
+        response = self._get()
+        self.assertEqual(response.status_code, 200)
+        rows = {(row['ip_address'], row['port']): row for row in response.data['data']}
+        self.assertEqual(sorted(rows), [('10.0.0.1', 22), ('10.0.0.2', 443)])
+        self.assertEqual(rows[('10.0.0.1', 22)]['service'], 'openssh')
+        self.assertEqual(rows[('10.0.0.1', 22)]['last_task'], self.second.id)
+        self.assertEqual(rows[('10.0.0.2', 443)]['last_task'], self.first.id)
+        self.assertEqual(response.data['summary'], {'open_ports': 2, 'unique_hosts': 2})
+
+        self.assertEqual(endpoints(self._get(state='closed')), [('10.0.0.1', 80)])
+        self.assertEqual(len(self._get(state='all').data['data']), 3)
+        self.assertEqual(endpoints(self._get(state='all', cidr='10.0.0.0/31', ip_address='10.0.0.1')),
+                         [('10.0.0.1', 22), ('10.0.0.1', 80)])
+
+    def test_invalid_filters_rejected(self):
+        """测试不支持的状态和错误的网段返回400"""
+        for params in ({'state': 'bogus'}, {'cidr': '10.0.0.0/99'}, {'cidr': 'example.com'}):
+            with self.subTest(params=params):
+                response = self._get(**params)
+                self.assertEqual(response.status_code, 400)
+                self.assertFalse(response.data['success'])
+
+
+class TaskDiffApiTest(TestCase):
+    """任务差异与变化事件API测试"""
+
+    def setUp(self):
+        self.factory = APIRequestFactory()
+        self.base = scan([
+            {'ip_address': '10.0.0.1', 'port': 22, 'state': 'open', 'service': 'ssh'},
+            {'ip_address': '10.0.0.1', 'port': 80, 'state': 'open', 'service': 'http'},
+            {'ip_address': '10.0.0.2', 'port': 443, 'state': 'open', 'service': 'https'},
+        ])
+        self.target = scan([
+            {'ip_address': '10.0.0.1', 'port': 22, 'state': 'open', 'service': 'ssh'},
+            {'ip_address': '10.0.0.1', 'port': 80, 'state': 'open', 'service': 'nginx'},
+            {'ip_address': '10.0.0.1', 'port': 8080, 'state': 'open', 'service': 'http-proxy'},
+        ])
+
+    def _diff(self, task_id, **params):
+        return views.task_diff_api(self.factory.get(f'/api/tasks/{task_id}/diff/', params), task_id=task_id)
+
+    def _events(self, **params):
+        return views.change_events_api(self.factory.get('/api/changes/', params))
+
+    def test_diff_against_base_task(self):
+        """测试指定 base 时比较两次任务"""
+        response = self._diff(self.target.id, base=self.base.id)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['base'], str(self.base.id))
+        data = response.data['data']
+        self.assertEqual([(row['ip_address'], row['port']) for row in data['added']], [('10.0.0.1', 8080)])
+        self.assertEqual([(row['ip_address'], row['port']) for row in data['removed']], [('10.0.0.2', 443)])
+        self.assertEqual([(row['port'], row['old_service'], row['service']) for row in data['changed']],
+                         [(80, 'http', 'nginx')])
+        self.assertEqual(response.data['summary'], {'added': 1, 'removed': 1, 'changed': 1})
+
+    def test_diff_against_exposure(self):
+        """测试不指定 base 时与当前暴露面比较"""
+        response = self._diff(self.base.id)
+        self.assertEqual(response.data['base'], 'exposure')
+        self.assertEqual([row['port'] for row in response.data['data']['added']], [8080])
+        self.assertEqual([row['port'] for row in response.data['data']['changed']], [80])
+
+    def test_unknown_task_not_found(self):
+        """测试任务或 base 任务不存在时返回404"""
+        self.assertEqual(self._diff(999999).status_code, 404)
+        self.assertEqual(self._diff(self.target.id, base=999999).status_code, 404)
+
+    def test_change_event_filters(self):
+        """测试按任务、变化类型、端口、网段和时间过滤变化事件"""
+        response = self._events(task_id=self.target.id)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(sorted((row['change_type'], row['port']) for row in response.data['data']),
+                         [('ADDED', 8080), ('CHANGED', 80)])
+        self.assertEqual(endpoints(self._events(task_id=self.target.id, change_type='ADDED')),
+                         [('10.0.0.1', 8080)])
+        self.assertEqual(endpoints(self._events(ports='8000-9000', cidr='10.0.0.0/30')), [('10.0.0.1', 8080)])
+        future = (timezone.now() + timedelta(hours=1)).isoformat()
+        self.assertEqual(self._events(since=future).data['total'], 0)
+
+    def test_invalid_event_filters_rejected(self):
+        """测试不支持的变化类型、错误的时间、网段和端口规格返回400"""
+        for params in ({'change_type': 'EXPLODED'}, {'since': 'yesterday'}, {'cidr': '10.0.0.0/40'},
+                       {'ports': '1-x'}):
+            with self.subTest(params=params):
+                response = self._events(**params)
+                self.assertEqual(response.status_code, 400)
+                self.assertFalse(response.data['success'])
+
+
+class TopologyApiTest(TestCase):
+    """拓扑路径与共同上游API测试"""
+
+    EDGES = [
+        ('10.0.0.1', '10.0.0.2', 1.0), ('10.0.0.2', '10.0.0.9', 2.0),
+        ('10.0.0.1', '10.0.0.4', 4.0), ('10.0.0.4', '10.0.0.5', 5.0), ('10.0.0.5', '10.0.0.9', 6.0),
+    ]
+
+    def setUp(self):
+        self.factory = APIRequestFactory()
+        self.task = ScanTask.objects.create(name='路由跟踪', target='10.0.0.9', scan_type='TRACEROUTE')
+        save_topology(self.task, [{'source_ip': source, 'destination_ip': destination, 'metadata': {'rtt': rtt}}
+                                  for source, destination, rtt in self.EDGES])
+
+    def _path(self, task_id=None, **params):
+        task_id = task_id or self.task.id
+        return views.topology_path_api(self.factory.get('/api/topology/path/', params), task_id=task_id)
+
+    def _upstream(self, task_id=None, **params):
+        task_id = task_id or self.task.id
+        return views.topology_upstream_api(self.factory.get('/api/topology/upstream/', params), task_id=task_id)
+
+    def test_path(self):
+        """测试跳数最少的路径和按RTT加权的前k条路径"""
+        response = self._path(source='10.0.0.1', target='10.0.0.9', k=3)
+        self.assertEqual(response.status_code, 200)
+        data = response.data['data']
+        self.assertEqual(data['shortest_path'], ['10.0.0.1', '10.0.0.2', '10.0.0.9'])
+        self.assertEqual([item['path'] for item in data['weighted_paths']], [
+            ['10.0.0.1', '10.0.0.2', '10.0.0.9'],
+            ['10.0.0.1', '10.0.0.4', '10.0.0.5', '10.0.0.9'],
+        ])
+        self.assertEqual(data['weighted_paths'][0]['rtt'], 2.0)
+        self.assertEqual(len(self._path(source='10.0.0.1', target='10.0.0.9').data['data']['weighted_paths']), 1)
+
+    def test_path_errors(self):
+        """测试缺少参数、k不是整数返回400，节点或任务不存在返回404"""
+        self.assertEqual(self._path(source='10.0.0.1').status_code, 400)
+        self.assertEqual(self._path(source='10.0.0.1', target='10.0.0.9', k='many').status_code, 400)
+        self.assertEqual(self._path(source='10.0.0.1', target='192.0.2.1').status_code, 404)
+        self.assertEqual(self._path(task_id=999999, source='10.0.0.1', target='10.0.0.9').status_code, 404)
+
+    def test_upstream(self):
+        """测试共同上游节点，指定 root 时返回共同必经节点"""
+        response = self._upstream(targets='10.0.0.2, 10.0.0.5', root='10.0.0.1')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['data'], {
+            'common_upstream': [{'ip': '10.0.0.1', 'max_hops': 2}],
+            'common_dominators': ['10.0.0.1'],
+        })
+        self.assertIsNone(self._upstream(targets='10.0.0.5').data['data']['common_dominators'])
+
+    def test_upstream_errors(self):
+        """测试缺少 targets 返回400，节点或任务不存在返回404"""
+        self.assertEqual(self._upstream().status_code, 400)
+        self.assertEqual(self._upstream(targets=' , ').status_code, 400)
+        self.assertEqual(self._upstream(targets='10.0.0.2,192.0.2.1').status_code, 404)
+        self.assertEqual(self._upstream(task_id=999999, targets='10.0.0.2').status_code, 404)
+
+
+class HopCountCheckApiTest(TestCase):
+    """跳数过滤检查API测试"""
+
+    def setUp(self):
+        self.factory = APIRequestFactory()
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        settings = override_settings(HCF_TABLE_PATH=os.path.join(tmp.name, 'hcf.npz'))
+        settings.enable()
+        self.addCleanup(settings.disable)
+        task = ScanTask.objects.create(name='ping', target='198.51.100.0/24', scan_type='PING_SWEEP')
+        save_scan_results(task, [{'ip_address': '198.51.100.10', 'state': 'up', 'ttl': 53}])
+
+    def _check(self, data):
+        return views.hcf_check_api(self.factory.post('/api/hcf/check/', data, format='json'))
+
+    def test_check(self):
+        """测试跳数表编译前返回503，编译后按源地址汇总疑似伪造的报文"""
+        packets = [['198.51.100.1', 53], ['198.51.100.1', 40], ['198.51.100.1', 40], ['192.0.2.1', 60]]
+        self.assertEqual(self._check({'packets': packets}).status_code, 503)
+
+        refresh_hcf_table()
+        response = self._check({'packets': packets})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['data'], {
+            'total': 4, 'known': 3, 'spoofed': 2,
+            'spoofed_sources': [{'ip': '198.51.100.1', 'packets': 2}],
+        })
+        self.assertEqual(self._check({'packets': packets, 'tolerance': 20}).data['data']['spoofed'], 0)
+
+    def test_malformed_packets_rejected(self):
+        """测试报文不是 [源地址, TTL] 列表或容差不是整数时返回400"""
+        refresh_hcf_table()
+        for data in ({'packets': [['198.51.100.1']]}, {'packets': [['198.51.100.1', 'high']]},
+                     {'packets': 'abc'}, {'packets': [['198.51.100.1', 53]], 'tolerance': 'x'}):
+            with self.subTest(data=data):
+                response = self._check(data)
+                self.assertEqual(response.status_code, 400)
+                self.assertFalse(response.data['success'])
+
+
+class CorrelationReportApiTest(TestCase):
+    """攻击源关联报告API测试"""
+
+    def setUp(self):
+        self.factory = APIRequestFactory()
+        self.capture = TrafficCapture.objects.create(name='attack', file_path='/tmp/attack.pcap', status='COMPLETED')
+        self.trace = ScanTask.objects.create(name='trace', target='198.51.100.10', scan_type='TRACEROUTE')
+
+    def _get(self, capture_id=None, **params):
+        capture_id = capture_id or self.capture.id
+        return views.correlation_report_api(self.factory.get('/api/correlation/', params), capture_id=capture_id)
+
+    def test_latest_report(self):
+        """测试返回最近一次报告，limit 限制候选数"""
+        old = CorrelationReport.objects.create(capture=self.capture, source_count=1)
+        CorrelationReport.objects.filter(pk=old.pk).update(created_at=timezone.now() - timedelta(days=1))
+        candidates = [{'ip': f'198.51.100.{i}', 'open_ports': 3 - i} for i in range(3)]
+        CorrelationReport.objects.create(capture=self.capture, topology_task=self.trace, source_count=5,
+                                         scanned_count=3, exposed_count=2, candidates=candidates)
+
+        response = self._get()
+        self.assertEqual(response.status_code, 200)
+        data = response.data['data']
+        self.assertEqual((data['source_count'], data['scanned_count'], data['exposed_count']), (5, 3, 2))
+        self.assertEqual(data['topology_task'], self.trace.id)
+        self.assertEqual(data['candidates'], candidates)
+        self.assertEqual(self._get(limit=2).data['data']['candidates'], candidates[:2])
+        self.assertEqual(self._get(limit=0).data['data']['candidates'], candidates[:1])
+
+    def test_errors(self):
+        """测试没有报告或抓包不存在时返回404，limit 不是整数返回400"""
+        self.assertEqual(self._get().status_code, 404)
+        self.assertEqual(self._get(capture_id=999999).status_code, 404)
+        CorrelationReport.objects.create(capture=self.capture)
+        self.assertEqual(self._get().status_code, 200)
+        self.assertEqual(self._get(limit='all').status_code, 400)
+
+
+class DeviceAddressesApiTest(TestCase):
+    """设备地址API测试"""
+
+    SSH_KEY = 'rsa:f0:e6:11:22:33:44:55:66:77:88:99:aa:bb:cc:dd:ee'
+
+    def setUp(self):
+        # 指纹缓存是进程级的，测试回滚后缓存的主键不再有效
+        fingerprint_cache.clear()
+        self.factory = APIRequestFactory()
+
+    def _scan(self, *devices):
+        task = ScanTask.objects.create(name='身份任务', target='10.0.0.0/24', scan_type='TCP_SCAN')
+        save_scan_results(task, [
+            {'ip_address': ip, 'mac_address': mac, 'port': 22, 'state': 'open', 'service': 'ssh',
+             'fingerprint': {'product': 'OpenSSH', 'ssh_hostkey': [self.SSH_KEY]}}
+            for ip, mac in devices
+        ])
+        ScanTask.objects.filter(pk=task.pk).update(status='COMPLETED', completed_at=timezone.now())
+        task.refresh_from_db()
+        update_identities(task)
+        return task
+
+    def _get(self, **params):
+        return views.device_addresses_api(self.factory.get('/api/devices/', params))
+
+    def test_addresses_grouped_by_device(self):
+        """测试返回同一设备用过的全部地址，按设备身份分组"""
+        self._scan(('10.0.0.5', 'aa:bb:cc:00:11:22'))
+        last = self._scan(('10.0.0.9', 'aa:bb:cc:00:11:22'))
+
+        response = self._get(ip_address='10.0.0.5')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['total'], 1)
+        device = response.data['data'][0]
+        self.assertEqual(device['mac_address'], 'aa:bb:cc:00:11:22')
+        self.assertEqual(device['ssh_hostkeys'], [self.SSH_KEY])
+        addresses = {address['ip_address']: address for address in device['addresses']}
+        self.assertEqual(sorted(addresses), ['10.0.0.5', '10.0.0.9'])
+        self.assertEqual(addresses['10.0.0.9']['last_task'], last.id)
+
+        self.assertEqual(self._get(ip_address='10.0.0.77').data['total'], 0)
+
+    def test_invalid_requests_rejected(self):
+        """测试缺少地址或地址格式错误时返回400"""
+        self.assertEqual(self._get().status_code, 400)
+        response = self._get(ip_address='not-an-ip')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(response.data['success'])
@@ -1,8 +1,14 @@
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from django.shortcuts import get_object_or_404
-from scanner.models import ScanTask, ScanResult
-from scanner.serializers import ScanTaskSerializer, ScanResultSerializer
+from django.utils.dateparse import parse_datetime
+from scanner.models import ScanTask, ScanResult, ExposureSnapshot, ChangeEvent
+from scanner.serializers import (
+    ScanTaskSerializer, ScanResultSerializer, ExposureSnapshotSerializer, ChangeEventSerializer
+)
+from scanner.exposure import exposure_counts
+from scanner.diff import diff_tasks, diff_task_with_exposure
+from scanner.fields import PortStateField
 import json
 
 @api_view(['GET'])
@@ -31,7 +37,7 @@ def task_status_api(request, task_id):
 @api_view(['POST'])
 def create_task_api(request):
     """创建扫描任务API"""
-    from scanner.tasks import run_scan_task
+    from scanner.scheduling import submit
     
     try:
         # 创建扫描任务记录
@@ -40,15 +46,18 @@ def create_task_api(request):
             target=request.data.get('target'),
             scan_type=request.data.get('scan_type'),
             ports=request.data.get('ports', '1-1000'),
+            incremental=bool(request.data.get('incremental', False)),
             created_by=request.user if request.user.is_authenticated else None
         )
         
-        # 异步执行扫描任务
-        run_scan_task.delay(task.id)
+        # 提交调度队列，按优先级和用户公平份额执行
+        submit(task, priority=request.data.get('priority'))
         
         return Response({
             'success': True,
             'task_id': task.id,
+            'priority': task.priority,
+            'estimated_cost': task.estimated_cost,
             'message': '任务创建成功，正在后台执行'
         })
         
@@ -64,15 +73,30 @@ def scan_results_api(request):
     task_id = request.GET.get('task_id')
     ip_address = request.GET.get('ip_address')
     state = request.GET.get('state')
+    cidr = request.GET.get('cidr')
+    ports = request.GET.get('ports')
     
-    results = ScanResult.objects.all()
+    results = ScanResult.objects.select_related('task', 'host')
     
-    if task_id:
-        results = results.filter(task_id=task_id)
-    if ip_address:
-        results = results.filter(ip_address=ip_address)
-    if state:
-        results = results.filter(state=state)
+    try:
+        if task_id:
+            task = ScanTask.objects.filter(id=task_id).first()
+            results = results.for_task(task) if task else results.none()
+        if ip_address:
+            results = results.filter(ip_address=ip_address)
+        if cidr:
+            results = results.in_cidr(cidr)
+        if ports:
+            results = results.in_ports(ports)
+        if state:
+            if state not in PortStateField.CODES:
+                raise ValueError(f'不支持的状态: {state}')
+            results = results.filter(state=state)
+    except ValueError as e:
+        return Response({
+            'success': False,
+            'error': str(e)
+        }, status=400)
     
     serializer = ScanResultSerializer(results, many=True)
     return Response({
@@ -81,6 +105,105 @@ def scan_results_api(request):
         'total': results.count()
     })
 
+@api_view(['GET'])
+def exposure_api(request):
+    """获取当前暴露面API，默认只返回开放端口"""
+    ip_address = request.GET.get('ip_address')
+    cidr = request.GET.get('cidr')
+    state = request.GET.get('state', 'open')
+    
+    snapshots = ExposureSnapshot.objects.all()
+    
+    try:
+        if ip_address:
+            snapshots = snapshots.filter(ip_address=ip_address)
+        if cidr:
+            snapshots = snapshots.in_cidr(cidr)
+        if state != 'all':
+            if state not in PortStateField.CODES:
+                raise ValueError(f'不支持的状态: {state}')
+            snapshots = snapshots.filter(state=state)
+    except ValueError as e:
+        return Response({
+            'success': False,
+            'error': str(e)
+        }, status=400)
+    
+    serializer = ExposureSnapshotSerializer(snapshots, many=True)
+    return Response({
+        'success': True,
+        'data': serializer.data,
+        'total': snapshots.count(),
+        'summary': exposure_counts()
+    })
+
+@api_view(['GET'])
+def task_diff_api(request, task_id):
+    """
+    任务差异API
+    指定 base 时比较两次任务（base -> task_id），否则比较该任务与当前暴露面
+    """
+    task = get_object_or_404(ScanTask, id=task_id)
+    base_id = request.GET.get('base')
+    
+    if base_id:
+        base = get_object_or_404(ScanTask, id=base_id)
+        diff = diff_tasks(base, task)
+    else:
+        diff = diff_task_with_exposure(task)
+    
+    data = {key: list(rows) for key, rows in diff.items()}
+    return Response({
+        'success': True,
+        'task_id': task.id,
+        'base': base_id or 'exposure',
+        'data': data,
+        'summary': {key: len(rows) for key, rows in data.items()}
+    })
+
+@api_view(['GET'])
+def change_events_api(request):
+    """获取变化事件API"""
+    task_id = request.GET.get('task_id')
+    ip_address = request.GET.get('ip_address')
+    cidr = request.GET.get('cidr')
+    ports = request.GET.get('ports')
+    change_type = request.GET.get('change_type')
+    since = request.GET.get('since')
+    
+    events = ChangeEvent.objects.all()
+    
+    try:
+        if task_id:
+            events = events.filter(task_id=task_id)
+        if ip_address:
+            events = events.filter(ip_address=ip_address)
+        if cidr:
+            events = events.in_cidr(cidr)
+        if ports:
+            events = events.in_ports(ports)
+        if change_type:
+            if change_type not in dict(ChangeEvent.CHANGE_TYPE_CHOICES):
+                raise ValueError(f'不支持的变化类型: {change_type}')
+            events = events.filter(change_type=change_type)
+        if since:
+            since_at = parse_datetime(since)
+            if since_at is None:
+                raise ValueError(f'时间格式不正确: {since}')
+            events = events.filter(created_at__gte=since_at)
+    except ValueError as e:
+        return Response({
+            'success': False,
+            'error': str(e)
+        }, status=400)
+    
+    serializer = ChangeEventSerializer(events, many=True)
+    return Response({
+        'success': True,
+        'data': serializer.data,
+        'total': events.count()
+    })
+
 @api_view(['GET'])
 def topology_data_api(request):
     """获取网络拓扑数据API"""
@@ -96,4 +219,162 @@ def topology_data_api(request):
         return Response({
             'success': False,
             'error': str(e)
-        }, status=500)
\ No newline at end of file
+        }, status=500)
+
+@api_view(['GET'])
+def topology_path_api(request, task_id):
+    """
+    拓扑路径查询API
+    source、target 之间跳数最少的路径和按RTT加权的前k条路径（k默认为1）
+    """
+    from scanner.topology import get_graph
+    
+    task = get_object_or_404(ScanTask, id=task_id)
+    source = request.GET.get('source')
+    target = request.GET.get('target')
+    if not source or not target:
+        return Response({'success': False, 'error': '需要 source 和 target 参数'}, status=400)
+    try:
+        k = min(max(int(request.GET.get('k', 1)), 1), 20)
+    except ValueError:
+        return Response({'success': False, 'error': 'k 必须是整数'}, status=400)
+    
+    graph = get_graph(task)
+    try:
+        hops = graph.shortest_path(source, target)
+        paths = graph.k_shortest_paths(source, target, k)
+    except KeyError as e:
+        return Response({'success': False, 'error': str(e.args[0])}, status=404)
+    
+    return Response({
+        'success': True,
+        'task_id': task.id,
+        'data': {
+            'shortest_path': hops,
+            'weighted_paths': [{'rtt': round(cost, 3), 'path': path} for cost, path in paths],
+        }
+    })
+
+@api_view(['GET'])
+def topology_upstream_api(request, task_id):
+    """
+    共同上游查询API
+    targets 为逗号分隔的节点；指定 root（通常为扫描点）时同时返回所有目标共同的必经节点
+    """
+    from scanner.topology import get_graph
+    
+    task = get_object_or_404(ScanTask, id=task_id)
+    targets = [ip.strip() for ip in request.GET.get('targets', '').split(',') if ip.strip()]
+    if not targets:
+        return Response({'success': False, 'error': '需要 targets 参数'}, status=400)
+    root = request.GET.get('root')
+    
+    graph = get_graph(task)
+    try:
+        upstream = graph.common_upstream(targets)
+        dominators = graph.common_dominators(root, targets) if root else None
+    except KeyError as e:
+        return Response({'success': False, 'error': str(e.args[0])}, status=404)
+    
+    return Response({
+        'success': True,
+        'task_id': task.id,
+        'data': {
+            'common_upstream': [{'ip': ip, 'max_hops': hops} for ip, hops in upstream],
+            'common_dominators': dominators,
+        }
+    })
+
+@api_view(['POST'])
+def hcf_check_api(request):
+    """
+    跳数过滤检查API
+    packets 为 [源地址, TTL] 列表，返回跳数与源网段不符（疑似伪造源地址）的报文统计
+    """
+    from scanner.tracing.hcf import DEFAULT_TOLERANCE, summarize
+    
+    packets = request.data.get('packets') or []
+    try:
+        sources = [str(src) for src, _ in packets]
+        ttls = [int(ttl) for _, ttl in packets]
+        tolerance = int(request.data.get('tolerance', DEFAULT_TOLERANCE))
+    except (TypeError, ValueError):
+        return Response({'success': False, 'error': 'packets 必须是 [源地址, TTL] 列表'}, status=400)
+    
+    result = summarize(sources, ttls, tolerance=tolerance)
+    if result is None:
+        return Response({'success': False, 'error': '跳数表尚未编译'}, status=503)
+    return Response({'success': True, 'data': result})
+
+@api_view(['GET'])
+def correlation_report_api(request, capture_id):
+    """
+    攻击源关联报告API
+    返回抓包最近一次的关联报告；limit 限制返回的候选数（默认100）
+    """
+    from scanner.models import CorrelationReport, TrafficCapture
+    
+    capture = get_object_or_404(TrafficCapture, id=capture_id)
+    report = CorrelationReport.objects.filter(capture=capture).first()
+    if report is None:
+        return Response({'success': False, 'error': '该抓包尚未生成关联报告'}, status=404)
+    try:
+        limit = min(max(int(request.GET.get('limit', 100)), 1), len(report.candidates) or 1)
+    except ValueError:
+        return Response({'success': False, 'error': 'limit 必须是整数'}, status=400)
+    
+    return Response({
+        'success': True,
+        'capture_id': capture.id,
+        'data': {
+            'created_at': report.created_at,
+            'topology_task': report.topology_task_id,
+            'source_count': report.source_count,
+            'scanned_count': report.scanned_count,
+            'exposed_count': report.exposed_count,
+            'candidates': report.candidates[:limit],
+        }
+    })
+
+@api_view(['GET'])
+def device_addresses_api(request):
+    """
+    设备地址API
+    返回与 ip_address 属于同一设备的全部地址，按设备身份分组
+    """
+    from scanner.identity import device_addresses
+    
+    ip_address = request.GET.get('ip_address')
+    if not ip_address:
+        return Response({'success': False, 'error': '缺少 ip_address 参数'}, status=400)
+    try:
+        addresses = list(device_addresses(ip_address))
+    except ValueError as e:
+        return Response({'success': False, 'error': str(e)}, status=400)
+    
+    devices = {}
+    for address in addresses:
+        identity = address.identity
+        device = devices.setdefault(identity.id, {
+            'digest': identity.digest,
+            'mac_address': identity.mac_address,
+            'ssh_hostkeys': identity.ssh_hostkeys,
+            'tls_certificates': identity.tls_certificates,
+            'port_signature': identity.port_signature,
+            'first_seen': identity.first_seen,
+            'last_seen': identity.last_seen,
+            'addresses': [],
+        })
+        device['addresses'].append({
+            'ip_address': address.ip_address,
+            'first_seen': address.first_seen,
+            'last_seen': address.last_seen,
+            'last_task': address.last_task_id,
+        })
+    
+    return Response({
+        'success': True,
+        'ip_address': ip_address,
+        'data': list(devices.values()),
+        'total': len(devices)
+    })
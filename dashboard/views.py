@@ -5,7 +5,9 @@ from django.views.decorators.http import require_GET
 from django.db import connection
 from django.core.cache import cache
 from django.utils import timezone
-from scanner.models import ScanTask, ScanResult
+from scanner.models import ScanTask, ScanResult, NetworkTopology
+from scanner.exposure import exposure_counts
+from scanner.topology import alias_map, collapse_edges
 from django.db.models import Count, Q
 import psutil
 import os
@@ -31,9 +33,10 @@ def dashboard(request):
         .order_by('-count')
     )
     
-    # 端口统计
-    open_ports = ScanResult.objects.filter(state='open').count()
-    unique_hosts = ScanResult.objects.values('ip_address').distinct().count()
+    # 端口统计（来自当前暴露面快照，不再扫描全部历史结果）
+    counts = exposure_counts()
+    open_ports = counts['open_ports']
+    unique_hosts = counts['unique_hosts']
     
     # 最近扫描结果
     recent_results = ScanResult.objects.select_related('task').order_by('-discovered_at')[:10]
@@ -381,8 +384,7 @@ def get_port_distribution_data():
     }
 
 def get_topology_data():
-    """获取网络拓扑数据（简化版）"""
-    # 这里可以实现更复杂的拓扑发现逻辑
+    """获取网络拓扑数据：扫描到的主机和路由跟踪发现的逐跳链路"""
     hosts = (
         ScanResult.objects
         .values('ip_address')
@@ -392,8 +394,10 @@ def get_topology_data():
     
     nodes = []
     links = []
+    seen = set()
     
     for i, host in enumerate(hosts):
+        seen.add(host['ip_address'])
         nodes.append({
             'id': host['ip_address'],
             'name': host['ip_address'],
@@ -401,11 +405,17 @@ def get_topology_data():
             'category': 0 if host['port_count'] > 5 else 1  # 根据端口数量分类
         })
     
-    # 简单的链接关系（实际应用中需要更复杂的发现逻辑）
-    if len(nodes) > 1:
+    # 同一台路由器的多个接口合并为一个节点
+    edges = NetworkTopology.objects.order_by().values_list('source_ip', 'destination_ip').distinct()
+    for source, target in collapse_edges(edges, alias_map()):
+        # 只在路径中出现的中间路由器单独归为一类
+        for ip in (source, target):
+            if ip not in seen:
+                seen.add(ip)
+                nodes.append({'id': ip, 'name': ip, 'value': 0, 'category': 2})
         links.append({
-            'source': nodes[0]['id'],
-            'target': nodes[1]['id']
+            'source': source,
+            'target': target
         })
     
     return {
@@ -2,22 +2,27 @@ from django.contrib import admin
 from django.utils.html import format_html
 from django.contrib import messages
 from django.http import HttpResponseRedirect
-from .models import ScanTask, ScanResult, NetworkTopology
+from .models import ScanTask, ScanExclusion, ScanHost, Fingerprint, ScanResult, ExposureSnapshot, ChangeEvent, NetworkTopology, RouterInterface, TrafficCapture, AttackFlow, CorrelationReport, VantagePoint, RTTMeasurement, GeoEstimate, HostIdentity, IdentityAddress, ProbeRegion
 
 @admin.register(ScanTask)
 class ScanTaskAdmin(admin.ModelAdmin):
     """扫描任务管理界面"""
-    list_display = ['name', 'target', 'scan_type', 'status', 'progress_bar', 
+    list_display = ['name', 'target', 'scan_type', 'status', 'priority', 'progress_bar', 
                    'created_at', 'created_by']
-    list_filter = ['scan_type', 'status', 'created_at']
+    list_filter = ['scan_type', 'status', 'priority', 'incremental', 'created_at']
     search_fields = ['name', 'target', 'description']
-    readonly_fields = ['created_at', 'started_at', 'completed_at', 'progress']
+    raw_id_fields = ['baseline_task']
+    readonly_fields = ['created_at', 'started_at', 'completed_at', 'progress',
+                       'estimated_cost', 'queued_at', 'dispatched_at', 'preemptions']
     fieldsets = (
         ('基本信息', {
             'fields': ('name', 'description', 'created_by')
         }),
         ('扫描配置', {
-            'fields': ('target', 'scan_type', 'ports', 'options')
+            'fields': ('target', 'scan_type', 'ports', 'options', 'incremental', 'baseline_task')
+        }),
+        ('调度', {
+            'fields': ('priority', 'estimated_cost', 'queued_at', 'dispatched_at', 'preemptions')
         }),
         ('任务状态', {
             'fields': ('status', 'progress', 'result_summary')
@@ -31,7 +36,7 @@ class ScanTaskAdmin(admin.ModelAdmin):
         """
         运行选中的扫描任务
         """
-        from .tasks import run_scan_task  # 延迟导入，避免循环依赖
+        from .scheduling import submit  # 延迟导入，避免循环依赖
         
         for task in queryset:
             if task.status in ['PENDING', 'FAILED']:
@@ -42,8 +47,8 @@ class ScanTaskAdmin(admin.ModelAdmin):
                 task.completed_at = None
                 task.save()
                 
-                # 异步执行扫描任务
-                run_scan_task.delay(task.id)
+                # 提交调度队列
+                submit(task, priority=task.priority)
                 self.message_user(
                     request, 
                     f"任务 '{task.name}' 已开始执行", 
@@ -79,8 +84,10 @@ class ScanTaskAdmin(admin.ModelAdmin):
             task.result_summary = {}
             task.save()
             
-            # 删除关联的扫描结果
+            # 删除关联的扫描结果、主机和执行计划
             task.results.all().delete()
+            task.hosts.all().delete()
+            task.probe_regions.all().delete()
             
             self.message_user(
                 request, 
@@ -129,18 +136,80 @@ class ScanTaskAdmin(admin.ModelAdmin):
             obj.created_by = request.user
         super().save_model(request, obj, form, change)
 
+@admin.register(ScanExclusion)
+class ScanExclusionAdmin(admin.ModelAdmin):
+    """扫描排除项管理界面"""
+    list_display = ['network', 'task', 'reason', 'enabled', 'created_at']
+    list_filter = ['enabled', 'created_at']
+    search_fields = ['network', 'reason']
+    raw_id_fields = ['task']
+
+@admin.register(ScanHost)
+class ScanHostAdmin(admin.ModelAdmin):
+    """扫描主机管理界面"""
+    list_display = ['ip_address', 'hostname', 'mac_address', 'vendor', 'os_family', 'asn', 'country', 'task']
+    list_filter = ['os_family', 'country', 'task']
+    search_fields = ['ip_address', 'hostname', 'mac_address', 'vendor', 'as_org']
+    raw_id_fields = ['carried_from']
+    
+    def has_add_permission(self, request):
+        """禁止手动添加扫描主机"""
+        return False
+
+@admin.register(Fingerprint)
+class FingerprintAdmin(admin.ModelAdmin):
+    """服务指纹管理界面"""
+    list_display = ['digest', 'data', 'created_at']
+    search_fields = ['digest']
+    readonly_fields = ['digest', 'data', 'created_at']
+
 @admin.register(ScanResult)
 class ScanResultAdmin(admin.ModelAdmin):
     """扫描结果管理界面"""
     list_display = ['ip_address', 'port', 'protocol', 'state', 'service', 'task']
     list_filter = ['state', 'protocol', 'discovered_at', 'task']
-    search_fields = ['ip_address', 'hostname', 'service']
+    search_fields = ['host__hostname', 'service']
     readonly_fields = ['discovered_at']
+    raw_id_fields = ['host', 'fingerprint']
+    
+    def get_search_results(self, request, queryset, search_term):
+        """IP以打包形式存储，不能做模糊匹配，按完整地址或网段精确查找"""
+        results, may_have_duplicates = super().get_search_results(request, queryset, search_term)
+        term = search_term.strip()
+        try:
+            if '/' in term:
+                results |= queryset.in_cidr(term)
+            elif term:
+                results |= queryset.filter(ip_address=term)
+        except ValueError:
+            pass
+        return results, may_have_duplicates
     
     def has_add_permission(self, request):
         """禁止手动添加扫描结果"""
         return False
 
+@admin.register(ExposureSnapshot)
+class ExposureSnapshotAdmin(admin.ModelAdmin):
+    """当前暴露面管理界面"""
+    list_display = ['ip_address', 'port', 'protocol', 'state', 'service', 'first_seen', 'last_seen']
+    list_filter = ['state', 'protocol']
+    search_fields = ['service']
+    readonly_fields = ['first_seen', 'last_seen', 'last_task']
+
+@admin.register(ChangeEvent)
+class ChangeEventAdmin(admin.ModelAdmin):
+    """变化事件管理界面（只读）"""
+    list_display = ['created_at', 'change_type', 'ip_address', 'port', 'protocol', 'old_state', 'new_state', 'task']
+    list_filter = ['change_type', 'protocol', 'created_at']
+    raw_id_fields = ['task']
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+
 @admin.register(NetworkTopology)
 class NetworkTopologyAdmin(admin.ModelAdmin):
     """网络拓扑管理界面"""
@@ -148,6 +217,81 @@ class NetworkTopologyAdmin(admin.ModelAdmin):
     list_filter = ['connection_type', 'created_at']
     search_fields = ['source_ip', 'destination_ip']
 
+@admin.register(RouterInterface)
+class RouterInterfaceAdmin(admin.ModelAdmin):
+    """路由器接口别名管理界面"""
+    list_display = ['ip_address', 'router', 'evidence', 'task', 'created_at']
+    list_filter = ['evidence', 'created_at']
+    search_fields = ['ip_address', 'router']
+    raw_id_fields = ['task']
+
+@admin.register(TrafficCapture)
+class TrafficCaptureAdmin(admin.ModelAdmin):
+    """攻击流量抓包管理界面"""
+    list_display = ['name', 'status', 'packets', 'flow_count', 'spoofed_packets', 'created_at']
+    list_filter = ['status', 'created_at']
+    search_fields = ['name', 'file_path']
+    readonly_fields = ['packets', 'bytes', 'skipped_packets', 'spoofed_packets', 'flow_count',
+                       'first_packet_at', 'last_packet_at', 'created_at', 'started_at', 'completed_at']
+
+@admin.register(AttackFlow)
+class AttackFlowAdmin(admin.ModelAdmin):
+    """攻击流管理界面"""
+    list_display = ['src_ip', 'dst_ip', 'dst_port', 'protocol', 'packets', 'bytes', 'spoofed_packets', 'capture']
+    list_filter = ['protocol']
+    raw_id_fields = ['capture']
+
+@admin.register(CorrelationReport)
+class CorrelationReportAdmin(admin.ModelAdmin):
+    """攻击源关联报告管理界面"""
+    list_display = ['capture', 'source_count', 'scanned_count', 'exposed_count', 'topology_task', 'created_at']
+    list_filter = ['created_at']
+    raw_id_fields = ['capture', 'topology_task']
+    readonly_fields = ['created_at']
+
+@admin.register(VantagePoint)
+class VantagePointAdmin(admin.ModelAdmin):
+    """探测点管理界面"""
+    list_display = ['name', 'queue', 'latitude', 'longitude', 'is_active', 'last_seen']
+    list_filter = ['is_active']
+    search_fields = ['name', 'queue', 'description']
+    readonly_fields = ['last_seen', 'created_at']
+
+@admin.register(RTTMeasurement)
+class RTTMeasurementAdmin(admin.ModelAdmin):
+    """RTT测量管理界面"""
+    list_display = ['ip_address', 'vantage', 'rtt', 'samples', 'task', 'measured_at']
+    list_filter = ['vantage']
+    raw_id_fields = ['task']
+
+@admin.register(GeoEstimate)
+class GeoEstimateAdmin(admin.ModelAdmin):
+    """地理位置估计管理界面"""
+    list_display = ['ip_address', 'latitude', 'longitude', 'radius_km', 'vantage_count', 'task']
+    raw_id_fields = ['task']
+
+class IdentityAddressInline(admin.TabularInline):
+    model = IdentityAddress
+    extra = 0
+    raw_id_fields = ['last_task']
+
+@admin.register(HostIdentity)
+class HostIdentityAdmin(admin.ModelAdmin):
+    """设备身份管理界面"""
+    list_display = ['digest', 'mac_address', 'port_signature', 'first_seen', 'last_seen']
+    search_fields = ['digest', 'mac_address']
+    readonly_fields = ['digest', 'first_seen', 'last_seen']
+    raw_id_fields = ['last_task']
+    inlines = [IdentityAddressInline]
+
+@admin.register(ProbeRegion)
+class ProbeRegionAdmin(admin.ModelAdmin):
+    """合并探测区域管理界面"""
+    list_display = ['task', 'source', 'addresses', 'ports', 'status', 'result_count', 'created_at', 'delivered_at']
+    list_filter = ['status']
+    raw_id_fields = ['task', 'source']
+    readonly_fields = ['created_at', 'delivered_at']
+
 # 设置Admin站点标题
 admin.site.site_header = "网络扫描溯源系统管理后台"
 admin.site.site_title = "扫描溯源系统"
@@ -0,0 +1,421 @@
+"""
+重叠扫描合并
+多个用户常在几分钟内对重叠的网段和端口发起任务，各任务会独立探测同样的 (IP, 端口)。
+任务开始时查找扫描类型和选项相同、正在运行或在新鲜度窗口内刚完成的任务，
+与它们自己探测的 地址×端口 区域重叠的部分不再探测，而是订阅其结果：
+来源任务已完成时立即复制，仍在运行时由来源任务完成后分发给全部订阅者。
+本任务只探测剩余区域，所有区域的结果送达后才完成。
+
+只订阅开始时间更早的任务，订阅关系不会成环；来源任务自己也只提供它亲自探测的区域，
+结果不会经过多次转手而超出新鲜度窗口。来源任务失败或超时未完成时，订阅者自行补扫该区域。
+"""
+import logging
+from datetime import timedelta
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .exclusions import compile_exclusions
+from .fields import int_to_ip
+from .incremental import build_scanner
+from .ingest import HOST_FIELDS, save_scan_results
+from .liveness import LivenessCache
+from .models import ProbeRegion, ScanResult, ScanTask
+from .scanners.rangeset import IntervalSet, TargetSet, address_spec, to_networks, to_spec
+
+logger = logging.getLogger(__name__)
+
+Block = Tuple[IntervalSet, IntervalSet]
+
+# 新鲜度窗口（秒）：只合并在此时间内开始的任务，0 表示不合并
+DEFAULT_WINDOW = 600
+
+# 订阅的区域超过该时间（秒）仍未送达时自行补扫
+DEFAULT_TIMEOUT = 3600
+
+COALESCED_SCAN_TYPES = ('SYN_SCAN', 'UDP_SCAN', 'OS_DETECTION', 'SERVICE_DETECTION', 'FULL_SCAN')
+
+# 不影响单个 (IP, 端口) 探测结果的选项，判断任务能否合并时忽略
+NEUTRAL_OPTIONS = frozenset({
+    'port_order', 'target_order', 'seed', 'reverse_dns', 'vantage_points', 'alias_resolution', 'coalesce',
+})
+
+# 单个任务的分片数上限，目标很大时每片相应变大
+MAX_SHARDS = 1000
+
+RESULT_VALUES = ('ip_address', 'port', 'protocol', 'state', 'service', 'service_version', 'ttl', 'rtt')
+
+
+def coalescing_window() -> timedelta:
+    return timedelta(seconds=getattr(settings, 'SCAN_COALESCE_WINDOW', DEFAULT_WINDOW))
+
+
+def options_profile(options: Dict) -> Dict:
+    """影响探测结果的选项"""
+    return {key: value for key, value in (options or {}).items() if key not in NEUTRAL_OPTIONS}
+
+
+def can_coalesce(task: ScanTask) -> bool:
+    return (
+        task.scan_type in COALESCED_SCAN_TYPES
+        and not task.incremental
+        and task.options.get('coalesce', True)
+        and coalescing_window() > timedelta(0)
+    )
+
+
+def parse_ports(spec: str) -> IntervalSet:
+    try:
+        return IntervalSet.parse(spec)
+    except ValueError:
+        return IntervalSet()
+
+
+def task_block(task: ScanTask, target: str = None, exclusions: IntervalSet = None) -> Block:
+    """任务要探测的全部 地址×端口，目标中的域名不参与合并"""
+    if exclusions is None:
+        exclusions = compile_exclusions(task)
+    addresses = TargetSet.parse(target or task.target).addresses.subtract(exclusions)
+    return addresses, parse_ports(task.ports)
+
+
+def region_block(region: ProbeRegion) -> Block:
+    return TargetSet.parse(region.addresses).addresses, parse_ports(region.ports)
+
+
+def probed_blocks(task: ScanTask) -> List[Block]:
+    """
+    任务亲自探测的区域
+
+    没有合并记录的任务探测了整个目标；有记录时只算自己探测和自行补扫的区域。
+    """
+    regions = list(task.probe_regions.all())
+    if not regions:
+        return [task_block(task)]
+    return [
+        region_block(region) for region in regions
+        if region.source_id == task.id or region.status == 'PROBED'
+    ]
+
+
+def subtract_block(block: Block, cover: Block) -> Tuple[Optional[Block], List[Block]]:
+    """
+    从矩形区域中减去另一块矩形
+
+    Returns:
+        (重叠部分或None, 剩余部分)：A×P − B×Q = (A−B)×P ∪ (A∩B)×(P−Q)，两块互不相交
+    """
+    addresses, ports = block
+    shared_addresses = addresses.intersection(cover[0])
+    shared_ports = ports.intersection(cover[1])
+    if not shared_addresses or not shared_ports:
+        return None, [block]
+    remainder = []
+    outside = addresses.subtract(cover[0])
+    if outside:
+        remainder.append((outside, ports))
+    other_ports = ports.subtract(cover[1])
+    if other_ports:
+        remainder.append((shared_addresses, other_ports))
+    return (shared_addresses, shared_ports), remainder
+
+
+def find_sources(task: ScanTask, now=None) -> List[ScanTask]:
+    """
+    可订阅的来源任务
+
+    扫描类型和选项相同，在新鲜度窗口内开始，正在运行或已完成，且开始得比本任务早
+    （同时开始的按ID先后），保证订阅关系无环。
+    """
+    now = now or timezone.now()
+    started_at = task.started_at or now
+    candidates = (
+        ScanTask.objects
+        .filter(scan_type=task.scan_type, incremental=False, status__in=['RUNNING', 'COMPLETED'],
+                started_at__gte=now - coalescing_window())
+        .filter(Q(started_at__lt=started_at) | Q(started_at=started_at, id__lt=task.id))
+        .exclude(id=task.id)
+        .order_by('started_at', 'id')
+    )
+    profile = options_profile(task.options)
+    return [source for source in candidates if options_profile(source.options) == profile]
+
+
+class CoalescingPlan:
+    """
+    单个任务的合并计划
+
+    Attributes:
+        own: 本任务需要探测的区域
+        subscriptions: (来源任务, 地址, 端口) 订阅的区域
+    """
+
+    def __init__(self, task: ScanTask, block: Block):
+        self.task = task
+        self.own: List[Block] = [block] if block[0] and block[1] else []
+        self.subscriptions: List[Tuple[ScanTask, IntervalSet, IntervalSet]] = []
+
+    def subscribe(self, source: ScanTask, cover: Block):
+        remaining = []
+        for block in self.own:
+            shared, rest = subtract_block(block, cover)
+            if shared:
+                self.subscriptions.append((source, *shared))
+            remaining.extend(rest)
+        self.own = remaining
+
+    def shard(self, max_probes: int, max_shards: int = MAX_SHARDS):
+        """把自己的区域按地址切成每片约 max_probes 个 (地址, 端口) 的分片，逐片探测"""
+        total = sum(len(addresses) for addresses, _ in self.own)
+        shards = []
+        for addresses, ports in self.own:
+            size = max(1, max_probes // max(1, len(ports)), -(-total // max_shards))
+            shards.extend((chunk, ports) for chunk in addresses.chunks(size))
+        self.own = shards
+
+    def __bool__(self) -> bool:
+        """是否按区域执行：有订阅或者分了片"""
+        return bool(self.subscriptions) or len(self.own) > 1
+
+    def save(self) -> List[ProbeRegion]:
+        """记录全部区域：自己探测的区域来源是任务自身"""
+        regions = [
+            ProbeRegion(task=self.task, source=self.task, addresses=address_spec(addresses), ports=to_spec(ports))
+            for addresses, ports in self.own
+        ] + [
+            ProbeRegion(task=self.task, source=source, addresses=address_spec(addresses), ports=to_spec(ports))
+            for source, addresses, ports in self.subscriptions
+        ]
+        return ProbeRegion.objects.bulk_create(regions)
+
+    def saved_probes(self) -> int:
+        """订阅区域的 地址×端口 数，即省去的探测数"""
+        return sum(len(addresses) * len(ports) for _, addresses, ports in self.subscriptions)
+
+
+def plan_task(task: ScanTask, target: str = None, exclusions: IntervalSet = None,
+              shard_probes: int = None) -> CoalescingPlan:
+    """
+    为开始运行的任务制定执行计划，按区域执行时记录各区域
+
+    Args:
+        target: 域名已解析为地址的扫描目标
+        exclusions: 任务的排除区间
+        shard_probes: 每个分片的 (地址, 端口) 数，为None时不分片
+    """
+    # 重试时丢弃上次运行的计划
+    task.probe_regions.all().delete()
+    plan = CoalescingPlan(task, task_block(task, target, exclusions))
+    if not plan.own:
+        return plan
+    if can_coalesce(task):
+        for source in find_sources(task):
+            for cover in probed_blocks(source):
+                plan.subscribe(source, cover)
+            if not plan.own:
+                break
+    if shard_probes:
+        plan.shard(shard_probes)
+    if plan:
+        plan.save()
+    if plan.subscriptions:
+        logger.info(
+            f"任务 {task.id} 与 {len({source.id for source, _, _ in plan.subscriptions})} 个任务重叠，"
+            f"订阅 {len(plan.subscriptions)} 块区域，省去 {plan.saved_probes()} 个探测"
+        )
+    return plan
+
+
+def probe_block(task: ScanTask, addresses: IntervalSet, ports: IntervalSet,
+                exclusions: IntervalSet = None, scanner_factory: Callable = build_scanner,
+                liveness: LivenessCache = None) -> List[Dict]:
+    """用任务配置的扫描器探测一块区域，liveness 为同一任务各分片共用的无响应缓存"""
+    if not addresses or not ports:
+        return []
+    if task.scan_type in ['SYN_SCAN', 'UDP_SCAN']:
+        # Scapy扫描器按 TargetSet 解析目标，写成地址区间不会丢掉网段的首尾地址
+        target = address_spec(addresses)
+    else:
+        target = ' '.join(to_networks(addresses))
+    scanner = scanner_factory(task.scan_type, target, to_spec(ports), task.options, exclusions, liveness=liveness)
+    return scanner.execute_scan(scan_type=task.scan_type)
+
+
+def region_results(source: ScanTask, addresses: IntervalSet, ports: IntervalSet, floor=None) -> Iterable[Dict]:
+    """
+    来源任务在区域内的结果，还原为扫描器输出的结果字典
+
+    Args:
+        floor: 发现时间下限。订阅者的结果需落在它自己的运行时间内（见 ScanResult.objects.for_task），
+               早于订阅者创建的观测按其创建时间记录
+    """
+    condition = Q()
+    for first, last in addresses.intervals:
+        condition |= Q(ip_address__range=(int_to_ip(first), int_to_ip(last)))
+    host_values = [f'host__{field}' for field in HOST_FIELDS]
+    rows = (
+        ScanResult.objects.for_task(source).filter(condition).in_ports(to_spec(ports))
+        .order_by()
+        .values(*RESULT_VALUES, 'discovered_at', 'fingerprint__data', *host_values)
+    )
+    for row in rows.iterator(chunk_size=2000):
+        result = {field: row[field] for field in RESULT_VALUES}
+        result['discovered_at'] = max(row['discovered_at'], floor) if floor else row['discovered_at']
+        if row['fingerprint__data']:
+            result['fingerprint'] = row['fingerprint__data']
+        for field, value in zip(HOST_FIELDS, host_values):
+            if row[value]:
+                result[field] = row[value]
+        yield result
+
+
+def _claim(region: ProbeRegion, status: str) -> bool:
+    """把等待中的区域标记为已送达或已补扫，只有一方能成功"""
+    claimed = ProbeRegion.objects.filter(pk=region.pk, status='PENDING').update(
+        status=status, delivered_at=timezone.now()
+    )
+    region.status = status
+    return claimed == 1
+
+
+def deliver_region(region: ProbeRegion) -> int:
+    """
+    把来源任务在区域内的结果复制给订阅者
+
+    Returns:
+        复制的结果数，区域已由其他进程送达时为0
+    """
+    task, source = region.task, region.source
+    addresses, ports = region_block(region)
+    with transaction.atomic():
+        if not _claim(region, 'DELIVERED'):
+            return 0
+        region.result_count = save_scan_results(task, region_results(source, addresses, ports, task.created_at))
+        ProbeRegion.objects.filter(pk=region.pk).update(result_count=region.result_count)
+    logger.info(f"任务 {source.id} 的 {region.result_count} 条结果已分发给任务 {task.id}")
+    return region.result_count
+
+
+def probe_region(region: ProbeRegion, scanner_factory: Callable = build_scanner) -> int:
+    """
+    订阅者自行补扫区域（来源任务失败或超时）
+
+    先探测再认领，探测期间来源任务送达了结果时丢弃补扫结果。
+    """
+    task = region.task
+    addresses, ports = region_block(region)
+    results = probe_block(task, addresses, ports, compile_exclusions(task), scanner_factory)
+    with transaction.atomic():
+        if not _claim(region, 'PROBED'):
+            return 0
+        region.result_count = save_scan_results(task, results)
+        ProbeRegion.objects.filter(pk=region.pk).update(result_count=region.result_count)
+    logger.info(f"任务 {task.id} 自行补扫区域 {region.addresses} / {region.ports}：{region.result_count} 条结果")
+    return region.result_count
+
+
+def own_regions(task: ScanTask) -> List[ProbeRegion]:
+    """本任务尚未探测的区域（分片），按计划顺序"""
+    return list(ProbeRegion.objects.filter(task=task, source=task, status='PENDING').order_by('id'))
+
+
+def finish_shard(region: ProbeRegion, count: int):
+    """本任务自己的一个区域探测完毕并已入库"""
+    region.status, region.result_count = 'DELIVERED', count
+    ProbeRegion.objects.filter(pk=region.pk).update(
+        status='DELIVERED', result_count=count, delivered_at=timezone.now()
+    )
+
+
+def is_ready(task: ScanTask) -> bool:
+    """全部区域的结果都已送达"""
+    return not ProbeRegion.objects.filter(task=task, status='PENDING').exists()
+
+
+def claim_completion(task: ScanTask) -> bool:
+    """
+    认领等待中任务的完成
+
+    订阅者自己探测完和来源任务分发完都可能发现结果已收齐，按进度做一次条件更新，只有一方继续完成任务。
+    """
+    return ScanTask.objects.filter(pk=task.pk, status='RUNNING', progress__lt=100).update(progress=100) == 1
+
+
+def deliver_available(task: ScanTask) -> List[ProbeRegion]:
+    """
+    送达来源任务已完成的订阅区域
+
+    Returns:
+        来源任务已失败、取消或被删除，需要自行补扫的区域
+    """
+    orphaned = []
+    pending = (
+        ProbeRegion.objects.filter(task=task, status='PENDING').exclude(source=task)
+        .select_related('task', 'source')
+    )
+    for region in pending:
+        if region.source is None or region.source.status in ('FAILED', 'CANCELLED'):
+            orphaned.append(region)
+        elif region.source.status == 'COMPLETED':
+            deliver_region(region)
+    return orphaned
+
+
+def fan_out(source: ScanTask) -> List[int]:
+    """
+    来源任务完成后向全部订阅者分发结果
+
+    Returns:
+        因此收齐了全部结果、可以完成的订阅任务ID
+    """
+    ready = set()
+    pending = (
+        ProbeRegion.objects.filter(source=source, status='PENDING', task__status='RUNNING')
+        .exclude(task=source)
+        .select_related('task', 'source')
+    )
+    for region in pending:
+        try:
+            deliver_region(region)
+        except Exception as e:
+            logger.error(f"向任务 {region.task_id} 分发结果失败: {e}")
+            continue
+        if is_ready(region.task):
+            ready.add(region.task_id)
+    return sorted(ready)
+
+
+def orphaned_regions(source: ScanTask) -> List[int]:
+    """来源任务失败后，订阅它的等待中区域"""
+    return list(
+        ProbeRegion.objects.filter(source=source, status='PENDING').exclude(task=source)
+        .values_list('id', flat=True)
+    )
+
+
+def stale_regions(now=None) -> List[int]:
+    """等待超时、来源任务已失败或已被删除的订阅区域"""
+    now = now or timezone.now()
+    timeout = timedelta(seconds=getattr(settings, 'SCAN_COALESCE_TIMEOUT', DEFAULT_TIMEOUT))
+    return list(
+        ProbeRegion.objects.filter(status='PENDING', task__status='RUNNING')
+        .exclude(source=F('task'))
+        .filter(Q(created_at__lt=now - timeout) | Q(source__isnull=True)
+                | Q(source__status__in=['FAILED', 'CANCELLED']))
+        .values_list('id', flat=True)
+    )
+
+
+def coalescing_summary(task: ScanTask) -> Dict:
+    """任务结果摘要中的合并统计"""
+    regions = list(task.probe_regions.all())
+    subscribed = [region for region in regions if region.source_id != task.id]
+    return {
+        'sources': sorted({region.source_id for region in subscribed if region.source_id}),
+        'subscribed_regions': len(subscribed),
+        'delivered_results': sum(region.result_count for region in subscribed if region.status == 'DELIVERED'),
+        'probed_regions': sum(1 for region in subscribed if region.status == 'PROBED'),
+    }
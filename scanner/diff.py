@@ -0,0 +1,72 @@
+"""
+扫描结果差异比较
+在数据库内用关联子查询完成两组端口结果的比较，只返回新增、消失和变化的端点，
+不再把两次任务的全部结果加载到Python中逐条比对。
+"""
+from typing import Dict
+
+from django.db.models import Exists, F, OuterRef, Subquery
+
+from .models import ExposureSnapshot
+
+# 差异输出字段
+DIFF_FIELDS = ('ip_address', 'port', 'protocol', 'state', 'service')
+
+
+def _same_endpoint(queryset):
+    """与外层查询同一 (IP, 端口, 协议) 的行"""
+    return queryset.filter(
+        ip_address=OuterRef('ip_address'),
+        port=OuterRef('port'),
+        protocol=OuterRef('protocol'),
+    ).order_by()
+
+
+def diff_querysets(base, target) -> Dict[str, object]:
+    """
+    比较两组端口结果
+
+    Args:
+        base: 作为基准的查询集（较早的任务或当前暴露面）
+        target: 参与比较的查询集
+
+    Returns:
+        added / removed / changed 三个 values() 查询集，changed 额外带有
+        old_state、old_service 两列
+    """
+    # 按端点排序输出，同时去掉默认排序带来的任务表连接
+    base = base.filter(port__isnull=False).order_by('ip_address', 'port', 'protocol')
+    target = target.filter(port__isnull=False).order_by('ip_address', 'port', 'protocol')
+    matched = _same_endpoint(base)
+
+    added = target.exclude(Exists(matched)).values(*DIFF_FIELDS)
+    removed = base.exclude(Exists(_same_endpoint(target))).values(*DIFF_FIELDS)
+    changed = (
+        target
+        .annotate(
+            old_state=Subquery(matched.values('state')[:1]),
+            old_service=Subquery(matched.values('service')[:1]),
+        )
+        .filter(old_state__isnull=False)
+        .exclude(old_state=F('state'), old_service=F('service'))
+        .values(*DIFF_FIELDS, 'old_state', 'old_service')
+    )
+    return {'added': added, 'removed': removed, 'changed': changed}
+
+
+def diff_tasks(base_task, target_task) -> Dict[str, object]:
+    """比较两次扫描任务的结果"""
+    return diff_querysets(base_task.effective_results(), target_task.effective_results())
+
+
+def diff_task_with_exposure(task) -> Dict[str, object]:
+    """
+    比较任务结果与当前暴露面，即该任务之后发生了哪些变化
+
+    暴露面只取本次有结果的主机，避免把范围外的端点都当作新增。
+    """
+    results = task.effective_results()
+    snapshots = ExposureSnapshot.objects.filter(
+        ip_address__in=results.order_by().values('ip_address')
+    )
+    return diff_querysets(results, snapshots)
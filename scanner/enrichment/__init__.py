@@ -0,0 +1,8 @@
+"""
+扫描结果补全
+用本地离线数据为扫描到的地址补充归属等信息，不访问外部服务
+"""
+from .ipindex import IPIndex, enrich_task, get_ip_index
+from .oui import OUITable, fill_vendors, get_oui_table
+
+__all__ = ['IPIndex', 'enrich_task', 'get_ip_index', 'OUITable', 'fill_vendors', 'get_oui_table']
@@ -0,0 +1,349 @@
+"""
+IP归属索引
+把离线的 网段 -> (ASN, 组织, 国家) 数据编译为按起始地址排序的互不相交区间数组，
+最长前缀匹配转换为一次 numpy.searchsorted 二分查找，可以整批向量化执行。
+编译结果以 .npy 文件保存并以内存映射方式加载，同一台机器上的所有worker进程共享页缓存。
+
+IPv4按32位整数索引；IPv6只索引前64位，长于/64的前缀在编译时忽略（路由表中基本不存在）。
+"""
+import csv
+import gzip
+import ipaddress
+import json
+import logging
+import os
+import socket
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+Record = Tuple[int, str, str]
+
+RECORDS_FILE = 'records.json'
+ARRAY_NAMES = ('v4_starts', 'v4_ends', 'v4_records', 'v6_starts', 'v6_ends', 'v6_records')
+
+# 数据文件中可以识别的列名
+COLUMN_ALIASES = {
+    'network': ('network', 'prefix', 'cidr'),
+    'start': ('start_ip', 'range_start', 'start'),
+    'end': ('end_ip', 'range_end', 'end'),
+    'asn': ('asn', 'as_number', 'autonomous_system_number'),
+    'organization': ('organization', 'as_org', 'as_description', 'autonomous_system_organization'),
+    'country': ('country', 'country_code', 'country_iso_code'),
+}
+
+# 索引目录 -> (记录文件修改时间, 索引)
+_index_cache: Dict[str, Tuple[int, Optional['IPIndex']]] = {}
+
+
+def _flatten(ranges: List[Tuple[int, int, int]]) -> List[Tuple[int, int, int]]:
+    """
+    嵌套区间展开为互不相交的区间，重叠部分归更具体（更短）的区间
+
+    输入为 (起点, 终点, 记录号)；相邻且记录相同的结果区间会被合并。
+    """
+    out: List[Tuple[int, int, int]] = []
+
+    def emit(start, end, record):
+        if start > end:
+            return
+        if out and out[-1][2] == record and out[-1][1] + 1 == start:
+            out[-1] = (out[-1][0], end, record)
+        else:
+            out.append((start, end, record))
+
+    stack: List[Tuple[int, int]] = []
+    cursor = 0
+    for start, end, record in sorted(ranges, key=lambda item: (item[0], -item[1])):
+        while stack and stack[-1][0] < start:
+            top_end, top_record = stack.pop()
+            emit(cursor, top_end, top_record)
+            cursor = top_end + 1
+        if stack:
+            emit(cursor, start - 1, stack[-1][1])
+            # 部分重叠的区间截断到外层区间内，保证栈中区间严格嵌套
+            end = min(end, stack[-1][0])
+        stack.append((end, record))
+        cursor = start
+    while stack:
+        top_end, top_record = stack.pop()
+        emit(cursor, top_end, top_record)
+        cursor = top_end + 1
+    return out
+
+
+def _arrays(segments: List[Tuple[int, int, int]], dtype) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    return (
+        np.array([start for start, _, _ in segments], dtype=dtype),
+        np.array([end for _, end, _ in segments], dtype=dtype),
+        np.array([record for _, _, record in segments], dtype=np.int32),
+    )
+
+
+def ipv4_ints(ips: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """批量把IPv4字符串转换为整数，返回 (整数数组, 是否为合法IPv4)"""
+    packed = bytearray()
+    valid = np.zeros(len(ips), dtype=bool)
+    for i, ip in enumerate(ips):
+        try:
+            packed += socket.inet_pton(socket.AF_INET, ip)
+            valid[i] = True
+        except (OSError, TypeError):
+            packed += b'\x00\x00\x00\x00'
+    return np.frombuffer(bytes(packed), dtype='>u4').astype(np.uint32), valid
+
+
+class IPIndex:
+    """
+    只读的IP归属索引
+
+    Args:
+        arrays: ARRAY_NAMES 中各数组，起点升序排列，区间互不相交
+        records: 记录号 -> (ASN, 组织, 国家)
+    """
+
+    def __init__(self, arrays: Dict[str, np.ndarray], records: List[Record]):
+        for name in ARRAY_NAMES:
+            setattr(self, name, arrays[name])
+        self.records = [tuple(record) for record in records]
+
+    @classmethod
+    def build(cls, entries: Iterable[Tuple[Tuple[int, int, int], Record]]) -> 'IPIndex':
+        """
+        由 ((IP版本, 起始整数, 结束整数), 记录) 序列编译索引
+        """
+        record_ids: Dict[Record, int] = {}
+        v4, v6 = [], []
+        skipped = 0
+        for (version, start, end), record in entries:
+            record_id = record_ids.setdefault(record, len(record_ids))
+            if version == 4:
+                v4.append((start, end, record_id))
+            elif start & 0xFFFFFFFFFFFFFFFF == 0 and end & 0xFFFFFFFFFFFFFFFF == 0xFFFFFFFFFFFFFFFF:
+                v6.append((start >> 64, end >> 64, record_id))
+            else:
+                skipped += 1
+        if skipped:
+            logger.info(f"忽略 {skipped} 个长于/64的IPv6前缀")
+
+        arrays = {}
+        for prefix, ranges, dtype in (('v4', v4, np.uint32), ('v6', v6, np.uint64)):
+            starts, ends, records = _arrays(_flatten(ranges), dtype)
+            arrays[f'{prefix}_starts'] = starts
+            arrays[f'{prefix}_ends'] = ends
+            arrays[f'{prefix}_records'] = records
+        return cls(arrays, list(record_ids))
+
+    @classmethod
+    def from_csv(cls, paths: Iterable[str]) -> 'IPIndex':
+        return cls.build(entry for path in paths for entry in read_csv(path))
+
+    def save(self, directory: str):
+        """写入目录，数组先写临时文件再改名，正在使用旧索引的进程不受影响"""
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        for name in ARRAY_NAMES:
+            tmp = directory / f'{name}.tmp.npy'
+            np.save(tmp, getattr(self, name))
+            os.replace(tmp, directory / f'{name}.npy')
+        tmp = directory / f'{RECORDS_FILE}.tmp'
+        tmp.write_text(json.dumps(self.records, ensure_ascii=False), encoding='utf-8')
+        os.replace(tmp, directory / RECORDS_FILE)
+
+    @classmethod
+    def load(cls, directory: str, mmap: bool = True) -> 'IPIndex':
+        directory = Path(directory)
+        arrays = {
+            name: np.load(directory / f'{name}.npy', mmap_mode='r' if mmap else None)
+            for name in ARRAY_NAMES
+        }
+        records = json.loads((directory / RECORDS_FILE).read_text(encoding='utf-8'))
+        return cls(arrays, records)
+
+    def __len__(self) -> int:
+        return len(self.v4_starts) + len(self.v6_starts)
+
+    @staticmethod
+    def _search(starts: np.ndarray, ends: np.ndarray, record_ids: np.ndarray, values: np.ndarray) -> np.ndarray:
+        if len(starts) == 0:
+            return np.full(len(values), -1, dtype=np.int32)
+        position = np.searchsorted(starts, values, side='right') - 1
+        clipped = np.maximum(position, 0)
+        hit = (position >= 0) & (values <= ends[clipped])
+        return np.where(hit, record_ids[clipped], -1).astype(np.int32)
+
+    def lookup_ipv4(self, values: np.ndarray) -> np.ndarray:
+        """整数形式的IPv4地址数组 -> 记录号数组（-1表示未命中）"""
+        return self._search(self.v4_starts, self.v4_ends, self.v4_records, np.asarray(values, dtype=np.uint32))
+
+    def lookup_ipv6(self, values: np.ndarray) -> np.ndarray:
+        """IPv6地址前64位组成的数组 -> 记录号数组"""
+        return self._search(self.v6_starts, self.v6_ends, self.v6_records, np.asarray(values, dtype=np.uint64))
+
+    def lookup_ids(self, ips: Sequence[str]) -> np.ndarray:
+        """地址字符串 -> 记录号数组，IPv4走向量化路径，IPv6逐个转换后批量查找"""
+        ips = list(ips)
+        v4_values, is_v4 = ipv4_ints(ips)
+        result = np.full(len(ips), -1, dtype=np.int32)
+        result[is_v4] = self.lookup_ipv4(v4_values[is_v4])
+
+        v6_positions, v6_values = [], []
+        for i in np.flatnonzero(~is_v4):
+            try:
+                address = ipaddress.ip_address(ips[i])
+            except ValueError:
+                continue
+            if address.version == 6:
+                v6_positions.append(i)
+                v6_values.append(int(address) >> 64)
+        if v6_positions:
+            result[v6_positions] = self.lookup_ipv6(np.array(v6_values, dtype=np.uint64))
+        return result
+
+    def lookup_many(self, ips: Sequence[str]) -> List[Optional[Record]]:
+        return [self.records[i] if i >= 0 else None for i in self.lookup_ids(ips)]
+
+    def lookup(self, ip: str) -> Optional[Record]:
+        return self.lookup_many([ip])[0]
+
+
+def _open(path: str):
+    if str(path).endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8', newline='')
+    return open(path, encoding='utf-8', newline='')
+
+
+def _column(header: List[str], field: str) -> Optional[str]:
+    lowered = {name.strip().lower(): name for name in header}
+    for alias in COLUMN_ALIASES[field]:
+        if alias in lowered:
+            return lowered[alias]
+    return None
+
+
+def _parse_asn(value: Optional[str]) -> int:
+    """'13335'、'AS13335' 都解析为13335，空值为0"""
+    value = (value or '').strip().upper()
+    if value.startswith('AS'):
+        value = value[2:]
+    return int(value) if value else 0
+
+
+def read_csv(path: str) -> Iterator[Tuple[Tuple[int, int, int], Record]]:
+    """
+    读取离线归属数据（CSV或TSV，可gzip压缩，首行为列名）
+
+    每行用 network 列给出网段，或用 start_ip/end_ip 给出地址区间，
+    另有 asn、organization、country 列（见 COLUMN_ALIASES）；无法解析的行会被跳过。
+    """
+    with _open(path) as f:
+        sample = f.readline()
+        f.seek(0)
+        reader = csv.DictReader(f, delimiter='\t' if '\t' in sample else ',')
+        header = reader.fieldnames or []
+        columns = {field: _column(header, field) for field in COLUMN_ALIASES}
+        if not columns['network'] and not (columns['start'] and columns['end']):
+            raise ValueError(f"{path} 缺少 network 或 start_ip/end_ip 列")
+
+        skipped = 0
+        for row in reader:
+            try:
+                if columns['network']:
+                    network = ipaddress.ip_network(row[columns['network']].strip(), strict=False)
+                    version = network.version
+                    start, end = int(network.network_address), int(network.broadcast_address)
+                else:
+                    first = ipaddress.ip_address(row[columns['start']].strip())
+                    last = ipaddress.ip_address(row[columns['end']].strip())
+                    if first.version != last.version or first > last:
+                        raise ValueError(f"无效区间: {first}-{last}")
+                    version, start, end = first.version, int(first), int(last)
+                asn = _parse_asn(row.get(columns['asn'])) if columns['asn'] else 0
+            except (ValueError, AttributeError):
+                skipped += 1
+                continue
+            organization = (row.get(columns['organization']) or '').strip() if columns['organization'] else ''
+            country = (row.get(columns['country']) or '').strip().upper()[:2] if columns['country'] else ''
+            if not asn and not organization and not country:
+                continue
+            yield (version, start, end), (asn, organization, country)
+        if skipped:
+            logger.warning(f"{path} 中有 {skipped} 行无法解析，已跳过")
+
+
+def get_ip_index() -> Optional[IPIndex]:
+    """
+    按配置加载索引，未编译索引时返回None
+
+    每个进程只映射一次；索引被重新编译（记录文件修改时间变化）后自动重新加载。
+    """
+    path = getattr(settings, 'IP_INDEX_PATH', None)
+    if not path:
+        return None
+    path = str(path)
+    try:
+        mtime = os.stat(os.path.join(path, RECORDS_FILE)).st_mtime_ns
+    except OSError:
+        return None
+    cached = _index_cache.get(path)
+    if cached is None or cached[0] != mtime:
+        try:
+            cached = (mtime, IPIndex.load(path))
+        except (OSError, ValueError) as e:
+            logger.warning(f"IP归属索引不可用: {e}")
+            cached = (mtime, None)
+        _index_cache[path] = cached
+    return cached[1]
+
+
+def _as_dict(record: Optional[Record]) -> Dict:
+    if record is None:
+        return {}
+    asn, organization, country = record
+    return {'asn': asn or None, 'as_org': organization, 'country': country}
+
+
+def enrich_task(task, index: IPIndex = None) -> Dict[str, int]:
+    """
+    用归属索引批量补全任务的主机（端口结果通过外键共享）和拓扑记录
+
+    拓扑记录的两端分别写入 metadata['source_owner'] 和 metadata['destination_owner']。
+
+    Returns:
+        {'hosts': 补全的主机数, 'topology': 补全的拓扑记录数}
+    """
+    from ..models import NetworkTopology, ScanHost
+
+    index = index or get_ip_index()
+    if index is None:
+        return {'hosts': 0, 'topology': 0}
+
+    hosts = list(ScanHost.objects.filter(task=task, asn__isnull=True)
+                 .only('id', 'ip_address', 'asn', 'as_org', 'country'))
+    updated_hosts = []
+    for host, record in zip(hosts, index.lookup_many([host.ip_address for host in hosts])):
+        if record is None:
+            continue
+        for field, value in _as_dict(record).items():
+            setattr(host, field, value)
+        updated_hosts.append(host)
+    ScanHost.objects.bulk_update(updated_hosts, ['asn', 'as_org', 'country'], batch_size=1000)
+
+    links = list(NetworkTopology.objects.filter(task=task).only('id', 'source_ip', 'destination_ip', 'metadata'))
+    owners = index.lookup_many([ip for link in links for ip in (link.source_ip, link.destination_ip)])
+    updated_links = []
+    for i, link in enumerate(links):
+        source, destination = owners[2 * i], owners[2 * i + 1]
+        if source is None and destination is None:
+            continue
+        link.metadata = dict(link.metadata or {},
+                             source_owner=_as_dict(source), destination_owner=_as_dict(destination))
+        updated_links.append(link)
+    NetworkTopology.objects.bulk_update(updated_links, ['metadata'], batch_size=1000)
+
+    logger.info(f"任务 {task.id} 归属信息补全：主机 {len(updated_hosts)}，拓扑 {len(updated_links)}")
+    return {'hosts': len(updated_hosts), 'topology': len(updated_links)}
@@ -0,0 +1,175 @@
+"""
+MAC地址厂商查询
+IEEE分配的MA-L（24位）、MA-M（28位）、MA-S（36位）前缀编译为按位数分组的有序数组，
+保存为一个 .npz 文件，每个进程首次使用时加载一次；查询时整批MAC按最长前缀向量化匹配。
+未编译厂商表时使用随代码发布的精简登记表（data/oui.csv），完整登记表用 build_oui_table 命令编译。
+"""
+import csv
+import logging
+import os
+import re
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+BUNDLED_REGISTRY = Path(__file__).resolve().parent / 'data' / 'oui.csv'
+
+# 由长到短匹配
+BLOCK_BITS = (36, 28, 24)
+
+_SEPARATORS = re.compile(r'[:\-.]')
+_HEX12 = re.compile(r'[0-9a-fA-F]{12}')
+
+_table_cache: Dict[str, 'OUITable'] = {}
+
+
+def parse_mac(mac: Optional[str]) -> int:
+    """MAC地址转换为48位整数，支持 : - . 分隔或不分隔的写法，无效时返回-1"""
+    digits = _SEPARATORS.sub('', (mac or '').strip())
+    if not _HEX12.fullmatch(digits):
+        return -1
+    return int(digits, 16)
+
+
+class OUITable:
+    """
+    厂商前缀表
+
+    Args:
+        blocks: 前缀位数 -> (有序前缀数组, 厂商序号数组)
+        vendors: 厂商名称列表
+    """
+
+    def __init__(self, blocks: Dict[int, Tuple[np.ndarray, np.ndarray]], vendors: List[str]):
+        self.blocks = blocks
+        self.vendors = list(vendors)
+
+    @classmethod
+    def build(cls, assignments: Iterable[Tuple[int, int, str]]) -> 'OUITable':
+        """由 (前缀位数, 前缀值, 厂商) 序列编译，同一前缀重复时保留先出现的"""
+        vendor_ids: Dict[str, int] = {}
+        prefixes: Dict[int, Dict[int, int]] = {bits: {} for bits in BLOCK_BITS}
+        for bits, prefix, vendor in assignments:
+            vendor_id = vendor_ids.setdefault(vendor, len(vendor_ids))
+            prefixes[bits].setdefault(prefix, vendor_id)
+
+        blocks = {}
+        for bits, mapping in prefixes.items():
+            keys = np.array(sorted(mapping), dtype=np.uint64)
+            blocks[bits] = (keys, np.array([mapping[key] for key in sorted(mapping)], dtype=np.int32))
+        return cls(blocks, list(vendor_ids))
+
+    @classmethod
+    def from_csv(cls, paths: Iterable[str]) -> 'OUITable':
+        return cls.build(entry for path in paths for entry in read_registry(path))
+
+    def save(self, path: str):
+        """写入单个 .npz 文件，先写临时文件再改名"""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        arrays = {'vendors': np.array(self.vendors, dtype=str)}
+        for bits, (keys, ids) in self.blocks.items():
+            arrays[f'keys_{bits}'] = keys
+            arrays[f'ids_{bits}'] = ids
+        tmp = path.with_name(path.name + '.tmp.npz')
+        np.savez_compressed(tmp, **arrays)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> 'OUITable':
+        with np.load(path, allow_pickle=False) as data:
+            blocks = {bits: (data[f'keys_{bits}'], data[f'ids_{bits}']) for bits in BLOCK_BITS}
+            vendors = data['vendors'].tolist()
+        return cls(blocks, vendors)
+
+    def __len__(self) -> int:
+        return sum(len(keys) for keys, _ in self.blocks.values())
+
+    def lookup_ids(self, values: np.ndarray) -> np.ndarray:
+        """48位整数数组 -> 厂商序号数组（-1表示未命中），更长的前缀优先"""
+        values = np.asarray(values, dtype=np.int64)
+        result = np.full(len(values), -1, dtype=np.int32)
+        valid = values >= 0
+        macs = np.where(valid, values, 0).astype(np.uint64)
+        for bits in BLOCK_BITS:
+            keys, ids = self.blocks[bits]
+            if len(keys) == 0:
+                continue
+            wanted = valid & (result < 0)
+            if not wanted.any():
+                break
+            prefixes = macs >> np.uint64(48 - bits)
+            position = np.minimum(np.searchsorted(keys, prefixes), len(keys) - 1)
+            hit = wanted & (keys[position] == prefixes)
+            result[hit] = ids[position[hit]]
+        return result
+
+    def lookup_many(self, macs: Sequence[str]) -> List[str]:
+        """MAC地址 -> 厂商名称，未知或无效的地址为空字符串"""
+        ids = self.lookup_ids(np.array([parse_mac(mac) for mac in macs], dtype=np.int64))
+        return [self.vendors[i] if i >= 0 else '' for i in ids]
+
+    def lookup(self, mac: str) -> str:
+        return self.lookup_many([mac])[0]
+
+
+def read_registry(path: str) -> Iterator[Tuple[int, int, str]]:
+    """
+    读取IEEE登记表CSV（oui.csv、mam.csv、oui36.csv 格式相同）
+
+    Assignment 列为6、7、9位十六进制，分别对应24、28、36位前缀。
+    """
+    lengths = {6: 24, 7: 28, 9: 36}
+    with open(path, encoding='utf-8', newline='') as f:
+        for row in csv.DictReader(f):
+            assignment = (row.get('Assignment') or '').strip()
+            vendor = (row.get('Organization Name') or '').strip()
+            bits = lengths.get(len(assignment))
+            if not bits or not vendor:
+                continue
+            try:
+                yield bits, int(assignment, 16), vendor
+            except ValueError:
+                continue
+
+
+def get_oui_table() -> OUITable:
+    """读取编译好的厂商表，未编译时编译随代码发布的精简登记表；每个进程只加载一次"""
+    path = str(getattr(settings, 'OUI_TABLE_PATH', '') or '')
+    if path not in _table_cache:
+        table = None
+        if path and os.path.exists(path):
+            try:
+                table = OUITable.load(path)
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning(f"厂商表加载失败，使用内置登记表: {e}")
+        if table is None:
+            table = OUITable.from_csv([BUNDLED_REGISTRY])
+        _table_cache[path] = table
+    return _table_cache[path]
+
+
+def fill_vendors(host_attrs: Dict[str, Dict[str, str]], table: OUITable = None) -> int:
+    """
+    为有MAC地址但没有厂商的主机补全厂商，整批一次查询，不访问数据库
+
+    Args:
+        host_attrs: IP -> 主机属性字典（见 scanner.ingest），原地修改
+
+    Returns:
+        补全的主机数
+    """
+    pending = [attrs for attrs in host_attrs.values() if attrs.get('mac_address') and not attrs.get('vendor')]
+    if not pending:
+        return 0
+    table = table or get_oui_table()
+    filled = 0
+    for attrs, vendor in zip(pending, table.lookup_many([attrs['mac_address'] for attrs in pending])):
+        if vendor:
+            attrs['vendor'] = vendor
+            filled += 1
+    return filled
@@ -0,0 +1,37 @@
+"""
+扫描排除列表
+把数据库中启用的全局排除项和任务排除项编译为有序区间集合，
+扫描目标在生成探测之前整体减去排除区间，单个地址的判断是一次二分查找。
+"""
+import logging
+from django.db.models import Q
+
+from .fields import ip_to_int
+from .models import ScanExclusion
+from .scanners.rangeset import IntervalSet
+
+logger = logging.getLogger(__name__)
+
+
+def compile_exclusions(task=None) -> IntervalSet:
+    """
+    编译排除区间
+
+    Args:
+        task: 扫描任务，为None时只包含全局排除项
+
+    Returns:
+        合并后的排除区间集合，数万条网段也只需一次排序
+    """
+    condition = Q(task__isnull=True)
+    if task is not None and task.pk:
+        condition |= Q(task=task)
+    rows = (
+        ScanExclusion.objects.filter(condition, enabled=True)
+        .order_by()
+        .values_list('start_ip', 'end_ip')
+    )
+    exclusions = IntervalSet((ip_to_int(start), ip_to_int(end)) for start, end in rows.iterator())
+    if exclusions:
+        logger.info(f"已加载 {len(exclusions.intervals)} 段排除范围，共 {len(exclusions)} 个地址")
+    return exclusions
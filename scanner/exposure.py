@@ -0,0 +1,217 @@
+"""
+当前暴露面维护
+任务完成时把本次端口结果批量合并进 ExposureSnapshot，
+查询某个IP当前开放了什么只需一次索引查找，不再扫描全部历史结果。
+合并过程中与旧快照比较得到的变化同时追加写入 ChangeEvent。
+"""
+import logging
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+
+from .ingest import batched
+from .models import ChangeEvent, ExposureSnapshot, ScanResult
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 1000
+
+SNAPSHOT_FIELDS = ('ip_address', 'port', 'protocol', 'state', 'service', 'service_version', 'discovered_at')
+
+# 扫描范围内但本次没有报告的开放端口，按nmap的约定视为关闭或被过滤
+UNREPORTED_STATE = 'closed|filtered'
+
+EndpointKey = Tuple[str, int, str]
+
+
+def endpoint_key(row) -> EndpointKey:
+    """(IP, 端口, 协议) 三元组，兼容字典和模型实例"""
+    if isinstance(row, dict):
+        return row['ip_address'], row['port'], row['protocol']
+    return row.ip_address, row.port, row.protocol
+
+
+def load_snapshots(keys: Iterable[EndpointKey]) -> Dict[EndpointKey, ExposureSnapshot]:
+    """批量读取一组端点的当前快照"""
+    keys = set(keys)
+    if not keys:
+        return {}
+    candidates = ExposureSnapshot.objects.filter(
+        ip_address__in={key[0] for key in keys},
+        port__in={key[1] for key in keys},
+    )
+    return {endpoint_key(snapshot): snapshot for snapshot in candidates if endpoint_key(snapshot) in keys}
+
+
+def merge_batch(task, rows: List[Dict]) -> int:
+    """
+    把一批端口结果合并进快照
+
+    比快照更新的观测整行覆盖（首次发现时间保留），
+    更早的观测（例如导入的历史数据）只会把首次发现时间往前推。
+    """
+    # 同一批内同一端点只保留最新的一条，避免一条语句里重复更新同一行
+    latest = {}
+    for row in rows:
+        key = endpoint_key(row)
+        if key not in latest or row['discovered_at'] >= latest[key]['discovered_at']:
+            latest[key] = row
+
+    existing = load_snapshots(latest)
+    upserts = []
+    backfills = []
+    events = []
+    for key, row in latest.items():
+        seen = row['discovered_at']
+        snapshot = existing.get(key)
+        if snapshot is not None and seen < snapshot.last_seen:
+            if seen < snapshot.first_seen:
+                snapshot.first_seen = seen
+                backfills.append(snapshot)
+            continue
+        event = _change_event(task, row, snapshot)
+        if event is not None:
+            events.append(event)
+        upserts.append(ExposureSnapshot(
+            ip_address=row['ip_address'],
+            port=row['port'],
+            protocol=row['protocol'],
+            state=row['state'],
+            service=row['service'],
+            service_version=row['service_version'],
+            first_seen=snapshot.first_seen if snapshot else seen,
+            last_seen=seen,
+            last_task=task,
+        ))
+
+    with transaction.atomic():
+        if upserts:
+            ExposureSnapshot.objects.bulk_create(
+                upserts,
+                update_conflicts=True,
+                unique_fields=['ip_address', 'port', 'protocol'],
+                update_fields=['state', 'service', 'service_version', 'last_seen', 'last_task'],
+            )
+        if backfills:
+            ExposureSnapshot.objects.bulk_update(backfills, ['first_seen'])
+        if events:
+            ChangeEvent.objects.bulk_create(events)
+    return len(upserts)
+
+
+def _change_event(task, row: Dict, snapshot) -> Optional[ChangeEvent]:
+    """新观测相对旧快照的变化事件，没有变化时返回None"""
+    if snapshot is None:
+        change_type = 'ADDED'
+    elif row['state'] != snapshot.state or row['service'] != snapshot.service:
+        change_type = 'CHANGED'
+    else:
+        return None
+    return ChangeEvent(
+        task=task,
+        ip_address=row['ip_address'],
+        port=row['port'],
+        protocol=row['protocol'],
+        change_type=change_type,
+        old_state=snapshot.state if snapshot else None,
+        new_state=row['state'],
+        old_service=snapshot.service if snapshot else '',
+        new_service=row['service'],
+    )
+
+
+def close_unreported(task, batch_size: int = DEFAULT_BATCH_SIZE) -> int:
+    """
+    关闭本次扫描范围内没有再出现的开放端口
+
+    只处理本次有结果的主机、任务端口范围内、且最近一次发现早于本任务的快照，
+    按时间倒序重放历史任务时不会误关后来才发现的端口。
+
+    Returns:
+        被关闭的端点数
+    """
+    results = ScanResult.objects.for_task(task).filter(port__isnull=False)
+    protocols = set(results.order_by().values_list('protocol', flat=True).distinct())
+    if not protocols:
+        return 0
+
+    reported = results.filter(
+        ip_address=OuterRef('ip_address'),
+        port=OuterRef('port'),
+        protocol=OuterRef('protocol'),
+    )
+    stale = (
+        ExposureSnapshot.objects
+        .filter(
+            state='open',
+            protocol__in=protocols,
+            ip_address__in=results.order_by().values('ip_address'),
+            last_seen__lt=task.created_at,
+        )
+        .in_ports(task.ports)
+        .exclude(Exists(reported))
+    )
+
+    closed = 0
+    for batch in batched(list(stale), batch_size):
+        events = [
+            ChangeEvent(
+                task=task,
+                ip_address=snapshot.ip_address,
+                port=snapshot.port,
+                protocol=snapshot.protocol,
+                change_type='REMOVED',
+                old_state=snapshot.state,
+                new_state=UNREPORTED_STATE,
+                old_service=snapshot.service,
+                new_service=snapshot.service,
+            )
+            for snapshot in batch
+        ]
+        with transaction.atomic():
+            ExposureSnapshot.objects.filter(id__in=[snapshot.id for snapshot in batch]).update(
+                state=UNREPORTED_STATE, last_task=task
+            )
+            ChangeEvent.objects.bulk_create(events)
+        closed += len(batch)
+    return closed
+
+
+def refresh_exposure(task, batch_size: int = DEFAULT_BATCH_SIZE) -> int:
+    """
+    用任务的端口结果更新当前暴露面
+
+    Args:
+        task: 已保存结果的扫描任务
+        batch_size: 每批合并的结果行数
+
+    Returns:
+        新增、更新或关闭的快照行数
+    """
+    rows = (
+        ScanResult.objects.for_task(task)
+        .filter(port__isnull=False)
+        .order_by()
+        .values(*SNAPSHOT_FIELDS)
+        .iterator(chunk_size=batch_size)
+    )
+    updated = 0
+    for batch in batched(rows, batch_size):
+        updated += merge_batch(task, batch)
+    try:
+        closed = close_unreported(task, batch_size)
+    except ValueError as e:
+        # 端口范围无法解析时只跳过关闭步骤
+        logger.warning(f"任务 {task.id} 端口范围无法解析，跳过关闭未报告端口: {e}")
+        closed = 0
+    logger.info(f"任务 {task.id} 更新当前暴露面 {updated} 条，关闭 {closed} 条")
+    return updated + closed
+
+
+def exposure_counts() -> Dict[str, int]:
+    """当前开放端口数和已发现主机数，供仪表盘和API使用"""
+    return {
+        'open_ports': ExposureSnapshot.objects.filter(state='open').count(),
+        'unique_hosts': ExposureSnapshot.objects.values('ip_address').distinct().count(),
+    }
@@ -0,0 +1,170 @@
+"""
+紧凑存储字段
+IP地址打包为16字节大端整数，状态和协议存为小整数编码；
+Python侧仍然使用字符串，ORM查询写法保持不变。
+"""
+import ipaddress
+from typing import Optional, Tuple, Union
+
+from django import forms
+from django.db import models
+
+# IPv4地址映射到 ::ffff:0:0/96，与IPv6共用同一个有序的128位空间
+_V4_MAPPED_PREFIX = b'\x00' * 10 + b'\xff\xff'
+
+IPAddress = Union[ipaddress.IPv4Address, ipaddress.IPv6Address]
+
+
+def ip_to_int(value: Union[str, IPAddress]) -> int:
+    """IP地址转换为128位整数，IPv4按IPv4映射地址处理"""
+    address = ipaddress.ip_address(value)
+    if address.version == 4:
+        return 0xFFFF00000000 | int(address)
+    return int(address)
+
+
+def int_to_ip(value: int) -> str:
+    """128位整数还原为IP地址字符串"""
+    if value >> 32 == 0xFFFF:
+        return str(ipaddress.IPv4Address(value & 0xFFFFFFFF))
+    return str(ipaddress.IPv6Address(value))
+
+
+def normalize_ip(value: Union[str, IPAddress]) -> str:
+    """IP地址的规范写法，与打包字段读出的值一致（IPv6小写并压缩，IPv4映射地址还原为IPv4）"""
+    return int_to_ip(ip_to_int(value))
+
+
+def pack_ip(value: Union[str, IPAddress]) -> bytes:
+    """IP地址打包为16字节大端整数，字节序即数值序"""
+    return ip_to_int(value).to_bytes(16, 'big')
+
+
+def unpack_ip(value: bytes) -> str:
+    """16字节打包值还原为IP地址字符串"""
+    return int_to_ip(int.from_bytes(bytes(value), 'big'))
+
+
+def cidr_bounds(cidr: str) -> Tuple[str, str]:
+    """网段的首尾地址，用于在打包IP列上做索引范围查询"""
+    network = ipaddress.ip_network(cidr, strict=False)
+    return str(network.network_address), str(network.broadcast_address)
+
+
+class PackedIPAddressField(models.BinaryField):
+    """
+    以16字节大端整数存储的IP地址字段
+
+    比较和排序按数值进行，网段过滤可以转换为索引上的范围扫描。
+    """
+    description = "IP地址（16字节打包）"
+
+    def __init__(self, *args, **kwargs):
+        kwargs['max_length'] = 16
+        kwargs.setdefault('editable', True)
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        kwargs.pop('max_length', None)
+        kwargs.pop('editable', None)
+        return name, path, args, kwargs
+
+    def from_db_value(self, value, expression, connection):
+        if value is None:
+            return None
+        return unpack_ip(value)
+
+    def to_python(self, value):
+        if value is None or value == '':
+            return value
+        if isinstance(value, (bytes, bytearray, memoryview)):
+            return unpack_ip(value)
+        return str(ipaddress.ip_address(value))
+
+    def get_prep_value(self, value):
+        if value is None or value == '':
+            return None
+        if isinstance(value, (bytes, bytearray, memoryview)):
+            return bytes(value)
+        return pack_ip(value)
+
+    def value_to_string(self, obj):
+        return self.value_from_object(obj) or ''
+
+    def formfield(self, **kwargs):
+        return forms.GenericIPAddressField(**{'required': not self.blank, **kwargs})
+
+
+class _CodeField(models.Field):
+    """
+    字符串标签以小整数编码存储的字段基类
+
+    子类通过 CODES 定义标签到编码的映射，未知标签在写入时报错。
+    """
+    CODES = {}
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault('choices', [(label, label) for label in self.CODES])
+        super().__init__(*args, **kwargs)
+        self._labels = {code: label for label, code in self.CODES.items()}
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        kwargs.pop('choices', None)
+        return name, path, args, kwargs
+
+    def get_internal_type(self):
+        return 'PositiveSmallIntegerField'
+
+    def from_db_value(self, value, expression, connection):
+        if value is None:
+            return None
+        return self._labels.get(value, value)
+
+    def to_python(self, value):
+        if isinstance(value, int):
+            return self._labels.get(value, value)
+        return value
+
+    def get_prep_value(self, value):
+        value = super().get_prep_value(value)
+        if value is None or isinstance(value, int):
+            return value
+        try:
+            return self.CODES[value]
+        except KeyError:
+            raise ValueError(f"{self.__class__.__name__} 不支持的取值: {value!r}")
+
+    @classmethod
+    def normalize(cls, value: Optional[str], default: str) -> str:
+        """把未知标签归一为默认值，供入库前清洗使用"""
+        return value if value in cls.CODES else default
+
+
+class PortStateField(_CodeField):
+    """端口/主机状态字段"""
+    description = "端口状态（小整数编码）"
+    CODES = {
+        'unknown': 0,
+        'open': 1,
+        'closed': 2,
+        'filtered': 3,
+        'unfiltered': 4,
+        'open|filtered': 5,
+        'closed|filtered': 6,
+        'up': 7,
+        'down': 8,
+        'error': 9,
+    }
+
+
+class ProtocolField(_CodeField):
+    """传输层协议字段，编码取IANA协议号"""
+    description = "协议（IANA协议号）"
+    CODES = {
+        'icmp': 1,
+        'tcp': 6,
+        'udp': 17,
+        'sctp': 132,
+    }
@@ -0,0 +1,120 @@
+"""
+服务指纹去重
+指纹JSON按内容哈希写入 Fingerprint 表，进程内LRU缓存哈希到主键的映射，
+入库时大部分指纹无需访问数据库即可得到外键。
+"""
+import hashlib
+import json
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import Fingerprint
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_SIZE = 10000
+
+
+def is_empty(data: Optional[Dict]) -> bool:
+    """没有任何非空取值的指纹视为空指纹，不入库"""
+    return not data or not any(data.values())
+
+
+def fingerprint_digest(data: Dict) -> str:
+    """指纹内容的规范化哈希（键排序后的紧凑JSON）"""
+    canonical = json.dumps(data, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.blake2b(canonical.encode('utf-8'), digest_size=16).hexdigest()
+
+
+class FingerprintCache:
+    """
+    指纹哈希到主键的LRU缓存
+
+    新建的指纹只有在事务提交后才进入缓存，避免回滚后缓存指向不存在的行。
+    """
+
+    def __init__(self, maxsize: int = DEFAULT_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, digest: str) -> Optional[int]:
+        with self._lock:
+            pk = self._entries.get(digest)
+            if pk is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(digest)
+            self.hits += 1
+            return pk
+
+    def put_many(self, mapping: Dict[str, int]):
+        with self._lock:
+            for digest, pk in mapping.items():
+                self._entries[digest] = pk
+                self._entries.move_to_end(digest)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def intern_many(self, fingerprints: Sequence[Optional[Dict]]) -> List[Optional[int]]:
+        """
+        批量获取指纹主键，不存在的指纹批量创建
+
+        Args:
+            fingerprints: 指纹字典序列，空指纹对应结果为None
+
+        Returns:
+            与输入一一对应的 Fingerprint 主键列表
+        """
+        digests = [None if is_empty(data) else fingerprint_digest(data) for data in fingerprints]
+
+        resolved = {}
+        missing = {}
+        for digest, data in zip(digests, fingerprints):
+            if digest is None or digest in resolved or digest in missing:
+                continue
+            pk = self.get(digest)
+            if pk is None:
+                missing[digest] = data
+            else:
+                resolved[digest] = pk
+
+        if missing:
+            existing = dict(
+                Fingerprint.objects.filter(digest__in=list(missing)).values_list('digest', 'id')
+            )
+            resolved.update(existing)
+            self.put_many(existing)
+
+            new_digests = [digest for digest in missing if digest not in existing]
+            if new_digests:
+                Fingerprint.objects.bulk_create(
+                    [Fingerprint(digest=digest, data=missing[digest]) for digest in new_digests],
+                    ignore_conflicts=True,
+                )
+                created = dict(
+                    Fingerprint.objects.filter(digest__in=new_digests).values_list('digest', 'id')
+                )
+                resolved.update(created)
+                transaction.on_commit(lambda: self.put_many(created))
+
+        return [resolved.get(digest) if digest else None for digest in digests]
+
+
+fingerprint_cache = FingerprintCache(getattr(settings, 'FINGERPRINT_CACHE_SIZE', DEFAULT_CACHE_SIZE))
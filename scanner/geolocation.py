@@ -0,0 +1,169 @@
+"""
+基于约束的地理定位（CBG）
+信号在光纤中的传播速度约为光速的2/3，探测点测得的RTT给出目标到该点的距离上限：
+单程距离 ≤ RTT/2 × 200km/ms。各探测点的约束圆求交即为目标可能所在的区域。
+
+求解在经纬度网格上整批进行：网格点到各探测点的大圆距离预先算好，
+每个目标的可行区域是一个布尔掩码，取区域的中心作为估计位置、区域到中心的最大距离作为误差半径。
+RTT含排队等非传播时延，约束只会偏松；测量噪声导致约束无交集时，取最接近满足全部约束的网格点。
+"""
+import logging
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_KM = 6371.0
+
+# RTT每毫秒对应的最大单程距离（km）
+KM_PER_MS = 100.0
+
+DEFAULT_RESOLUTION = 0.5
+
+# 每批求解的 目标数 × 探测点数 × 网格点数 上限，控制中间数组的内存
+CHUNK_ELEMENTS = 1 << 24
+
+
+def _unit_vectors(latitudes: np.ndarray, longitudes: np.ndarray) -> np.ndarray:
+    lat, lon = np.radians(latitudes), np.radians(longitudes)
+    return np.stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)], axis=-1)
+
+
+def _to_degrees(vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    x, y, z = vectors[..., 0], vectors[..., 1], vectors[..., 2]
+    return np.degrees(np.arctan2(z, np.hypot(x, y))), np.degrees(np.arctan2(y, x))
+
+
+class GeoGrid:
+    """
+    全球经纬度网格，网格点取各格中心
+
+    Args:
+        resolution: 网格间距（度）
+    """
+
+    def __init__(self, resolution: float = DEFAULT_RESOLUTION):
+        self.resolution = resolution
+        latitudes = np.arange(-90 + resolution / 2, 90, resolution)
+        longitudes = np.arange(-180 + resolution / 2, 180, resolution)
+        lat, lon = np.meshgrid(latitudes, longitudes, indexing='ij')
+        self.latitudes = lat.ravel()
+        self.longitudes = lon.ravel()
+        self.vectors = _unit_vectors(self.latitudes, self.longitudes)
+        # 网格点代表的面积与纬度余弦成正比，求区域中心时按面积加权
+        self.weights = np.cos(np.radians(self.latitudes))
+
+    def __len__(self) -> int:
+        return len(self.latitudes)
+
+    def distances(self, vectors: np.ndarray) -> np.ndarray:
+        """若干点（单位向量）到全部网格点的大圆距离（km），形状为 (点数, 网格点数)"""
+        return np.arccos(np.clip(vectors @ self.vectors.T, -1.0, 1.0)) * EARTH_RADIUS_KM
+
+
+class CBGSolver:
+    """
+    多探测点RTT约束求解
+
+    Args:
+        vantages: 各探测点的 (纬度, 经度)，顺序与RTT矩阵的列一致
+        grid: 候选位置网格
+    """
+
+    def __init__(self, vantages: Sequence[Tuple[float, float]], grid: GeoGrid = None):
+        self.grid = grid or GeoGrid()
+        coordinates = np.array(vantages, dtype=np.float64).reshape(-1, 2)
+        self.distance = self.grid.distances(_unit_vectors(coordinates[:, 0], coordinates[:, 1])).astype(np.float32)
+        self.vectors = self.grid.vectors.astype(np.float32)
+        self.weights = self.grid.weights.astype(np.float32)
+        # 网格本身的误差：约束半径至少为一个格子的对角线
+        self.min_radius = self.grid.resolution * 111.0 * np.sqrt(2)
+
+    def solve(self, rtts: np.ndarray) -> Dict[str, np.ndarray]:
+        """
+        Args:
+            rtts: 形状为 (目标数, 探测点数) 的RTT矩阵（ms），缺失的测量为NaN
+
+        Returns:
+            latitude、longitude、radius_km、vantage_count 各列数组；没有任何测量的目标坐标为NaN
+        """
+        rtts = np.asarray(rtts, dtype=np.float64).reshape(-1, self.distance.shape[0])
+        count = len(rtts)
+        result = {
+            'latitude': np.full(count, np.nan),
+            'longitude': np.full(count, np.nan),
+            'radius_km': np.full(count, np.nan),
+            'vantage_count': (~np.isnan(rtts)).sum(axis=1),
+        }
+        # 没有测量的探测点不构成约束
+        bounds = np.where(np.isnan(rtts), np.inf, np.maximum(rtts * KM_PER_MS, self.min_radius))
+        step = max(1, CHUNK_ELEMENTS // max(1, self.distance.size))
+        for start in range(0, count, step):
+            stop = min(start + step, count)
+            self._solve_chunk(bounds[start:stop].astype(np.float32), result, start, stop)
+        return result
+
+    def _solve_chunk(self, bounds: np.ndarray, result: Dict[str, np.ndarray], start: int, stop: int):
+        # 各网格点对最紧约束的超出比例，不超过1即满足全部约束；逐个探测点原地取最大，不展开三维数组
+        scale = 1.0 / bounds
+        worst = np.multiply.outer(scale[:, 0], self.distance[0])
+        for v in range(1, len(self.distance)):
+            np.maximum(worst, np.multiply.outer(scale[:, v], self.distance[v]), out=worst)
+        best = worst.min(axis=1)
+        feasible = worst <= np.maximum(best, 1.0)[:, None]
+        known = np.isfinite(bounds).any(axis=1)
+
+        center = (feasible * self.weights) @ self.vectors
+        center /= np.maximum(np.linalg.norm(center, axis=1, keepdims=True), 1e-12)
+        latitude, longitude = _to_degrees(center.astype(np.float64))
+
+        # 可行区域中离中心最远的点决定误差半径
+        cosines = center @ self.vectors.T
+        cosines[~feasible] = 1.0
+        radius = np.arccos(np.clip(cosines.min(axis=1), -1.0, 1.0)) * EARTH_RADIUS_KM
+
+        result['latitude'][start:stop] = np.where(known, latitude, np.nan)
+        result['longitude'][start:stop] = np.where(known, longitude, np.nan)
+        result['radius_km'][start:stop] = np.where(known, np.maximum(radius, self.min_radius / 2), np.nan)
+
+
+def estimate_task(task, grid: GeoGrid = None) -> int:
+    """
+    用任务的多探测点RTT测量估计各目标的位置，替换任务已有的估计结果
+
+    Returns:
+        写入的估计数
+    """
+    from .models import GeoEstimate, RTTMeasurement
+
+    rows = list(RTTMeasurement.objects.filter(task=task).order_by()
+                .values_list('ip_address', 'vantage_id', 'vantage__latitude', 'vantage__longitude', 'rtt'))
+    vantages: Dict[int, Tuple[float, float]] = {}
+    targets: Dict[str, int] = {}
+    for ip, vantage_id, latitude, longitude, _ in rows:
+        vantages.setdefault(vantage_id, (latitude, longitude))
+        targets.setdefault(ip, len(targets))
+    columns = {vantage_id: i for i, vantage_id in enumerate(vantages)}
+
+    rtts = np.full((len(targets), len(vantages)), np.nan)
+    for ip, vantage_id, _, _, rtt in rows:
+        rtts[targets[ip], columns[vantage_id]] = rtt
+
+    estimates: List[GeoEstimate] = []
+    if targets:
+        result = CBGSolver(list(vantages.values()), grid).solve(rtts)
+        for ip, i in targets.items():
+            estimates.append(GeoEstimate(
+                task=task, ip_address=ip,
+                latitude=round(float(result['latitude'][i]), 4),
+                longitude=round(float(result['longitude'][i]), 4),
+                radius_km=round(float(result['radius_km'][i]), 1),
+                vantage_count=int(result['vantage_count'][i]),
+            ))
+    with transaction.atomic():
+        GeoEstimate.objects.filter(task=task).delete()
+        GeoEstimate.objects.bulk_create(estimates, batch_size=1000)
+    logger.info(f"任务 {task.id} 地理定位完成：{len(vantages)} 个探测点，{len(estimates)} 个目标")
+    return len(estimates)
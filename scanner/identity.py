@@ -0,0 +1,173 @@
+"""
+设备身份索引
+同一台设备在不同任务中可能换了地址（DHCP、NAT），按地址无法追踪它的变化。
+任务完成时按主机汇总 MAC地址、SSH主机密钥指纹、TLS证书指纹和开放端口特征，
+组合哈希作为设备身份，批量合并进 HostIdentity / IdentityAddress：
+查询“这台设备用过哪些地址”只需按身份做一次索引查找，不再在结果的指纹JSON里模糊匹配。
+
+只有端口特征的主机不建立身份——相同端口组合的设备太多，无法区分。
+"""
+import logging
+from typing import Dict, Iterable, List, Tuple
+
+from django.db import transaction
+from django.utils import timezone
+
+from .enrichment.oui import parse_mac
+from .fingerprints import fingerprint_digest
+from .ingest import batched
+from .models import HostIdentity, IdentityAddress
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 1000
+
+
+def _format_mac(mac: str) -> str:
+    value = parse_mac(mac)
+    if value < 0:
+        return ''
+    return ':'.join(f'{value >> shift & 0xFF:02x}' for shift in range(40, -8, -8))
+
+
+def host_features(rows: Iterable[tuple]) -> Dict[str, Dict]:
+    """
+    按主机汇总身份特征
+
+    Args:
+        rows: (IP, 端口, 协议, 状态, 指纹内容, MAC地址) 行
+
+    Returns:
+        IP -> {'mac_address', 'ssh_hostkeys', 'tls_certificates', 'port_signature'}
+    """
+    hosts: Dict[str, Dict] = {}
+    for ip, port, protocol, state, fingerprint, mac in rows:
+        host = hosts.get(ip)
+        if host is None:
+            host = hosts[ip] = {'mac': '', 'ssh': set(), 'tls': set(), 'ports': set()}
+        if mac and not host['mac']:
+            host['mac'] = _format_mac(mac)
+        if state != 'open' or port is None:
+            continue
+        host['ports'].add((port, protocol))
+        fingerprint = fingerprint or {}
+        host['ssh'].update(fingerprint.get('ssh_hostkey') or ())
+        if fingerprint.get('tls_cert'):
+            host['tls'].add(fingerprint['tls_cert'])
+
+    return {
+        ip: {
+            'mac_address': host['mac'],
+            'ssh_hostkeys': sorted(host['ssh']),
+            'tls_certificates': sorted(host['tls']),
+            'port_signature': ','.join(f'{port}/{protocol}' for port, protocol in sorted(host['ports'])),
+        }
+        for ip, host in hosts.items()
+    }
+
+
+def identity_digest(features: Dict) -> str:
+    """身份特征的规范化哈希，没有MAC、SSH密钥和TLS证书中任何一项时返回空串"""
+    if not (features['mac_address'] or features['ssh_hostkeys'] or features['tls_certificates']):
+        return ''
+    return fingerprint_digest(features)
+
+
+def _merge(model, candidates: Dict, existing: Dict[object, Tuple[int, object, object]], task, seen) -> int:
+    """
+    与 scanner.exposure 的合并规则一致：比已有记录新的观测更新最近发现时间，
+    更早的观测（按时间倒序重放的历史任务）只把首次发现时间往前推。
+    同一批的观测时间相同，已有记录按主键集合整体更新，不逐行写回
+
+    Args:
+        candidates: 键 -> 新建记录的字段
+        existing: 键 -> 已有记录的 (主键, 首次发现时间, 最近发现时间)
+
+    Returns:
+        新增或更新的记录数
+    """
+    created, newer, older = [], [], []
+    for key, fields in candidates.items():
+        current = existing.get(key)
+        if current is None:
+            created.append(model(**fields, first_seen=seen, last_seen=seen, last_task=task))
+        elif seen >= current[2]:
+            newer.append(current[0])
+        elif seen < current[1]:
+            older.append(current[0])
+    if created:
+        model.objects.bulk_create(created, ignore_conflicts=True)
+    if newer:
+        model.objects.filter(pk__in=newer).update(last_seen=seen, last_task=task)
+    if older:
+        model.objects.filter(pk__in=older).update(first_seen=seen)
+    return len(created) + len(newer)
+
+
+def merge_batch(task, seen, batch: List[Tuple[str, str, Dict]]) -> int:
+    """合并一批 (IP, 身份哈希, 身份特征)"""
+    identities = {digest: dict(features, digest=digest) for _, digest, features in batch}
+    with transaction.atomic():
+        existing = {
+            digest: (pk, first_seen, last_seen)
+            for digest, pk, first_seen, last_seen in HostIdentity.objects.filter(digest__in=identities)
+            .values_list('digest', 'id', 'first_seen', 'last_seen')
+        }
+        _merge(HostIdentity, identities, existing, task, seen)
+        ids = {digest: values[0] for digest, values in existing.items()}
+        missing = [digest for digest in identities if digest not in ids]
+        if missing:
+            ids.update(HostIdentity.objects.filter(digest__in=missing).values_list('digest', 'id'))
+
+        addresses = {
+            (ids[digest], ip): {'identity_id': ids[digest], 'ip_address': ip}
+            for ip, digest, _ in batch
+        }
+        # 只按身份取（唯一索引的前缀），每台设备用过的地址不多
+        existing = {
+            (identity_id, ip): (pk, first_seen, last_seen)
+            for pk, identity_id, ip, first_seen, last_seen in IdentityAddress.objects.filter(
+                identity_id__in=set(ids.values())
+            ).values_list('id', 'identity_id', 'ip_address', 'first_seen', 'last_seen')
+        }
+        return _merge(IdentityAddress, addresses, existing, task, seen)
+
+
+def update_identities(task, batch_size: int = DEFAULT_BATCH_SIZE) -> Dict[str, int]:
+    """
+    用任务结果更新设备身份索引
+
+    Returns:
+        hosts（有结果的主机数）、identified（建立了身份的主机数）、updated（新增或更新的地址记录数）
+    """
+    rows = (
+        task.effective_results()
+        .order_by()
+        .values_list('ip_address', 'port', 'protocol', 'state', 'fingerprint__data', 'host__mac_address')
+        .iterator(chunk_size=batch_size)
+    )
+    features = host_features(rows)
+    identified = []
+    for ip, host in features.items():
+        digest = identity_digest(host)
+        if digest:
+            identified.append((ip, digest, host))
+
+    seen = task.completed_at or timezone.now()
+    updated = 0
+    for batch in batched(identified, batch_size):
+        updated += merge_batch(task, seen, batch)
+    stats = {'hosts': len(features), 'identified': len(identified), 'updated': updated}
+    logger.info(f"任务 {task.id} 设备身份索引已更新: {stats}")
+    return stats
+
+
+def device_addresses(ip_address: str):
+    """
+    与该地址属于同一设备的全部地址记录
+
+    一条语句：先按地址索引找到用过该地址的身份，再按 (身份, 地址) 唯一索引取出各身份的全部地址。
+    NAT后的多台设备共用一个地址时，结果包含每台设备的地址。
+    """
+    identities = IdentityAddress.objects.filter(ip_address=ip_address).values('identity')
+    return IdentityAddress.objects.filter(identity__in=identities).select_related('identity')
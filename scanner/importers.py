@@ -0,0 +1,405 @@
+"""
+外部扫描结果导入
+流式解析 nmap XML（含 masscan -oX）、masscan JSON（-oJ/-oD）和 masscan 列表（-oL）文件，
+解析出的结果行与扫描器的输出格式相同，直接交给 scanner.ingest 分批写入：
+XML按 <host> 逐个解析后立即释放，JSON和列表格式逐行解析，内存占用与文件大小无关。
+
+每个文件导入为一个已完成的 ScanTask，任务时间取文件中记录的扫描时间，
+结果的发现时间取各主机/记录自己的时间，历史结果落在对应的月度分区并按时间顺序合并进暴露面。
+"""
+import json
+import logging
+import os
+import time
+import xml.etree.ElementTree as ElementTree
+from datetime import datetime, timezone as dt_timezone
+from functools import lru_cache
+from typing import Dict, Iterator, Optional, Set
+
+from django.utils import timezone
+
+from .fields import int_to_ip, ip_to_int
+from .scanners.nmap_scanner import script_fingerprints
+from .scanners.rangeset import IntervalSet
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 5000
+
+# ScanTask.ports 的长度上限
+MAX_PORT_SPEC = 500
+
+
+class ImportFormatError(ValueError):
+    """无法识别或解析的导入文件"""
+
+
+@lru_cache(maxsize=4096)
+def _epoch(value) -> Optional[datetime]:
+    try:
+        return datetime.fromtimestamp(int(value), tz=dt_timezone.utc)
+    except (TypeError, ValueError, OverflowError, OSError):
+        return None
+
+
+def port_spec(ports: IntervalSet, limit: int = MAX_PORT_SPEC) -> str:
+    """
+    端口集合的规格字符串，超长时按区间截断
+
+    截断后仍是扫描端口的子集：暴露面只会对这些端口关闭未报告的结果，不会误关没有扫描过的端口。
+    """
+    parts, length = [], 0
+    for start, end in ports.intervals:
+        part = str(start) if start == end else f'{start}-{end}'
+        added = len(part) + (1 if parts else 0)
+        if length + added > limit:
+            break
+        parts.append(part)
+        length += added
+    return ','.join(parts)
+
+
+class ScanFileReader:
+    """
+    导入文件读取器基类
+
+    迭代产生结果行，迭代过程中累积文件级信息：扫描器、参数、扫描类型、
+    地址和时间范围、扫描过的端口，供导入结束后填写任务。
+    """
+    format = ''
+
+    def __init__(self, path: str):
+        self.path = path
+        self.scanner = ''
+        self.args = ''
+        self.scan_type = 'SYN_SCAN'
+        self.scanned_ports = IntervalSet()
+        self.seen_ports: Set[int] = set()
+        self.first_seen: Optional[datetime] = None
+        self.last_seen: Optional[datetime] = None
+        self.low_address: Optional[int] = None
+        self.high_address: Optional[int] = None
+        self.records = 0
+        self.skipped = 0
+        # 记录本身没有时间时使用的发现时间
+        self.fallback_time = timezone.now()
+
+    def __iter__(self) -> Iterator[Dict]:
+        raise NotImplementedError
+
+    def _observe(self, row: Dict) -> Dict:
+        seen = row.setdefault('discovered_at', self.fallback_time)
+        if self.first_seen is None or seen < self.first_seen:
+            self.first_seen = seen
+        if self.last_seen is None or seen > self.last_seen:
+            self.last_seen = seen
+        value = ip_to_int(row['ip_address'])
+        if self.low_address is None or value < self.low_address:
+            self.low_address = value
+        if self.high_address is None or value > self.high_address:
+            self.high_address = value
+        if row.get('port') is not None:
+            self.seen_ports.add(row['port'])
+        self.records += 1
+        return row
+
+    def target(self) -> str:
+        """导入结果覆盖的地址范围"""
+        if self.low_address is None:
+            return ''
+        if self.low_address == self.high_address:
+            return int_to_ip(self.low_address)
+        return f'{int_to_ip(self.low_address)}-{int_to_ip(self.high_address)}'
+
+    def ports(self) -> str:
+        """扫描过的端口：文件中有扫描范围时取扫描范围，否则取出现过的端口"""
+        return port_spec(self.scanned_ports or IntervalSet.from_values(self.seen_ports))
+
+
+class NmapXMLReader(ScanFileReader):
+    """nmap -oX 输出，也接受 masscan -oX 输出"""
+    format = 'nmap-xml'
+
+    def __iter__(self) -> Iterator[Dict]:
+        try:
+            events = ElementTree.iterparse(self.path, events=('start', 'end'))
+            root = None
+            for event, element in events:
+                if event == 'start':
+                    if root is None:
+                        root = element
+                        self._read_run(element)
+                    continue
+                if element.tag == 'scaninfo':
+                    self._read_scaninfo(element)
+                elif element.tag == 'finished':
+                    finished = _epoch(element.get('time'))
+                    if finished and (self.last_seen is None or finished > self.last_seen):
+                        self.last_seen = finished
+                elif element.tag == 'host':
+                    yield from self._host_rows(element)
+                    # 已处理的主机从树上摘除，内存只保留当前主机
+                    root.clear()
+        except ElementTree.ParseError as e:
+            raise ImportFormatError(f"{self.path}: XML解析失败: {e}")
+
+    def _read_run(self, element):
+        if element.tag != 'nmaprun':
+            raise ImportFormatError(f"{self.path}: 不是nmap XML输出")
+        self.scanner = element.get('scanner', 'nmap')
+        self.args = element.get('args', '')
+        started = _epoch(element.get('start'))
+        if started:
+            self.fallback_time = self.first_seen = started
+        arguments = self.args.split()
+        if '-A' in arguments:
+            self.scan_type = 'FULL_SCAN'
+        elif '-sV' in arguments:
+            self.scan_type = 'SERVICE_DETECTION'
+        elif '-O' in arguments:
+            self.scan_type = 'OS_DETECTION'
+
+    def _read_scaninfo(self, element):
+        services = element.get('services', '')
+        try:
+            self.scanned_ports = self.scanned_ports.union(IntervalSet.parse(services))
+        except ValueError:
+            logger.warning(f"{self.path}: 无法解析扫描端口范围: {services[:100]}")
+        if element.get('type') == 'udp' and self.scan_type == 'SYN_SCAN':
+            self.scan_type = 'UDP_SCAN'
+
+    def _host_rows(self, host) -> Iterator[Dict]:
+        status = host.find('status')
+        if status is not None and status.get('state') != 'up':
+            return
+        info = {'hostname': '', 'mac_address': '', 'vendor': ''}
+        for address in host.iter('address'):
+            kind = address.get('addrtype')
+            if kind in ('ipv4', 'ipv6'):
+                info['ip_address'] = address.get('addr')
+            elif kind == 'mac':
+                info['mac_address'] = address.get('addr', '')
+                info['vendor'] = address.get('vendor', '')
+        if 'ip_address' not in info:
+            self.skipped += 1
+            return
+        hostname = host.find('hostnames/hostname')
+        if hostname is not None:
+            info['hostname'] = hostname.get('name', '')
+        osclass = host.find('os/osmatch/osclass')
+        if osclass is not None:
+            info['os_family'] = osclass.get('osfamily', '')
+            info['os_version'] = osclass.get('osgen') or ''
+        times = host.find('times')
+        if times is not None and times.get('srtt'):
+            info['rtt'] = int(times.get('srtt')) / 1000
+        seen = _epoch(host.get('endtime')) or _epoch(host.get('starttime'))
+        if seen:
+            info['discovered_at'] = seen
+
+        ports = host.findall('ports/port')
+        for port in ports:
+            state = port.find('state')
+            service = port.find('service')
+            row = dict(info)
+            row.update({
+                'port': int(port.get('portid')),
+                'protocol': port.get('protocol', 'tcp'),
+                'state': state.get('state') if state is not None else 'unknown',
+                'service': service.get('name', '') if service is not None else '',
+                'service_version': service.get('version', '') if service is not None else '',
+            })
+            if state is not None and state.get('reason_ttl'):
+                row['ttl'] = int(state.get('reason_ttl')) or None
+            fingerprint = {}
+            if service is not None:
+                fingerprint = {
+                    'product': service.get('product', ''),
+                    'version': service.get('version', ''),
+                    'extrainfo': service.get('extrainfo', ''),
+                }
+            fingerprint.update(script_fingerprints({
+                script.get('id'): script.get('output', '') for script in port.iter('script')
+            }))
+            row['fingerprint'] = fingerprint
+            yield self._observe(row)
+        if not ports:
+            yield self._observe(dict(info, state='up'))
+
+
+class MasscanJSONReader(ScanFileReader):
+    """
+    masscan -oJ 输出（一个JSON数组，每行一条记录）和 -oD 输出（每行一个JSON对象）
+    """
+    format = 'masscan-json'
+
+    def __iter__(self) -> Iterator[Dict]:
+        self.scanner = 'masscan'
+        with open(self.path, encoding='utf-8', errors='replace') as handle:
+            for number, line in enumerate(handle, 1):
+                line = line.strip().rstrip(',')
+                if not line or line in ('[', ']', '{finished: 1}'):
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    self.skipped += 1
+                    logger.warning(f"{self.path}:{number} 无法解析的记录")
+                    continue
+                yield from self._record_rows(record)
+
+    def _record_rows(self, record: Dict) -> Iterator[Dict]:
+        ip = record.get('ip')
+        if not ip:
+            self.skipped += 1
+            return
+        seen = _epoch(record.get('timestamp'))
+        for entry in record.get('ports') or ():
+            row = {
+                'ip_address': ip,
+                'port': int(entry['port']),
+                'protocol': entry.get('proto', 'tcp'),
+                'state': entry.get('status', 'open'),
+                'ttl': entry.get('ttl') or None,
+            }
+            service = entry.get('service')
+            if service:
+                row['service'] = service.get('name', '')
+                row['fingerprint'] = {'banner': service.get('banner', '')}
+            if seen:
+                row['discovered_at'] = seen
+            yield self._observe(row)
+
+
+class MasscanListReader(ScanFileReader):
+    """
+    masscan -oL 输出：每行 "<状态> <协议> <端口> <地址> <时间戳>"，
+    banner 行为 "banner <协议> <端口> <地址> <时间戳> <服务> <内容>"
+    """
+    format = 'masscan-list'
+
+    def __iter__(self) -> Iterator[Dict]:
+        self.scanner = 'masscan'
+        with open(self.path, encoding='utf-8', errors='replace') as handle:
+            for line in handle:
+                if not line.strip() or line.startswith('#'):
+                    continue
+                fields = line.split(None, 6)
+                if len(fields) < 4 or not fields[2].isdigit():
+                    self.skipped += 1
+                    continue
+                kind, protocol, port, ip = fields[:4]
+                row = {'ip_address': ip, 'port': int(port), 'protocol': protocol}
+                if kind == 'banner':
+                    row['state'] = 'open'
+                    row['service'] = fields[5] if len(fields) > 5 else ''
+                    row['fingerprint'] = {'banner': fields[6].rstrip('\n') if len(fields) > 6 else ''}
+                else:
+                    row['state'] = kind
+                seen = _epoch(fields[4]) if len(fields) > 4 else None
+                if seen:
+                    row['discovered_at'] = seen
+                yield self._observe(row)
+
+
+READERS = {reader.format: reader for reader in (NmapXMLReader, MasscanJSONReader, MasscanListReader)}
+
+
+def detect_format(path: str) -> str:
+    """按文件开头的内容识别格式"""
+    with open(path, 'rb') as handle:
+        head = handle.read(4096).lstrip()
+    if head.startswith(b'<'):
+        return 'nmap-xml'
+    if head.startswith((b'[', b'{')):
+        return 'masscan-json'
+    if head.startswith(b'#masscan') or head.split(b' ', 1)[0] in (b'open', b'closed', b'banner'):
+        return 'masscan-list'
+    raise ImportFormatError(f"{path}: 无法识别的文件格式")
+
+
+def open_reader(path: str, file_format: str = None) -> ScanFileReader:
+    file_format = file_format or detect_format(path)
+    try:
+        return READERS[file_format](path)
+    except KeyError:
+        raise ImportFormatError(f"不支持的格式: {file_format}")
+
+
+def import_scan_file(path: str, name: str = None, file_format: str = None, created_by=None,
+                     batch_size: int = DEFAULT_BATCH_SIZE, post_process: bool = True) -> Dict:
+    """
+    把一个扫描输出文件导入为已完成的扫描任务
+
+    Args:
+        file_format: nmap-xml、masscan-json 或 masscan-list，默认按内容识别
+        post_process: 导入后补全归属信息、合并进暴露面和设备身份索引
+
+    Returns:
+        task_id、rows、hosts、skipped、seconds、rows_per_second
+    """
+    from .enrichment import enrich_task
+    from .exposure import refresh_exposure
+    from .identity import update_identities
+    from .ingest import save_scan_results
+    from .models import ScanTask
+
+    reader = open_reader(path, file_format)
+    task = ScanTask.objects.create(
+        name=name or os.path.basename(path),
+        target=path,
+        scan_type=reader.scan_type,
+        status='RUNNING',
+        started_at=timezone.now(),
+        options={'imported_from': os.path.abspath(path), 'format': reader.format},
+        created_by=created_by,
+    )
+    started = time.perf_counter()
+    try:
+        rows = save_scan_results(task, reader, batch_size=batch_size)
+    except Exception as e:
+        ScanTask.objects.filter(pk=task.pk).update(status='FAILED', completed_at=timezone.now(),
+                                                   result_summary={'error': str(e)})
+        raise
+    seconds = time.perf_counter() - started
+
+    # 任务时间改为文件中的扫描时间，使按时间范围限定的结果查询覆盖全部导入结果
+    first_seen = reader.first_seen or task.created_at
+    last_seen = reader.last_seen or timezone.now()
+    task.options.update({'scanner': reader.scanner, 'args': reader.args})
+    stats = {
+        'task_id': task.id,
+        'rows': rows,
+        'hosts': task.hosts.count(),
+        'skipped': reader.skipped,
+        'seconds': round(seconds, 3),
+        'rows_per_second': int(rows / seconds) if seconds > 0 else rows,
+    }
+    ScanTask.objects.filter(pk=task.pk).update(
+        target=reader.target() or path,
+        ports=reader.ports(),
+        scan_type=reader.scan_type,
+        options=task.options,
+        status='COMPLETED',
+        progress=100,
+        created_at=first_seen,
+        started_at=first_seen,
+        completed_at=last_seen,
+        result_summary={
+            'total_results': rows,
+            'open_ports': task.results.filter(state='open').count(),
+            'unique_hosts': stats['hosts'],
+            'import': {key: stats[key] for key in ('skipped', 'seconds', 'rows_per_second')},
+        },
+    )
+    task.refresh_from_db()
+    logger.info(f"{path} 导入完成: {rows} 条结果，{stats['rows_per_second']} 行/秒")
+
+    if post_process:
+        for step, label in ((enrich_task, '补全归属信息'), (refresh_exposure, '更新当前暴露面'),
+                            (update_identities, '更新设备身份索引')):
+            try:
+                step(task)
+            except Exception as e:
+                logger.error(f"任务 {task.id} {label}失败: {e}")
+    return stats
@@ -0,0 +1,218 @@
+"""
+增量扫描
+以相同目标最近一次完成的任务为基线：先做存活发现和已知开放端口的快速验证，
+只对新增或发生变化的主机做完整的端口和服务探测，未变化主机的结果按引用沿用。
+"""
+import logging
+from collections import defaultdict
+from datetime import timedelta
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from django.conf import settings
+from django.utils import timezone
+
+from .ingest import HOST_FIELDS
+from .liveness import LivenessCache
+from .models import ExposureSnapshot, ScanHost, ScanTask
+from .scanners import NMAPScanner, ScapyScanner, TracerouteScanner
+from .scanners.rangeset import IntervalSet, contains_address
+
+logger = logging.getLogger(__name__)
+
+Endpoint = Tuple[int, str]
+
+# 沿用链上最早的结果超过该天数后强制完整重扫，避免结果随旧任务被清理
+DEFAULT_MAX_CARRY_DAYS = 7
+
+
+def find_baseline(task: ScanTask) -> Optional[ScanTask]:
+    """
+    选择增量扫描的基线任务
+
+    优先使用任务上指定的基线，否则取目标、类型和端口范围都相同的最近一次完成任务。
+    """
+    if task.baseline_task_id:
+        return task.baseline_task
+    return (
+        ScanTask.objects
+        .filter(status='COMPLETED', target=task.target, scan_type=task.scan_type, ports=task.ports)
+        .exclude(id=task.id)
+        .order_by('-completed_at')
+        .first()
+    )
+
+
+def build_scanner(scan_type: str, target: str, ports: str, options: Dict = None,
+                  exclusions: IntervalSet = None, liveness: LivenessCache = None):
+    """按扫描类型选择扫描器，与完整扫描使用相同的规则；liveness 为任务共用的无响应缓存"""
+    if scan_type in ['SYN_SCAN', 'UDP_SCAN']:
+        return ScapyScanner(target=target, ports=ports, options=options, exclusions=exclusions,
+                            liveness=liveness)
+    if scan_type == 'TRACEROUTE':
+        return TracerouteScanner(target=target, ports=ports, options=options, exclusions=exclusions)
+    return NMAPScanner(target=target, ports=ports, options=options, exclusions=exclusions)
+
+
+def scan_hosts(task: ScanTask, ips: Iterable[str], exclusions: IntervalSet = None,
+               liveness: LivenessCache = None) -> List[Dict]:
+    """对指定主机执行任务配置的完整扫描"""
+    ips = sorted(ips)
+    if not ips:
+        return []
+    scanner = build_scanner(task.scan_type, ' '.join(ips), task.ports, task.options, exclusions, liveness)
+    return scanner.execute_scan(scan_type=task.scan_type)
+
+
+def verify_open_ports(expected: Dict[str, Set[Endpoint]]) -> Set[Tuple[str, int, str]]:
+    """
+    用一次Nmap扫描验证已知开放端口，返回仍然开放的 (IP, 端口, 协议)
+
+    所有主机并行探测已知端口的并集，比逐台完整扫描少得多。
+    """
+    found = set()
+    for protocol, scan_type in (('tcp', 'SYN_SCAN'), ('udp', 'UDP_SCAN')):
+        ips = sorted(ip for ip, endpoints in expected.items() if any(p == protocol for _, p in endpoints))
+        ports = sorted({port for endpoints in expected.values() for port, p in endpoints if p == protocol})
+        if not ips:
+            continue
+        scanner = NMAPScanner(target=' '.join(ips), ports=','.join(map(str, ports)))
+        for row in scanner.execute_scan(scan_type=scan_type):
+            if row.get('state') == 'open' and row.get('port'):
+                found.add((row['ip_address'], row['port'], row.get('protocol', protocol)))
+    return found
+
+
+def discover_hosts(target: str, exclusions: IntervalSet = None) -> Set[str]:
+    """对目标做一次存活主机发现"""
+    scanner = NMAPScanner(target=target, exclusions=exclusions)
+    return {
+        row['ip_address'] for row in scanner.execute_scan(scan_type='PING_SWEEP')
+        if row.get('state') == 'up' and row.get('ip_address')
+    }
+
+
+class IncrementalScan:
+    """
+    单个增量扫描任务的执行计划
+
+    Args:
+        task: 当前任务
+        baseline: 基线任务
+        exclusions: 禁止扫描的地址区间，基线中落在其中的主机也不再探测
+        verify: 已知开放端口验证函数，可替换以便测试
+        discover: 存活发现函数
+        scan: 完整扫描函数
+        target: 域名已解析为地址的扫描目标，默认使用任务目标
+        liveness: 任务共用的无响应缓存，传给完整扫描函数
+    """
+
+    def __init__(self, task: ScanTask, baseline: ScanTask,
+                 exclusions: IntervalSet = None,
+                 verify: Callable = verify_open_ports,
+                 discover: Callable = discover_hosts,
+                 scan: Callable = scan_hosts,
+                 target: str = None,
+                 liveness: LivenessCache = None):
+        self.task = task
+        self.target = target or task.target
+        self.baseline = baseline
+        self.exclusions = exclusions or IntervalSet()
+        self.verify = verify
+        self.discover = discover
+        self.scan = scan
+        self.liveness = liveness
+        self.max_carry_age = timedelta(days=getattr(settings, 'INCREMENTAL_MAX_CARRY_DAYS', DEFAULT_MAX_CARRY_DAYS))
+
+        self.new_hosts: Set[str] = set()
+        self.changed_hosts: Set[str] = set()
+        self.carried_hosts: Dict[str, ScanHost] = {}
+
+    def _baseline_hosts(self) -> Dict[str, ScanHost]:
+        hosts = ScanHost.objects.filter(task=self.baseline).select_related('task', 'carried_from__task')
+        return {
+            host.ip_address: host for host in hosts
+            if not contains_address(self.exclusions, host.ip_address)
+        }
+
+    def _baseline_open_ports(self) -> Dict[str, Set[Endpoint]]:
+        expected = defaultdict(set)
+        rows = (
+            self.baseline.effective_results()
+            .filter(state='open', port__isnull=False)
+            .values_list('ip_address', 'port', 'protocol')
+        )
+        for ip, port, protocol in rows:
+            if not contains_address(self.exclusions, ip):
+                expected[ip].add((port, protocol))
+        return expected
+
+    def _origin(self, host: ScanHost) -> ScanHost:
+        """沿用链上实际产生结果的主机记录"""
+        return host.carried_from or host
+
+    def execute(self) -> List[Dict]:
+        """执行增量扫描，返回需要入库的结果（只含完整重扫的主机）"""
+        baseline_hosts = self._baseline_hosts()
+        expected = self._baseline_open_ports()
+
+        alive = {
+            ip for ip in self.discover(self.target, self.exclusions)
+            if not contains_address(self.exclusions, ip)
+        }
+        still_open = self.verify(expected) if expected else set()
+        verified = defaultdict(set)
+        for ip, port, protocol in still_open:
+            verified[ip].add((port, protocol))
+
+        stale_before = timezone.now() - self.max_carry_age
+        for ip, host in baseline_hosts.items():
+            origin = self._origin(host)
+            if expected.get(ip, set()) != verified.get(ip, set()):
+                # 已知端口有关闭的，或者端口验证时发现了新的开放端口
+                if ip in alive or ip in verified:
+                    self.changed_hosts.add(ip)
+            elif ip in alive or ip in verified:
+                if (origin.task.completed_at or origin.task.created_at) < stale_before:
+                    self.changed_hosts.add(ip)
+                else:
+                    self.carried_hosts[ip] = origin
+        self.new_hosts = alive - set(baseline_hosts)
+
+        logger.info(
+            f"增量扫描 {self.task.id}（基线 {self.baseline.id}）："
+            f"新增 {len(self.new_hosts)}，变化 {len(self.changed_hosts)}，沿用 {len(self.carried_hosts)}"
+        )
+        return self.scan(self.task, self.new_hosts | self.changed_hosts, self.exclusions, liveness=self.liveness)
+
+    def carry_forward(self) -> int:
+        """
+        为未变化的主机创建引用原结果的主机记录，并刷新其暴露面的最近发现时间
+
+        Returns:
+            沿用的主机数
+        """
+        if not self.carried_hosts:
+            return 0
+        ScanHost.objects.bulk_create([
+            ScanHost(
+                task=self.task,
+                ip_address=ip,
+                carried_from=origin,
+                **{field: getattr(origin, field) for field in HOST_FIELDS}
+            )
+            for ip, origin in self.carried_hosts.items()
+        ], ignore_conflicts=True)
+
+        # 已验证仍开放的端口视为本次观测到
+        ExposureSnapshot.objects.filter(
+            ip_address__in=list(self.carried_hosts), state='open'
+        ).update(last_seen=timezone.now(), last_task=self.task)
+        return len(self.carried_hosts)
+
+    def summary(self) -> Dict:
+        return {
+            'baseline_task': self.baseline.id,
+            'new_hosts': len(self.new_hosts),
+            'changed_hosts': len(self.changed_hosts),
+            'carried_hosts': len(self.carried_hosts),
+        }
@@ -0,0 +1,269 @@
+"""
+扫描结果入库
+将扫描器返回的扁平结果字典拆分为主机（ScanHost）和端口结果（ScanResult）批量写入
+"""
+import io
+import logging
+from typing import Callable, Dict, Iterable, List, Optional
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .fields import PortStateField, ProtocolField, int_to_ip, ip_to_int, normalize_ip
+from .enrichment.oui import fill_vendors
+from .fingerprints import fingerprint_cache
+from .models import NetworkTopology, ScanHost, ScanResult
+from .topology.graph import invalidate_graph
+
+logger = logging.getLogger(__name__)
+
+# 属于主机而不是端口的字段
+HOST_FIELDS = ('hostname', 'mac_address', 'vendor', 'os_family', 'os_version', 'asn', 'as_org', 'country')
+
+# 端口结果行上可直接赋值的字段
+RESULT_FIELDS = (
+    'ip_address', 'port', 'protocol', 'state', 'service', 'service_version',
+    'ttl', 'rtt', 'discovered_at',
+)
+
+# 快速写入路径直接写的结果表列，覆盖 ScanResult 除主键外的全部字段
+RESULT_COLUMNS = (
+    'task', 'host', 'ip_address', 'port', 'protocol', 'state', 'service', 'service_version',
+    'ttl', 'rtt', 'fingerprint', 'discovered_at',
+)
+
+DEFAULT_BATCH_SIZE = 1000
+
+
+def batched(items: Iterable[Dict], size: int) -> Iterable[List[Dict]]:
+    """把序列切分为固定大小的批次，最后一批可能不足"""
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _merge_host_attrs(rows: List[Dict]) -> Dict[str, Dict[str, str]]:
+    """按IP合并主机属性，同一主机取第一条非空值"""
+    hosts = {}
+    for row in rows:
+        attrs = hosts.setdefault(row['ip_address'], {})
+        for field in HOST_FIELDS:
+            value = row.get(field)
+            if value and not attrs.get(field):
+                attrs[field] = value
+    return hosts
+
+
+def upsert_hosts(task, host_attrs: Dict[str, Dict[str, str]]) -> Dict[str, int]:
+    """
+    批量创建或补全任务下的主机记录
+
+    Args:
+        task: 所属扫描任务
+        host_attrs: IP -> 主机属性字典
+
+    Returns:
+        规范写法的IP（见 normalize_ip） -> ScanHost.id 映射
+    """
+    # 同一地址的不同写法（大小写、未压缩的IPv6）归为同一主机
+    merged: Dict[str, Dict[str, str]] = {}
+    for ip, attrs in host_attrs.items():
+        target = merged.setdefault(normalize_ip(ip), {})
+        for field, value in attrs.items():
+            if value and not target.get(field):
+                target[field] = value
+    host_attrs = merged
+    ips = list(host_attrs)
+    existing = {host.ip_address: host for host in ScanHost.objects.filter(task=task, ip_address__in=ips)}
+
+    to_create = []
+    to_update = []
+    for ip, attrs in host_attrs.items():
+        host = existing.get(ip)
+        if host is None:
+            to_create.append(ScanHost(task=task, ip_address=ip, **attrs))
+            continue
+        changed = False
+        for field, value in attrs.items():
+            if not getattr(host, field):
+                setattr(host, field, value)
+                changed = True
+        if changed:
+            to_update.append(host)
+
+    if to_create:
+        ScanHost.objects.bulk_create(to_create, ignore_conflicts=True)
+    if to_update:
+        ScanHost.objects.bulk_update(to_update, list(HOST_FIELDS))
+
+    return dict(
+        ScanHost.objects.filter(task=task, ip_address__in=ips).values_list('ip_address', 'id')
+    )
+
+
+def save_scan_results(task, results: Iterable[Dict], batch_size: int = DEFAULT_BATCH_SIZE,
+                      progress_callback: Optional[Callable[[int], None]] = None) -> int:
+    """
+    批量保存扫描结果
+
+    带有 error 键的条目是扫描器报告的错误，只记录日志不入库。
+
+    Args:
+        task: 所属扫描任务
+        results: 扫描器返回的结果字典序列
+        batch_size: 每批写入的行数
+        progress_callback: 每批写入后以累计保存数调用
+
+    Returns:
+        保存的结果条数
+    """
+    saved_count = 0
+    valid = (row for row in results if _is_valid(row))
+
+    for batch in batched(valid, batch_size):
+        host_attrs = _merge_host_attrs(batch)
+        fill_vendors(host_attrs)
+        host_ids = upsert_hosts(task, host_attrs)
+        fingerprint_ids = fingerprint_cache.intern_many([row.get('fingerprint') for row in batch])
+        rows = encode_results(task, batch, host_ids, fingerprint_ids)
+        insert_results(rows)
+        saved_count += len(rows)
+        if progress_callback:
+            progress_callback(saved_count)
+
+    return saved_count
+
+
+def encode_results(task, batch: List[Dict], host_ids: Dict[str, int], fingerprint_ids: List[Optional[int]],
+                   conn=None) -> List[tuple]:
+    """
+    把结果字典直接编码为 RESULT_COLUMNS 顺序的数据库取值
+
+    与经过 ScanResult 实例写入的结果相同（IP打包、状态和协议编码、发现时间默认为当前时间），
+    省去逐行构造模型实例和逐字段准备取值的开销。
+    """
+    conn = conn or connection
+    adapt_datetime = conn.ops.adapt_datetimefield_value
+    now = adapt_datetime(timezone.now())
+    # IP -> (打包值, 规范写法)
+    addresses: Dict[str, tuple] = {}
+    states, protocols = PortStateField.CODES, ProtocolField.CODES
+    encoded = []
+    for row, fingerprint_id in zip(batch, fingerprint_ids):
+        values = _result_values(row)
+        ip = row['ip_address']
+        if ip not in addresses:
+            value = ip_to_int(ip)
+            addresses[ip] = (value.to_bytes(16, 'big'), int_to_ip(value))
+        packed, canonical = addresses[ip]
+        discovered_at = values.get('discovered_at')
+        encoded.append((
+            task.id,
+            host_ids.get(canonical),
+            packed,
+            values.get('port'),
+            protocols[values.get('protocol', 'tcp')],
+            states[values['state']] if 'state' in values else None,
+            values.get('service') or '',
+            values.get('service_version') or '',
+            values.get('ttl'),
+            values.get('rtt'),
+            fingerprint_id,
+            adapt_datetime(discovered_at) if discovered_at else now,
+        ))
+    return encoded
+
+
+def _copy_text(value) -> str:
+    """PostgreSQL COPY 文本格式的字段值"""
+    if value is None:
+        return '\\N'
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        # bytea 的十六进制输入形式 \x...，反斜杠本身需要转义
+        return '\\\\x' + bytes(value).hex()
+    return (str(value).replace('\\', '\\\\').replace('\t', '\\t')
+            .replace('\n', '\\n').replace('\r', '\\r'))
+
+
+def copy_rows(rows: List[tuple]) -> str:
+    """按 COPY 文本格式编码结果行"""
+    return ''.join('\t'.join(_copy_text(value) for value in row) + '\n' for row in rows)
+
+
+def insert_results(rows: List[tuple], conn=None):
+    """
+    写入 encode_results 编码好的结果行
+
+    PostgreSQL上用 COPY FROM STDIN，一批只有一次往返；其他数据库用单条预编译的 INSERT 批量执行。
+    """
+    if not rows:
+        return
+    conn = conn or connection
+    quote = conn.ops.quote_name
+    table = quote(ScanResult._meta.db_table)
+    columns = ', '.join(quote(ScanResult._meta.get_field(name).column) for name in RESULT_COLUMNS)
+    with transaction.atomic(using=conn.alias, savepoint=False), conn.cursor() as cursor:
+        if conn.vendor != 'postgresql':
+            placeholders = ', '.join(['%s'] * len(RESULT_COLUMNS))
+            cursor.executemany(f'INSERT INTO {table} ({columns}) VALUES ({placeholders})', rows)
+            return
+        sql = f'COPY {table} ({columns}) FROM STDIN'
+        raw = cursor.cursor
+        if hasattr(raw, 'copy_expert'):
+            raw.copy_expert(sql, io.StringIO(copy_rows(rows)))
+        else:
+            # psycopg 3
+            with raw.copy(sql) as copy:
+                copy.write(copy_rows(rows))
+
+
+def save_topology(task, edges: Iterable[Dict], batch_size: int = DEFAULT_BATCH_SIZE,
+                  connection_type: str = 'traceroute') -> int:
+    """
+    批量保存拓扑边
+
+    Args:
+        task: 所属扫描任务
+        edges: 含 source_ip、destination_ip、metadata 的字典序列
+
+    Returns:
+        保存的边数
+    """
+    objects = [
+        NetworkTopology(
+            task=task,
+            source_ip=edge['source_ip'],
+            destination_ip=edge['destination_ip'],
+            connection_type=connection_type,
+            metadata=edge.get('metadata', {}),
+        )
+        for edge in edges
+    ]
+    NetworkTopology.objects.bulk_create(objects, batch_size=batch_size)
+    invalidate_graph(task.id)
+    return len(objects)
+
+
+def _result_values(row: Dict) -> Dict:
+    """取出端口结果字段，并把状态和协议归一到可编码的取值"""
+    values = {field: row[field] for field in RESULT_FIELDS if field in row}
+    if 'state' in values:
+        values['state'] = PortStateField.normalize(values['state'], 'unknown')
+    if 'protocol' in values:
+        values['protocol'] = ProtocolField.normalize(str(values['protocol']).lower(), 'tcp')
+    return values
+
+
+def _is_valid(row: Dict) -> bool:
+    if 'error' in row:
+        logger.warning(f"跳过扫描错误结果: {row.get('ip_address', '')} {row['error']}")
+        return False
+    if not row.get('ip_address'):
+        logger.warning(f"跳过缺少IP地址的结果: {row}")
+        return False
+    return True
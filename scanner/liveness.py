@@ -0,0 +1,226 @@
+"""
+无响应地址缓存
+近期探测无响应的IPv4地址记录在Redis位图中，每个/16网段一个位图（8KB）。
+扫描前查询缓存，已知无响应的地址只按较低的采样率重新探测，避免在稀疏网段上反复等待超时。
+Redis不可用时所有操作均为空操作，扫描行为与未启用缓存时一致。
+"""
+import ipaddress
+import logging
+import random
+import time
+from collections import defaultdict
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'liveness:dead'
+DEFAULT_TTL = 7 * 24 * 3600
+DEFAULT_SAMPLE_RATE = 0.05
+
+# 按URL复用的Redis客户端，连接失败记为None，避免每个扫描器都重新探测
+_clients: Dict[str, object] = {}
+
+# TTL划分为若干时间桶，每个桶一组位图并整体过期，过期精度为TTL的1/BUCKETS
+BUCKETS = 8
+
+
+def _split(ip: str) -> Optional[Tuple[str, int]]:
+    """IPv4地址拆分为 (/16前缀, 位偏移)，其他地址返回None"""
+    try:
+        address = ipaddress.ip_address(ip)
+    except ValueError:
+        return None
+    if address.version != 4:
+        return None
+    value = int(address)
+    return f'{value >> 24}.{(value >> 16) & 0xFF}', value & 0xFFFF
+
+
+def _test_bit(bitmap: bytes, offset: int) -> bool:
+    """按Redis SETBIT的位序（字节内高位在前）读取一位"""
+    index = offset >> 3
+    if index >= len(bitmap):
+        return False
+    return bool((bitmap[index] >> (7 - (offset & 7))) & 1)
+
+
+class LivenessCache:
+    """
+    无响应地址的负缓存
+
+    Args:
+        client: Redis客户端，为None时缓存不生效
+        ttl: 无响应记录的有效期（秒）
+        sample_rate: 缓存命中的地址仍被探测的比例
+        rng: 随机数函数，测试时可替换
+        clock: 时间函数，测试时可替换
+    """
+
+    def __init__(self, client=None, ttl: int = DEFAULT_TTL, sample_rate: float = DEFAULT_SAMPLE_RATE,
+                 rng: Callable[[], float] = random.random, clock: Callable[[], float] = time.time):
+        self.client = client
+        self.ttl = ttl
+        self.bucket_seconds = max(1, ttl // BUCKETS)
+        self.sample_rate = sample_rate
+        self.rng = rng
+        self.clock = clock
+
+        self.lookups = 0
+        self.hits = 0
+        self.sampled = 0
+        self._known_dead: Set[str] = set()
+
+    @classmethod
+    def from_settings(cls) -> 'LivenessCache':
+        """按配置创建缓存，未配置或Redis不可用时返回不生效的实例"""
+        url = getattr(settings, 'LIVENESS_CACHE_URL', None)
+        if url and url not in _clients:
+            try:
+                import redis
+                client = redis.Redis.from_url(url, socket_connect_timeout=1, socket_timeout=1)
+                client.ping()
+            except Exception as e:
+                logger.warning(f"无响应地址缓存不可用: {e}")
+                client = None
+            _clients[url] = client
+        client = _clients.get(url) if url else None
+        return cls(
+            client,
+            ttl=getattr(settings, 'LIVENESS_CACHE_TTL', DEFAULT_TTL),
+            sample_rate=getattr(settings, 'LIVENESS_SAMPLE_RATE', DEFAULT_SAMPLE_RATE),
+        )
+
+    @classmethod
+    def for_options(cls, options: Dict = None) -> 'LivenessCache':
+        """按扫描选项创建缓存，options中 liveness_cache=False 时返回不生效的实例"""
+        if (options or {}).get('liveness_cache', True):
+            return cls.from_settings()
+        return cls()
+
+    @property
+    def enabled(self) -> bool:
+        return self.client is not None
+
+    def _bucket(self) -> int:
+        return int(self.clock() // self.bucket_seconds)
+
+    def _key(self, bucket: int, prefix: str) -> str:
+        return f'{KEY_PREFIX}:{bucket}:{prefix}'
+
+    def _window(self) -> List[int]:
+        """可能仍在有效期内的时间桶"""
+        current = self._bucket()
+        return list(range(current - BUCKETS, current + 1))
+
+    def _expire_at(self, bucket: int) -> int:
+        return (bucket + 1) * self.bucket_seconds + self.ttl
+
+    def _disable(self, error: Exception):
+        logger.warning(f"无响应地址缓存访问失败，本次扫描停用缓存: {error}")
+        self.client = None
+
+    def dead_addresses(self, ips: Iterable[str]) -> Set[str]:
+        """返回其中近期被记录为无响应的地址"""
+        if not self.enabled:
+            return set()
+
+        by_prefix = defaultdict(list)
+        for ip in ips:
+            split = _split(ip)
+            if split:
+                by_prefix[split[0]].append((ip, split[1]))
+        if not by_prefix:
+            return set()
+
+        window = self._window()
+        prefixes = list(by_prefix)
+        try:
+            pipe = self.client.pipeline(transaction=False)
+            for prefix in prefixes:
+                for bucket in window:
+                    pipe.get(self._key(bucket, prefix))
+            values = pipe.execute()
+        except Exception as e:
+            self._disable(e)
+            return set()
+
+        dead = set()
+        for i, prefix in enumerate(prefixes):
+            bitmaps = [value for value in values[i * len(window):(i + 1) * len(window)] if value]
+            if not bitmaps:
+                continue
+            for ip, offset in by_prefix[prefix]:
+                if any(_test_bit(bitmap, offset) for bitmap in bitmaps):
+                    dead.add(ip)
+        return dead
+
+    def filter_targets(self, ips: List[str]) -> List[str]:
+        """
+        过滤扫描目标
+
+        缓存中无响应的地址按采样率保留，其余直接跳过；顺序与输入一致。
+        """
+        if not self.enabled:
+            return list(ips)
+        dead = self.dead_addresses(ips)
+        self._known_dead |= dead
+        self.lookups += len(ips)
+        self.hits += len(dead)
+
+        targets = []
+        for ip in ips:
+            if ip in dead:
+                if self.rng() >= self.sample_rate:
+                    continue
+                self.sampled += 1
+            targets.append(ip)
+        return targets
+
+    def _set_bits(self, ips: Iterable[str], value: int, buckets: List[int]):
+        if not self.enabled:
+            return
+        try:
+            pipe = self.client.pipeline(transaction=False)
+            touched = set()
+            for ip in ips:
+                split = _split(ip)
+                if not split:
+                    continue
+                prefix, offset = split
+                for bucket in buckets:
+                    key = self._key(bucket, prefix)
+                    pipe.setbit(key, offset, value)
+                    touched.add((key, bucket))
+            for key, bucket in touched:
+                pipe.expireat(key, self._expire_at(bucket))
+            pipe.execute()
+        except Exception as e:
+            self._disable(e)
+
+    def mark_dead(self, ips: Iterable[str]):
+        """记录无响应的地址"""
+        self._set_bits(ips, 1, [self._bucket()])
+
+    def mark_alive(self, ips: Iterable[str]):
+        """
+        清除有响应地址在所有有效时间桶中的记录
+
+        只处理本次查询时命中缓存的地址，其他地址本来就没有记录。
+        """
+        revived = [ip for ip in ips if ip in self._known_dead]
+        if revived:
+            self._set_bits(revived, 0, self._window())
+            self._known_dead.difference_update(revived)
+
+    def stats(self) -> Dict:
+        """命中统计，写入任务的结果摘要"""
+        return {
+            'enabled': self.enabled,
+            'lookups': self.lookups,
+            'hits': self.hits,
+            'sampled': self.sampled,
+            'skipped': self.hits - self.sampled,
+            'hit_rate': round(self.hits / self.lookups, 4) if self.lookups else 0.0,
+        }
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from scanner.tracing import refresh_hcf_table
+
+
+class Command(BaseCommand):
+    """
+    编译跳数过滤表
+    与定时任务 refresh_hcf_table 相同，用于首次上线或调整统计窗口后立即生效
+    """
+    help = '用最近扫描结果中的TTL编译 网段 -> 跳数 过滤表'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None,
+                            help='统计最近多少天的扫描结果，默认为 HCF_WINDOW_DAYS')
+        parser.add_argument('--output', default=None,
+                            help='输出文件，默认为 HCF_TABLE_PATH')
+
+    def handle(self, *args, **options):
+        table = refresh_hcf_table(options['days'], options['output'])
+        self.stdout.write(self.style.SUCCESS(
+            f'跳数表已写入：{len(table)} 个网段，{int(table.samples.sum())} 台主机'
+        ))
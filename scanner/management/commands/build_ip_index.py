@@ -0,0 +1,31 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from scanner.enrichment import IPIndex
+
+
+class Command(BaseCommand):
+    """
+    编译离线IP归属索引
+    读取一个或多个 网段/区间 -> ASN、组织、国家 的CSV或TSV文件，写出可内存映射的索引目录
+    """
+    help = '从离线归属数据文件编译IP归属索引'
+
+    def add_arguments(self, parser):
+        parser.add_argument('sources', nargs='+', help='数据文件（CSV/TSV，可gzip压缩）')
+        parser.add_argument('--output', default=None,
+                            help='索引输出目录，默认为 IP_INDEX_PATH')
+
+    def handle(self, *args, **options):
+        output = options['output'] or getattr(settings, 'IP_INDEX_PATH', None)
+        if not output:
+            raise CommandError('未指定输出目录，也没有配置 IP_INDEX_PATH')
+
+        try:
+            index = IPIndex.from_csv(options['sources'])
+        except (OSError, ValueError) as e:
+            raise CommandError(f'读取数据文件失败: {e}')
+        index.save(output)
+        self.stdout.write(self.style.SUCCESS(
+            f'索引已写入 {output}：{len(index)} 个区间，{len(index.records)} 条归属记录'
+        ))
@@ -0,0 +1,34 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from scanner.enrichment import OUITable
+from scanner.enrichment.oui import BUNDLED_REGISTRY
+
+
+class Command(BaseCommand):
+    """
+    编译MAC厂商表
+    读取IEEE登记表（oui.csv、mam.csv、oui36.csv），写出入库时使用的厂商前缀表
+    """
+    help = '从IEEE登记表CSV编译MAC厂商表'
+
+    def add_arguments(self, parser):
+        parser.add_argument('sources', nargs='*',
+                            help='IEEE登记表CSV文件，不指定时使用内置的精简登记表')
+        parser.add_argument('--output', default=None,
+                            help='输出文件，默认为 OUI_TABLE_PATH')
+
+    def handle(self, *args, **options):
+        output = options['output'] or getattr(settings, 'OUI_TABLE_PATH', None)
+        if not output:
+            raise CommandError('未指定输出文件，也没有配置 OUI_TABLE_PATH')
+
+        sources = options['sources'] or [BUNDLED_REGISTRY]
+        try:
+            table = OUITable.from_csv(sources)
+        except OSError as e:
+            raise CommandError(f'读取登记表失败: {e}')
+        table.save(output)
+        self.stdout.write(self.style.SUCCESS(
+            f'厂商表已写入 {output}：{len(table)} 个前缀，{len(table.vendors)} 个厂商'
+        ))
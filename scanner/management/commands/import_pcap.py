@@ -0,0 +1,46 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from scanner.models import TrafficCapture
+from scanner.tracing.pcap import CaptureFormatError, ingest_capture
+
+
+class Command(BaseCommand):
+    """
+    导入攻击流量抓包
+    pcap/pcapng文件按流汇总后写入 AttackFlow，可以直接导入或提交给Celery后台导入
+    """
+    help = '导入pcap/pcapng抓包文件并按 (源, 目的, 目的端口, 协议) 汇总攻击流'
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='+', help='抓包文件')
+        parser.add_argument('--name', default=None, help='抓包名称，默认为文件名')
+        parser.add_argument('--async', dest='background', action='store_true',
+                            help='提交给Celery后台导入')
+
+    def handle(self, *args, **options):
+        from scanner.tasks import ingest_traffic_capture
+
+        for path in options['paths']:
+            if not os.path.isfile(path):
+                raise CommandError(f'文件不存在: {path}')
+            capture = TrafficCapture.objects.create(
+                name=options['name'] or os.path.basename(path),
+                file_path=os.path.abspath(path),
+            )
+            if options['background']:
+                ingest_traffic_capture.delay(capture.id)
+                self.stdout.write(f'{path}: 已提交后台导入（抓包 {capture.id}）')
+                continue
+            try:
+                stats = ingest_capture(capture)
+            except (OSError, CaptureFormatError) as e:
+                capture.status = 'FAILED'
+                capture.error_message = str(e)
+                capture.save(update_fields=['status', 'error_message'])
+                raise CommandError(f'{path}: {e}')
+            self.stdout.write(self.style.SUCCESS(
+                f"{path}: {stats['packets']} 个报文，{stats['flows']} 个流，"
+                f"跳过 {stats['skipped']} 个，{stats['packets_per_second']} 报文/秒"
+            ))
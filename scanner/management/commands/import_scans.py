@@ -0,0 +1,93 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+
+from scanner.importers import DEFAULT_BATCH_SIZE, READERS, ImportFormatError, import_scan_file
+
+
+def _import(path, options):
+    return import_scan_file(
+        path,
+        name=options['name'],
+        file_format=options['format'],
+        batch_size=options['batch_size'],
+        post_process=not options['skip_post_process'],
+    )
+
+
+class Command(BaseCommand):
+    """
+    导入外部扫描结果
+    nmap XML和masscan JSON/列表输出流式解析后写入，每个文件成为一个已完成的扫描任务；
+    多个文件可以用多个进程并行导入，或提交给Celery后台导入
+    """
+    help = '流式导入nmap XML、masscan JSON/列表输出文件'
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='+', help='扫描输出文件')
+        parser.add_argument('--format', choices=sorted(READERS), default=None, help='文件格式，默认按内容识别')
+        parser.add_argument('--name', default=None, help='任务名称，默认为文件名')
+        parser.add_argument('--workers', type=int, default=1, help='并行导入的进程数')
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help='每批写入的行数')
+        parser.add_argument('--skip-post-process', action='store_true',
+                            help='不补全归属信息、不合并进暴露面和设备身份索引')
+        parser.add_argument('--async', dest='background', action='store_true',
+                            help='提交给Celery后台导入')
+
+    def handle(self, *args, **options):
+        paths = options['paths']
+        for path in paths:
+            if not os.path.isfile(path):
+                raise CommandError(f'文件不存在: {path}')
+
+        if options['background']:
+            from scanner.tasks import import_scan_file as import_task
+
+            for path in paths:
+                import_task.delay(os.path.abspath(path), options['name'], options['format'])
+                self.stdout.write(f'{path}: 已提交后台导入')
+            return
+
+        workers = max(1, min(options['workers'], len(paths)))
+        if workers > 1 and connection.vendor == 'sqlite':
+            self.stdout.write(self.style.WARNING('SQLite只允许单个写入者，改为顺序导入'))
+            workers = 1
+
+        # 只把导入参数传给子进程，options 里的输出流等对象不能序列化
+        options = {key: options[key] for key in ('name', 'format', 'batch_size', 'skip_post_process')}
+        started = time.perf_counter()
+        total = 0
+        failed = []
+        if workers == 1:
+            for path in paths:
+                total += self._report(path, lambda: _import(path, options), failed)
+        else:
+            # 子进程各自建立数据库连接，不能继承父进程的连接
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                futures = {pool.submit(_import, path, options): path for path in paths}
+                for future in as_completed(futures):
+                    total += self._report(futures[future], future.result, failed)
+
+        seconds = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'共导入 {total} 条结果，用时 {seconds:.1f} 秒，{int(total / seconds) if seconds else total} 行/秒'
+        ))
+        if failed:
+            raise CommandError(f'{len(failed)} 个文件导入失败: {", ".join(failed)}')
+
+    def _report(self, path, run, failed) -> int:
+        try:
+            stats = run()
+        except (OSError, ImportFormatError) as e:
+            self.stderr.write(f'{path}: {e}')
+            failed.append(path)
+            return 0
+        self.stdout.write(
+            f"{path}: 任务 {stats['task_id']}，{stats['rows']} 条结果，{stats['hosts']} 台主机，"
+            f"跳过 {stats['skipped']} 条，{stats['rows_per_second']} 行/秒"
+        )
+        return stats['rows']
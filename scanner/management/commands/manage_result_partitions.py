@@ -0,0 +1,57 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from scanner import partitioning
+
+
+class Command(BaseCommand):
+    """
+    维护扫描结果分区表
+    提前创建未来月份的分区，并按保留期删除过期分区
+    """
+    help = '为扫描结果表预建未来月份分区，并按保留期删除过期分区（仅PostgreSQL）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--months-ahead', type=int, default=3,
+                            help='提前创建的月份数量（默认3）')
+        parser.add_argument('--retention-days', type=int, default=None,
+                            help='保留天数，整体早于该期限的分区将被删除')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='只显示将执行的操作，不修改数据库')
+
+    def handle(self, *args, **options):
+        if not partitioning.partitioning_supported():
+            self.stdout.write(self.style.WARNING('当前数据库不支持原生分区，跳过'))
+            return
+        if not partitioning.is_partitioned():
+            self.stdout.write(self.style.WARNING('扫描结果表尚未分区，请先执行 migrate'))
+            return
+
+        months_ahead = options['months_ahead']
+        retention_days = options['retention_days']
+        dry_run = options['dry_run']
+
+        if dry_run:
+            existing = set(partitioning.list_partitions())
+            current = partitioning.month_start(timezone.now())
+            for offset in range(months_ahead + 1):
+                name = partitioning.partition_name(partitioning.add_months(current, offset))
+                if name not in existing:
+                    self.stdout.write(f'将创建分区: {name}')
+        else:
+            for name in partitioning.ensure_partitions(months_ahead):
+                self.stdout.write(self.style.SUCCESS(f'已创建分区: {name}'))
+
+        if retention_days is not None:
+            cutoff = timezone.now() - timedelta(days=retention_days)
+            if dry_run:
+                for name in partitioning.expired_partitions(cutoff):
+                    self.stdout.write(f'将删除分区: {name}')
+            else:
+                for name in partitioning.drop_partitions_before(cutoff):
+                    self.stdout.write(self.style.SUCCESS(f'已删除分区: {name}'))
+
+        partitions = partitioning.list_partitions()
+        self.stdout.write(f'当前共有 {len(partitions)} 个月度分区')
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from scanner.exposure import refresh_exposure
+from scanner.models import ScanTask, ExposureSnapshot
+
+
+class Command(BaseCommand):
+    """
+    重建当前暴露面
+    按完成时间依次合并已完成任务的结果，用于首次上线或数据修复
+    """
+    help = '按完成时间顺序用已完成任务的结果重建当前暴露面快照'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clear', action='store_true',
+                            help='重建前清空现有快照')
+
+    def handle(self, *args, **options):
+        if options['clear']:
+            deleted, _ = ExposureSnapshot.objects.all().delete()
+            self.stdout.write(f'已清空 {deleted} 条快照')
+
+        tasks = ScanTask.objects.filter(status='COMPLETED').order_by('completed_at')
+        total = 0
+        for task in tasks.iterator():
+            total += refresh_exposure(task)
+        self.stdout.write(self.style.SUCCESS(f'重建完成，共合并 {total} 条端口状态'))
@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from scanner.models import VantagePoint
+
+
+class Command(BaseCommand):
+    """
+    运行探测点代理
+    登记（或更新）探测点后启动只消费该探测点队列的Celery worker，
+    同一台机器上可以用不同名称运行多个代理，分别代表不同的出口网络
+    """
+    help = '登记探测点并启动消费其专用队列的Celery worker'
+
+    def add_arguments(self, parser):
+        parser.add_argument('name', help='探测点名称')
+        parser.add_argument('--latitude', type=float, default=None, help='探测点纬度')
+        parser.add_argument('--longitude', type=float, default=None, help='探测点经度')
+        parser.add_argument('--description', default=None, help='描述')
+        parser.add_argument('--concurrency', type=int, default=2, help='worker并发数')
+        parser.add_argument('--loglevel', default='info', help='worker日志级别')
+
+    def handle(self, *args, **options):
+        from trace_system.celery import app
+
+        vantage = VantagePoint.objects.filter(name=options['name']).first()
+        if vantage is None:
+            if options['latitude'] is None or options['longitude'] is None:
+                raise CommandError('新登记的探测点需要指定 --latitude 和 --longitude')
+            vantage = VantagePoint(name=options['name'])
+        for field in ('latitude', 'longitude', 'description'):
+            if options[field] is not None:
+                setattr(vantage, field, options[field])
+        vantage.is_active = True
+        vantage.last_seen = timezone.now()
+        vantage.save()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'探测点 {vantage.name} ({vantage.latitude}, {vantage.longitude}) 消费队列 {vantage.queue}'
+        ))
+        app.worker_main([
+            'worker',
+            '--queues', vantage.queue,
+            '--hostname', f'{vantage.name}@%h',
+            '--concurrency', str(options['concurrency']),
+            '--loglevel', options['loglevel'],
+        ])
@@ -0,0 +1,24 @@
+# 在PostgreSQL上将扫描结果表转换为按 discovered_at 月份分区的表
+
+from django.db import migrations
+
+
+def partition_scanresult(apps, schema_editor):
+    from scanner.partitioning import convert_to_partitioned
+    convert_to_partitioned(schema_editor)
+
+
+def unpartition_scanresult(apps, schema_editor):
+    from scanner.partitioning import revert_to_plain
+    revert_to_plain(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scanner', '0002_alter_scantask_options_scantask_completed_at_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_scanresult, unpartition_scanresult),
+    ]
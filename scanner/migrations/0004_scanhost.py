@@ -0,0 +1,134 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:34
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+HOST_FIELDS = ('hostname', 'mac_address', 'vendor', 'os_family', 'os_version')
+CHUNK_SIZE = 5000
+
+
+def move_host_columns(apps, schema_editor):
+    """按主键分块把结果行上的主机列迁移到ScanHost"""
+    ScanResult = apps.get_model('scanner', 'ScanResult')
+    ScanHost = apps.get_model('scanner', 'ScanHost')
+
+    last_id = 0
+    while True:
+        rows = list(
+            ScanResult.objects.filter(id__gt=last_id).order_by('id')
+            .values('id', 'task_id', 'ip_address', *HOST_FIELDS)[:CHUNK_SIZE]
+        )
+        if not rows:
+            break
+        last_id = rows[-1]['id']
+
+        # 同一主机的属性取第一条非空值
+        attrs = {}
+        for row in rows:
+            host_attrs = attrs.setdefault((row['task_id'], row['ip_address']), {})
+            for field in HOST_FIELDS:
+                if row[field] and not host_attrs.get(field):
+                    host_attrs[field] = row[field]
+
+        task_ids = {key[0] for key in attrs}
+        ips = {key[1] for key in attrs}
+        existing = {
+            (host.task_id, host.ip_address): host
+            for host in ScanHost.objects.filter(task_id__in=task_ids, ip_address__in=ips)
+        }
+        ScanHost.objects.bulk_create([
+            ScanHost(task_id=task_id, ip_address=ip, **host_attrs)
+            for (task_id, ip), host_attrs in attrs.items()
+            if (task_id, ip) not in existing
+        ])
+        host_ids = {
+            (task_id, ip): host_id
+            for task_id, ip, host_id in ScanHost.objects.filter(task_id__in=task_ids, ip_address__in=ips)
+            .values_list('task_id', 'ip_address', 'id')
+        }
+        ScanResult.objects.bulk_update(
+            [ScanResult(id=row['id'], host_id=host_ids[(row['task_id'], row['ip_address'])]) for row in rows],
+            ['host'],
+            batch_size=1000,
+        )
+
+
+def restore_host_columns(apps, schema_editor):
+    """回滚时把ScanHost上的属性写回结果行"""
+    ScanResult = apps.get_model('scanner', 'ScanResult')
+
+    last_id = 0
+    while True:
+        rows = list(
+            ScanResult.objects.filter(id__gt=last_id, host__isnull=False).order_by('id')
+            .values('id', *(f'host__{field}' for field in HOST_FIELDS))[:CHUNK_SIZE]
+        )
+        if not rows:
+            break
+        last_id = rows[-1]['id']
+        ScanResult.objects.bulk_update(
+            [
+                ScanResult(id=row['id'], **{field: row[f'host__{field}'] for field in HOST_FIELDS})
+                for row in rows
+            ],
+            list(HOST_FIELDS),
+            batch_size=1000,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scanner', '0003_partition_scanresult'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScanHost',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ip_address', models.GenericIPAddressField(verbose_name='IP地址')),
+                ('hostname', models.CharField(blank=True, max_length=255, verbose_name='主机名')),
+                ('mac_address', models.CharField(blank=True, max_length=17, verbose_name='MAC地址')),
+                ('vendor', models.CharField(blank=True, max_length=255, verbose_name='设备厂商')),
+                ('os_family', models.CharField(blank=True, max_length=100, verbose_name='操作系统家族')),
+                ('os_version', models.CharField(blank=True, max_length=100, verbose_name='操作系统版本')),
+                ('task', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='hosts', to='scanner.scantask', verbose_name='所属任务')),
+            ],
+            options={
+                'verbose_name': '扫描主机',
+                'verbose_name_plural': '扫描主机',
+                'ordering': ['task', 'ip_address'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='scanhost',
+            constraint=models.UniqueConstraint(fields=('task', 'ip_address'), name='unique_scanhost_task_ip'),
+        ),
+        migrations.AddField(
+            model_name='scanresult',
+            name='host',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='results', to='scanner.scanhost', verbose_name='所属主机'),
+        ),
+        migrations.RunPython(move_host_columns, restore_host_columns),
+        migrations.RemoveField(
+            model_name='scanresult',
+            name='hostname',
+        ),
+        migrations.RemoveField(
+            model_name='scanresult',
+            name='mac_address',
+        ),
+        migrations.RemoveField(
+            model_name='scanresult',
+            name='os_family',
+        ),
+        migrations.RemoveField(
+            model_name='scanresult',
+            name='os_version',
+        ),
+        migrations.RemoveField(
+            model_name='scanresult',
+            name='vendor',
+        ),
+    ]
@@ -0,0 +1,156 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:36
+
+import scanner.fields
+from django.db import migrations, models
+
+CHUNK_SIZE = 5000
+
+
+def encode_columns(apps, schema_editor):
+    """按主键分块把文本列转换为打包IP和小整数编码"""
+    ScanResult = apps.get_model('scanner', 'ScanResult')
+
+    last_id = 0
+    while True:
+        rows = list(
+            ScanResult.objects.filter(id__gt=last_id).order_by('id')
+            .values_list('id', 'ip_address', 'state', 'protocol')[:CHUNK_SIZE]
+        )
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        ScanResult.objects.bulk_update(
+            [
+                ScanResult(
+                    id=pk,
+                    packed_ip=ip,
+                    state_code=scanner.fields.PortStateField.normalize(state, 'unknown'),
+                    protocol_code=scanner.fields.ProtocolField.normalize((protocol or 'tcp').lower(), 'tcp'),
+                )
+                for pk, ip, state, protocol in rows
+            ],
+            ['packed_ip', 'state_code', 'protocol_code'],
+            batch_size=1000,
+        )
+
+
+def decode_columns(apps, schema_editor):
+    """回滚时把编码列还原为文本列"""
+    ScanResult = apps.get_model('scanner', 'ScanResult')
+
+    last_id = 0
+    while True:
+        rows = list(
+            ScanResult.objects.filter(id__gt=last_id).order_by('id')
+            .values_list('id', 'packed_ip', 'state_code', 'protocol_code')[:CHUNK_SIZE]
+        )
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        ScanResult.objects.bulk_update(
+            [
+                ScanResult(id=pk, ip_address=ip, state=state, protocol=protocol)
+                for pk, ip, state, protocol in rows
+            ],
+            ['ip_address', 'state', 'protocol'],
+            batch_size=1000,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scanner', '0004_scanhost'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='scanresult',
+            name='scanner_sca_ip_addr_4d5d6e_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='scanresult',
+            name='scanner_sca_task_id_e27b24_idx',
+        ),
+        # 旧列先改为可空，回滚时才能在已有数据的表上重新加列
+        migrations.AlterField(
+            model_name='scanresult',
+            name='ip_address',
+            field=models.GenericIPAddressField(null=True, verbose_name='IP地址'),
+        ),
+        migrations.AlterField(
+            model_name='scanresult',
+            name='state',
+            field=models.CharField(max_length=20, null=True, verbose_name='状态'),
+        ),
+        migrations.AddField(
+            model_name='scanresult',
+            name='packed_ip',
+            field=scanner.fields.PackedIPAddressField(null=True, verbose_name='IP地址'),
+        ),
+        migrations.AddField(
+            model_name='scanresult',
+            name='state_code',
+            field=scanner.fields.PortStateField(null=True, verbose_name='状态'),
+        ),
+        migrations.AddField(
+            model_name='scanresult',
+            name='protocol_code',
+            field=scanner.fields.ProtocolField(null=True, verbose_name='协议'),
+        ),
+        migrations.RunPython(encode_columns, decode_columns),
+        migrations.RemoveField(
+            model_name='scanresult',
+            name='ip_address',
+        ),
+        migrations.RemoveField(
+            model_name='scanresult',
+            name='state',
+        ),
+        migrations.RemoveField(
+            model_name='scanresult',
+            name='protocol',
+        ),
+        migrations.RenameField(
+            model_name='scanresult',
+            old_name='packed_ip',
+            new_name='ip_address',
+        ),
+        migrations.RenameField(
+            model_name='scanresult',
+            old_name='state_code',
+            new_name='state',
+        ),
+        migrations.RenameField(
+            model_name='scanresult',
+            old_name='protocol_code',
+            new_name='protocol',
+        ),
+        migrations.AlterField(
+            model_name='scanresult',
+            name='ip_address',
+            field=scanner.fields.PackedIPAddressField(verbose_name='IP地址'),
+        ),
+        migrations.AlterField(
+            model_name='scanresult',
+            name='state',
+            field=scanner.fields.PortStateField(verbose_name='状态'),
+        ),
+        migrations.AlterField(
+            model_name='scanresult',
+            name='protocol',
+            field=scanner.fields.ProtocolField(default='tcp', verbose_name='协议'),
+        ),
+        migrations.AddIndex(
+            model_name='scanresult',
+            index=models.Index(fields=['ip_address', 'port'], name='scanner_sca_ip_addr_780323_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='scanresult',
+            index=models.Index(fields=['task', 'state'], name='scanner_sca_task_id_e27b24_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='scanresult',
+            index=models.Index(fields=['port'], name='scanner_sca_port_d4cd41_idx'),
+        ),
+    ]
@@ -0,0 +1,101 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:38
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+CHUNK_SIZE = 5000
+
+
+def intern_fingerprints(apps, schema_editor):
+    """按主键分块把结果行上的指纹JSON写入去重表并回填外键"""
+    from scanner.fingerprints import fingerprint_digest, is_empty
+
+    ScanResult = apps.get_model('scanner', 'ScanResult')
+    Fingerprint = apps.get_model('scanner', 'Fingerprint')
+
+    last_id = 0
+    while True:
+        rows = list(
+            ScanResult.objects.filter(id__gt=last_id).order_by('id')
+            .values_list('id', 'fingerprint')[:CHUNK_SIZE]
+        )
+        if not rows:
+            break
+        last_id = rows[-1][0]
+
+        digests = {}
+        for pk, data in rows:
+            if not is_empty(data):
+                digests[pk] = fingerprint_digest(data)
+        if not digests:
+            continue
+
+        contents = {digests[pk]: data for pk, data in rows if pk in digests}
+        Fingerprint.objects.bulk_create(
+            [Fingerprint(digest=digest, data=data) for digest, data in contents.items()],
+            ignore_conflicts=True,
+        )
+        ids = dict(Fingerprint.objects.filter(digest__in=list(contents)).values_list('digest', 'id'))
+        ScanResult.objects.bulk_update(
+            [ScanResult(id=pk, fingerprint_ref_id=ids[digest]) for pk, digest in digests.items()],
+            ['fingerprint_ref'],
+            batch_size=1000,
+        )
+
+
+def inline_fingerprints(apps, schema_editor):
+    """回滚时把去重表中的指纹内容写回结果行"""
+    ScanResult = apps.get_model('scanner', 'ScanResult')
+
+    last_id = 0
+    while True:
+        rows = list(
+            ScanResult.objects.filter(id__gt=last_id, fingerprint_ref__isnull=False).order_by('id')
+            .values_list('id', 'fingerprint_ref__data')[:CHUNK_SIZE]
+        )
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        ScanResult.objects.bulk_update(
+            [ScanResult(id=pk, fingerprint=data) for pk, data in rows],
+            ['fingerprint'],
+            batch_size=1000,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scanner', '0005_compact_scanresult_columns'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Fingerprint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('digest', models.CharField(max_length=32, unique=True, verbose_name='内容哈希')),
+                ('data', models.JSONField(default=dict, verbose_name='指纹内容')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='创建时间')),
+            ],
+            options={
+                'verbose_name': '服务指纹',
+                'verbose_name_plural': '服务指纹',
+            },
+        ),
+        migrations.AddField(
+            model_name='scanresult',
+            name='fingerprint_ref',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='results', to='scanner.fingerprint', verbose_name='设备指纹'),
+        ),
+        migrations.RunPython(intern_fingerprints, inline_fingerprints),
+        migrations.RemoveField(
+            model_name='scanresult',
+            name='fingerprint',
+        ),
+        migrations.RenameField(
+            model_name='scanresult',
+            old_name='fingerprint_ref',
+            new_name='fingerprint',
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:40
+
+import django.db.models.deletion
+import scanner.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scanner', '0006_fingerprint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExposureSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ip_address', scanner.fields.PackedIPAddressField(verbose_name='IP地址')),
+                ('port', models.IntegerField(verbose_name='端口号')),
+                ('protocol', scanner.fields.ProtocolField(default='tcp', verbose_name='协议')),
+                ('state', scanner.fields.PortStateField(verbose_name='状态')),
+                ('service', models.CharField(blank=True, max_length=100, verbose_name='服务名称')),
+                ('service_version', models.CharField(blank=True, max_length=255, verbose_name='服务版本')),
+                ('first_seen', models.DateTimeField(verbose_name='首次发现时间')),
+                ('last_seen', models.DateTimeField(verbose_name='最近发现时间')),
+                ('last_task', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='scanner.scantask', verbose_name='最近扫描任务')),
+            ],
+            options={
+                'verbose_name': '当前暴露面',
+                'verbose_name_plural': '当前暴露面',
+                'ordering': ['ip_address', 'port'],
+                'indexes': [models.Index(fields=['state', 'ip_address'], name='scanner_exp_state_eb5676_idx')],
+                'constraints': [models.UniqueConstraint(fields=('ip_address', 'port', 'protocol'), name='unique_exposure_endpoint')],
+            },
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:52
+
+import django.db.models.deletion
+import scanner.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scanner', '0007_exposuresnapshot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ip_address', scanner.fields.PackedIPAddressField(verbose_name='IP地址')),
+                ('port', models.IntegerField(verbose_name='端口号')),
+                ('protocol', scanner.fields.ProtocolField(default='tcp', verbose_name='协议')),
+                ('change_type', models.CharField(choices=[('ADDED', '新增'), ('REMOVED', '消失'), ('CHANGED', '变化')], max_length=10, verbose_name='变化类型')),
+                ('old_state', scanner.fields.PortStateField(blank=True, null=True, verbose_name='原状态')),
+                ('new_state', scanner.fields.PortStateField(blank=True, null=True, verbose_name='新状态')),
+                ('old_service', models.CharField(blank=True, max_length=100, verbose_name='原服务')),
+                ('new_service', models.CharField(blank=True, max_length=100, verbose_name='新服务')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='记录时间')),
+            ],
+            options={
+                'verbose_name': '变化事件',
+                'verbose_name_plural': '变化事件',
+                'ordering': ['-created_at', '-id'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='scanresult',
+            index=models.Index(fields=['task', 'ip_address', 'port'], name='scanner_sca_task_id_134ebe_idx'),
+        ),
+        migrations.AddField(
+            model_name='changeevent',
+            name='task',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='change_events', to='scanner.scantask', verbose_name='触发任务'),
+        ),
+        migrations.AddIndex(
+            model_name='changeevent',
+            index=models.Index(fields=['ip_address', 'port'], name='scanner_cha_ip_addr_9670b5_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='changeevent',
+            index=models.Index(fields=['created_at'], name='scanner_cha_created_489627_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scanner', '0008_changeevent'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='scanhost',
+            name='carried_from',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='scanner.scanhost', verbose_name='沿用自'),
+        ),
+        migrations.AddField(
+            model_name='scantask',
+            name='baseline_task',
+            field=models.ForeignKey(blank=True, help_text='留空时自动选择相同目标最近一次完成的任务', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='scanner.scantask', verbose_name='基线任务'),
+        ),
+        migrations.AddField(
+            model_name='scantask',
+            name='incremental',
+            field=models.BooleanField(default=False, verbose_name='增量扫描'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:38
+
+import django.db.models.deletion
+import scanner.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scanner', '0009_incremental_scan'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScanExclusion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('network', models.CharField(help_text='IP地址、网段或 起始IP-结束IP，例如 10.0.0.0/8', max_length=100, verbose_name='排除范围')),
+                ('start_ip', scanner.fields.PackedIPAddressField(verbose_name='起始地址')),
+                ('end_ip', scanner.fields.PackedIPAddressField(verbose_name='结束地址')),
+                ('reason', models.CharField(blank=True, max_length=255, verbose_name='排除原因')),
+                ('enabled', models.BooleanField(default=True, verbose_name='启用')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='创建时间')),
+                ('task', models.ForeignKey(blank=True, help_text='留空表示全局排除', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='exclusions', to='scanner.scantask', verbose_name='所属任务')),
+            ],
+            options={
+                'verbose_name': '扫描排除项',
+                'verbose_name_plural': '扫描排除项',
+                'ordering': ['start_ip'],
+                'indexes': [models.Index(fields=['enabled', 'task'], name='scanner_sca_enabled_5db08a_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scanner', '0010_scanexclusion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='scanhost',
+            name='as_org',
+            field=models.CharField(blank=True, max_length=255, verbose_name='自治系统组织'),
+        ),
+        migrations.AddField(
+            model_name='scanhost',
+            name='asn',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='自治系统号'),
+        ),
+        migrations.AddField(
+            model_name='scanhost',
+            name='country',
+            field=models.CharField(blank=True, max_length=2, verbose_name='国家代码'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scanner', '0011_scanhost_enrichment'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='scantask',
+            name='scan_type',
+            field=models.CharField(choices=[('SYN_SCAN', 'SYN端口扫描'), ('UDP_SCAN', 'UDP端口扫描'), ('OS_DETECTION', '操作系统检测'), ('SERVICE_DETECTION', '服务版本检测'), ('FULL_SCAN', '全面扫描'), ('TRACEROUTE', '路由跟踪')], max_length=50, verbose_name='扫描类型'),
+        ),
+    ]
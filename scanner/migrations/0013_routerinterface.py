@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scanner', '0012_scantask_traceroute'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RouterInterface',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ip_address', models.GenericIPAddressField(verbose_name='接口地址')),
+                ('router', models.GenericIPAddressField(verbose_name='路由器标识')),
+                ('evidence', models.CharField(choices=[('ipid', 'IP-ID计数器一致'), ('source', '应答源地址相同')], max_length=10, verbose_name='判定依据')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='创建时间')),
+                ('task', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='router_interfaces', to='scanner.scantask', verbose_name='关联任务')),
+            ],
+            options={
+                'verbose_name': '路由器接口别名',
+                'verbose_name_plural': '路由器接口别名',
+                'ordering': ['task', 'router', 'ip_address'],
+                'indexes': [models.Index(fields=['task', 'router'], name='scanner_rou_task_id_049791_idx')],
+                'constraints': [models.UniqueConstraint(fields=('task', 'ip_address'), name='unique_routerinterface_task_ip')],
+            },
+        ),
+    ]
@@ -0,0 +1,67 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:10
+
+import django.db.models.deletion
+import scanner.fields
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scanner', '0013_routerinterface'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrafficCapture',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=200, verbose_name='名称')),
+                ('file_path', models.CharField(max_length=500, verbose_name='文件路径')),
+                ('status', models.CharField(choices=[('PENDING', '等待中'), ('RUNNING', '导入中'), ('COMPLETED', '已完成'), ('FAILED', '失败')], default='PENDING', max_length=20, verbose_name='状态')),
+                ('error_message', models.TextField(blank=True, verbose_name='错误信息')),
+                ('packets', models.BigIntegerField(default=0, verbose_name='报文数')),
+                ('bytes', models.BigIntegerField(default=0, verbose_name='字节数')),
+                ('skipped_packets', models.BigIntegerField(default=0, help_text='非IPv4或截断的报文', verbose_name='跳过的报文数')),
+                ('spoofed_packets', models.BigIntegerField(default=0, verbose_name='疑似伪造源地址报文数')),
+                ('flow_count', models.IntegerField(default=0, verbose_name='流数')),
+                ('first_packet_at', models.DateTimeField(blank=True, null=True, verbose_name='首个报文时间')),
+                ('last_packet_at', models.DateTimeField(blank=True, null=True, verbose_name='末个报文时间')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='创建时间')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='开始时间')),
+                ('completed_at', models.DateTimeField(blank=True, null=True, verbose_name='完成时间')),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='创建者')),
+            ],
+            options={
+                'verbose_name': '攻击流量抓包',
+                'verbose_name_plural': '攻击流量抓包',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='AttackFlow',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('src_ip', scanner.fields.PackedIPAddressField(verbose_name='源地址')),
+                ('dst_ip', scanner.fields.PackedIPAddressField(verbose_name='目的地址')),
+                ('dst_port', models.IntegerField(default=0, verbose_name='目的端口')),
+                ('protocol', scanner.fields.ProtocolField(verbose_name='协议')),
+                ('packets', models.BigIntegerField(verbose_name='报文数')),
+                ('bytes', models.BigIntegerField(verbose_name='字节数')),
+                ('first_seen', models.DateTimeField(verbose_name='首个报文时间')),
+                ('last_seen', models.DateTimeField(verbose_name='末个报文时间')),
+                ('ttl_min', models.PositiveSmallIntegerField(verbose_name='最小TTL')),
+                ('ttl_max', models.PositiveSmallIntegerField(verbose_name='最大TTL')),
+                ('spoofed_packets', models.BigIntegerField(default=0, verbose_name='疑似伪造源地址报文数')),
+                ('capture', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='flows', to='scanner.trafficcapture', verbose_name='所属抓包')),
+            ],
+            options={
+                'verbose_name': '攻击流',
+                'verbose_name_plural': '攻击流',
+                'ordering': ['capture', '-packets'],
+                'indexes': [models.Index(fields=['capture', 'src_ip'], name='scanner_att_capture_083bb3_idx'), models.Index(fields=['src_ip'], name='scanner_att_src_ip_3fc584_idx')],
+            },
+        ),
+    ]
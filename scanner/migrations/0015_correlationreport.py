@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:42
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scanner', '0014_trafficcapture'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CorrelationReport',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source_count', models.IntegerField(default=0, verbose_name='攻击源数')),
+                ('scanned_count', models.IntegerField(default=0, verbose_name='扫描过的攻击源数')),
+                ('exposed_count', models.IntegerField(default=0, verbose_name='有开放端口的攻击源数')),
+                ('candidates', models.JSONField(blank=True, default=list, help_text='按暴露程度和拓扑距离排序', verbose_name='候选攻击源')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='生成时间')),
+                ('capture', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reports', to='scanner.trafficcapture', verbose_name='所属抓包')),
+                ('topology_task', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='scanner.scantask', verbose_name='拓扑任务')),
+            ],
+            options={
+                'verbose_name': '攻击源关联报告',
+                'verbose_name_plural': '攻击源关联报告',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,71 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:20
+
+import django.db.models.deletion
+import scanner.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scanner', '0015_correlationreport'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VantagePoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True, verbose_name='名称')),
+                ('queue', models.CharField(blank=True, help_text='留空时为 vantage.<名称>', max_length=150, unique=True, verbose_name='任务队列')),
+                ('latitude', models.FloatField(verbose_name='纬度')),
+                ('longitude', models.FloatField(verbose_name='经度')),
+                ('description', models.TextField(blank=True, verbose_name='描述')),
+                ('is_active', models.BooleanField(default=True, verbose_name='启用')),
+                ('last_seen', models.DateTimeField(blank=True, null=True, verbose_name='最近活动时间')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='创建时间')),
+            ],
+            options={
+                'verbose_name': '探测点',
+                'verbose_name_plural': '探测点',
+                'ordering': ['name'],
+            },
+        ),
+        migrations.CreateModel(
+            name='GeoEstimate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ip_address', scanner.fields.PackedIPAddressField(verbose_name='目标地址')),
+                ('latitude', models.FloatField(verbose_name='纬度')),
+                ('longitude', models.FloatField(verbose_name='经度')),
+                ('radius_km', models.FloatField(verbose_name='误差半径(km)')),
+                ('vantage_count', models.PositiveSmallIntegerField(verbose_name='参与定位的探测点数')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='创建时间')),
+                ('task', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='geo_estimates', to='scanner.scantask', verbose_name='所属任务')),
+            ],
+            options={
+                'verbose_name': '地理位置估计',
+                'verbose_name_plural': '地理位置估计',
+                'ordering': ['task', 'ip_address'],
+                'constraints': [models.UniqueConstraint(fields=('task', 'ip_address'), name='unique_geoestimate_task_ip')],
+            },
+        ),
+        migrations.CreateModel(
+            name='RTTMeasurement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ip_address', scanner.fields.PackedIPAddressField(verbose_name='目标地址')),
+                ('rtt', models.FloatField(verbose_name='往返时间(ms)')),
+                ('samples', models.PositiveSmallIntegerField(default=1, verbose_name='有效样本数')),
+                ('measured_at', models.DateTimeField(auto_now_add=True, verbose_name='测量时间')),
+                ('task', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rtt_measurements', to='scanner.scantask', verbose_name='所属任务')),
+                ('vantage', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='measurements', to='scanner.vantagepoint', verbose_name='探测点')),
+            ],
+            options={
+                'verbose_name': 'RTT测量',
+                'verbose_name_plural': 'RTT测量',
+                'ordering': ['task', 'ip_address', 'vantage'],
+                'constraints': [models.UniqueConstraint(fields=('task', 'vantage', 'ip_address'), name='unique_rtt_task_vantage_ip')],
+            },
+        ),
+    ]
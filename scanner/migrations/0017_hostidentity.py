@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:05
+
+import django.db.models.deletion
+import scanner.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scanner', '0016_vantagepoint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HostIdentity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('digest', models.CharField(max_length=32, unique=True, verbose_name='特征哈希')),
+                ('mac_address', models.CharField(blank=True, max_length=17, verbose_name='MAC地址')),
+                ('ssh_hostkeys', models.JSONField(blank=True, default=list, verbose_name='SSH主机密钥指纹')),
+                ('tls_certificates', models.JSONField(blank=True, default=list, verbose_name='TLS证书指纹')),
+                ('port_signature', models.TextField(blank=True, help_text='开放端口，如 22/tcp,443/tcp', verbose_name='端口特征')),
+                ('first_seen', models.DateTimeField(verbose_name='首次发现时间')),
+                ('last_seen', models.DateTimeField(verbose_name='最近发现时间')),
+                ('last_task', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='scanner.scantask', verbose_name='最近扫描任务')),
+            ],
+            options={
+                'verbose_name': '设备身份',
+                'verbose_name_plural': '设备身份',
+                'ordering': ['-last_seen'],
+            },
+        ),
+        migrations.CreateModel(
+            name='IdentityAddress',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ip_address', scanner.fields.PackedIPAddressField(db_index=True, verbose_name='IP地址')),
+                ('first_seen', models.DateTimeField(verbose_name='首次发现时间')),
+                ('last_seen', models.DateTimeField(verbose_name='最近发现时间')),
+                ('identity', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='addresses', to='scanner.hostidentity', verbose_name='设备身份')),
+                ('last_task', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='scanner.scantask', verbose_name='最近扫描任务')),
+            ],
+            options={
+                'verbose_name': '设备地址',
+                'verbose_name_plural': '设备地址',
+                'ordering': ['identity', '-last_seen'],
+                'constraints': [models.UniqueConstraint(fields=('identity', 'ip_address'), name='unique_identity_ip')],
+            },
+        ),
+    ]
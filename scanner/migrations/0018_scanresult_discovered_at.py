@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:10
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scanner', '0017_hostidentity'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='scanresult',
+            name='discovered_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False, verbose_name='发现时间'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scanner', '0018_scanresult_discovered_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProbeRegion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('addresses', models.TextField(help_text='起始IP-结束IP，空格分隔', verbose_name='地址范围')),
+                ('ports', models.TextField(verbose_name='端口范围')),
+                ('status', models.CharField(choices=[('PENDING', '等待结果'), ('DELIVERED', '已送达'), ('PROBED', '已自行补扫')], default='PENDING', max_length=20, verbose_name='状态')),
+                ('result_count', models.IntegerField(default=0, verbose_name='结果数')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='创建时间')),
+                ('delivered_at', models.DateTimeField(blank=True, null=True, verbose_name='送达时间')),
+                ('source', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='subscribed_regions', to='scanner.scantask', verbose_name='结果来源任务')),
+                ('task', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='probe_regions', to='scanner.scantask', verbose_name='所属任务')),
+            ],
+            options={
+                'verbose_name': '合并探测区域',
+                'verbose_name_plural': '合并探测区域',
+                'ordering': ['task', 'id'],
+                'indexes': [models.Index(fields=['source', 'status'], name='scanner_pro_source__0df9f7_idx'), models.Index(fields=['task', 'status'], name='scanner_pro_task_id_081783_idx')],
+            },
+        ),
+    ]
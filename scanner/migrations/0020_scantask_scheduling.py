@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scanner', '0019_proberegion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='scantask',
+            name='dispatched_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='调度时间'),
+        ),
+        migrations.AddField(
+            model_name='scantask',
+            name='estimated_cost',
+            field=models.BigIntegerField(default=0, help_text='探测数加权', verbose_name='估计开销'),
+        ),
+        migrations.AddField(
+            model_name='scantask',
+            name='preemptions',
+            field=models.PositiveIntegerField(default=0, verbose_name='让出次数'),
+        ),
+        migrations.AddField(
+            model_name='scantask',
+            name='priority',
+            field=models.CharField(choices=[('INTERACTIVE', '交互'), ('NORMAL', '普通'), ('BULK', '批量')], default='NORMAL', max_length=20, verbose_name='优先级'),
+        ),
+        migrations.AddField(
+            model_name='scantask',
+            name='queued_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='排队时间'),
+        ),
+    ]
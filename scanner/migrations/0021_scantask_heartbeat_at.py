@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scanner', '0020_scantask_scheduling'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='scantask',
+            name='heartbeat_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='心跳时间'),
+        ),
+    ]
@@ -1,5 +1,8 @@
 from django.db import models
+from django.db.models import Q
+from django.utils import timezone
 import json
+from .fields import PackedIPAddressField, PortStateField, ProtocolField, cidr_bounds, int_to_ip
 
 class ScanTask(models.Model):
     """
@@ -12,6 +15,7 @@ class ScanTask(models.Model):
         ('OS_DETECTION', '操作系统检测'),
         ('SERVICE_DETECTION', '服务版本检测'),
         ('FULL_SCAN', '全面扫描'),
+        ('TRACEROUTE', '路由跟踪'),
     )
     
     STATUS_CHOICES = (
@@ -22,6 +26,12 @@ class ScanTask(models.Model):
         ('CANCELLED', '已取消'),
     )
     
+    PRIORITY_CHOICES = (
+        ('INTERACTIVE', '交互'),
+        ('NORMAL', '普通'),
+        ('BULK', '批量'),
+    )
+    
     # 任务基本信息
     name = models.CharField(max_length=200, verbose_name="任务名称")
     description = models.TextField(blank=True, verbose_name="任务描述")
@@ -33,6 +43,21 @@ class ScanTask(models.Model):
                            help_text="例如: 80,443,1-1000")
     options = models.JSONField(default=dict, blank=True, verbose_name="扫描选项")
     
+    # 增量扫描：只对新增或变化的主机做完整探测，其余主机沿用基线任务的结果
+    incremental = models.BooleanField(default=False, verbose_name="增量扫描")
+    baseline_task = models.ForeignKey('self', on_delete=models.SET_NULL, null=True, blank=True,
+                                      related_name='+', verbose_name="基线任务",
+                                      help_text="留空时自动选择相同目标最近一次完成的任务")
+    
+    # 调度：优先级类别和按 目标规模×端口数×扫描类型 估计的开销（见 scanner.scheduling）
+    priority = models.CharField(max_length=20, choices=PRIORITY_CHOICES, default='NORMAL', verbose_name="优先级")
+    estimated_cost = models.BigIntegerField(default=0, verbose_name="估计开销", help_text="探测数加权")
+    queued_at = models.DateTimeField(null=True, blank=True, verbose_name="排队时间")
+    dispatched_at = models.DateTimeField(null=True, blank=True, verbose_name="调度时间")
+    preemptions = models.PositiveIntegerField(default=0, verbose_name="让出次数")
+    # 运行中定期刷新，长时间没有刷新说明工作进程已退出，调度器回收其槽位
+    heartbeat_at = models.DateTimeField(null=True, blank=True, verbose_name="心跳时间")
+    
     # 任务状态
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='PENDING', verbose_name="状态")
     progress = models.IntegerField(default=0, verbose_name="进度百分比")
@@ -69,8 +94,175 @@ class ScanTask(models.Model):
         self.result_summary = {}
         self.save()
         
-        # 删除关联的扫描结果
+        # 删除关联的扫描结果和主机
         self.results.all().delete()
+        self.hosts.all().delete()
+        self.probe_regions.all().delete()
+
+    def effective_results(self):
+        """
+        任务的有效结果
+
+        增量任务除本任务写入的结果外，还包括沿用主机在原任务中的结果。
+        """
+        own = ScanResult.objects.for_task(self)
+        if not self.incremental:
+            return own
+        carried = self.hosts.filter(carried_from__isnull=False).values('carried_from')
+        return own | ScanResult.objects.filter(host__in=carried)
+
+class ScanExclusion(models.Model):
+    """
+    扫描排除项模型
+    不允许扫描的地址范围；未关联任务的为全局排除，关联任务的只对该任务生效
+    """
+    network = models.CharField(max_length=100, verbose_name="排除范围",
+                               help_text="IP地址、网段或 起始IP-结束IP，例如 10.0.0.0/8")
+    start_ip = PackedIPAddressField(editable=False, verbose_name="起始地址")
+    end_ip = PackedIPAddressField(editable=False, verbose_name="结束地址")
+    task = models.ForeignKey(ScanTask, on_delete=models.CASCADE, null=True, blank=True,
+                             related_name='exclusions', verbose_name="所属任务",
+                             help_text="留空表示全局排除")
+    reason = models.CharField(max_length=255, blank=True, verbose_name="排除原因")
+    enabled = models.BooleanField(default=True, verbose_name="启用")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="创建时间")
+    
+    class Meta:
+        verbose_name = "扫描排除项"
+        verbose_name_plural = "扫描排除项"
+        ordering = ['start_ip']
+        indexes = [
+            models.Index(fields=['enabled', 'task']),
+        ]
+    
+    def __str__(self):
+        return self.network
+    
+    def clean(self):
+        from django.core.exceptions import ValidationError
+        from .scanners.rangeset import address_range
+        try:
+            address_range(self.network.strip())
+        except ValueError as e:
+            raise ValidationError({'network': f'排除范围格式不正确: {e}'})
+    
+    def save(self, *args, **kwargs):
+        """保存时计算范围的首尾地址，用于编译排除区间"""
+        from .scanners.rangeset import address_range
+        self.network = self.network.strip()
+        first, last = address_range(self.network)
+        self.start_ip = int_to_ip(first)
+        self.end_ip = int_to_ip(last)
+        super().save(*args, **kwargs)
+
+
+class ScanHost(models.Model):
+    """
+    扫描主机模型
+    存储单个任务中每台主机的属性，端口级结果通过外键引用主机
+    """
+    task = models.ForeignKey(ScanTask, on_delete=models.CASCADE, related_name='hosts', verbose_name="所属任务")
+    ip_address = models.GenericIPAddressField(verbose_name="IP地址")
+    hostname = models.CharField(max_length=255, blank=True, verbose_name="主机名")
+    mac_address = models.CharField(max_length=17, blank=True, verbose_name="MAC地址")
+    vendor = models.CharField(max_length=255, blank=True, verbose_name="设备厂商")
+    os_family = models.CharField(max_length=100, blank=True, verbose_name="操作系统家族")
+    os_version = models.CharField(max_length=100, blank=True, verbose_name="操作系统版本")
+    
+    # 归属信息，扫描完成后由离线IP归属索引批量补全（见 scanner.enrichment）
+    asn = models.PositiveIntegerField(null=True, blank=True, verbose_name="自治系统号")
+    as_org = models.CharField(max_length=255, blank=True, verbose_name="自治系统组织")
+    country = models.CharField(max_length=2, blank=True, verbose_name="国家代码")
+    
+    # 增量扫描中未变化的主机不再写入结果，而是引用最初产生结果的主机记录
+    carried_from = models.ForeignKey('self', on_delete=models.SET_NULL, null=True, blank=True,
+                                     related_name='+', verbose_name="沿用自")
+    
+    class Meta:
+        verbose_name = "扫描主机"
+        verbose_name_plural = "扫描主机"
+        ordering = ['task', 'ip_address']
+        constraints = [
+            models.UniqueConstraint(fields=['task', 'ip_address'], name='unique_scanhost_task_ip'),
+        ]
+    
+    def __str__(self):
+        return f"{self.ip_address} ({self.hostname})" if self.hostname else self.ip_address
+
+
+class Fingerprint(models.Model):
+    """
+    服务指纹模型
+    按内容哈希去重存储产品/版本/附加信息组合，扫描结果只保存外键
+    """
+    digest = models.CharField(max_length=32, unique=True, verbose_name="内容哈希")
+    data = models.JSONField(default=dict, verbose_name="指纹内容")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="创建时间")
+    
+    class Meta:
+        verbose_name = "服务指纹"
+        verbose_name_plural = "服务指纹"
+    
+    def __str__(self):
+        return self.digest
+
+
+class EndpointQuerySet(models.QuerySet):
+    """按 (IP, 端口) 存储的模型通用的查询集"""
+
+    def in_cidr(self, cidr):
+        """
+        按网段过滤
+
+        IP以打包整数存储，网段对应一段连续取值，可直接走索引范围扫描。
+        """
+        first, last = cidr_bounds(cidr)
+        return self.filter(ip_address__range=(first, last))
+
+    def in_ports(self, spec):
+        """
+        按端口规格过滤，例如 "22,80,8000-8100"
+
+        Raises:
+            ValueError: 端口规格格式不正确
+        """
+        singles = []
+        condition = Q()
+        for part in spec.split(','):
+            part = part.strip()
+            if not part:
+                continue
+            if '-' in part:
+                start, end = (int(value) for value in part.split('-', 1))
+                if start > end:
+                    raise ValueError(f"端口范围起点大于终点: {part}")
+                condition |= Q(port__range=(start, end))
+            else:
+                singles.append(int(part))
+        if singles:
+            condition |= Q(port__in=singles)
+        if not condition:
+            raise ValueError("端口规格为空")
+        return self.filter(condition)
+
+
+class ScanResultQuerySet(EndpointQuerySet):
+    """扫描结果查询集"""
+
+    def for_task(self, task):
+        """
+        限定到单个任务的结果
+
+        除 task_id 外还附带 discovered_at 的时间范围，PostgreSQL分区表上
+        查询只会落到任务运行期间对应的月度分区。
+        """
+        queryset = self.filter(task=task)
+        if task.created_at:
+            queryset = queryset.filter(discovered_at__gte=task.created_at)
+        if task.completed_at:
+            queryset = queryset.filter(discovered_at__lte=task.completed_at)
+        return queryset
+
 
 class ScanResult(models.Model):
     """
@@ -80,16 +272,15 @@ class ScanResult(models.Model):
     # 关联任务
     task = models.ForeignKey(ScanTask, on_delete=models.CASCADE, related_name='results', verbose_name="所属任务")
     
-    # 主机信息
-    ip_address = models.GenericIPAddressField(verbose_name="IP地址")
-    hostname = models.CharField(max_length=255, blank=True, verbose_name="主机名")
-    mac_address = models.CharField(max_length=17, blank=True, verbose_name="MAC地址")
-    vendor = models.CharField(max_length=255, blank=True, verbose_name="设备厂商")
+    # 主机信息（主机属性保存在ScanHost中，这里只保留地址用于索引和排序）
+    host = models.ForeignKey(ScanHost, on_delete=models.CASCADE, related_name='results',
+                             null=True, blank=True, verbose_name="所属主机")
+    ip_address = PackedIPAddressField(verbose_name="IP地址")
     
     # 端口信息
     port = models.IntegerField(null=True, blank=True, verbose_name="端口号")
-    protocol = models.CharField(max_length=10, default='tcp', verbose_name="协议")
-    state = models.CharField(max_length=20, verbose_name="状态")  # open, closed, filtered, unfiltered
+    protocol = ProtocolField(default='tcp', verbose_name="协议")
+    state = PortStateField(verbose_name="状态")  # open, closed, filtered, unfiltered
     service = models.CharField(max_length=100, blank=True, verbose_name="服务名称")
     service_version = models.CharField(max_length=255, blank=True, verbose_name="服务版本")
     
@@ -97,29 +288,110 @@ class ScanResult(models.Model):
     ttl = models.IntegerField(null=True, blank=True, verbose_name="TTL值")
     rtt = models.FloatField(null=True, blank=True, verbose_name="往返时间(ms)")
     
-    # 指纹信息
-    os_family = models.CharField(max_length=100, blank=True, verbose_name="操作系统家族")
-    os_version = models.CharField(max_length=100, blank=True, verbose_name="操作系统版本")
-    fingerprint = models.JSONField(default=dict, verbose_name="设备指纹")
+    # 指纹信息（按内容去重，见 scanner.fingerprints）
+    fingerprint = models.ForeignKey(Fingerprint, on_delete=models.PROTECT, related_name='results',
+                                    null=True, blank=True, verbose_name="设备指纹")
     
-    # 时间戳
-    discovered_at = models.DateTimeField(auto_now_add=True, verbose_name="发现时间")
+    # 时间戳（导入历史扫描结果时使用原始发现时间）
+    discovered_at = models.DateTimeField(default=timezone.now, editable=False, verbose_name="发现时间")
+    
+    objects = ScanResultQuerySet.as_manager()
     
     class Meta:
         verbose_name = "扫描结果"
         verbose_name_plural = "扫描结果"
         ordering = ['task', 'ip_address', 'port']
         indexes = [
-            models.Index(fields=['ip_address']),
+            models.Index(fields=['ip_address', 'port']),
             models.Index(fields=['task', 'state']),
+            models.Index(fields=['port']),
+            models.Index(fields=['task', 'ip_address', 'port']),
         ]
     
+    def save(self, *args, **kwargs):
+        """单条保存时自动关联所属主机，批量写入请使用 scanner.ingest"""
+        if self.host_id is None and self.task_id and self.ip_address:
+            self.host, _ = ScanHost.objects.get_or_create(task_id=self.task_id, ip_address=self.ip_address)
+        super().save(*args, **kwargs)
+    
     def __str__(self):
         if self.port:
             return f"{self.ip_address}:{self.port} ({self.state})"
         return f"{self.ip_address} ({self.state})"
 
 
+class ExposureSnapshot(models.Model):
+    """
+    当前暴露面模型
+    按 (IP, 端口, 协议) 保存最近一次观测到的状态，任务完成时批量更新
+    """
+    ip_address = PackedIPAddressField(verbose_name="IP地址")
+    port = models.IntegerField(verbose_name="端口号")
+    protocol = ProtocolField(default='tcp', verbose_name="协议")
+    state = PortStateField(verbose_name="状态")
+    service = models.CharField(max_length=100, blank=True, verbose_name="服务名称")
+    service_version = models.CharField(max_length=255, blank=True, verbose_name="服务版本")
+    
+    first_seen = models.DateTimeField(verbose_name="首次发现时间")
+    last_seen = models.DateTimeField(verbose_name="最近发现时间")
+    last_task = models.ForeignKey(ScanTask, on_delete=models.SET_NULL, null=True, blank=True,
+                                  related_name='+', verbose_name="最近扫描任务")
+    
+    objects = EndpointQuerySet.as_manager()
+    
+    class Meta:
+        verbose_name = "当前暴露面"
+        verbose_name_plural = "当前暴露面"
+        ordering = ['ip_address', 'port']
+        constraints = [
+            models.UniqueConstraint(fields=['ip_address', 'port', 'protocol'], name='unique_exposure_endpoint'),
+        ]
+        indexes = [
+            models.Index(fields=['state', 'ip_address']),
+        ]
+    
+    def __str__(self):
+        return f"{self.ip_address}:{self.port}/{self.protocol} ({self.state})"
+
+
+class ChangeEvent(models.Model):
+    """
+    端口变化事件模型
+    合并当前暴露面时追加写入，只增不改，历史变化查询不再回扫原始结果
+    """
+    CHANGE_TYPE_CHOICES = (
+        ('ADDED', '新增'),
+        ('REMOVED', '消失'),
+        ('CHANGED', '变化'),
+    )
+    
+    task = models.ForeignKey(ScanTask, on_delete=models.SET_NULL, null=True, blank=True,
+                             related_name='change_events', verbose_name="触发任务")
+    ip_address = PackedIPAddressField(verbose_name="IP地址")
+    port = models.IntegerField(verbose_name="端口号")
+    protocol = ProtocolField(default='tcp', verbose_name="协议")
+    change_type = models.CharField(max_length=10, choices=CHANGE_TYPE_CHOICES, verbose_name="变化类型")
+    old_state = PortStateField(null=True, blank=True, verbose_name="原状态")
+    new_state = PortStateField(null=True, blank=True, verbose_name="新状态")
+    old_service = models.CharField(max_length=100, blank=True, verbose_name="原服务")
+    new_service = models.CharField(max_length=100, blank=True, verbose_name="新服务")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="记录时间")
+    
+    objects = EndpointQuerySet.as_manager()
+    
+    class Meta:
+        verbose_name = "变化事件"
+        verbose_name_plural = "变化事件"
+        ordering = ['-created_at', '-id']
+        indexes = [
+            models.Index(fields=['ip_address', 'port']),
+            models.Index(fields=['created_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.get_change_type_display()} {self.ip_address}:{self.port}/{self.protocol}"
+
+
 class NetworkTopology(models.Model):
     """
     网络拓扑模型
@@ -135,4 +407,301 @@ class NetworkTopology(models.Model):
     
     class Meta:
         verbose_name = "网络拓扑"
-        verbose_name_plural = "网络拓扑"
\ No newline at end of file
+        verbose_name_plural = "网络拓扑"
+
+class RouterInterface(models.Model):
+    """
+    路由器接口别名
+    路由跟踪记录的是路由器接口，别名解析（见 scanner.topology.aliases）判定属于同一台路由器的接口
+    以组内最小的接口地址作为路由器标识，拓扑图中合并为一个节点
+    """
+    EVIDENCE_CHOICES = (
+        ('ipid', 'IP-ID计数器一致'),
+        ('source', '应答源地址相同'),
+    )
+    
+    task = models.ForeignKey(ScanTask, on_delete=models.CASCADE, related_name='router_interfaces',
+                             verbose_name="关联任务")
+    ip_address = models.GenericIPAddressField(verbose_name="接口地址")
+    router = models.GenericIPAddressField(verbose_name="路由器标识")
+    evidence = models.CharField(max_length=10, choices=EVIDENCE_CHOICES, verbose_name="判定依据")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="创建时间")
+    
+    class Meta:
+        verbose_name = "路由器接口别名"
+        verbose_name_plural = "路由器接口别名"
+        ordering = ['task', 'router', 'ip_address']
+        constraints = [
+            models.UniqueConstraint(fields=['task', 'ip_address'], name='unique_routerinterface_task_ip'),
+        ]
+        indexes = [
+            models.Index(fields=['task', 'router']),
+        ]
+    
+    def __str__(self):
+        return f"{self.ip_address} -> {self.router}"
+
+
+class TrafficCapture(models.Model):
+    """
+    攻击流量抓包文件
+    抓包文件按流汇总后只保存汇总结果（AttackFlow），原始报文不入库
+    """
+    STATUS_CHOICES = (
+        ('PENDING', '等待中'),
+        ('RUNNING', '导入中'),
+        ('COMPLETED', '已完成'),
+        ('FAILED', '失败'),
+    )
+    
+    name = models.CharField(max_length=200, verbose_name="名称")
+    file_path = models.CharField(max_length=500, verbose_name="文件路径")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='PENDING', verbose_name="状态")
+    error_message = models.TextField(blank=True, verbose_name="错误信息")
+    
+    # 导入统计
+    packets = models.BigIntegerField(default=0, verbose_name="报文数")
+    bytes = models.BigIntegerField(default=0, verbose_name="字节数")
+    skipped_packets = models.BigIntegerField(default=0, verbose_name="跳过的报文数",
+                                             help_text="非IPv4或截断的报文")
+    spoofed_packets = models.BigIntegerField(default=0, verbose_name="疑似伪造源地址报文数")
+    flow_count = models.IntegerField(default=0, verbose_name="流数")
+    first_packet_at = models.DateTimeField(null=True, blank=True, verbose_name="首个报文时间")
+    last_packet_at = models.DateTimeField(null=True, blank=True, verbose_name="末个报文时间")
+    
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="创建时间")
+    started_at = models.DateTimeField(null=True, blank=True, verbose_name="开始时间")
+    completed_at = models.DateTimeField(null=True, blank=True, verbose_name="完成时间")
+    created_by = models.ForeignKey('auth.User', on_delete=models.CASCADE, null=True, blank=True,
+                                   verbose_name="创建者")
+    
+    class Meta:
+        verbose_name = "攻击流量抓包"
+        verbose_name_plural = "攻击流量抓包"
+        ordering = ['-created_at']
+    
+    def __str__(self):
+        return f"{self.name} ({self.get_status_display()})"
+
+
+class AttackFlow(models.Model):
+    """
+    攻击流汇总
+    按 (源地址, 目的地址, 目的端口, 协议) 汇总抓包中的IPv4报文；没有端口的协议目的端口记为0
+    """
+    capture = models.ForeignKey(TrafficCapture, on_delete=models.CASCADE, related_name='flows',
+                                verbose_name="所属抓包")
+    src_ip = PackedIPAddressField(verbose_name="源地址")
+    dst_ip = PackedIPAddressField(verbose_name="目的地址")
+    dst_port = models.IntegerField(default=0, verbose_name="目的端口")
+    # 取值为IANA协议号，ProtocolField未定义名称的协议（如GRE）以数字形式读出
+    protocol = ProtocolField(verbose_name="协议")
+    
+    packets = models.BigIntegerField(verbose_name="报文数")
+    bytes = models.BigIntegerField(verbose_name="字节数")
+    first_seen = models.DateTimeField(verbose_name="首个报文时间")
+    last_seen = models.DateTimeField(verbose_name="末个报文时间")
+    ttl_min = models.PositiveSmallIntegerField(verbose_name="最小TTL")
+    ttl_max = models.PositiveSmallIntegerField(verbose_name="最大TTL")
+    spoofed_packets = models.BigIntegerField(default=0, verbose_name="疑似伪造源地址报文数")
+    
+    class Meta:
+        verbose_name = "攻击流"
+        verbose_name_plural = "攻击流"
+        ordering = ['capture', '-packets']
+        indexes = [
+            models.Index(fields=['capture', 'src_ip']),
+            models.Index(fields=['src_ip']),
+        ]
+    
+    def __str__(self):
+        return f"{self.src_ip} -> {self.dst_ip}:{self.dst_port}"
+
+
+class CorrelationReport(models.Model):
+    """
+    攻击源关联报告
+    抓包中的攻击源与当前暴露面、路由跟踪拓扑的关联结果（见 scanner.tracing.correlation）
+    """
+    capture = models.ForeignKey(TrafficCapture, on_delete=models.CASCADE, related_name='reports',
+                                verbose_name="所属抓包")
+    topology_task = models.ForeignKey(ScanTask, on_delete=models.SET_NULL, null=True, blank=True,
+                                      related_name='+', verbose_name="拓扑任务")
+    
+    source_count = models.IntegerField(default=0, verbose_name="攻击源数")
+    scanned_count = models.IntegerField(default=0, verbose_name="扫描过的攻击源数")
+    exposed_count = models.IntegerField(default=0, verbose_name="有开放端口的攻击源数")
+    candidates = models.JSONField(default=list, blank=True, verbose_name="候选攻击源",
+                                  help_text="按暴露程度和拓扑距离排序")
+    
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="生成时间")
+    
+    class Meta:
+        verbose_name = "攻击源关联报告"
+        verbose_name_plural = "攻击源关联报告"
+        ordering = ['-created_at']
+    
+    def __str__(self):
+        return f"{self.capture.name}: {self.scanned_count}/{self.source_count}"
+
+
+class VantagePoint(models.Model):
+    """
+    探测点
+    部署在不同网络位置的扫描代理，每个探测点消费自己专用的Celery队列，
+    同一组探测可以分发到多个探测点执行，各点测得的RTT用于目标地理定位
+    """
+    name = models.CharField(max_length=100, unique=True, verbose_name="名称")
+    queue = models.CharField(max_length=150, unique=True, blank=True, verbose_name="任务队列",
+                             help_text="留空时为 vantage.<名称>")
+    latitude = models.FloatField(verbose_name="纬度")
+    longitude = models.FloatField(verbose_name="经度")
+    description = models.TextField(blank=True, verbose_name="描述")
+    is_active = models.BooleanField(default=True, verbose_name="启用")
+    last_seen = models.DateTimeField(null=True, blank=True, verbose_name="最近活动时间")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="创建时间")
+    
+    class Meta:
+        verbose_name = "探测点"
+        verbose_name_plural = "探测点"
+        ordering = ['name']
+    
+    def save(self, *args, **kwargs):
+        if not self.queue:
+            self.queue = f"vantage.{self.name}"
+        super().save(*args, **kwargs)
+    
+    def __str__(self):
+        return self.name
+
+
+class RTTMeasurement(models.Model):
+    """探测点到目标的最小往返时间"""
+    task = models.ForeignKey(ScanTask, on_delete=models.CASCADE, related_name='rtt_measurements',
+                             verbose_name="所属任务")
+    vantage = models.ForeignKey(VantagePoint, on_delete=models.CASCADE, related_name='measurements',
+                                verbose_name="探测点")
+    ip_address = PackedIPAddressField(verbose_name="目标地址")
+    rtt = models.FloatField(verbose_name="往返时间(ms)")
+    samples = models.PositiveSmallIntegerField(default=1, verbose_name="有效样本数")
+    measured_at = models.DateTimeField(auto_now_add=True, verbose_name="测量时间")
+    
+    class Meta:
+        verbose_name = "RTT测量"
+        verbose_name_plural = "RTT测量"
+        ordering = ['task', 'ip_address', 'vantage']
+        constraints = [
+            models.UniqueConstraint(fields=['task', 'vantage', 'ip_address'], name='unique_rtt_task_vantage_ip'),
+        ]
+    
+    def __str__(self):
+        return f"{self.vantage} -> {self.ip_address}: {self.rtt}ms"
+
+
+class GeoEstimate(models.Model):
+    """
+    目标地理位置估计
+    多个探测点的RTT约束求交得到的可行区域中心，半径为可行区域到中心的最大距离
+    """
+    task = models.ForeignKey(ScanTask, on_delete=models.CASCADE, related_name='geo_estimates',
+                             verbose_name="所属任务")
+    ip_address = PackedIPAddressField(verbose_name="目标地址")
+    latitude = models.FloatField(verbose_name="纬度")
+    longitude = models.FloatField(verbose_name="经度")
+    radius_km = models.FloatField(verbose_name="误差半径(km)")
+    vantage_count = models.PositiveSmallIntegerField(verbose_name="参与定位的探测点数")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="创建时间")
+    
+    class Meta:
+        verbose_name = "地理位置估计"
+        verbose_name_plural = "地理位置估计"
+        ordering = ['task', 'ip_address']
+        constraints = [
+            models.UniqueConstraint(fields=['task', 'ip_address'], name='unique_geoestimate_task_ip'),
+        ]
+    
+    def __str__(self):
+        return f"{self.ip_address}: ({self.latitude:.2f}, {self.longitude:.2f}) ±{self.radius_km:.0f}km"
+
+
+class HostIdentity(models.Model):
+    """
+    设备身份
+    按MAC地址、SSH主机密钥指纹、TLS证书指纹和开放端口特征的组合哈希识别同一台设备，
+    设备在不同任务中更换地址（DHCP、NAT）时仍归到同一身份下
+    """
+    digest = models.CharField(max_length=32, unique=True, verbose_name="特征哈希")
+    mac_address = models.CharField(max_length=17, blank=True, verbose_name="MAC地址")
+    ssh_hostkeys = models.JSONField(default=list, blank=True, verbose_name="SSH主机密钥指纹")
+    tls_certificates = models.JSONField(default=list, blank=True, verbose_name="TLS证书指纹")
+    port_signature = models.TextField(blank=True, verbose_name="端口特征", help_text="开放端口，如 22/tcp,443/tcp")
+    first_seen = models.DateTimeField(verbose_name="首次发现时间")
+    last_seen = models.DateTimeField(verbose_name="最近发现时间")
+    last_task = models.ForeignKey(ScanTask, on_delete=models.SET_NULL, null=True, blank=True,
+                                  related_name='+', verbose_name="最近扫描任务")
+    
+    class Meta:
+        verbose_name = "设备身份"
+        verbose_name_plural = "设备身份"
+        ordering = ['-last_seen']
+    
+    def __str__(self):
+        return self.mac_address or self.digest
+
+
+class IdentityAddress(models.Model):
+    """设备身份使用过的地址，(身份, 地址) 唯一索引即“设备用过的全部地址”的查询索引"""
+    identity = models.ForeignKey(HostIdentity, on_delete=models.CASCADE, related_name='addresses',
+                                 verbose_name="设备身份")
+    ip_address = PackedIPAddressField(db_index=True, verbose_name="IP地址")
+    first_seen = models.DateTimeField(verbose_name="首次发现时间")
+    last_seen = models.DateTimeField(verbose_name="最近发现时间")
+    last_task = models.ForeignKey(ScanTask, on_delete=models.SET_NULL, null=True, blank=True,
+                                  related_name='+', verbose_name="最近扫描任务")
+    
+    class Meta:
+        verbose_name = "设备地址"
+        verbose_name_plural = "设备地址"
+        ordering = ['identity', '-last_seen']
+        constraints = [
+            models.UniqueConstraint(fields=['identity', 'ip_address'], name='unique_identity_ip'),
+        ]
+    
+    def __str__(self):
+        return f"{self.identity}: {self.ip_address}"
+
+
+class ProbeRegion(models.Model):
+    """
+    合并探测区域
+    任务目标中一块 地址×端口 区域的结果来源：来源是任务自身时由本任务探测，
+    否则订阅同时期重叠任务的结果（见 scanner.coalescing）
+    """
+    STATUS_CHOICES = (
+        ('PENDING', '等待结果'),
+        ('DELIVERED', '已送达'),
+        ('PROBED', '已自行补扫'),
+    )
+    
+    task = models.ForeignKey(ScanTask, on_delete=models.CASCADE, related_name='probe_regions',
+                             verbose_name="所属任务")
+    source = models.ForeignKey(ScanTask, on_delete=models.SET_NULL, null=True, blank=True,
+                               related_name='subscribed_regions', verbose_name="结果来源任务")
+    addresses = models.TextField(verbose_name="地址范围", help_text="起始IP-结束IP，空格分隔")
+    ports = models.TextField(verbose_name="端口范围")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='PENDING', verbose_name="状态")
+    result_count = models.IntegerField(default=0, verbose_name="结果数")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="创建时间")
+    delivered_at = models.DateTimeField(null=True, blank=True, verbose_name="送达时间")
+    
+    class Meta:
+        verbose_name = "合并探测区域"
+        verbose_name_plural = "合并探测区域"
+        ordering = ['task', 'id']
+        indexes = [
+            models.Index(fields=['source', 'status']),
+            models.Index(fields=['task', 'status']),
+        ]
+    
+    def __str__(self):
+        return f"{self.task_id} ← {self.source_id}: {self.addresses} / {self.ports}"
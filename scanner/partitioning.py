@@ -0,0 +1,302 @@
+"""
+扫描结果分区管理
+在PostgreSQL上将 scanner_scanresult 按 discovered_at 月份做原生范围分区，
+其他数据库（如开发环境的SQLite）上所有操作均为空操作。
+"""
+import logging
+import re
+from datetime import datetime, timezone as dt_timezone
+from typing import List, Optional, Tuple
+
+from django.db import connection, transaction
+
+logger = logging.getLogger(__name__)
+
+RESULT_TABLE = 'scanner_scanresult'
+DEFAULT_PARTITION = f'{RESULT_TABLE}_default'
+PARTITION_NAME_RE = re.compile(rf'^{RESULT_TABLE}_p(\d{{4}})(\d{{2}})$')
+
+
+def partitioning_supported(conn=None) -> bool:
+    """当前数据库是否支持原生分区"""
+    conn = conn or connection
+    return conn.vendor == 'postgresql'
+
+
+def month_start(value: datetime) -> datetime:
+    """返回所在月份第一天零点（UTC）"""
+    return datetime(value.year, value.month, 1, tzinfo=dt_timezone.utc)
+
+
+def add_months(value: datetime, months: int) -> datetime:
+    """按月偏移，结果始终落在月初"""
+    index = value.year * 12 + (value.month - 1) + months
+    return datetime(index // 12, index % 12 + 1, 1, tzinfo=dt_timezone.utc)
+
+
+def partition_name(month: datetime) -> str:
+    """月份对应的分区表名，例如 scanner_scanresult_p202510"""
+    return f'{RESULT_TABLE}_p{month.year:04d}{month.month:02d}'
+
+
+def partition_bounds(name: str) -> Optional[Tuple[datetime, datetime]]:
+    """从分区表名解析 [起始, 结束) 时间范围，非月度分区返回None"""
+    match = PARTITION_NAME_RE.match(name)
+    if not match:
+        return None
+    start = datetime(int(match.group(1)), int(match.group(2)), 1, tzinfo=dt_timezone.utc)
+    return start, add_months(start, 1)
+
+
+def is_partitioned(conn=None) -> bool:
+    """结果表是否已经转换为分区表"""
+    conn = conn or connection
+    if not partitioning_supported(conn):
+        return False
+    with conn.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_partitioned_table pt "
+            "JOIN pg_class c ON c.oid = pt.partrelid "
+            "WHERE c.relname = %s AND pg_table_is_visible(c.oid)",
+            [RESULT_TABLE],
+        )
+        return cursor.fetchone() is not None
+
+
+def list_partitions(conn=None) -> List[str]:
+    """列出结果表当前挂载的所有月度分区（按时间升序）"""
+    conn = conn or connection
+    if not is_partitioned(conn):
+        return []
+    with conn.cursor() as cursor:
+        cursor.execute(
+            "SELECT child.relname FROM pg_inherits i "
+            "JOIN pg_class parent ON parent.oid = i.inhparent "
+            "JOIN pg_class child ON child.oid = i.inhrelid "
+            "WHERE parent.relname = %s",
+            [RESULT_TABLE],
+        )
+        names = [row[0] for row in cursor.fetchall()]
+    return sorted(name for name in names if PARTITION_NAME_RE.match(name))
+
+
+def create_partition(month: datetime, conn=None) -> bool:
+    """
+    创建指定月份的分区，已存在时跳过
+
+    如果默认分区中已有落在该月的数据，会先将其迁入新分区，
+    否则PostgreSQL会拒绝创建。
+
+    Returns:
+        是否新建了分区
+    """
+    conn = conn or connection
+    start = month_start(month)
+    end = add_months(start, 1)
+    name = partition_name(start)
+    if name in list_partitions(conn):
+        return False
+
+    qn = conn.ops.quote_name
+    with transaction.atomic(using=conn.alias), conn.cursor() as cursor:
+        cursor.execute(
+            f"SELECT EXISTS (SELECT 1 FROM {qn(DEFAULT_PARTITION)} "
+            f"WHERE discovered_at >= %s AND discovered_at < %s)",
+            [start, end],
+        )
+        has_stray_rows = cursor.fetchone()[0]
+        if has_stray_rows:
+            cursor.execute(f"ALTER TABLE {qn(RESULT_TABLE)} DETACH PARTITION {qn(DEFAULT_PARTITION)}")
+        cursor.execute(
+            f"CREATE TABLE {qn(name)} PARTITION OF {qn(RESULT_TABLE)} "
+            f"FOR VALUES FROM (%s) TO (%s)",
+            [start, end],
+        )
+        if has_stray_rows:
+            cursor.execute(
+                f"INSERT INTO {qn(name)} SELECT * FROM {qn(DEFAULT_PARTITION)} "
+                f"WHERE discovered_at >= %s AND discovered_at < %s",
+                [start, end],
+            )
+            cursor.execute(
+                f"DELETE FROM {qn(DEFAULT_PARTITION)} WHERE discovered_at >= %s AND discovered_at < %s",
+                [start, end],
+            )
+            cursor.execute(f"ALTER TABLE {qn(RESULT_TABLE)} ATTACH PARTITION {qn(DEFAULT_PARTITION)} DEFAULT")
+
+    logger.info(f"已创建扫描结果分区: {name}")
+    return True
+
+
+def ensure_partitions(months_ahead: int = 3, now: Optional[datetime] = None, conn=None) -> List[str]:
+    """确保当前月份及未来 months_ahead 个月的分区都已存在，返回新建的分区名"""
+    conn = conn or connection
+    if not is_partitioned(conn):
+        return []
+    current = month_start(now or datetime.now(dt_timezone.utc))
+    created = []
+    for offset in range(months_ahead + 1):
+        month = add_months(current, offset)
+        if create_partition(month, conn):
+            created.append(partition_name(month))
+    return created
+
+
+def expired_partitions(cutoff: datetime, conn=None) -> List[str]:
+    """结束时间不晚于 cutoff 的分区，其中的数据全部早于 cutoff"""
+    return [
+        name for name in list_partitions(conn)
+        if partition_bounds(name)[1] <= cutoff
+    ]
+
+
+def drop_partitions_before(cutoff: datetime, conn=None) -> List[str]:
+    """
+    删除整体早于 cutoff 的分区
+
+    保留策略因此变成元数据操作，不再需要逐行DELETE。
+    """
+    conn = conn or connection
+    qn = conn.ops.quote_name
+    dropped = []
+    for name in expired_partitions(cutoff, conn):
+        with transaction.atomic(using=conn.alias), conn.cursor() as cursor:
+            cursor.execute(f"ALTER TABLE {qn(RESULT_TABLE)} DETACH PARTITION {qn(name)}")
+            cursor.execute(f"DROP TABLE {qn(name)}")
+        dropped.append(name)
+        logger.info(f"已删除过期扫描结果分区: {name}")
+    return dropped
+
+
+def _id_sequence(cursor, table: str) -> Tuple[Optional[str], bool]:
+    """
+    表的 id 列使用的序列及该列是否为标识列
+
+    Returns:
+        (带模式限定的序列名，没有时为None, 是否为标识列)
+    """
+    cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", [table])
+    sequence = cursor.fetchone()[0]
+    cursor.execute(
+        "SELECT attidentity FROM pg_attribute WHERE attrelid = %s::regclass AND attname = 'id'",
+        [table],
+    )
+    return sequence, cursor.fetchone()[0] != ''
+
+
+def convert_to_partitioned(schema_editor, months_ahead: int = 3):
+    """
+    将现有的普通结果表就地转换为按月分区表（仅PostgreSQL）
+
+    分区表的主键必须包含分区键，因此数据库主键变为 (id, discovered_at)；
+    id 仍由序列生成并保持唯一，Django侧的模型定义不受影响。
+    PostgreSQL 17之前分区表不支持标识列，id 改为以序列为默认值。
+    """
+    conn = schema_editor.connection
+    if not partitioning_supported(conn) or is_partitioned(conn):
+        return
+
+    qn = conn.ops.quote_name
+    legacy = f'{RESULT_TABLE}_legacy'
+
+    with conn.cursor() as cursor:
+        # 记录原有的普通索引和外键定义，稍后在分区表上重建
+        cursor.execute(
+            "SELECT indexdef FROM pg_indexes WHERE tablename = %s "
+            "AND indexname NOT IN (SELECT conname FROM pg_constraint)",
+            [RESULT_TABLE],
+        )
+        index_defs = [row[0] for row in cursor.fetchall()]
+        cursor.execute(
+            "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+            "WHERE conrelid = %s::regclass AND contype = 'f'",
+            [RESULT_TABLE],
+        )
+        foreign_keys = cursor.fetchall()
+        cursor.execute(
+            f"SELECT MIN(discovered_at), MAX(id) FROM {qn(RESULT_TABLE)}"
+        )
+        oldest, max_id = cursor.fetchone()
+        sequence, identity = _id_sequence(cursor, RESULT_TABLE)
+
+        # 改名后序列仍沿用原名：标识列的序列随标识一起删除，腾出名字给新序列；
+        # serial 列的序列转移给新表继续使用
+        cursor.execute(f"ALTER TABLE {qn(RESULT_TABLE)} RENAME TO {qn(legacy)}")
+        if identity:
+            cursor.execute(f"ALTER TABLE {qn(legacy)} ALTER COLUMN id DROP IDENTITY")
+            sequence = None
+        cursor.execute(
+            f"CREATE TABLE {qn(RESULT_TABLE)} (LIKE {qn(legacy)} INCLUDING DEFAULTS) "
+            f"PARTITION BY RANGE (discovered_at)"
+        )
+        if sequence:
+            cursor.execute(f"ALTER SEQUENCE {sequence} OWNED BY {qn(RESULT_TABLE)}.id")
+        else:
+            sequence = qn(f'{RESULT_TABLE}_id_seq')
+            cursor.execute(f"CREATE SEQUENCE {sequence} OWNED BY {qn(RESULT_TABLE)}.id")
+        cursor.execute(
+            f"ALTER TABLE {qn(RESULT_TABLE)} ALTER COLUMN id SET DEFAULT nextval(%s)",
+            [sequence],
+        )
+        cursor.execute("SELECT setval(%s, %s, false)", [sequence, (max_id or 0) + 1])
+        cursor.execute(f"ALTER TABLE {qn(RESULT_TABLE)} ADD PRIMARY KEY (id, discovered_at)")
+        cursor.execute(f"CREATE TABLE {qn(DEFAULT_PARTITION)} PARTITION OF {qn(RESULT_TABLE)} DEFAULT")
+
+    # 为历史数据和未来几个月预建分区，再整体搬迁数据
+    now = datetime.now(dt_timezone.utc)
+    month = month_start(oldest or now)
+    while month <= add_months(month_start(now), months_ahead):
+        create_partition(month, conn)
+        month = add_months(month, 1)
+
+    with conn.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {qn(RESULT_TABLE)} SELECT * FROM {qn(legacy)}")
+        cursor.execute(f"DROP TABLE {qn(legacy)}")
+        for index_def in index_defs:
+            cursor.execute(index_def)
+        for name, definition in foreign_keys:
+            cursor.execute(f"ALTER TABLE {qn(RESULT_TABLE)} ADD CONSTRAINT {qn(name)} {definition}")
+
+
+def revert_to_plain(schema_editor):
+    """将分区表还原为普通表（迁移回滚用），id 恢复为 0001 迁移创建的标识列"""
+    conn = schema_editor.connection
+    if not is_partitioned(conn):
+        return
+
+    qn = conn.ops.quote_name
+    partitioned = f'{RESULT_TABLE}_partitioned'
+    with conn.cursor() as cursor:
+        cursor.execute(
+            "SELECT indexdef FROM pg_indexes WHERE tablename = %s "
+            "AND indexname NOT IN (SELECT conname FROM pg_constraint)",
+            [RESULT_TABLE],
+        )
+        index_defs = [row[0] for row in cursor.fetchall()]
+        cursor.execute(
+            "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+            "WHERE conrelid = %s::regclass AND contype = 'f'",
+            [RESULT_TABLE],
+        )
+        foreign_keys = cursor.fetchall()
+        cursor.execute(f"SELECT MAX(id) FROM {qn(RESULT_TABLE)}")
+        max_id = cursor.fetchone()[0]
+
+        cursor.execute(f"ALTER TABLE {qn(RESULT_TABLE)} RENAME TO {qn(partitioned)}")
+        cursor.execute(
+            f"CREATE TABLE {qn(RESULT_TABLE)} (LIKE {qn(partitioned)} INCLUDING DEFAULTS)"
+        )
+        cursor.execute(f"ALTER TABLE {qn(RESULT_TABLE)} ALTER COLUMN id DROP DEFAULT")
+        cursor.execute(f"ALTER TABLE {qn(RESULT_TABLE)} ADD PRIMARY KEY (id)")
+        cursor.execute(f"INSERT INTO {qn(RESULT_TABLE)} SELECT * FROM {qn(partitioned)}")
+        # 分区表的序列随表一起删除，之后新建的标识列才能使用原来的序列名
+        cursor.execute(f"DROP TABLE {qn(partitioned)} CASCADE")
+        cursor.execute(
+            f"ALTER TABLE {qn(RESULT_TABLE)} ALTER COLUMN id ADD GENERATED BY DEFAULT AS IDENTITY"
+        )
+        sequence, _ = _id_sequence(cursor, RESULT_TABLE)
+        cursor.execute("SELECT setval(%s, %s, false)", [sequence, (max_id or 0) + 1])
+        for index_def in index_defs:
+            cursor.execute(index_def)
+        for name, definition in foreign_keys:
+            cursor.execute(f"ALTER TABLE {qn(RESULT_TABLE)} ADD CONSTRAINT {qn(name)} {definition}")
@@ -0,0 +1,93 @@
+"""
+端口热度排序
+按历史扫描结果中各端口开放的次数排序，让最可能开放的端口先被探测。
+排名由定时任务预先计算并写入缓存，扫描时只读缓存；缓存缺失时使用内置的默认热度表。
+"""
+import logging
+from datetime import timedelta
+from typing import Dict, Iterable, List
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count
+from django.utils import timezone
+
+from .models import ScanResult
+
+logger = logging.getLogger(__name__)
+
+CACHE_KEY = 'scanner:port_ranking:{protocol}'
+CACHE_TIMEOUT = 2 * 24 * 3600
+
+DEFAULT_WINDOW_DAYS = 90
+DEFAULT_RANKING_LIMIT = 1000
+
+# 历史中至少开放过这么多次的端口才参与排名，样本太少时以默认热度表为准
+MIN_OBSERVATIONS = 3
+
+# 默认热度表，取自Nmap服务频率统计中最常见的端口，按热度降序
+DEFAULT_PORT_FREQUENCIES = {
+    'tcp': [
+        80, 23, 443, 21, 22, 25, 3389, 110, 445, 139, 143, 53, 135, 3306, 8080,
+        1723, 111, 995, 993, 5900, 1025, 587, 8888, 199, 1720, 465, 548, 113, 81,
+        6001, 10000, 514, 5060, 179, 1026, 2000, 8443, 8000, 32768, 554, 26, 1433,
+        49152, 2001, 515, 8008, 49154, 1027, 5666, 646, 5000, 5631, 631, 49153,
+        8081, 2049, 88, 79, 5800, 106, 2121, 1110, 49155, 6000, 513, 990, 5357,
+        427, 49156, 543, 544, 5101, 144, 7, 389,
+    ],
+    'udp': [
+        631, 161, 137, 123, 138, 1434, 445, 135, 67, 53, 139, 500, 68, 520, 1900,
+        4500, 514, 49152, 162, 69, 5353, 111, 49154, 1701, 998, 996, 997, 999,
+        3283, 49153, 1812, 136, 2222, 2049, 32768, 5060, 1025, 1433, 3456, 80,
+        20031, 1026, 7, 1646, 1027,
+    ],
+}
+
+
+def compute_port_ranking(protocol: str = 'tcp', window_days: int = DEFAULT_WINDOW_DAYS,
+                         limit: int = DEFAULT_RANKING_LIMIT) -> List[int]:
+    """
+    根据最近 window_days 天的扫描结果计算端口排名
+
+    历史中足够常见的端口排在前面，其余按默认热度表补齐。
+    """
+    since = timezone.now() - timedelta(days=window_days)
+    rows = (
+        ScanResult.objects
+        .filter(state='open', protocol=protocol, port__isnull=False, discovered_at__gte=since)
+        .values('port')
+        .annotate(count=Count('id'))
+        .filter(count__gte=MIN_OBSERVATIONS)
+        .order_by('-count', 'port')[:limit]
+    )
+    ranking = [row['port'] for row in rows]
+    seen = set(ranking)
+    ranking.extend(port for port in DEFAULT_PORT_FREQUENCIES.get(protocol, []) if port not in seen)
+    return ranking[:limit]
+
+
+def refresh_port_rankings() -> Dict[str, int]:
+    """重新计算所有协议的端口排名并写入缓存，返回各协议的排名长度"""
+    window_days = getattr(settings, 'PORT_RANKING_WINDOW_DAYS', DEFAULT_WINDOW_DAYS)
+    sizes = {}
+    for protocol in DEFAULT_PORT_FREQUENCIES:
+        ranking = compute_port_ranking(protocol, window_days)
+        cache.set(CACHE_KEY.format(protocol=protocol), ranking, CACHE_TIMEOUT)
+        sizes[protocol] = len(ranking)
+    logger.info(f"端口热度排名已更新: {sizes}")
+    return sizes
+
+
+def get_port_ranking(protocol: str = 'tcp') -> List[int]:
+    """读取缓存中的端口排名，缺失时返回默认热度表"""
+    ranking = cache.get(CACHE_KEY.format(protocol=protocol))
+    if ranking is None:
+        return DEFAULT_PORT_FREQUENCIES.get(protocol, [])
+    return ranking
+
+
+def order_ports(ports: Iterable[int], protocol: str = 'tcp') -> List[int]:
+    """按热度排序端口，排名之外的端口按数值顺序排在最后"""
+    rank = {port: index for index, port in enumerate(get_port_ranking(protocol))}
+    unranked = len(rank)
+    return sorted(ports, key=lambda port: (rank.get(port, unranked), port))
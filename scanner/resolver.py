@@ -0,0 +1,193 @@
+"""
+域名解析
+扫描前并发解析任务目标中的全部域名，扫描后批量反向解析发现的主机以补全主机名。
+解析在有界的asyncio并发下进行，结果写入共享缓存（Redis可用时跨worker共享），
+重复的任务不必再次等待解析延迟；解析失败的结果按较短的有效期缓存。
+"""
+import asyncio
+import logging
+import socket
+from concurrent.futures import ThreadPoolExecutor
+from typing import Awaitable, Callable, Dict, Iterable, List, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .scanners.rangeset import TargetSet
+
+logger = logging.getLogger(__name__)
+
+FORWARD_KEY = 'dns:a:{name}'
+REVERSE_KEY = 'dns:ptr:{ip}'
+
+DEFAULT_CONCURRENCY = 64
+DEFAULT_TIMEOUT = 3.0
+DEFAULT_TTL = 3600
+DEFAULT_NEGATIVE_TTL = 300
+
+# 有这些状态的结果说明主机作出了响应，只为这些主机发出反向解析
+RESPONSIVE_STATES = ('open', 'closed', 'up')
+
+
+class AsyncResolver:
+    """
+    带缓存的批量解析器
+
+    标准库不提供记录自身的TTL，缓存有效期取自配置 DNS_CACHE_TTL / DNS_NEGATIVE_CACHE_TTL。
+
+    Args:
+        concurrency: 同时进行的查询数上限
+        timeout: 单个查询的超时（秒）
+        ttl: 解析成功结果的缓存有效期（秒）
+        negative_ttl: 解析失败结果的缓存有效期（秒）
+        getaddrinfo: 正向解析函数，测试时可替换
+        gethostbyaddr: 反向解析函数，测试时可替换
+    """
+
+    def __init__(self, concurrency: int = None, timeout: float = None,
+                 ttl: int = None, negative_ttl: int = None,
+                 getaddrinfo: Callable = socket.getaddrinfo,
+                 gethostbyaddr: Callable = socket.gethostbyaddr):
+        self.concurrency = concurrency or getattr(settings, 'DNS_RESOLVER_CONCURRENCY', DEFAULT_CONCURRENCY)
+        self.timeout = timeout or getattr(settings, 'DNS_RESOLVER_TIMEOUT', DEFAULT_TIMEOUT)
+        self.ttl = ttl or getattr(settings, 'DNS_CACHE_TTL', DEFAULT_TTL)
+        self.negative_ttl = negative_ttl or getattr(settings, 'DNS_NEGATIVE_CACHE_TTL', DEFAULT_NEGATIVE_TTL)
+        self.getaddrinfo = getaddrinfo
+        self.gethostbyaddr = gethostbyaddr
+
+        self.lookups = 0
+        self.cache_hits = 0
+
+    def _forward(self, name: str) -> List[str]:
+        addresses = []
+        for info in self.getaddrinfo(name, None, 0, socket.SOCK_STREAM):
+            address = info[4][0]
+            if address not in addresses:
+                addresses.append(address)
+        return addresses
+
+    def _reverse(self, ip: str) -> str:
+        return self.gethostbyaddr(ip)[0]
+
+    async def _gather(self, lookup: Callable, keys: List[str], empty) -> Dict:
+        """在有界线程池中并发执行阻塞的解析调用，超时或失败的结果为 empty"""
+        loop = asyncio.get_running_loop()
+        semaphore = asyncio.Semaphore(self.concurrency)
+        executor = ThreadPoolExecutor(max_workers=min(self.concurrency, len(keys)))
+
+        async def run(key: str) -> Tuple[str, object]:
+            async with semaphore:
+                try:
+                    value = await asyncio.wait_for(loop.run_in_executor(executor, lookup, key), self.timeout)
+                except (OSError, UnicodeError, asyncio.TimeoutError):
+                    return key, empty
+                return key, value
+
+        try:
+            return dict(await asyncio.gather(*(run(key) for key in keys)))
+        finally:
+            # 超时的查询仍在线程中运行，不等待它们结束
+            executor.shutdown(wait=False)
+
+    def _resolve(self, keys: Iterable[str], key_format: str, lookup: Callable, empty) -> Dict:
+        keys = list(dict.fromkeys(key for key in keys if key))
+        if not keys:
+            return {}
+        cache_keys = {key: key_format.format(name=key, ip=key) for key in keys}
+        cached = cache.get_many(list(cache_keys.values()))
+        results = {key: cached[cache_keys[key]] for key in keys if cache_keys[key] in cached}
+        missing = [key for key in keys if key not in results]
+
+        self.lookups += len(keys)
+        self.cache_hits += len(results)
+        if missing:
+            resolved = self._run(self._gather(lookup, missing, empty))
+            cache.set_many({cache_keys[key]: value for key, value in resolved.items() if value}, self.ttl)
+            cache.set_many({cache_keys[key]: value for key, value in resolved.items() if not value},
+                           self.negative_ttl)
+            results.update(resolved)
+        return results
+
+    @staticmethod
+    def _run(coroutine: Awaitable) -> Dict:
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(coroutine)
+        # 已经处在事件循环中（例如异步视图），放到独立线程里运行
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            return executor.submit(asyncio.run, coroutine).result()
+
+    def resolve(self, names: Iterable[str]) -> Dict[str, List[str]]:
+        """正向解析，返回 域名 -> 地址列表，解析失败的域名对应空列表"""
+        return self._resolve(names, FORWARD_KEY, self._forward, [])
+
+    def reverse(self, ips: Iterable[str]) -> Dict[str, str]:
+        """反向解析，返回 IP -> 主机名，没有PTR记录的地址对应空字符串"""
+        return self._resolve(ips, REVERSE_KEY, self._reverse, '')
+
+    def stats(self) -> Dict:
+        return {
+            'lookups': self.lookups,
+            'cache_hits': self.cache_hits,
+        }
+
+
+def resolve_target(target: str, resolver: AsyncResolver = None) -> Tuple[str, Dict[str, str]]:
+    """
+    把扫描目标中的域名替换为解析得到的地址
+
+    与nmap默认行为一致，一个域名解析出多个地址时只扫描第一个；解析失败的域名从目标中去掉。
+
+    Returns:
+        (替换后的目标, IP -> 原域名)
+    """
+    names = TargetSet.parse(target).names
+    if not names:
+        return target, {}
+    resolver = resolver or AsyncResolver()
+    resolved = resolver.resolve(names)
+
+    parts = []
+    hostnames = {}
+    for part in target.replace(',', ' ').split():
+        if part not in resolved:
+            parts.append(part)
+            continue
+        addresses = resolved[part]
+        if not addresses:
+            logger.warning(f"域名解析失败，已从扫描目标中去掉: {part}")
+            continue
+        parts.append(addresses[0])
+        hostnames.setdefault(addresses[0], part)
+    return ' '.join(parts), hostnames
+
+
+def fill_hostnames(results: List[Dict], hostnames: Dict[str, str] = None,
+                   resolver: AsyncResolver = None, reverse: bool = True) -> int:
+    """
+    为缺少主机名的结果补全主机名
+
+    目标原本写的是域名时直接使用该域名，其余地址中有 open、closed 或 up 结果的批量反向解析；
+    过滤或无响应的地址多半没有PTR记录，逐个等待超时得不偿失。
+
+    Returns:
+        补全的结果条数
+    """
+    hostnames = dict(hostnames or {})
+    missing = {
+        row['ip_address'] for row in results
+        if row.get('ip_address') and not row.get('hostname') and row['ip_address'] not in hostnames
+        and row.get('state') in RESPONSIVE_STATES
+    }
+    if reverse and missing:
+        resolver = resolver or AsyncResolver()
+        hostnames.update({ip: name for ip, name in resolver.reverse(missing).items() if name})
+
+    filled = 0
+    for row in results:
+        name = hostnames.get(row.get('ip_address'))
+        if name and not row.get('hostname'):
+            row['hostname'] = name
+            filled += 1
+    return filled
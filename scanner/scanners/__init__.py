@@ -1,4 +1,6 @@
 from .scapy_scanner import ScapyScanner
 from .nmap_scanner import NMAPScanner
+from .traceroute import TracerouteScanner
+from .rtt import RTTScanner
 
-__all__ = ['ScapyScanner', 'NMAPScanner']
\ No newline at end of file
+__all__ = ['ScapyScanner', 'NMAPScanner', 'TracerouteScanner', 'RTTScanner']
@@ -1,14 +1,17 @@
 import abc
 import ipaddress
-from typing import List, Dict, Any
+from typing import Any, Dict, Iterator, List
 import logging
+from ..port_ranking import get_port_ranking
+from .rangeset import IntervalSet, TargetSet, contains_address
 
 logger = logging.getLogger(__name__)
 
 class BaseScanner(abc.ABC):
     """扫描器基类，定义扫描器的通用接口"""
     
-    def __init__(self, target: str, ports: str = "1-1000", options: Dict = None):
+    def __init__(self, target: str, ports: str = "1-1000", options: Dict = None,
+                 exclusions: IntervalSet = None):
         """
         初始化扫描器
         
@@ -16,10 +19,12 @@ class BaseScanner(abc.ABC):
             target: 扫描目标，可以是IP、网段或域名
             ports: 端口范围，如 "80,443,1-1000"
             options: 扫描选项字典
+            exclusions: 禁止扫描的地址区间（见 scanner.exclusions）
         """
         self.target = target
         self.ports = ports
         self.options = options or {}
+        self.exclusions = exclusions or IntervalSet()
         self.results = []
     
     @abc.abstractmethod
@@ -40,20 +45,45 @@ class BaseScanner(abc.ABC):
             # 可能是域名，暂时认为合法
             return True
     
-    def parse_ports(self) -> List[int]:
-        """解析端口范围字符串为端口列表"""
-        ports = []
+    def port_set(self) -> IntervalSet:
+        """端口范围解析为区间集合，格式错误时返回空集合"""
         try:
-            for part in self.ports.split(','):
-                part = part.strip()
-                if '-' in part:
-                    # 处理端口范围，如 "1-100"
-                    start, end = map(int, part.split('-'))
-                    ports.extend(range(start, end + 1))
-                else:
-                    # 处理单个端口
-                    ports.append(int(part))
-            return sorted(set(ports))  # 去重并排序
+            return IntervalSet.parse(self.ports)
         except ValueError as e:
             logger.error(f"端口解析错误: {e}")
-            return []
\ No newline at end of file
+            return IntervalSet()
+    
+    def target_set(self) -> TargetSet:
+        """扫描目标解析为目标集合并减去排除区间，大网段也不会展开"""
+        targets = TargetSet.parse(self.target)
+        if self.exclusions:
+            targets = targets.exclude(self.exclusions)
+        return targets
+    
+    def is_excluded(self, ip: str) -> bool:
+        """单个地址是否在排除范围内，一次二分查找"""
+        return bool(self.exclusions) and contains_address(self.exclusions, ip)
+    
+    def iter_ports(self, protocol: str = 'tcp') -> Iterator[int]:
+        """
+        惰性遍历待扫描端口
+
+        options 中 port_order 决定顺序：默认按端口号升序；popularity 按历史开放热度，
+        最可能开放的端口先被探测，扫描中途停止时已得到的结果也最有价值；
+        random 按伪随机置换顺序（可用 seed 固定）。
+        """
+        ports = self.port_set()
+        order = self.options.get('port_order')
+        if order == 'popularity':
+            ranked = [port for port in get_port_ranking(protocol) if port in ports]
+            yield from ranked
+            ranked = set(ranked)
+            yield from (port for port in ports if port not in ranked)
+        elif order == 'random':
+            yield from ports.permutation(self.options.get('seed'))
+        else:
+            yield from ports
+    
+    def parse_ports(self, protocol: str = 'tcp') -> List[int]:
+        """解析端口范围字符串为端口列表（会展开全部端口，扫描循环请使用 iter_ports）"""
+        return list(self.iter_ports(protocol))
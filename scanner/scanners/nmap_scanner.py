@@ -1,11 +1,39 @@
 from typing import List, Dict, Any
 import nmap
 import json
+import os
+import re
+import tempfile
 from .base import BaseScanner
+from .rangeset import IntervalSet, TargetSet, to_networks
 import logging
 
 logger = logging.getLogger(__name__)
 
+# ssh-hostkey 脚本输出的每行为 "<位数> <指纹> (<类型>)"
+SSH_HOSTKEY_PATTERN = re.compile(r'^\s*\d+\s+([0-9a-f]{2}(?::[0-9a-f]{2}){15})\s+\((\S+)\)', re.M | re.I)
+SSL_CERT_SHA1_PATTERN = re.compile(r'SHA-1:\s*((?:[0-9a-f]{4}\s*){10})', re.I)
+
+
+def script_fingerprints(scripts: Dict[str, str]) -> Dict[str, Any]:
+    """
+    从NSE脚本输出中提取设备身份相关的指纹
+
+    Returns:
+        ssh_hostkey（"类型:指纹" 列表）和 tls_cert（证书SHA-1），没有的键不出现，
+        不带这两个脚本的扫描产生的指纹内容与之前完全相同
+    """
+    fingerprints = {}
+    hostkeys = sorted(f"{kind.lower()}:{key.lower()}"
+                      for key, kind in SSH_HOSTKEY_PATTERN.findall(scripts.get('ssh-hostkey', '')))
+    if hostkeys:
+        fingerprints['ssh_hostkey'] = hostkeys
+    certificate = SSL_CERT_SHA1_PATTERN.search(scripts.get('ssl-cert', ''))
+    if certificate:
+        fingerprints['tls_cert'] = re.sub(r'\s+', '', certificate.group(1)).lower()
+    return fingerprints
+
+
 class NMAPScanner(BaseScanner):
     """基于Nmap的扫描器实现"""
     
@@ -21,17 +49,41 @@ class NMAPScanner(BaseScanner):
         # 构建Nmap参数
         arguments = self._build_arguments(scan_type)
         
+        # 只把与目标有交集的排除网段写入排除文件
+        exclude_file = None
+        if self.exclusions:
+            targets = TargetSet.parse(self.target)
+            relevant = self.exclusions if targets.names else targets.addresses.intersection(self.exclusions)
+            if not targets.names and relevant == targets.addresses:
+                logger.info(f"目标全部在排除范围内，跳过扫描: {self.target}")
+                return []
+            if relevant:
+                exclude_file = self._write_exclude_file(relevant)
+                arguments += f' --excludefile {exclude_file}'
+        
         try:
             logger.info(f"开始Nmap扫描: {self.target} 参数: {arguments}")
             
             # 执行扫描
-            scan_result = self.nm.scan(hosts=self.target, ports=self.ports, arguments=arguments)
+            # 存活发现不带端口参数
+            ports = None if scan_type == 'PING_SWEEP' else self.ports
+            scan_result = self.nm.scan(hosts=self.target, ports=ports, arguments=arguments)
             
             return self._parse_nmap_result(scan_result)
             
         except Exception as e:
             logger.error(f"Nmap扫描出错: {e}")
             return [{'error': f'Nmap扫描失败: {str(e)}'}]
+        finally:
+            if exclude_file:
+                os.unlink(exclude_file)
+    
+    def _write_exclude_file(self, exclusions: IntervalSet) -> str:
+        """把排除区间写成Nmap可读的网段列表文件"""
+        with tempfile.NamedTemporaryFile('w', suffix='.txt', prefix='nmap-exclude-', delete=False) as handle:
+            for network in to_networks(exclusions):
+                handle.write(network + '\n')
+        return handle.name
     
     def _build_arguments(self, scan_type: str) -> str:
         """根据扫描类型构建Nmap参数"""
@@ -51,6 +103,8 @@ class NMAPScanner(BaseScanner):
             arguments.append('-sV')
         elif scan_type == 'FULL_SCAN':
             arguments.extend(['-A', '-T4'])
+        elif scan_type == 'PING_SWEEP':
+            arguments.append('-sn')
         
         # 添加自定义选项
         if self.options.get('aggressive_timing'):
@@ -59,6 +113,9 @@ class NMAPScanner(BaseScanner):
             arguments.append('-sV')
         if self.options.get('os_detection'):
             arguments.append('-O')
+        # 采集SSH主机密钥和TLS证书指纹，用于跨任务识别同一台设备
+        if self.options.get('host_identity'):
+            arguments.append('--script ssh-hostkey,ssl-cert')
         
         return ' '.join(arguments)
     
@@ -71,9 +128,12 @@ class NMAPScanner(BaseScanner):
                 continue
             
             # 主机信息
+            mac = host_data.get('addresses', {}).get('mac', '')
             host_info = {
                 'ip_address': host,
                 'hostname': host_data['hostnames'][0]['name'] if host_data['hostnames'] else '',
+                'mac_address': mac,
+                'vendor': host_data.get('vendor', {}).get(mac, ''),  # 缺失时入库阶段按OUI补全
                 'state': 'up',
                 'ttl': None  # Nmap不直接提供TTL
             }
@@ -83,17 +143,19 @@ class NMAPScanner(BaseScanner):
                 if protocol in host_data:
                     for port, port_data in host_data[protocol].items():
                         result = host_info.copy()
+                        fingerprint = {
+                            'product': port_data.get('product', ''),
+                            'version': port_data.get('version', ''),
+                            'extrainfo': port_data.get('extrainfo', '')
+                        }
+                        fingerprint.update(script_fingerprints(port_data.get('script', {})))
                         result.update({
                             'port': port,
                             'protocol': protocol,
                             'state': port_data['state'],
                             'service': port_data['name'],
                             'service_version': port_data.get('version', ''),
-                            'fingerprint': {
-                                'product': port_data.get('product', ''),
-                                'version': port_data.get('version', ''),
-                                'extrainfo': port_data.get('extrainfo', '')
-                            }
+                            'fingerprint': fingerprint
                         })
                         results.append(result)
             
@@ -0,0 +1,301 @@
+"""
+区间集合
+端口和扫描目标以有序、互不相交的闭区间保存，而不是展开成列表：
+/8 网段或全部65535个端口都只占一个区间，长度直接可得，按下标取值只需一次二分查找，
+遍历是惰性的，排除列表通过区间相减完成，内存占用与区间数有关而与元素个数无关。
+"""
+import ipaddress
+import random
+from bisect import bisect_right
+from math import gcd
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from ..fields import int_to_ip, ip_to_int
+
+Interval = Tuple[int, int]
+
+# IPv4地址在映射空间中的范围（::ffff:0:0/96）
+_V4_FIRST = 0xFFFF00000000
+_V4_LAST = 0xFFFFFFFFFFFF
+
+
+class IntervalSet:
+    """
+    整数区间集合
+
+    Args:
+        intervals: (起点, 终点) 闭区间序列，可以重叠或相邻，构造时会合并
+    """
+    __slots__ = ('_starts', '_ends', '_offsets', '_size')
+
+    def __init__(self, intervals: Iterable[Interval] = ()):
+        merged: List[List[int]] = []
+        for start, end in sorted((int(start), int(end)) for start, end in intervals):
+            if start > end:
+                raise ValueError(f"区间起点大于终点: {start}-{end}")
+            if merged and start <= merged[-1][1] + 1:
+                merged[-1][1] = max(merged[-1][1], end)
+            else:
+                merged.append([start, end])
+
+        self._starts = [start for start, _ in merged]
+        self._ends = [end for _, end in merged]
+        # 每个区间第一个元素在整个集合中的下标
+        self._offsets = []
+        size = 0
+        for start, end in merged:
+            self._offsets.append(size)
+            size += end - start + 1
+        self._size = size
+
+    @classmethod
+    def from_values(cls, values: Iterable[int]) -> 'IntervalSet':
+        return cls((value, value) for value in values)
+
+    @classmethod
+    def parse(cls, spec: str, lower: int = 0, upper: int = 65535) -> 'IntervalSet':
+        """
+        解析端口规格，例如 "22,80,8000-8100"
+
+        Raises:
+            ValueError: 格式不正确或超出 [lower, upper]
+        """
+        intervals = []
+        for part in spec.split(','):
+            part = part.strip()
+            if not part:
+                continue
+            if '-' in part:
+                start, end = (int(value) for value in part.split('-', 1))
+            else:
+                start = end = int(part)
+            if start < lower or end > upper:
+                raise ValueError(f"端口超出范围: {part}")
+            intervals.append((start, end))
+        return cls(intervals)
+
+    @property
+    def intervals(self) -> List[Interval]:
+        return list(zip(self._starts, self._ends))
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __bool__(self) -> bool:
+        return self._size > 0
+
+    def __iter__(self) -> Iterator[int]:
+        for start, end in zip(self._starts, self._ends):
+            yield from range(start, end + 1)
+
+    def __contains__(self, value) -> bool:
+        index = bisect_right(self._starts, value) - 1
+        return index >= 0 and value <= self._ends[index]
+
+    def __getitem__(self, index: int) -> int:
+        if index < 0:
+            index += self._size
+        if not 0 <= index < self._size:
+            raise IndexError(index)
+        position = bisect_right(self._offsets, index) - 1
+        return self._starts[position] + index - self._offsets[position]
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, IntervalSet) and self.intervals == other.intervals
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({self.intervals!r})"
+
+    def union(self, other: 'IntervalSet') -> 'IntervalSet':
+        return self.__class__(self.intervals + other.intervals)
+
+    def intersection(self, other: 'IntervalSet') -> 'IntervalSet':
+        return self.subtract(self.subtract(other))
+
+    def subtract(self, other: 'IntervalSet') -> 'IntervalSet':
+        """去掉另一个集合中的元素，两个集合的区间各扫描一遍"""
+        result = []
+        others = other.intervals
+        j = 0
+        for start, end in self.intervals:
+            while j < len(others) and others[j][1] < start:
+                j += 1
+            k = j
+            while k < len(others) and others[k][0] <= end:
+                if others[k][0] > start:
+                    result.append((start, others[k][0] - 1))
+                start = max(start, others[k][1] + 1)
+                k += 1
+            if start <= end:
+                result.append((start, end))
+        return self.__class__(result)
+
+    def chunks(self, size: int) -> Iterator['IntervalSet']:
+        """按顺序切分为每块至多 size 个元素的子集合"""
+        chunk, count = [], 0
+        for start, end in self.intervals:
+            while start <= end:
+                stop = min(end, start + size - count - 1)
+                chunk.append((start, stop))
+                count += stop - start + 1
+                start = stop + 1
+                if count == size:
+                    yield self.__class__(chunk)
+                    chunk, count = [], 0
+        if chunk:
+            yield self.__class__(chunk)
+
+    def permutation(self, seed: Optional[int] = None) -> Iterator[int]:
+        """
+        惰性地按伪随机顺序遍历全部元素
+
+        使用仿射置换 i -> (a*i + c) mod n（a与n互素），每个元素恰好出现一次，
+        不需要额外内存，适合把探测打散到整个目标范围。
+        """
+        n = self._size
+        if n == 0:
+            return
+        rng = random.Random(seed)
+        a = 1
+        if n > 2:
+            a = rng.randrange(1, n)
+            while gcd(a, n) != 1:
+                a = rng.randrange(1, n)
+        c = rng.randrange(n)
+        for i in range(n):
+            yield self[(a * i + c) % n]
+
+
+class TargetSet:
+    """
+    扫描目标集合
+
+    IP地址按 scanner.fields 的128位映射整数保存在 IntervalSet 中，
+    无法解析为地址的目标（域名）单独保存，遍历时排在地址之后。
+    """
+
+    def __init__(self, addresses: IntervalSet = None, names: List[str] = None):
+        self.addresses = addresses if addresses is not None else IntervalSet()
+        self.names = names or []
+
+    @classmethod
+    def parse(cls, target: str) -> 'TargetSet':
+        """
+        解析扫描目标，支持逗号或空白分隔的IP、网段、"起始IP-结束IP" 区间和域名
+
+        网段与 ipaddress 的 hosts() 保持一致：IPv4去掉网络地址和广播地址，
+        IPv6去掉子网路由器任播地址。
+        """
+        intervals = []
+        names = []
+        for part in target.replace(',', ' ').split():
+            try:
+                intervals.append(address_range(part, hosts_only=True))
+            except ValueError:
+                names.append(part)
+        return cls(IntervalSet(intervals), names)
+
+    def __len__(self) -> int:
+        return len(self.addresses) + len(self.names)
+
+    def __bool__(self) -> bool:
+        return len(self) > 0
+
+    def __iter__(self) -> Iterator[str]:
+        for value in self.addresses:
+            yield int_to_ip(value)
+        yield from self.names
+
+    def __getitem__(self, index: int) -> str:
+        if index < 0:
+            index += len(self)
+        size = len(self.addresses)
+        if 0 <= index < size:
+            return int_to_ip(self.addresses[index])
+        if size <= index < len(self):
+            return self.names[index - size]
+        raise IndexError(index)
+
+    def __contains__(self, value: str) -> bool:
+        try:
+            return ip_to_int(value) in self.addresses
+        except ValueError:
+            return value in self.names
+
+    def exclude(self, excluded: IntervalSet) -> 'TargetSet':
+        """去掉排除区间内的地址，域名不受影响"""
+        return TargetSet(self.addresses.subtract(excluded), list(self.names))
+
+    def permutation(self, seed: Optional[int] = None) -> Iterator[str]:
+        """按伪随机顺序遍历地址，域名排在最后"""
+        for value in self.addresses.permutation(seed):
+            yield int_to_ip(value)
+        yield from self.names
+
+
+def address_range(part: str, hosts_only: bool = False) -> Interval:
+    """
+    单个地址、网段或 "起始IP-结束IP" 区间转换为映射整数区间
+
+    Args:
+        hosts_only: 网段是否按 hosts() 去掉网络地址和广播地址（扫描目标用），
+                    排除列表需要覆盖整个网段，保持默认的False
+
+    Raises:
+        ValueError: 不是合法的地址写法
+    """
+    if '/' in part:
+        network = ipaddress.ip_network(part, strict=False)
+        first = ip_to_int(network.network_address)
+        last = ip_to_int(network.broadcast_address)
+        if hosts_only and network.version == 4 and network.prefixlen < 31:
+            return first + 1, last - 1
+        if hosts_only and network.version == 6 and network.prefixlen < 127:
+            return first + 1, last
+        return first, last
+    if '-' in part:
+        start, end = part.split('-', 1)
+        first, last = ip_to_int(start.strip()), ip_to_int(end.strip())
+        if first > last:
+            raise ValueError(f"地址区间起点大于终点: {part}")
+        return first, last
+    value = ip_to_int(part)
+    return value, value
+
+
+def contains_address(addresses: IntervalSet, ip: str) -> bool:
+    """地址是否落在区间集合内，无法解析的目标（域名）返回False"""
+    try:
+        return ip_to_int(ip) in addresses
+    except ValueError:
+        return False
+
+
+def to_networks(addresses: IntervalSet) -> Iterator[str]:
+    """把地址区间拆分为最少的CIDR网段，供只接受网段的工具（如nmap排除文件）使用"""
+    for first, last in addresses.intervals:
+        # 跨越IPv4映射段边界的区间先按地址族切开
+        pieces = []
+        if first < _V4_FIRST:
+            pieces.append((ipaddress.IPv6Address, first, min(last, _V4_FIRST - 1)))
+        if first <= _V4_LAST and last >= _V4_FIRST:
+            pieces.append((ipaddress.IPv4Address, max(first, _V4_FIRST) & 0xFFFFFFFF,
+                           min(last, _V4_LAST) & 0xFFFFFFFF))
+        if last > _V4_LAST:
+            pieces.append((ipaddress.IPv6Address, max(first, _V4_LAST + 1), last))
+        for address, start, end in pieces:
+            for network in ipaddress.summarize_address_range(address(start), address(end)):
+                yield str(network)
+
+
+def to_spec(values: IntervalSet) -> str:
+    """区间集合写成规格字符串，例如 "22,80,8000-8100"，与 IntervalSet.parse 互逆"""
+    return ','.join(str(start) if start == end else f'{start}-{end}' for start, end in values.intervals)
+
+
+def address_spec(addresses: IntervalSet) -> str:
+    """地址区间写成 "起始IP-结束IP" 形式，TargetSet.parse 可原样解析回来"""
+    return ' '.join(
+        int_to_ip(first) if first == last else f'{int_to_ip(first)}-{int_to_ip(last)}'
+        for first, last in addresses.intervals
+    )
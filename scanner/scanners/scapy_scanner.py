@@ -1,10 +1,12 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Set
 import time
 import socket
+from itertools import islice
 from scapy.all import *
 from scapy.layers.inet import IP, TCP, UDP, ICMP
 from scapy.layers.l2 import ARP, Ether
 from .base import BaseScanner
+from ..liveness import LivenessCache
 import logging
 
 logger = logging.getLogger(__name__)
@@ -12,10 +14,21 @@ logger = logging.getLogger(__name__)
 class ScapyScanner(BaseScanner):
     """基于Scapy的扫描器实现"""
     
-    def __init__(self, *args, **kwargs):
+    # Ping扫描每批处理的地址数
+    SWEEP_CHUNK_SIZE = 1024
+    # SYN/UDP扫描每批发出的探测数上限，一批只等待一轮超时
+    PROBE_BATCH_SIZE = 4096
+    
+    def __init__(self, *args, liveness: LivenessCache = None, **kwargs):
+        """
+        Args:
+            liveness: 多个扫描器共用的无响应缓存，为None时按配置创建
+        """
         super().__init__(*args, **kwargs)
         self.timeout = self.options.get('timeout', 2)
         self.retries = self.options.get('retries', 1)
+        # 近期无响应地址的负缓存，options中 liveness_cache=False 可关闭
+        self.liveness = liveness if liveness is not None else LivenessCache.for_options(self.options)
     
     def execute_scan(self, scan_type: str) -> List[Dict]:
         """根据扫描类型执行相应的扫描"""
@@ -33,149 +46,184 @@ class ScapyScanner(BaseScanner):
     
     def syn_scan(self) -> List[Dict]:
         """SYN端口扫描"""
-        results = []
-        ports = self.parse_ports()
-        
-        if not ports:
+        if not self.port_set():
             return [{'error': '没有有效的端口可扫描'}]
-        
-        logger.info(f"开始SYN扫描: {self.target} 端口: {len(ports)}个")
-        
-        for port in ports:
-            try:
-                # 创建SYN包
-                pkt = IP(dst=self.target)/TCP(dport=port, flags="S")
-                start_time = time.time()
-                
-                # 发送包并接收响应
-                resp = sr1(pkt, timeout=self.timeout, retry=self.retries, verbose=0)
-                rtt = (time.time() - start_time) * 1000  # 转换为毫秒
-                
-                result = {
-                    'ip_address': self.target,
-                    'port': port,
-                    'protocol': 'tcp',
-                    'rtt': round(rtt, 2)
-                }
-                
-                if resp is None:
-                    # 没有响应，可能是过滤状态
-                    result['state'] = 'filtered'
-                elif resp.haslayer(TCP):
-                    tcp_layer = resp.getlayer(TCP)
-                    if tcp_layer.flags == 0x12:  # SYN-ACK
-                        result['state'] = 'open'
-                        # 发送RST包关闭连接
-                        rst_pkt = IP(dst=self.target)/TCP(dport=port, flags="R")
-                        send(rst_pkt, verbose=0)
-                    elif tcp_layer.flags == 0x14:  # RST-ACK
-                        result['state'] = 'closed'
-                    else:
-                        result['state'] = 'unknown'
-                else:
-                    result['state'] = 'unknown'
-                
-                results.append(result)
-                logger.debug(f"端口 {port}: {result['state']}")
-                
-            except Exception as e:
-                logger.error(f"扫描端口 {port} 时出错: {e}")
-                results.append({
-                    'ip_address': self.target,
-                    'port': port,
-                    'state': 'error',
-                    'error': str(e)
-                })
-        
-        return results
+        return self._port_scan('tcp', list(self.iter_ports('tcp')))
     
     def udp_scan(self) -> List[Dict]:
         """UDP端口扫描"""
+        ports = list(islice(self.iter_ports('udp'), 100))  # UDP扫描较慢，限制端口数量
+        return self._port_scan('udp', ports)
+    
+    def _port_scan(self, protocol: str, ports: List[int]) -> List[Dict]:
+        """
+        分批探测目标中的全部地址
+
+        每批是若干地址的全部端口，用一次 sr() 发出并只等待一轮超时，
+        整个网段不再逐个地址、逐个端口地等待；近期无响应的地址在发包前去掉。
+        """
         results = []
-        ports = self.parse_ports()[:100]  # UDP扫描较慢，限制端口数量
-        
-        logger.info(f"开始UDP扫描: {self.target} 端口: {len(ports)}个")
+        if not ports:
+            return results
         
-        for port in ports:
-            try:
-                # 创建UDP包
-                pkt = IP(dst=self.target)/UDP(dport=port)
-                start_time = time.time()
-                
-                # 发送UDP包
-                resp = sr1(pkt, timeout=self.timeout, verbose=0)
-                rtt = (time.time() - start_time) * 1000
-                
-                result = {
-                    'ip_address': self.target,
-                    'port': port,
-                    'protocol': 'udp',
-                    'rtt': round(rtt, 2)
-                }
-                
-                if resp is None:
-                    # 没有响应，可能是开放或过滤
-                    result['state'] = 'open|filtered'
-                elif resp.haslayer(ICMP):
-                    icmp_layer = resp.getlayer(ICMP)
-                    if icmp_layer.type == 3 and icmp_layer.code in [1, 2, 3, 9, 10, 13]:
-                        # 目标不可达，端口关闭
-                        result['state'] = 'closed'
-                    else:
-                        result['state'] = 'filtered'
-                elif resp.haslayer(UDP):
-                    result['state'] = 'open'
+        addresses = iter(self.target_set())
+        batch_size = max(1, self.PROBE_BATCH_SIZE // len(ports))
+        while True:
+            chunk = list(islice(addresses, batch_size))
+            if not chunk:
+                break
+            targets = self.liveness.filter_targets(chunk)
+            if len(targets) < len(chunk):
+                logger.info(f"跳过 {len(chunk) - len(targets)} 个近期无响应的地址")
+            if targets:
+                logger.info(f"开始{'SYN' if protocol == 'tcp' else 'UDP'}扫描: {len(targets)}个地址 "
+                            f"端口: {len(ports)}个")
+                results.extend(self._probe_batch(protocol, targets, ports))
+        return results
+    
+    def _probe_batch(self, protocol: str, targets: List[str], ports: List[int]) -> List[Dict]:
+        """对一批地址的全部端口并发探测，并更新无响应缓存"""
+        layer = TCP if protocol == 'tcp' else UDP
+        packets = []
+        results = {}
+        for target_ip in targets:
+            for port in ports:
+                if protocol == 'tcp':
+                    pkt = IP(dst=target_ip)/TCP(dport=port, flags="S")
                 else:
-                    result['state'] = 'unknown'
-                
-                results.append(result)
-                
-            except Exception as e:
-                logger.error(f"UDP扫描端口 {port} 时出错: {e}")
-                results.append({
-                    'ip_address': self.target,
+                    pkt = IP(dst=target_ip)/UDP(dport=port)
+                packets.append(pkt)
+                # 无响应时SYN扫描判为过滤，UDP扫描判为开放或过滤
+                results[(str(pkt[IP].dst), port)] = {
+                    'ip_address': target_ip,
                     'port': port,
-                    'state': 'error',
-                    'error': str(e)
-                })
+                    'protocol': protocol,
+                    'state': 'filtered' if protocol == 'tcp' else 'open|filtered'
+                }
         
-        return results
+        try:
+            # 一次发出整批探测，收到的响应按目标地址和端口匹配
+            answered, _ = sr(packets, timeout=self.timeout, retry=self.retries if protocol == 'tcp' else 0,
+                             verbose=0)
+        except Exception as e:
+            logger.error(f"{protocol.upper()}扫描 {len(targets)} 个地址时出错: {e}")
+            return [{'ip_address': result['ip_address'], 'port': result['port'], 'state': 'error', 'error': str(e)}
+                    for result in results.values()]
+        
+        responded = set()
+        opened = []
+        for sent, resp in answered:
+            result = results.get((str(sent[IP].dst), sent[layer].dport))
+            if result is None:
+                continue
+            responded.add(result['ip_address'])
+            result['rtt'] = round((resp.time - (sent.sent_time or sent.time)) * 1000, 2)  # 转换为毫秒
+            if protocol == 'tcp':
+                result['state'] = self._syn_state(resp)
+                if result['state'] == 'open':
+                    opened.append(IP(dst=result['ip_address'])/TCP(dport=result['port'], flags="R"))
+            else:
+                result['state'] = self._udp_state(resp)
+            logger.debug(f"{result['ip_address']} 端口 {result['port']}: {result['state']}")
+        
+        if opened:
+            # 发送RST包关闭半开连接
+            send(opened, verbose=0)
+        self._update_liveness(targets, responded)
+        return list(results.values())
+    
+    @staticmethod
+    def _syn_state(resp) -> str:
+        """SYN探测的响应判定端口状态"""
+        if resp.haslayer(TCP):
+            tcp_layer = resp.getlayer(TCP)
+            if tcp_layer.flags == 0x12:  # SYN-ACK
+                return 'open'
+            if tcp_layer.flags == 0x14:  # RST-ACK
+                return 'closed'
+            return 'unknown'
+        if resp.haslayer(ICMP) and resp.getlayer(ICMP).type == 3 and \
+                resp.getlayer(ICMP).code in [1, 2, 3, 9, 10, 13]:
+            # ICMP不可达，端口被防火墙过滤
+            return 'filtered'
+        return 'unknown'
+    
+    @staticmethod
+    def _udp_state(resp) -> str:
+        """UDP探测的响应判定端口状态"""
+        if resp.haslayer(ICMP):
+            icmp_layer = resp.getlayer(ICMP)
+            if icmp_layer.type == 3 and icmp_layer.code in [1, 2, 3, 9, 10, 13]:
+                # 目标不可达，端口关闭
+                return 'closed'
+            return 'filtered'
+        if resp.haslayer(UDP):
+            return 'open'
+        return 'unknown'
+    
+    def _update_liveness(self, targets: List[str], responded: Set[str]):
+        """
+        任一探测收到回复即认为主机存活，包括把端口判为过滤的ICMP不可达；
+        全部探测都没有任何回复才记为无响应
+        """
+        self.liveness.mark_alive([target_ip for target_ip in targets if target_ip in responded])
+        self.liveness.mark_dead([target_ip for target_ip in targets if target_ip not in responded])
     
     def ping_sweep(self) -> List[Dict]:
         """Ping扫描发现活跃主机"""
         results = []
         
         try:
-            # 如果是网段，扫描整个网段
-            if '/' in self.target:
-                network = ipaddress.ip_network(self.target, strict=False)
-                targets = [str(ip) for ip in network.hosts()]
+            # 目标按区间保存并惰性遍历，大网段不会展开成列表
+            targets = self.target_set()
+            if self.options.get('target_order') == 'random':
+                addresses = targets.permutation(self.options.get('seed'))
             else:
-                targets = [self.target]
+                addresses = iter(targets)
             
-            for target_ip in targets:
-                try:
-                    # 发送ICMP Echo请求
-                    pkt = IP(dst=target_ip)/ICMP()
-                    start_time = time.time()
-                    
-                    resp = sr1(pkt, timeout=self.timeout, verbose=0)
-                    rtt = (time.time() - start_time) * 1000
-                    
-                    if resp is not None:
-                        results.append({
-                            'ip_address': target_ip,
-                            'state': 'up',
-                            'rtt': round(rtt, 2),
-                            'ttl': resp.ttl
-                        })
-                    
-                except Exception as e:
-                    logger.debug(f"Ping {target_ip} 失败: {e}")
-                    continue
+            # 分块查询无响应缓存，内存占用与网段大小无关
+            while True:
+                chunk = list(islice(addresses, self.SWEEP_CHUNK_SIZE))
+                if not chunk:
+                    break
+                results.extend(self._ping_chunk(self.liveness.filter_targets(chunk)))
                     
         except Exception as e:
             logger.error(f"Ping扫描出错: {e}")
             results.append({'error': str(e)})
         
-        return results
\ No newline at end of file
+        return results
+    
+    def _ping_chunk(self, targets: List[str]) -> List[Dict]:
+        """对一批地址发送ICMP Echo请求，并更新无响应缓存"""
+        results = []
+        alive = []
+        dead = []
+        
+        for target_ip in targets:
+            try:
+                # 发送ICMP Echo请求
+                pkt = IP(dst=target_ip)/ICMP()
+                start_time = time.time()
+                
+                resp = sr1(pkt, timeout=self.timeout, verbose=0)
+                rtt = (time.time() - start_time) * 1000
+                
+                if resp is not None:
+                    alive.append(target_ip)
+                    results.append({
+                        'ip_address': target_ip,
+                        'state': 'up',
+                        'rtt': round(rtt, 2),
+                        'ttl': resp.ttl
+                    })
+                else:
+                    dead.append(target_ip)
+                
+            except Exception as e:
+                logger.debug(f"Ping {target_ip} 失败: {e}")
+                continue
+        
+        self.liveness.mark_alive(alive)
+        self.liveness.mark_dead(dead)
+        return results
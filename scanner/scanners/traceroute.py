@@ -0,0 +1,225 @@
+"""
+Paris traceroute
+对全部目标按轮并行发送TTL受限的探测包，每轮每个目标只有一个探测在途，一次 sr() 发出整轮探测。
+同一目标的所有探测使用相同的五元组（Paris traceroute），经过按流负载均衡的路由器时路径保持稳定。
+
+按Doubletree的停止规则减少重复探测：
+- 从 start_ttl 开始向远端探测，到达目标、收到不可达或连续 gap_limit 跳无响应时停止；
+- 再从 start_ttl-1 向近端回溯，遇到已由其他目标发现的接口即停止——靠近扫描点的共享路径只探测一次。
+"""
+import logging
+from collections import namedtuple
+from typing import Dict, List, Optional, Tuple
+
+from scapy.all import conf, sr
+from scapy.layers.inet import ICMP, IP, UDP
+
+from .base import BaseScanner
+from .rangeset import contains_address
+from ..fields import ip_to_int
+
+logger = logging.getLogger(__name__)
+
+TRACE_DPORT = 33434
+TRACE_SPORT = 50000
+
+# 单个探测的应答：响应地址、往返时间(ms)、是否为目标本身、应答TTL、是否为终止应答（不可达）
+Reply = namedtuple('Reply', ['ip', 'rtt', 'reached', 'ttl', 'final'])
+
+
+class _Trace:
+    """单个目标的探测状态"""
+
+    def __init__(self, destination: str, start_ttl: int):
+        self.destination = destination
+        self.start_ttl = start_ttl
+        self.forward_ttl = start_ttl
+        self.backward_ttl = start_ttl - 1
+        self.forward_done = False
+        self.backward_done = start_ttl <= 1
+        # 回溯因遇到共享接口而提前停止，近端路径由其他目标的结果覆盖
+        self.joined = False
+        self.gap = 0
+        self.hops: Dict[int, Tuple[str, float]] = {}
+        self.reply: Optional[Reply] = None
+
+    def next_ttl(self) -> Optional[int]:
+        if not self.forward_done:
+            return self.forward_ttl
+        if not self.backward_done:
+            return self.backward_ttl
+        return None
+
+
+class TracerouteScanner(BaseScanner):
+    """基于Scapy的并行Paris traceroute"""
+
+    # 每次 sr() 发出的最大探测数
+    BATCH_SIZE = 512
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.timeout = self.options.get('timeout', 2)
+        self.max_ttl = self.options.get('max_ttl', 30)
+        self.start_ttl = max(1, min(self.options.get('start_ttl', 3), self.max_ttl))
+        self.gap_limit = self.options.get('gap_limit', 3)
+        self.probe_protocol = self.options.get('probe_protocol', 'udp')
+        # 流标识决定探测的五元组，同一任务内保持不变
+        self.flow_id = self.options.get('flow_id', 0)
+        self.source = self.options.get('source', '')
+
+        self.traces: Dict[str, _Trace] = {}
+        # 已发现的接口 -> 最先发现它的目标（Doubletree的本地停止集合）
+        self.stop_set: Dict[str, str] = {}
+        self.probes_sent = 0
+
+    def execute_scan(self, scan_type: str) -> List[Dict]:
+        if scan_type != 'TRACEROUTE':
+            return [{'error': f'不支持的扫描类型: {scan_type}'}]
+        return self.traceroute()
+
+    def _probe(self, destination: str, ttl: int):
+        """构造探测包，除TTL外所有首部字段对同一目标保持不变"""
+        if self.probe_protocol == 'icmp':
+            return IP(dst=destination, ttl=ttl) / ICMP(id=TRACE_SPORT + self.flow_id, seq=0)
+        return IP(dst=destination, ttl=ttl) / UDP(sport=TRACE_SPORT + self.flow_id,
+                                                  dport=TRACE_DPORT + self.flow_id)
+
+    def _send_round(self, probes: List[Tuple[str, int]]) -> Dict[str, Reply]:
+        """发出一轮探测，返回 目标 -> 应答；每个目标只有一个探测，应答按目标地址匹配"""
+        answered, _ = sr([self._probe(destination, ttl) for destination, ttl in probes],
+                         timeout=self.timeout, verbose=0)
+        replies = {}
+        for sent, received in answered:
+            reached = received.src == sent.dst
+            final = reached or (received.haslayer(ICMP) and received[ICMP].type == 3)
+            replies[sent.dst] = Reply(received.src, round((received.time - sent.sent_time) * 1000, 2),
+                                      reached, received.ttl, final)
+        return replies
+
+    def _source_address(self, destination: str) -> str:
+        try:
+            return conf.route.route(destination)[1]
+        except Exception as e:
+            logger.debug(f"无法确定到 {destination} 的源地址: {e}")
+            return ''
+
+    def _destinations(self) -> List[str]:
+        destinations = []
+        for target in self.target_set():
+            try:
+                ip_to_int(target)
+            except ValueError:
+                logger.warning(f"路由跟踪只支持IP地址目标，跳过: {target}")
+                continue
+            if not contains_address(self.exclusions, target):
+                destinations.append(target)
+        return destinations
+
+    def _record(self, trace: _Trace, ttl: int, reply: Optional[Reply]):
+        forward = not trace.forward_done
+        if reply:
+            trace.hops[ttl] = (reply.ip, reply.rtt)
+
+        if forward:
+            if reply and reply.final:
+                trace.forward_done = True
+                if reply.reached:
+                    trace.reply = reply
+            else:
+                trace.gap = 0 if reply else trace.gap + 1
+                trace.forward_ttl += 1
+                if trace.gap >= self.gap_limit or trace.forward_ttl > self.max_ttl:
+                    trace.forward_done = True
+        else:
+            trace.backward_ttl -= 1
+            if trace.backward_ttl < 1:
+                trace.backward_done = True
+
+        if reply and not reply.reached:
+            owner = self.stop_set.setdefault(reply.ip, trace.destination)
+            if owner != trace.destination and ttl <= trace.start_ttl and not trace.backward_done:
+                trace.backward_done = True
+                trace.joined = True
+
+    def traceroute(self) -> List[Dict]:
+        """
+        对所有目标执行路由跟踪
+
+        Returns:
+            到达的目标各一条 up 结果；逐跳路径保存在 traces 中，见 edges()
+        """
+        destinations = self._destinations()
+        if not destinations:
+            return []
+        if not self.source:
+            self.source = self._source_address(destinations[0])
+        self.traces = {destination: _Trace(destination, self.start_ttl) for destination in destinations}
+        logger.info(f"开始路由跟踪: {len(destinations)} 个目标")
+
+        try:
+            while True:
+                probes = []
+                for trace in self.traces.values():
+                    ttl = trace.next_ttl()
+                    if ttl is not None:
+                        probes.append((trace.destination, ttl))
+                if not probes:
+                    break
+                for i in range(0, len(probes), self.BATCH_SIZE):
+                    batch = probes[i:i + self.BATCH_SIZE]
+                    replies = self._send_round(batch)
+                    self.probes_sent += len(batch)
+                    for destination, ttl in batch:
+                        self._record(self.traces[destination], ttl, replies.get(destination))
+        except Exception as e:
+            logger.error(f"路由跟踪出错: {e}")
+            return [{'error': str(e)}]
+
+        return [
+            {
+                'ip_address': trace.destination,
+                'state': 'up',
+                'rtt': trace.reply.rtt,
+                'ttl': trace.reply.ttl,
+            }
+            for trace in self.traces.values() if trace.reply
+        ]
+
+    def edges(self) -> List[Dict]:
+        """
+        路径上相邻的响应跳组成的有向边，同一条边只保留一次
+
+        metadata 中 ttl 为边终点的跳数，rtt 为到终点的最小往返时间，
+        gap 为两端之间无响应的跳数，destinations 为经过该边的目标数。
+        """
+        edges: Dict[Tuple[str, str], Dict] = {}
+        for trace in self.traces.values():
+            previous = None if trace.joined or not self.source else (0, self.source)
+            for ttl, (ip, rtt) in sorted(trace.hops.items()):
+                if previous and previous[1] != ip:
+                    edge = edges.setdefault((previous[1], ip), {
+                        'source_ip': previous[1],
+                        'destination_ip': ip,
+                        'metadata': {
+                            'ttl': ttl,
+                            'rtt': rtt,
+                            'gap': ttl - previous[0] - 1,
+                            'destinations': 0,
+                            'flow_id': self.flow_id,
+                            'protocol': self.probe_protocol,
+                        },
+                    })
+                    metadata = edge['metadata']
+                    metadata['rtt'] = min(metadata['rtt'], rtt)
+                    metadata['destinations'] += 1
+                previous = (ttl, ip)
+        return list(edges.values())
+
+    def stats(self) -> Dict:
+        return {
+            'destinations': len(self.traces),
+            'reached': sum(1 for trace in self.traces.values() if trace.reply),
+            'probes_sent': self.probes_sent,
+            'interfaces': len(self.stop_set),
+        }
@@ -0,0 +1,271 @@
+"""
+扫描任务调度
+任务不再直接 run_scan_task.delay() 进入默认队列按先进先出执行，而是先在数据库中排队，
+由调度器按优先级类别和用户公平份额决定何时放入Celery队列，同时运行的任务数不超过槽位数。
+
+- 开销按 目标地址数 × 端口数 × 扫描类型权重 估计；未指定优先级时，开销不超过
+  SCAN_INTERACTIVE_COST 的任务归为交互类，否则为普通类；交互类开销超限时降为普通类。
+- 交互类任务独占 SCAN_INTERACTIVE_SLOTS 个保留槽位，且开销有上限，
+  排队时间不超过排在前面的交互任务数 / 保留槽位数 × 单个交互任务的最长执行时间。
+- 同一类别中优先调度当前运行开销最小的用户的任务，排队超过 SCAN_PRIORITY_AGING 秒的任务每次提升一级，避免饥饿。
+- 开销大的任务按分片执行（见 scanner.coalescing 的区域），每片结束时若有更高类别的任务、
+  或运行开销更少的用户在等待且没有空闲槽位，就保存进度让出工作进程，重新排队后从下一片继续。
+- 运行中的任务定期刷新心跳，超过 SCAN_HEARTBEAT_TIMEOUT 秒没有心跳的视为工作进程已退出，判为失败并释放槽位。
+"""
+import logging
+from collections import defaultdict
+from datetime import timedelta
+from typing import Dict, List, Optional
+
+from django.conf import settings
+from django.db.models import Exists, F, OuterRef, Q
+from django.utils import timezone
+
+from .coalescing import parse_ports
+from .exclusions import compile_exclusions
+from .models import ProbeRegion, ScanTask
+from .scanners.rangeset import IntervalSet, TargetSet
+
+logger = logging.getLogger(__name__)
+
+# 每个 (地址, 端口) 探测的相对开销：UDP要等超时，服务和系统识别要发多轮探测
+SCAN_TYPE_WEIGHTS = {
+    'SYN_SCAN': 1,
+    'UDP_SCAN': 4,
+    'OS_DETECTION': 2,
+    'SERVICE_DETECTION': 3,
+    'FULL_SCAN': 6,
+}
+
+# 路由跟踪与端口无关，每个目标按逐跳探测计
+TRACEROUTE_COST = 30
+
+PRIORITY_RANKS = {'INTERACTIVE': 0, 'NORMAL': 1, 'BULK': 2}
+
+DEFAULT_SLOTS = 8
+DEFAULT_INTERACTIVE_SLOTS = 2
+DEFAULT_INTERACTIVE_COST = 20000
+DEFAULT_SHARD_COST = 100000
+DEFAULT_AGING = 1800
+DEFAULT_DISPATCH_TIMEOUT = 600
+DEFAULT_HEARTBEAT_TIMEOUT = 3600
+
+
+def _setting(name: str, default):
+    return getattr(settings, name, default)
+
+
+def estimate_cost(task: ScanTask, exclusions: IntervalSet = None) -> int:
+    """按 目标地址数 × 端口数 × 扫描类型权重 估计任务开销，域名按一个地址计"""
+    if exclusions is None:
+        exclusions = compile_exclusions(task)
+    targets = TargetSet.parse(task.target)
+    hosts = len(targets.addresses.subtract(exclusions)) + len(targets.names)
+    if task.scan_type == 'TRACEROUTE':
+        return hosts * TRACEROUTE_COST
+    return hosts * max(1, len(parse_ports(task.ports))) * SCAN_TYPE_WEIGHTS.get(task.scan_type, 1)
+
+
+def classify(cost: int, requested: Optional[str] = None) -> str:
+    """优先级类别：交互类有开销上限，超限的降为普通类"""
+    limit = _setting('SCAN_INTERACTIVE_COST', DEFAULT_INTERACTIVE_COST)
+    if requested not in PRIORITY_RANKS:
+        return 'INTERACTIVE' if cost <= limit else 'NORMAL'
+    if requested == 'INTERACTIVE' and cost > limit:
+        logger.info(f"任务开销 {cost} 超过交互类上限 {limit}，按普通优先级调度")
+        return 'NORMAL'
+    return requested
+
+
+def shard_probes(task: ScanTask) -> Optional[int]:
+    """每个分片的 (地址, 端口) 数，不能按区域执行的任务（增量、路由跟踪）返回None"""
+    if task.incremental or task.scan_type not in SCAN_TYPE_WEIGHTS:
+        return None
+    return max(1, _setting('SCAN_SHARD_COST', DEFAULT_SHARD_COST) // SCAN_TYPE_WEIGHTS[task.scan_type])
+
+
+def effective_rank(task: ScanTask, now=None) -> int:
+    """优先级按排队时长老化，每等待一个老化周期提升一级"""
+    rank = PRIORITY_RANKS.get(task.priority, PRIORITY_RANKS['NORMAL'])
+    if not task.queued_at:
+        return rank
+    aging = _setting('SCAN_PRIORITY_AGING', DEFAULT_AGING)
+    waited = ((now or timezone.now()) - task.queued_at).total_seconds()
+    return max(0, rank - int(waited // aging)) if aging > 0 else rank
+
+
+def active_tasks():
+    """
+    占用槽位的任务：已调度未开始的和正在运行的
+
+    自己的区域已探测完、只在等待重叠任务分发结果的任务不占用工作进程，不计入。
+    """
+    pending = ProbeRegion.objects.filter(task=OuterRef('pk'), status='PENDING')
+    waiting = Exists(pending.exclude(source=OuterRef('pk'))) & ~Exists(pending.filter(source=OuterRef('pk')))
+    return (
+        ScanTask.objects
+        .filter(Q(status='RUNNING') | Q(status='PENDING', dispatched_at__isnull=False))
+        .exclude(waiting)
+    )
+
+
+def reclaim_stale(now=None) -> List[int]:
+    """
+    工作进程异常退出后停在运行中的任务判为失败，释放占用的槽位
+
+    心跳在开始运行、每个分片结束和每批结果入库时刷新，没有心跳记录的按开始时间计。
+    订阅了这些任务结果的区域由 release_stale_regions 改为自行补扫。
+
+    Returns:
+        判为失败的任务ID
+    """
+    now = now or timezone.now()
+    timeout = _setting('SCAN_HEARTBEAT_TIMEOUT', DEFAULT_HEARTBEAT_TIMEOUT)
+    cutoff = now - timedelta(seconds=timeout)
+    silent = Q(heartbeat_at__lt=cutoff) | Q(heartbeat_at__isnull=True, started_at__lt=cutoff)
+    stale = list(active_tasks().filter(silent, status='RUNNING').values_list('id', flat=True))
+    if stale:
+        # 条件更新，判定之后刚刷新了心跳的任务不受影响
+        ScanTask.objects.filter(silent, pk__in=stale, status='RUNNING').update(status='FAILED')
+        logger.warning(f"任务 {stale} 超过 {timeout} 秒没有心跳，工作进程可能已退出，判为失败")
+    return stale
+
+
+def queued_tasks():
+    """已提交、等待调度的任务"""
+    return ScanTask.objects.filter(status='PENDING', queued_at__isnull=False, dispatched_at__isnull=True)
+
+
+class SchedulerState:
+    """一次调度决策看到的槽位占用和各用户的运行开销"""
+
+    def __init__(self, now=None):
+        self.now = now or timezone.now()
+        self.slots = _setting('SCAN_SCHEDULER_SLOTS', DEFAULT_SLOTS)
+        self.general_slots = self.slots - _setting('SCAN_INTERACTIVE_SLOTS', DEFAULT_INTERACTIVE_SLOTS)
+        self.busy = 0
+        self.general_busy = 0
+        self.usage: Dict[Optional[int], int] = defaultdict(int)
+        for priority, user_id, cost in active_tasks().values_list('priority', 'created_by_id', 'estimated_cost'):
+            self.occupy(priority, user_id, cost)
+        self.waiting: List[ScanTask] = list(queued_tasks().order_by('queued_at', 'id'))
+
+    def occupy(self, priority: str, user_id: Optional[int], cost: int):
+        self.busy += 1
+        if priority != 'INTERACTIVE':
+            self.general_busy += 1
+        self.usage[user_id] += cost
+
+    def admissible(self, task: ScanTask) -> bool:
+        """有可用槽位：普通和批量任务不能占用交互类的保留槽位"""
+        if self.busy >= self.slots:
+            return False
+        return task.priority == 'INTERACTIVE' or self.general_busy < self.general_slots
+
+    def key(self, task: ScanTask):
+        return effective_rank(task, self.now), self.usage[task.created_by_id], task.queued_at, task.id
+
+    def next_task(self) -> Optional[ScanTask]:
+        candidates = [task for task in self.waiting if self.admissible(task)]
+        return min(candidates, key=self.key) if candidates else None
+
+
+def submit(task: ScanTask, priority: Optional[str] = None) -> ScanTask:
+    """
+    提交任务排队，随后尝试调度
+
+    Args:
+        priority: 请求的优先级类别，为None时按估计开销自动归类
+    """
+    task.estimated_cost = estimate_cost(task)
+    task.priority = classify(task.estimated_cost, priority)
+    task.status = 'PENDING'
+    task.queued_at = timezone.now()
+    task.dispatched_at = None
+    task.save(update_fields=['estimated_cost', 'priority', 'status', 'queued_at', 'dispatched_at'])
+    logger.info(f"任务 {task.id} 已提交：{task.get_priority_display()}优先级，估计开销 {task.estimated_cost}")
+    dispatch()
+    return task
+
+
+def dispatch(now=None) -> List[int]:
+    """
+    把排队的任务放入Celery队列直到槽位占满
+
+    Returns:
+        本次调度的任务ID
+    """
+    from .tasks import run_scan_task  # 延迟导入，避免循环依赖
+
+    now = now or timezone.now()
+    # 调度后长时间没有开始的任务（队列消息丢失）重新排队
+    timeout = timedelta(seconds=_setting('SCAN_DISPATCH_TIMEOUT', DEFAULT_DISPATCH_TIMEOUT))
+    ScanTask.objects.filter(status='PENDING', dispatched_at__lt=now - timeout).update(dispatched_at=None)
+    # 开始运行后失去心跳的任务（工作进程退出）释放槽位
+    reclaim_stale(now)
+
+    state = SchedulerState(now)
+    dispatched = []
+    while True:
+        task = state.next_task()
+        if task is None:
+            break
+        state.waiting.remove(task)
+        # 条件更新认领，并发调度时每个任务只会被放入队列一次
+        if not queued_tasks().filter(pk=task.pk).update(dispatched_at=now):
+            continue
+        run_scan_task.delay(task.id)
+        state.occupy(task.priority, task.created_by_id, task.estimated_cost)
+        dispatched.append(task.id)
+    if dispatched:
+        logger.info(f"已调度 {len(dispatched)} 个扫描任务，占用 {state.busy}/{state.slots} 个槽位")
+    return dispatched
+
+
+def should_yield(task: ScanTask, now=None) -> bool:
+    """
+    分片边界上是否让出工作进程
+
+    交互类任务不让出。没有空闲槽位时，等待中有更高类别的任务，
+    或同类别中有运行开销比本用户让出本任务后还少的用户，则让出。
+    """
+    if task.priority == 'INTERACTIVE':
+        return False
+    state = SchedulerState(now)
+    if not state.waiting:
+        return False
+    # 槽位还有空闲时由 dispatch 直接放行等待的任务
+    if any(state.admissible(waiting) for waiting in state.waiting):
+        return False
+    rank = effective_rank(task, state.now)
+    remaining = state.usage[task.created_by_id] - task.estimated_cost
+    for waiting in state.waiting:
+        waiting_rank = effective_rank(waiting, state.now)
+        if waiting_rank < rank:
+            return True
+        if (waiting_rank == rank and waiting.created_by_id != task.created_by_id
+                and state.usage[waiting.created_by_id] < remaining):
+            return True
+    return False
+
+
+def preempt(task: ScanTask):
+    """让出工作进程：任务回到队列，已探测的分片保留，下次从未完成的分片继续"""
+    ScanTask.objects.filter(pk=task.pk).update(
+        status='PENDING', dispatched_at=None, preemptions=F('preemptions') + 1
+    )
+    task.refresh_from_db(fields=['status', 'dispatched_at', 'preemptions'])
+    logger.info(f"任务 {task.id} 在分片边界让出，第 {task.preemptions} 次")
+    dispatch()
+
+
+def scheduling_summary(task: ScanTask) -> Dict:
+    """任务结果摘要中的调度统计"""
+    summary = {
+        'priority': task.priority,
+        'estimated_cost': task.estimated_cost,
+        'preemptions': task.preemptions,
+    }
+    if task.queued_at and task.started_at:
+        summary['queued_seconds'] = round(max(0.0, (task.started_at - task.queued_at).total_seconds()), 1)
+    return summary
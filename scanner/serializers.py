@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from .models import ScanTask, ScanResult
+from .models import ScanTask, ScanResult, ExposureSnapshot, ChangeEvent
 
 class ScanTaskSerializer(serializers.ModelSerializer):
     """扫描任务序列化器"""
@@ -10,8 +10,8 @@ class ScanTaskSerializer(serializers.ModelSerializer):
     class Meta:
         model = ScanTask
         fields = [
-            'id', 'name', 'target', 'scan_type', 'status', 'status_display',
-            'progress', 'result_summary', 'created_at', 'started_at', 
+            'id', 'name', 'target', 'scan_type', 'incremental', 'baseline_task',
+            'status', 'status_display', 'progress', 'result_summary', 'created_at', 'started_at', 
             'completed_at', 'duration', 'created_by_name'
         ]
     
@@ -22,6 +22,10 @@ class ScanTaskSerializer(serializers.ModelSerializer):
 class ScanResultSerializer(serializers.ModelSerializer):
     """扫描结果序列化器"""
     task_name = serializers.CharField(source='task.name', read_only=True)
+    # 主机属性来自ScanHost，保持原有的扁平输出结构
+    hostname = serializers.CharField(source='host.hostname', read_only=True, default='')
+    os_family = serializers.CharField(source='host.os_family', read_only=True, default='')
+    os_version = serializers.CharField(source='host.os_version', read_only=True, default='')
     
     class Meta:
         model = ScanResult
@@ -29,4 +33,28 @@ class ScanResultSerializer(serializers.ModelSerializer):
             'id', 'task', 'task_name', 'ip_address', 'hostname', 'port',
             'protocol', 'state', 'service', 'service_version', 'ttl', 'rtt',
             'os_family', 'os_version', 'discovered_at'
-        ]
\ No newline at end of file
+        ]
+
+class ExposureSnapshotSerializer(serializers.ModelSerializer):
+    """当前暴露面序列化器"""
+    ip_address = serializers.CharField(read_only=True)
+    
+    class Meta:
+        model = ExposureSnapshot
+        fields = [
+            'ip_address', 'port', 'protocol', 'state', 'service', 'service_version',
+            'first_seen', 'last_seen', 'last_task'
+        ]
+
+
+class ChangeEventSerializer(serializers.ModelSerializer):
+    """变化事件序列化器"""
+    ip_address = serializers.CharField(read_only=True)
+    change_type_display = serializers.CharField(source='get_change_type_display', read_only=True)
+    
+    class Meta:
+        model = ChangeEvent
+        fields = [
+            'id', 'task', 'ip_address', 'port', 'protocol', 'change_type', 'change_type_display',
+            'old_state', 'new_state', 'old_service', 'new_service', 'created_at'
+        ]
@@ -2,8 +2,21 @@ from celery import shared_task
 from celery.exceptions import MaxRetriesExceededError
 from django.utils import timezone
 import logging
-from .models import ScanTask, ScanResult
-from .scanners import NMAPScanner, ScapyScanner
+from .models import ProbeRegion, ScanTask, ScanResult
+from .scanners import NMAPScanner, RTTScanner, ScapyScanner, TracerouteScanner
+from .ingest import save_scan_results, save_topology
+from .exposure import refresh_exposure
+from .identity import update_identities
+from .coalescing import (claim_completion, coalescing_summary, deliver_available, deliver_region, fan_out,
+                         finish_shard, is_ready, orphaned_regions, own_regions, plan_task, probe_block, probe_region,
+                         region_block, stale_regions)
+from .scheduling import dispatch, preempt, scheduling_summary, shard_probes, should_yield
+from .incremental import IncrementalScan, find_baseline
+from .liveness import LivenessCache
+from .exclusions import compile_exclusions
+from .enrichment import enrich_task
+from .resolver import AsyncResolver, fill_hostnames, resolve_target
+from .vantage import dispatch_measurements, save_measurements
 
 logger = logging.getLogger(__name__)
 
@@ -16,75 +29,170 @@ def run_scan_task(self, task_id):
         task_id: ScanTask实例的ID
         self: Celery任务实例，用于重试和状态更新
     """
-    #添加任务验证
-    if task.status == 'RUNNING':
-        logger.warning(f"任务 {task_id} 已经在运行中")
-        return {
-            'task_id': task_id,
-            'status': 'skipped', 
-            'message': '任务已在运行中'
-        }
-    
-    if task.status == 'COMPLETED' and not task.result_summary:
-        logger.info(f"任务 {task_id} 已完成但无结果，重新执行")
-        task.reset_task()
-    
     try:
         # 获取扫描任务实例
         task = ScanTask.objects.get(id=task_id)
-        logger.info(f"开始执行扫描任务: {task.name} (ID: {task_id})")
+        
+        # 任务验证
+        if task.status == 'RUNNING':
+            logger.warning(f"任务 {task_id} 已经在运行中")
+            return {
+                'task_id': task_id,
+                'status': 'skipped', 
+                'message': '任务已在运行中'
+            }
+        
+        if task.status == 'COMPLETED' and not task.result_summary:
+            logger.info(f"任务 {task_id} 已完成但无结果，重新执行")
+            task.reset_task()
+        
+        # 在分片边界让出过的任务保留了执行计划，从未完成的分片继续
+        resuming = task.status == 'PENDING' and task.probe_regions.filter(source=task).exists()
+        
+        logger.info(f"{'继续' if resuming else '开始'}执行扫描任务: {task.name} (ID: {task_id})")
         
         # 更新任务状态为运行中
         task.status = 'RUNNING'
-        task.started_at = timezone.now()
+        task.heartbeat_at = timezone.now()
+        if not resuming:
+            task.started_at = timezone.now()
         task.save()
         
-        # 根据扫描类型选择合适的扫描器
+        # 全局和任务级排除范围，在生成探测之前从目标中减去
+        exclusions = compile_exclusions(task)
+        
+        # 目标中的域名先并发解析为地址，扫描器不再逐个同步解析
+        resolver = AsyncResolver()
+        target, target_names = resolve_target(task.target, resolver)
+        
+        # 整个任务共用一个无响应缓存，各分片、增量扫描的命中统计汇总到结果摘要
+        liveness = LivenessCache.for_options(task.options)
+        
+        # 增量任务有可用基线时只完整扫描新增或变化的主机
+        incremental = None
         scanner = None
-        if task.scan_type in ['SYN_SCAN', 'UDP_SCAN']:
-            scanner = ScapyScanner(target=task.target, ports=task.ports)
+        regional = resuming
+        total_shards = 0
+        if task.incremental and task.scan_type == 'TRACEROUTE':
+            logger.info(f"任务 {task_id} 为路由跟踪，不支持增量扫描，执行完整扫描")
+        elif task.incremental:
+            baseline = find_baseline(task)
+            if baseline:
+                incremental = IncrementalScan(task, baseline, exclusions=exclusions, target=target,
+                                              liveness=liveness)
+            else:
+                logger.info(f"任务 {task_id} 没有可用的基线任务，执行完整扫描")
+        
+        # 与同时期的重叠任务合并：重叠区域订阅对方的结果，只探测剩余区域；
+        # 开销大的任务按分片执行，分片之间可以让出工作进程
+        if not incremental and not resuming:
+            regional = bool(plan_task(task, target, exclusions, shard_probes(task)))
+        
+        if incremental:
+            results = incremental.execute()
+        elif regional:
+            deliver_available(task)
+            shards = own_regions(task)
+            total_shards = task.probe_regions.filter(source=task).count()
+            for index, region in enumerate(shards, 1):
+                shard_results = probe_block(task, *region_block(region), exclusions, liveness=liveness)
+                fill_hostnames(shard_results, target_names, resolver,
+                               reverse=task.options.get('reverse_dns', True))
+                finish_shard(region, save_scan_results(task, shard_results))
+                task.progress = min(90, int((total_shards - len(shards) + index) / total_shards * 90))
+                task.heartbeat_at = timezone.now()
+                task.save(update_fields=['progress', 'heartbeat_at'])
+                if index < len(shards) and should_yield(task):
+                    preempt(task)
+                    return {
+                        'task_id': task_id,
+                        'status': 'preempted',
+                        'message': f'已在分片边界让出，完成 {total_shards - len(shards) + index}/{total_shards} 个分片'
+                    }
+            results = []
         else:
-            scanner = NMAPScanner(target=task.target, ports=task.ports, options=task.options)
+            # 根据扫描类型选择合适的扫描器
+            if task.scan_type in ['SYN_SCAN', 'UDP_SCAN']:
+                scanner = ScapyScanner(target=target, ports=task.ports, options=task.options,
+                                       exclusions=exclusions, liveness=liveness)
+            elif task.scan_type == 'TRACEROUTE':
+                scanner = TracerouteScanner(target=target, ports=task.ports, options=task.options,
+                                            exclusions=exclusions)
+            else:
+                scanner = NMAPScanner(target=target, ports=task.ports, options=task.options,
+                                      exclusions=exclusions)
+            
+            # 执行扫描并获取结果
+            results = scanner.execute_scan(scan_type=task.scan_type)
+        
+        # 补全主机名：目标写的是域名时用原域名，其余地址批量反向解析
+        fill_hostnames(results, target_names, resolver,
+                       reverse=task.options.get('reverse_dns', True))
+        
+        # 批量保存扫描结果到数据库，每批写入后更新一次进度
+        total = len(results)
         
-        # 执行扫描并获取结果
-        results = scanner.execute_scan(scan_type=task.scan_type)
+        def update_progress(saved):
+            task.progress = min(90, int((saved / total) * 90))
+            task.heartbeat_at = timezone.now()
+            task.save(update_fields=['progress', 'heartbeat_at'])
         
-        # 保存扫描结果到数据库
-        saved_count = 0
-        for result_data in results:
+        saved_count = save_scan_results(task, results, progress_callback=update_progress)
+        if incremental:
+            incremental.carry_forward()
+        if isinstance(scanner, TracerouteScanner):
+            save_topology(task, scanner.edges())
+            # 别名解析需要多轮探测，单独排队执行
+            if task.options.get('alias_resolution', True):
+                resolve_router_aliases.delay(task.id)
+        
+        # 指定了探测点时，各探测点测量目标的RTT用于地理定位
+        if task.options.get('vantage_points'):
             try:
-                # 创建扫描结果记录
-                ScanResult.objects.create(task=task, **result_data)
-                saved_count += 1
-                
-                # 更新任务进度（每保存10条记录更新一次进度）
-                if saved_count % 10 == 0:
-                    progress = min(90, int((saved_count / len(results)) * 90))
-                    task.progress = progress
-                    task.save()
-                    
+                dispatch_measurements(task, target)
             except Exception as e:
-                logger.error(f"保存扫描结果失败: {e}")
-                continue
-        
-        # 更新任务状态为完成
-        task.status = 'COMPLETED'
-        task.progress = 100
-        task.completed_at = timezone.now()
-        
-        # 生成结果摘要
-        open_ports = ScanResult.objects.filter(task=task, state='open').count()
-        unique_hosts = ScanResult.objects.filter(task=task).values('ip_address').distinct().count()
-        
-        task.result_summary = {
-            'total_results': saved_count,
-            'open_ports': open_ports,
-            'unique_hosts': unique_hosts,
-            'scan_duration': str(task.get_duration()) if task.get_duration() else None
-        }
-        task.save()
+                logger.error(f"分发RTT测量失败: {e}")
         
-        logger.info(f"扫描任务完成: {task.name}，共保存 {saved_count} 条结果")
+        # 本次运行的统计，与结果摘要一起保存
+        extra = {}
+        if incremental:
+            extra['incremental'] = incremental.summary()
+        if liveness.enabled and liveness.lookups:
+            extra['liveness_cache'] = liveness.stats()
+        if isinstance(scanner, TracerouteScanner):
+            extra['traceroute'] = scanner.stats()
+        if resolver.lookups:
+            extra['dns'] = resolver.stats()
+        if task.queued_at:
+            extra['scheduling'] = scheduling_summary(task)
+        if total_shards > 1:
+            extra['shards'] = total_shards
+        
+        # 订阅的区域还有未送达的，由来源任务完成时分发并完成本任务
+        if regional:
+            # 运行统计先保存，结果收齐后由完成任务的一方写入摘要
+            task.result_summary = extra
+            task.save(update_fields=['result_summary'])
+            for region in deliver_available(task):
+                probe_region(region)
+            if not is_ready(task):
+                logger.info(f"任务 {task_id} 自有区域探测完成，等待重叠任务的结果")
+                dispatch()
+                return {
+                    'task_id': task_id,
+                    'status': 'waiting',
+                    'results_count': saved_count,
+                    'message': '等待重叠任务的结果'
+                }
+            if not claim_completion(task):
+                return {
+                    'task_id': task_id,
+                    'status': 'skipped',
+                    'message': '任务已由结果分发完成'
+                }
+            saved_count = ScanResult.objects.filter(task=task).count()
+        
+        complete_scan_task(task, saved_count, extra)
         return {
             'task_id': task_id,
             'status': 'completed',
@@ -111,6 +219,14 @@ def run_scan_task(self, task_id):
         except:
             pass
         
+        # 订阅了本任务结果的重叠任务改为自行补扫，空出的槽位调度排队的任务
+        try:
+            for region_id in orphaned_regions(task):
+                probe_coalesced_region.delay(region_id)
+            dispatch()
+        except Exception as e:
+            logger.error(f"释放合并扫描订阅失败: {e}")
+        
         # 尝试重试任务
         try:
             raise self.retry(exc=exc, countdown=60)
@@ -123,6 +239,240 @@ def run_scan_task(self, task_id):
             }
 
 
+def complete_scan_task(task, saved_count, extra=None):
+    """
+    完成扫描任务：生成结果摘要，补全归属信息，合并进暴露面和设备身份索引，
+    再把结果分发给订阅了本任务的重叠任务
+    
+    Args:
+        saved_count: 任务保存的结果条数
+        extra: 附加到结果摘要中的运行统计
+    """
+    # 更新任务状态为完成
+    task.status = 'COMPLETED'
+    task.progress = 100
+    task.completed_at = timezone.now()
+    
+    # 生成结果摘要
+    task_results = task.effective_results()
+    open_ports = task_results.filter(state='open').count()
+    unique_hosts = task_results.values('ip_address').distinct().count()
+    
+    task.result_summary = {
+        'total_results': saved_count,
+        'open_ports': open_ports,
+        'unique_hosts': unique_hosts,
+        'scan_duration': str(task.get_duration()) if task.get_duration() else None
+    }
+    task.result_summary.update(extra or {})
+    if task.probe_regions.exclude(source=task).exists():
+        task.result_summary['coalescing'] = coalescing_summary(task)
+    task.save()
+    
+    # 补全归属信息，未编译IP归属索引时跳过
+    try:
+        enrich_task(task)
+    except Exception as e:
+        logger.error(f"补全归属信息失败: {e}")
+    
+    # 合并进当前暴露面，失败不影响任务本身的结果
+    try:
+        refresh_exposure(task)
+    except Exception as e:
+        logger.error(f"更新当前暴露面失败: {e}")
+    
+    # 按设备特征合并进设备身份索引
+    try:
+        update_identities(task)
+    except Exception as e:
+        logger.error(f"更新设备身份索引失败: {e}")
+    
+    # 分发给订阅了本任务结果的重叠任务，收齐结果的任务排队完成
+    try:
+        for subscriber_id in fan_out(task):
+            finalize_coalesced_task.delay(subscriber_id)
+    except Exception as e:
+        logger.error(f"分发合并扫描结果失败: {e}")
+    
+    # 空出的槽位调度排队的任务
+    try:
+        dispatch()
+    except Exception as e:
+        logger.error(f"调度扫描任务失败: {e}")
+    
+    logger.info(f"扫描任务完成: {task.name}，共保存 {saved_count} 条结果")
+
+
+@shared_task
+def finalize_coalesced_task(task_id):
+    """订阅的结果全部送达后完成等待中的任务"""
+    try:
+        task = ScanTask.objects.get(id=task_id)
+    except ScanTask.DoesNotExist:
+        return f"扫描任务不存在: {task_id}"
+    
+    if task.status != 'RUNNING' or not is_ready(task) or not claim_completion(task):
+        return f"任务 {task_id} 无需完成"
+    
+    complete_scan_task(task, ScanResult.objects.filter(task=task).count(), task.result_summary)
+    return f"任务 {task_id} 已完成"
+
+
+@shared_task
+def probe_coalesced_region(region_id):
+    """来源任务失败或超时未完成时，订阅者自己探测该区域"""
+    try:
+        region = ProbeRegion.objects.select_related('task', 'source').get(id=region_id)
+    except ProbeRegion.DoesNotExist:
+        return f"合并探测区域不存在: {region_id}"
+    
+    if region.status != 'PENDING':
+        return f"区域 {region_id} 已送达"
+    if region.source is not None and region.source.status == 'COMPLETED':
+        # 来源任务已完成但分发失败，直接复制结果
+        count = deliver_region(region)
+    else:
+        count = probe_region(region)
+    
+    if is_ready(region.task):
+        finalize_coalesced_task(region.task_id)
+    return f"区域 {region_id} 已送达 {count} 条结果"
+
+
+@shared_task
+def release_stale_regions():
+    """定期补扫等待超时或来源任务已失败的订阅区域"""
+    regions = stale_regions()
+    for region_id in regions:
+        probe_coalesced_region.delay(region_id)
+    return f"{len(regions)} 个订阅区域改为自行补扫"
+
+
+@shared_task
+def dispatch_scan_tasks():
+    """定期调度排队的扫描任务，补上因消息丢失或工作进程异常退出而没有触发的调度"""
+    dispatched = dispatch()
+    return f"已调度 {len(dispatched)} 个扫描任务"
+
+
+@shared_task
+def resolve_router_aliases(task_id):
+    """对路由跟踪任务发现的接口做别名解析"""
+    from .topology import resolve_aliases
+    
+    try:
+        task = ScanTask.objects.get(id=task_id)
+    except ScanTask.DoesNotExist:
+        return f"扫描任务不存在: {task_id}"
+    
+    groups = resolve_aliases(task)
+    return f"任务 {task_id} 别名解析完成，合并为 {len(groups)} 台多接口路由器"
+
+
+@shared_task
+def measure_vantage_rtt(task_id, vantage_id, target):
+    """在探测点上测量目标的RTT，由探测点专用队列上的worker执行"""
+    from .models import VantagePoint
+    
+    try:
+        task = ScanTask.objects.get(id=task_id)
+        vantage = VantagePoint.objects.get(id=vantage_id)
+    except (ScanTask.DoesNotExist, VantagePoint.DoesNotExist):
+        return 0
+    
+    scanner = RTTScanner(target=target, ports=task.ports, options=task.options,
+                         exclusions=compile_exclusions(task))
+    count = save_measurements(task, vantage, scanner.measure())
+    logger.info(f"探测点 {vantage.name} 完成任务 {task_id} 的RTT测量: {count} 个目标")
+    return count
+
+
+@shared_task
+def geolocate_targets(results, task_id):
+    """各探测点测量完成后估计目标位置"""
+    from .geolocation import estimate_task
+    
+    try:
+        task = ScanTask.objects.get(id=task_id)
+    except ScanTask.DoesNotExist:
+        return f"扫描任务不存在: {task_id}"
+    
+    count = estimate_task(task)
+    summary = task.result_summary or {}
+    summary['geolocation'] = {'vantage_points': len(results), 'measured': sum(results), 'located': count}
+    task.result_summary = summary
+    task.save(update_fields=['result_summary'])
+    return f"任务 {task_id} 地理定位完成: {count} 个目标"
+
+
+@shared_task
+def refresh_port_rankings():
+    """定时重新计算端口热度排名"""
+    from .port_ranking import refresh_port_rankings as refresh
+    
+    sizes = refresh()
+    return f"端口热度排名已更新: {sizes}"
+
+
+@shared_task
+def refresh_hcf_table():
+    """定时用最近的扫描结果重新编译跳数过滤表"""
+    from .tracing import refresh_hcf_table as refresh
+    
+    table = refresh()
+    return f"跳数表已更新: {len(table)} 个网段"
+
+
+@shared_task
+def ingest_traffic_capture(capture_id):
+    """导入攻击流量抓包文件，按流汇总后写入数据库"""
+    from .models import TrafficCapture
+    from .tracing.pcap import ingest_capture
+    
+    try:
+        capture = TrafficCapture.objects.get(id=capture_id)
+    except TrafficCapture.DoesNotExist:
+        return f"抓包记录不存在: {capture_id}"
+    
+    try:
+        stats = ingest_capture(capture)
+    except Exception as exc:
+        logger.error(f"抓包 {capture_id} 导入失败: {exc}")
+        capture.status = 'FAILED'
+        capture.error_message = str(exc)
+        capture.completed_at = timezone.now()
+        capture.save(update_fields=['status', 'error_message', 'completed_at'])
+        return f"抓包 {capture_id} 导入失败: {exc}"
+    
+    # 与扫描结果关联需要读取整个暴露面，单独排队执行
+    correlate_traffic_capture.delay(capture.id)
+    return f"抓包 {capture_id} 导入完成: {stats['packets']} 个报文，{stats['flows']} 个流"
+
+
+@shared_task
+def correlate_traffic_capture(capture_id):
+    """生成抓包的攻击源关联报告"""
+    from .models import TrafficCapture
+    from .tracing.correlation import correlate_capture
+    
+    try:
+        capture = TrafficCapture.objects.get(id=capture_id, status='COMPLETED')
+    except TrafficCapture.DoesNotExist:
+        return f"抓包不存在或尚未导入完成: {capture_id}"
+    
+    report = correlate_capture(capture)
+    return f"抓包 {capture_id} 关联完成: {report.scanned_count}/{report.source_count} 个攻击源扫描过"
+
+
+@shared_task
+def import_scan_file(path, name=None, file_format=None):
+    """后台导入nmap/masscan输出文件"""
+    from .importers import import_scan_file as run_import
+    
+    stats = run_import(path, name=name, file_format=file_format)
+    return f"{path} 导入完成: 任务 {stats['task_id']}，{stats['rows']} 条结果，{stats['rows_per_second']} 行/秒"
+
+
 @shared_task
 def cleanup_old_tasks(days=30):
     """
@@ -133,9 +483,15 @@ def cleanup_old_tasks(days=30):
     """
     from django.utils import timezone
     from datetime import timedelta
+    from .partitioning import drop_partitions_before
     
     cutoff_date = timezone.now() - timedelta(days=days)
     
+    # 分区表上先整体删除过期分区，剩余结果再随任务级联删除
+    dropped = drop_partitions_before(cutoff_date)
+    if dropped:
+        logger.info(f"已删除 {len(dropped)} 个过期扫描结果分区")
+    
     # 删除旧任务及相关结果
     old_tasks = ScanTask.objects.filter(created_at__lt=cutoff_date)
     task_count = old_tasks.count()
@@ -0,0 +1,79 @@
+"""
+测试用的扫描替身
+
+FakeNetwork 在 sr/sr1 层面模拟网络，ScapyScanner 的扫描逻辑照常执行；
+FakeScanner 替换整个Scapy扫描器，同样接受地址、网段或多个地址组成的目标。
+"""
+from unittest.mock import patch
+
+from scapy.layers.inet import ICMP, IP, TCP, UDP
+
+from scanner.scanners.base import BaseScanner
+
+
+class FakeNetwork:
+    """
+    代替 scapy 的 sr、sr1 和 send，rounds 记录 sr 被调用的轮数
+
+    hosts 中的地址在线：TCP探测 open_ports 中的端口回复SYN-ACK、其余回复RST-ACK，
+    UDP探测开放端口回复UDP、其余回复ICMP端口不可达；firewalled 中的地址一律回复ICMP管理禁止；
+    其他地址没有响应。
+    """
+
+    def __init__(self, hosts=(), open_ports=(), firewalled=()):
+        self.hosts = set(hosts)
+        self.open_ports = set(open_ports)
+        self.firewalled = set(firewalled)
+        self.probes = []
+        self.rounds = 0
+
+    def sr1(self, pkt, *args, **kwargs):
+        dst = str(pkt[IP].dst)
+        layer = TCP if pkt.haslayer(TCP) else UDP
+        port = pkt[layer].dport
+        self.probes.append((dst, port))
+        if dst in self.firewalled:
+            return IP(src=dst) / ICMP(type=3, code=13)
+        if dst not in self.hosts:
+            return None
+        is_open = (dst, port) in self.open_ports
+        if layer is TCP:
+            return IP(src=dst) / TCP(sport=port, flags='SA' if is_open else 'RA')
+        return IP(src=dst) / (UDP(sport=port) if is_open else ICMP(type=3, code=3))
+
+    def sr(self, packets, *args, **kwargs):
+        self.rounds += 1
+        answered, unanswered = [], []
+        for pkt in packets:
+            resp = self.sr1(pkt)
+            if resp is None:
+                unanswered.append(pkt)
+            else:
+                answered.append((pkt, resp))
+        return answered, unanswered
+
+    def patch(self):
+        return patch.multiple('scanner.scanners.scapy_scanner', sr=self.sr, sr1=self.sr1,
+                              send=lambda *args, **kwargs: None)
+
+
+class FakeScanner(BaseScanner):
+    """
+    代替 ScapyScanner，每个 (地址, 端口) 都报告开放，并记录探测过的目标
+
+    与 ScapyScanner 相同，目标可以是地址、网段或多个地址，结果按单个地址逐条报告。
+    """
+    probes = []
+
+    def __init__(self, *args, liveness=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.liveness = liveness
+
+    def execute_scan(self, scan_type):
+        results = []
+        for ip in self.target_set():
+            for port in self.port_set():
+                FakeScanner.probes.append((ip, port))
+                results.append({'ip_address': ip, 'port': port, 'state': 'open', 'service': 'fake',
+                                'mac_address': 'aa:bb:cc:00:00:01'})
+        return results
@@ -0,0 +1,101 @@
+import random
+
+from django.test import TestCase
+
+from scanner.models import NetworkTopology, RouterInterface, ScanTask
+from scanner.topology import alias_map, collapse_edges, resolve_aliases
+from scanner.topology.aliases import (
+    AliasProber, candidate_pairs, ipid_velocity, monotonic_bounds_test,
+)
+
+SOURCE, HOP = '10.0.0.1', '10.0.0.254'
+A1, A2, B1, C1, D1, D2 = (
+    '198.51.100.1', '198.51.100.5', '198.51.100.9', '198.51.100.13', '198.51.100.17', '203.0.113.1',
+)
+
+# 接口 -> 路由器，路由器 -> (计数器初值, 每秒增长)
+ROUTER_OF = {HOP: 'H', A1: 'A', A2: 'A', B1: 'B', D1: 'D'}
+COUNTERS = {'H': (500, 400.0), 'A': (1000, 50.0), 'B': (30000, 50.0), 'D': (7000, 5.0)}
+
+
+class FakeProber(AliasProber):
+    """按共享计数器模拟路由器的IP-ID，C1的IP-ID随机，探测D1时应答来自D2"""
+
+    def __init__(self):
+        super().__init__({'alias_rounds': 6}, sleep=lambda seconds: None)
+        self.round = 0
+        self.sent = {router: 0 for router in COUNTERS}
+        self.rng = random.Random(7)
+
+    def _send_round(self, targets):
+        replies = {}
+        for i, target in enumerate(targets):
+            at = self.round * 1.0 + i * 0.001
+            if target == C1:
+                replies[target] = (at, self.rng.randrange(65536), target)
+                continue
+            router = ROUTER_OF[target]
+            start, velocity = COUNTERS[router]
+            self.sent[router] += 1
+            ipid = int(start + velocity * at + self.sent[router]) % 65536
+            replies[target] = (at, ipid, D2 if target == D1 else target)
+        self.round += 1
+        return replies
+
+
+class AliasResolutionTest(TestCase):
+    """路由器别名解析测试"""
+
+    def setUp(self):
+        self.task = ScanTask.objects.create(name='trace', target='203.0.113.0/24', scan_type='TRACEROUTE')
+        edges = [
+            (SOURCE, HOP, 1), (HOP, A1, 2), (HOP, A2, 2), (HOP, B1, 2), (HOP, C1, 2), (A1, D1, 3),
+        ]
+        NetworkTopology.objects.bulk_create([
+            NetworkTopology(task=self.task, source_ip=source, destination_ip=destination,
+                            connection_type='traceroute', metadata={'ttl': ttl, 'gap': 0})
+            for source, destination, ttl in edges
+        ])
+
+    def test_velocity(self):
+        """随机或不变的IP-ID没有速度"""
+        self.assertAlmostEqual(ipid_velocity([(0, 100), (1, 150), (2, 200), (3, 250)]), 50.0)
+        self.assertAlmostEqual(ipid_velocity([(0, 65500), (1, 14), (2, 64), (3, 114)]), 50.0)
+        self.assertIsNone(ipid_velocity([(0, 5), (1, 5), (2, 5), (3, 5)]))
+        self.assertIsNone(ipid_velocity([(0, 5), (1, 40000), (2, 7), (3, 30000)]))
+        self.assertIsNone(ipid_velocity([(0, 5), (1, 6)]))
+
+    def test_monotonic_bounds(self):
+        """共享计数器的样本交错后仍单调，不同计数器则出现跳变"""
+        first = [(0.0, 100), (1.0, 150), (2.0, 200)]
+        self.assertTrue(monotonic_bounds_test(first + [(0.5, 126), (1.5, 176)], 50.0))
+        self.assertFalse(monotonic_bounds_test(first + [(0.5, 30000), (1.5, 30050)], 50.0))
+
+    def test_candidate_pruning(self):
+        """只配对速度相近、跳数相差不超过1且不相邻的接口"""
+        interfaces = {
+            'a': (3, 50.0), 'b': (3, 52.0), 'c': (9, 51.0), 'd': (3, 400.0), 'e': (4, 50.5),
+        }
+        pairs = {frozenset(pair) for pair in candidate_pairs(interfaces, {frozenset(('a', 'e'))})}
+        self.assertEqual(pairs, {frozenset(('a', 'b')), frozenset(('b', 'e'))})
+
+    def test_resolve_aliases(self):
+        """同一计数器和共同源地址的接口合并，其余保持独立"""
+        groups = resolve_aliases(self.task, FakeProber())
+
+        self.assertEqual(sorted(sorted(group) for group in groups), [[A1, A2], [D1, D2]])
+        aliases = alias_map(self.task)
+        self.assertEqual(aliases[A2], A1)
+        self.assertEqual(aliases[D2], D1)
+        self.assertNotIn(B1, aliases)
+        self.assertEqual(RouterInterface.objects.get(task=self.task, ip_address=D1).evidence, 'source')
+        self.assertEqual(RouterInterface.objects.get(task=self.task, ip_address=A2).evidence, 'ipid')
+
+        # 重新解析时替换旧结果
+        resolve_aliases(self.task, FakeProber())
+        self.assertEqual(RouterInterface.objects.filter(task=self.task).count(), 4)
+
+    def test_collapse_edges(self):
+        """合并后的边去掉自环和重复"""
+        edges = [(HOP, A1), (HOP, A2), (A1, A2), (A2, D1)]
+        self.assertEqual(collapse_edges(edges, {A2: A1}), [(HOP, A1), (A1, D1)])
@@ -0,0 +1,166 @@
+from datetime import timedelta
+from unittest.mock import patch
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from scanner.coalescing import CoalescingPlan, find_sources, subtract_block
+from scanner.fingerprints import fingerprint_cache
+from scanner.ingest import save_scan_results
+from scanner.models import ProbeRegion, ScanResult, ScanTask
+from scanner.scanners.rangeset import IntervalSet, TargetSet
+from scanner.tasks import complete_scan_task, finalize_coalesced_task, probe_coalesced_region, run_scan_task
+from scanner.tests.fakes import FakeNetwork, FakeScanner
+
+
+def endpoints(target, ports):
+    return {(ip, port) for ip in TargetSet.parse(target) for port in IntervalSet.parse(ports)}
+
+
+@patch('scanner.incremental.ScapyScanner', FakeScanner)
+@patch('scanner.tasks.ScapyScanner', FakeScanner)
+@patch('scanner.tasks.finalize_coalesced_task.delay', lambda task_id: finalize_coalesced_task(task_id))
+class ScanCoalescingTest(TestCase):
+    """重叠扫描合并测试"""
+
+    def setUp(self):
+        fingerprint_cache.clear()
+        FakeScanner.probes = []
+
+    def _source(self, status='RUNNING', target='10.0.0.0-10.0.0.7', ports='20-29', **kwargs):
+        """一个先开始、已探测完自己目标的任务"""
+        task = ScanTask.objects.create(name='来源任务', target=target, ports=ports, scan_type='SYN_SCAN',
+                                       status='RUNNING', started_at=timezone.now() - timedelta(minutes=1),
+                                       **kwargs)
+        save_scan_results(task, [{'ip_address': ip, 'port': port, 'state': 'open', 'service': 'ssh'}
+                                 for ip, port in endpoints(target, ports)])
+        if status == 'COMPLETED':
+            complete_scan_task(task, len(endpoints(target, ports)))
+        return task
+
+    def _task(self, target='10.0.0.4-10.0.0.11', ports='25-34', **kwargs):
+        kwargs.setdefault('options', {'reverse_dns': False})
+        return ScanTask.objects.create(name='重叠任务', target=target, ports=ports, scan_type='SYN_SCAN', **kwargs)
+
+    def test_subtract_block(self):
+        """测试矩形区域相减"""
+        block = (IntervalSet([(0, 9)]), IntervalSet([(100, 199)]))
+        shared, rest = subtract_block(block, (IntervalSet([(5, 20)]), IntervalSet([(150, 300)])))
+        self.assertEqual(shared, (IntervalSet([(5, 9)]), IntervalSet([(150, 199)])))
+        self.assertEqual(rest, [(IntervalSet([(0, 4)]), IntervalSet([(100, 199)])),
+                                (IntervalSet([(5, 9)]), IntervalSet([(100, 149)]))])
+        self.assertEqual(sum(len(a) * len(p) for a, p in [shared] + rest), 1000)
+        self.assertEqual(subtract_block(block, (IntervalSet([(10, 20)]), block[1])), (None, [block]))
+
+        plan = CoalescingPlan(None, block)
+        plan.subscribe(None, block)
+        self.assertEqual((plan.own, plan.saved_probes()), ([], 1000))
+
+    def test_completed_source_delivered_immediately(self):
+        """测试来源任务已完成时直接复制重叠部分的结果，只探测剩余部分"""
+        source = self._source(status='COMPLETED')
+        task = self._task()
+        result = run_scan_task(task.id)
+
+        self.assertEqual(result['status'], 'completed')
+        overlap = endpoints('10.0.0.4-10.0.0.7', '25-29')
+        expected = endpoints(task.target, task.ports)
+        self.assertEqual(set(FakeScanner.probes), expected - overlap)
+        self.assertEqual(len(FakeScanner.probes), len(expected - overlap))
+
+        task.refresh_from_db()
+        rows = ScanResult.objects.for_task(task)
+        self.assertEqual({(row.ip_address, row.port) for row in rows}, expected)
+        self.assertEqual(rows.filter(service='ssh').count(), len(overlap))
+        self.assertEqual(task.result_summary['total_results'], len(expected))
+        self.assertEqual(task.result_summary['coalescing'], {
+            'sources': [source.id], 'subscribed_regions': 1, 'delivered_results': len(overlap), 'probed_regions': 0,
+        })
+
+    def test_running_source_fans_out_on_completion(self):
+        """测试来源任务仍在运行时等待，来源完成后分发结果并完成订阅任务"""
+        source = ScanTask.objects.create(name='来源任务', target='10.0.0.0-10.0.0.7', ports='20-29',
+                                         scan_type='SYN_SCAN', status='RUNNING',
+                                         started_at=timezone.now() - timedelta(minutes=1))
+        first, second = self._task(), self._task(target='10.0.0.6', ports='20-21')
+        self.assertEqual(run_scan_task(first.id)['status'], 'waiting')
+        # 整个目标都被来源任务覆盖，不做任何探测
+        probed = len(FakeScanner.probes)
+        self.assertEqual(run_scan_task(second.id)['status'], 'waiting')
+        self.assertEqual(len(FakeScanner.probes), probed)
+
+        first.refresh_from_db()
+        self.assertEqual(first.status, 'RUNNING')
+        save_scan_results(source, [{'ip_address': ip, 'port': port, 'state': 'closed'}
+                                   for ip, port in endpoints(source.target, source.ports)])
+        complete_scan_task(source, 80)
+
+        for task in (first, second):
+            task.refresh_from_db()
+            self.assertEqual(task.status, 'COMPLETED')
+            self.assertEqual(ScanResult.objects.for_task(task).count(), len(endpoints(task.target, task.ports)))
+        self.assertEqual(ScanResult.objects.for_task(second).filter(state='closed').count(), 2)
+        self.assertFalse(ProbeRegion.objects.filter(status='PENDING').exists())
+
+    def test_failed_source_probed_by_subscriber(self):
+        """测试来源任务失败后订阅者自行补扫"""
+        source = ScanTask.objects.create(name='来源任务', target='10.0.0.0-10.0.0.7', ports='20-29',
+                                         scan_type='SYN_SCAN', status='RUNNING',
+                                         started_at=timezone.now() - timedelta(minutes=1))
+        task = self._task()
+        run_scan_task(task.id)
+        ScanTask.objects.filter(pk=source.pk).update(status='FAILED')
+
+        region = ProbeRegion.objects.get(task=task, source=source)
+        probe_coalesced_region(region.id)
+        task.refresh_from_db()
+        self.assertEqual(task.status, 'COMPLETED')
+        self.assertEqual(set(FakeScanner.probes), endpoints(task.target, task.ports))
+        self.assertEqual(task.result_summary['coalescing']['probed_regions'], 1)
+
+    def test_incompatible_tasks_not_coalesced(self):
+        """测试选项不同、超出新鲜度窗口或后开始的任务不合并"""
+        self._source(options={'timeout': 5})
+        stale = self._source()
+        ScanTask.objects.filter(pk=stale.pk).update(started_at=timezone.now() - timedelta(hours=1))
+        task = self._task(status='RUNNING', started_at=timezone.now() - timedelta(minutes=5))
+        self._source()
+        self.assertEqual(find_sources(task), [])
+
+        with override_settings(SCAN_COALESCE_WINDOW=0):
+            run_scan_task(self._task(target='10.0.0.8/29').id)
+        self.assertEqual(len(FakeScanner.probes), 60)
+        self.assertFalse(ProbeRegion.objects.exists())
+
+
+@patch('scanner.tasks.finalize_coalesced_task.delay', lambda task_id: finalize_coalesced_task(task_id))
+class ScapyCoalescingTest(TestCase):
+    """用真实的Scapy扫描器探测区域，只替换 sr 和 sr1"""
+
+    def setUp(self):
+        fingerprint_cache.clear()
+
+    def test_regions_probed_with_scapy(self):
+        """测试自有区域和来源失败后的补扫都按单个地址报告结果，结果全部入库"""
+        source = ScanTask.objects.create(name='来源任务', target='10.0.0.0-10.0.0.7', ports='20-29',
+                                         scan_type='SYN_SCAN', status='RUNNING',
+                                         started_at=timezone.now() - timedelta(minutes=1))
+        task = ScanTask.objects.create(name='重叠任务', target='10.0.0.4-10.0.0.11', ports='25-34',
+                                       scan_type='SYN_SCAN', options={'reverse_dns': False})
+        expected = endpoints(task.target, task.ports)
+        network = FakeNetwork(hosts=[ip for ip, _ in expected], open_ports=[(ip, 25) for ip, _ in expected])
+
+        with network.patch():
+            self.assertEqual(run_scan_task(task.id)['status'], 'waiting')
+            self.assertEqual(set(network.probes), expected - endpoints('10.0.0.4-10.0.0.7', '25-29'))
+            ScanTask.objects.filter(pk=source.pk).update(status='FAILED')
+            probe_coalesced_region(ProbeRegion.objects.get(task=task, source=source).id)
+
+        task.refresh_from_db()
+        self.assertEqual(task.status, 'COMPLETED')
+        self.assertEqual(set(network.probes), expected)
+        self.assertEqual(len(network.probes), len(expected))
+        rows = ScanResult.objects.for_task(task)
+        self.assertEqual({(row.ip_address, row.port) for row in rows}, expected)
+        self.assertEqual(rows.filter(state='open').count(), 8)
+        self.assertFalse(task.probe_regions.filter(status='PENDING').exists())
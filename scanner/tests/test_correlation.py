@@ -0,0 +1,80 @@
+from datetime import datetime, timezone
+
+import numpy as np
+from django.test import TestCase
+from django.utils import timezone as dj_timezone
+
+from scanner.ingest import save_topology
+from scanner.models import AttackFlow, CorrelationReport, ExposureSnapshot, ScanTask, TrafficCapture
+from scanner.tasks import correlate_traffic_capture
+from scanner.tracing import ScannedIndex
+from scanner.tracing.correlation import PrefixHops, correlate
+
+NEAR, FAR, QUIET, UNKNOWN = '198.51.100.10', '203.0.113.5', '192.0.2.50', '8.8.8.8'
+SEEN = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+class CorrelationTest(TestCase):
+    """攻击源关联测试"""
+
+    def setUp(self):
+        endpoints = [
+            (NEAR, 22, 'open', 'ssh'), (NEAR, 80, 'open', 'http'),
+            (FAR, 23, 'open', 'telnet'), (FAR, 8080, 'open', 'http-proxy'),
+            (QUIET, 443, 'closed', ''), ('2001:db8::1', 22, 'open', 'ssh'),
+        ]
+        ExposureSnapshot.objects.bulk_create([
+            ExposureSnapshot(ip_address=ip, port=port, protocol='tcp', state=state, service=service,
+                             first_seen=SEEN, last_seen=SEEN)
+            for ip, port, state, service in endpoints
+        ])
+
+        self.trace = ScanTask.objects.create(name='trace', target=NEAR, scan_type='TRACEROUTE',
+                                             status='COMPLETED', completed_at=dj_timezone.now())
+        save_topology(self.trace, [
+            {'source_ip': '10.0.0.1', 'destination_ip': '192.0.2.1', 'metadata': {}},
+            {'source_ip': '192.0.2.1', 'destination_ip': '198.51.100.1', 'metadata': {}},
+        ])
+
+        self.capture = TrafficCapture.objects.create(name='attack', file_path='/tmp/attack.pcap', status='COMPLETED')
+        flows = [(NEAR, 80, 100, 0), (NEAR, 443, 50, 5), (FAR, 80, 900, 0), (QUIET, 80, 10, 0), (UNKNOWN, 80, 5000, 0)]
+        AttackFlow.objects.bulk_create([
+            AttackFlow(capture=self.capture, src_ip=ip, dst_ip='203.0.113.200', dst_port=port, protocol=6,
+                       packets=packets, bytes=packets * 60, first_seen=SEEN, last_seen=SEEN,
+                       ttl_min=50, ttl_max=50, spoofed_packets=spoofed)
+            for ip, port, packets, spoofed in flows
+        ])
+
+    def test_scanned_index(self):
+        """按地址汇总开放端口数，未扫描过的地址不命中"""
+        index = ScannedIndex.from_exposure()
+        self.assertEqual(len(index), 3)
+        scanned, open_ports = index.lookup(np.array([0xC6336400 + 10, 0x08080808], dtype=np.uint32))
+        self.assertEqual(scanned.tolist(), [True, False])
+        self.assertEqual(open_ports.tolist(), [2, 0])
+
+    def test_ranking(self):
+        """按开放端口数、拓扑距离、报文数排序，同一攻击源的多个流合并"""
+        sources = np.array([1, 2, 2, 3, 4, 5], dtype=np.uint32)
+        index = ScannedIndex.build(np.array([1, 2, 3, 4, 4], dtype=np.uint32), np.array([0, 1, 1, 1, 1]))
+        prefix_hops = PrefixHops(np.array([0], dtype=np.uint32), np.array([3], dtype=np.int16), 30)
+        result = correlate(sources, np.array([10, 1, 1, 7, 3, 9]), np.zeros(6), index, prefix_hops)
+
+        self.assertEqual(result['source_count'], 5)
+        self.assertEqual(result['addresses'].tolist(), [4, 3, 2, 1])
+        self.assertEqual(result['packets'].tolist(), [3, 7, 2, 10])
+        self.assertEqual(result['hops'].tolist(), [-1, 3, 3, 3])
+
+    def test_report(self):
+        """报告列出扫描过的攻击源及其开放端口和拓扑跳数"""
+        correlate_traffic_capture(self.capture.id)
+        report = CorrelationReport.objects.get(capture=self.capture)
+
+        self.assertEqual((report.source_count, report.scanned_count, report.exposed_count), (4, 3, 2))
+        self.assertEqual(report.topology_task, self.trace)
+        self.assertEqual([candidate['ip'] for candidate in report.candidates], [NEAR, FAR, QUIET])
+        near = report.candidates[0]
+        self.assertEqual((near['packets'], near['spoofed_packets'], near['hops']), (150, 5, 2))
+        self.assertEqual([port['port'] for port in near['open_ports']], [22, 80])
+        self.assertIsNone(report.candidates[1]['hops'])
+        self.assertEqual(report.candidates[2]['open_ports'], [])
@@ -0,0 +1,66 @@
+from django.test import TestCase
+
+from scanner.diff import diff_tasks, diff_task_with_exposure
+from scanner.exposure import refresh_exposure
+from scanner.ingest import save_scan_results
+from scanner.models import ScanTask, ChangeEvent, ExposureSnapshot
+
+
+class TaskDiffTest(TestCase):
+    """任务差异与变化事件测试"""
+
+    def _scan(self, results, ports='1-1000'):
+        task = ScanTask.objects.create(name='差异任务', target='10.0.0.0/24', scan_type='TCP_SCAN', ports=ports)
+        save_scan_results(task, results)
+        refresh_exposure(task)
+        return task
+
+    def setUp(self):
+        self.base = self._scan([
+            {'ip_address': '10.0.0.1', 'port': 22, 'state': 'open', 'service': 'ssh'},
+            {'ip_address': '10.0.0.1', 'port': 80, 'state': 'open', 'service': 'http'},
+            {'ip_address': '10.0.0.2', 'port': 443, 'state': 'open', 'service': 'https'},
+        ])
+        self.target = self._scan([
+            {'ip_address': '10.0.0.1', 'port': 22, 'state': 'open', 'service': 'ssh'},
+            {'ip_address': '10.0.0.1', 'port': 80, 'state': 'open', 'service': 'nginx'},
+            {'ip_address': '10.0.0.1', 'port': 8080, 'state': 'open', 'service': 'http-proxy'},
+        ])
+
+    def test_diff_between_tasks(self):
+        """测试两次任务之间的新增、消失和变化"""
+        diff = diff_tasks(self.base, self.target)
+
+        self.assertEqual([(row['ip_address'], row['port']) for row in diff['added']], [('10.0.0.1', 8080)])
+        self.assertEqual([(row['ip_address'], row['port']) for row in diff['removed']], [('10.0.0.2', 443)])
+        changed = list(diff['changed'])
+        self.assertEqual(len(changed), 1)
+        self.assertEqual(changed[0]['port'], 80)
+        self.assertEqual(changed[0]['old_service'], 'http')
+        self.assertEqual(changed[0]['service'], 'nginx')
+        self.assertEqual(changed[0]['old_state'], 'open')
+
+    def test_diff_with_exposure(self):
+        """测试旧任务与当前暴露面比较"""
+        diff = diff_task_with_exposure(self.base)
+
+        self.assertEqual([row['port'] for row in diff['added']], [8080])
+        self.assertEqual([row['port'] for row in diff['changed']], [80])
+
+    def test_change_events_recorded_on_merge(self):
+        """测试合并暴露面时追加变化事件，范围内未报告的开放端口被关闭"""
+        events = ChangeEvent.objects.filter(task=self.target)
+
+        self.assertEqual(
+            sorted((event.change_type, event.port) for event in events),
+            [('ADDED', 8080), ('CHANGED', 80)],
+        )
+        # 10.0.0.2 本次没有结果，不应被关闭
+        self.assertEqual(ExposureSnapshot.objects.get(port=443).state, 'open')
+
+        third = self._scan([{'ip_address': '10.0.0.1', 'port': 22, 'state': 'open'}], ports='1-100')
+        removed = ChangeEvent.objects.get(task=third, change_type='REMOVED')
+        self.assertEqual(removed.port, 80)
+        self.assertEqual(ExposureSnapshot.objects.get(port=80).state, 'closed|filtered')
+        # 8080 不在本次端口范围内，保持开放
+        self.assertEqual(ExposureSnapshot.objects.get(port=8080).state, 'open')
@@ -0,0 +1,50 @@
+from django.core.exceptions import ValidationError
+from django.test import TestCase
+
+from scanner.exclusions import compile_exclusions
+from scanner.models import ScanTask, ScanExclusion
+from scanner.scanners.base import BaseScanner
+from scanner.scanners.rangeset import to_networks
+
+
+class DummyScanner(BaseScanner):
+    def execute_scan(self, scan_type):
+        return []
+
+
+class ScanExclusionTest(TestCase):
+    """扫描排除列表测试"""
+
+    def setUp(self):
+        self.task = ScanTask.objects.create(name='排除', target='10.0.0.0/24', scan_type='SYN_SCAN')
+        ScanExclusion.objects.create(network='10.0.0.0/26', reason='客户网段')
+        ScanExclusion.objects.create(network='10.0.0.200-10.0.0.210', task=self.task)
+        ScanExclusion.objects.create(network='10.0.0.100', enabled=False)
+        other = ScanTask.objects.create(name='其他', target='10.0.0.0/24', scan_type='SYN_SCAN')
+        ScanExclusion.objects.create(network='10.0.0.150', task=other)
+
+    def test_compile_global_and_task_exclusions(self):
+        """测试编译全局和本任务的启用排除项"""
+        exclusions = compile_exclusions(self.task)
+
+        self.assertEqual(len(exclusions), 64 + 11)
+        self.assertEqual(list(to_networks(exclusions)), [
+            '10.0.0.0/26', '10.0.0.200/29', '10.0.0.208/31', '10.0.0.210/32',
+        ])
+        self.assertEqual(len(compile_exclusions()), 64)
+
+    def test_scanner_subtracts_exclusions_from_targets(self):
+        """测试扫描目标整体减去排除区间"""
+        scanner = DummyScanner('10.0.0.0/24', exclusions=compile_exclusions(self.task))
+        targets = scanner.target_set()
+
+        self.assertEqual(len(targets), 254 - 63 - 11)
+        self.assertEqual(targets[0], '10.0.0.64')
+        self.assertTrue(scanner.is_excluded('10.0.0.205'))
+        self.assertFalse(scanner.is_excluded('10.0.0.150'))
+        self.assertFalse(scanner.is_excluded('example.com'))
+
+    def test_invalid_network_rejected(self):
+        """测试格式错误的排除范围不能通过校验"""
+        with self.assertRaises(ValidationError):
+            ScanExclusion(network='10.0.0.0/33').full_clean()
@@ -0,0 +1,62 @@
+from datetime import timedelta
+
+from django.test import TestCase
+from django.utils import timezone
+
+from scanner.exposure import exposure_counts, refresh_exposure
+from scanner.ingest import save_scan_results
+from scanner.models import ScanTask, ScanResult, ExposureSnapshot
+
+
+class ExposureSnapshotTest(TestCase):
+    """当前暴露面测试"""
+
+    def _scan(self, results, discovered_at=None):
+        task = ScanTask.objects.create(name='暴露面任务', target='10.0.0.0/24', scan_type='TCP_SCAN')
+        save_scan_results(task, results)
+        if discovered_at:
+            # 模拟导入的历史任务：任务和结果的时间一起前移
+            ScanTask.objects.filter(pk=task.pk).update(created_at=discovered_at)
+            ScanResult.objects.filter(task=task).update(discovered_at=discovered_at)
+            task.refresh_from_db()
+        refresh_exposure(task)
+        return task
+
+    def test_newer_scan_overwrites_state_and_keeps_first_seen(self):
+        """测试新结果覆盖状态，首次发现时间保持不变"""
+        first = self._scan([{'ip_address': '10.0.0.1', 'port': 22, 'state': 'open', 'service': 'ssh'}])
+        first_seen = ExposureSnapshot.objects.get().first_seen
+
+        second = self._scan([{'ip_address': '10.0.0.1', 'port': 22, 'state': 'closed'}])
+        snapshot = ExposureSnapshot.objects.get()
+
+        self.assertEqual(snapshot.state, 'closed')
+        self.assertEqual(snapshot.first_seen, first_seen)
+        self.assertGreaterEqual(snapshot.last_seen, first_seen)
+        self.assertEqual(snapshot.last_task, second)
+        self.assertNotEqual(snapshot.last_task, first)
+
+    def test_older_observation_only_backfills_first_seen(self):
+        """测试更早的观测不覆盖当前状态，只前移首次发现时间"""
+        self._scan([{'ip_address': '10.0.0.2', 'port': 443, 'state': 'open', 'service': 'https'}])
+        earlier = timezone.now() - timedelta(days=30)
+        self._scan([{'ip_address': '10.0.0.2', 'port': 443, 'state': 'filtered'}], discovered_at=earlier)
+
+        snapshot = ExposureSnapshot.objects.get()
+        self.assertEqual(snapshot.state, 'open')
+        self.assertEqual(snapshot.service, 'https')
+        self.assertEqual(snapshot.first_seen, earlier)
+
+    def test_counts_come_from_snapshot(self):
+        """测试统计只计当前开放端口和去重主机"""
+        self._scan([
+            {'ip_address': '10.0.0.1', 'port': 22, 'state': 'open'},
+            {'ip_address': '10.0.0.1', 'port': 80, 'state': 'open'},
+            {'ip_address': '10.0.0.3', 'port': 22, 'state': 'closed'},
+        ])
+        self._scan([
+            {'ip_address': '10.0.0.1', 'port': 22, 'state': 'open'},
+            {'ip_address': '10.0.0.1', 'port': 80, 'state': 'closed'},
+        ])
+
+        self.assertEqual(exposure_counts(), {'open_ports': 1, 'unique_hosts': 2})
@@ -0,0 +1,55 @@
+from django.db import connection
+from django.test import TestCase
+
+from scanner.fields import pack_ip, unpack_ip, cidr_bounds
+from scanner.models import ScanTask, ScanResult
+
+
+class PackedIPTest(TestCase):
+    """打包IP编码测试"""
+
+    def test_pack_round_trip(self):
+        """测试IPv4和IPv6打包后可还原"""
+        for address in ['10.1.2.3', '0.0.0.0', '2001:db8::1', '::1']:
+            self.assertEqual(unpack_ip(pack_ip(address)), address)
+
+    def test_byte_order_matches_numeric_order(self):
+        """测试打包后的字节序与数值序一致"""
+        addresses = ['9.255.255.255', '10.0.0.0', '10.0.0.10', '10.0.1.0', '::ffff:ffff:ffff', '2001:db8::1']
+        packed = [pack_ip(address) for address in addresses]
+        self.assertEqual(packed, sorted(packed))
+
+    def test_cidr_bounds(self):
+        """测试网段首尾地址"""
+        self.assertEqual(cidr_bounds('10.1.2.3/8'), ('10.0.0.0', '10.255.255.255'))
+
+
+class CompactColumnQueryTest(TestCase):
+    """编码列查询测试"""
+
+    def setUp(self):
+        self.task = ScanTask.objects.create(name='编码测试', target='10.0.0.0/8', scan_type='SYN_SCAN')
+        for ip, port, state in [('10.0.0.5', 22, 'open'), ('10.200.0.1', 443, 'closed'),
+                                ('11.0.0.1', 80, 'open'), ('10.0.0.5', 8080, 'filtered')]:
+            ScanResult.objects.create(task=self.task, ip_address=ip, port=port, state=state)
+
+    def test_state_and_protocol_stored_as_codes(self):
+        """测试状态和协议以小整数存储，读取时仍为字符串"""
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT state, protocol FROM scanner_scanresult WHERE port = 22")
+            self.assertEqual(cursor.fetchone(), (1, 6))
+        result = ScanResult.objects.get(port=22)
+        self.assertEqual((result.state, result.protocol, result.ip_address), ('open', 'tcp', '10.0.0.5'))
+
+    def test_cidr_filter(self):
+        """测试网段过滤"""
+        results = ScanResult.objects.in_cidr('10.0.0.0/8')
+        self.assertEqual(sorted(results.values_list('port', flat=True)), [22, 443, 8080])
+        self.assertEqual(ScanResult.objects.in_cidr('10.0.0.0/24').filter(state='open').count(), 1)
+
+    def test_port_range_filter(self):
+        """测试端口范围过滤"""
+        results = ScanResult.objects.in_ports('20-100,8080')
+        self.assertEqual(sorted(results.values_list('port', flat=True)), [22, 80, 8080])
+        with self.assertRaises(ValueError):
+            ScanResult.objects.in_ports('100-20')
@@ -0,0 +1,57 @@
+from django.test import TestCase
+
+from scanner.fingerprints import FingerprintCache, fingerprint_digest
+from scanner.ingest import save_scan_results
+from scanner.models import ScanTask, ScanResult, Fingerprint
+
+
+class FingerprintInternTest(TestCase):
+    """指纹去重测试"""
+
+    def setUp(self):
+        self.cache = FingerprintCache(maxsize=2)
+
+    def test_digest_ignores_key_order(self):
+        """测试哈希与键顺序无关"""
+        self.assertEqual(
+            fingerprint_digest({'product': 'nginx', 'version': '1.24'}),
+            fingerprint_digest({'version': '1.24', 'product': 'nginx'}),
+        )
+
+    def test_identical_fingerprints_share_one_row(self):
+        """测试相同指纹只存一行，空指纹不入库"""
+        nginx = {'product': 'nginx', 'version': '1.24', 'extrainfo': ''}
+        ids = self.cache.intern_many([nginx, dict(nginx), {}, {'product': '', 'version': ''}, None])
+
+        self.assertEqual(Fingerprint.objects.count(), 1)
+        self.assertEqual(ids[0], ids[1])
+        self.assertEqual(ids[2:], [None, None, None])
+
+    def test_cache_filled_only_after_commit(self):
+        """测试新建指纹在提交后才进入缓存，之后的入库命中缓存"""
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            self.cache.intern_many([{'product': 'openssh'}])
+        self.assertEqual(len(self.cache), 0)
+
+        for callback in callbacks:
+            callback()
+        self.assertEqual(len(self.cache), 1)
+
+        with self.assertNumQueries(0):
+            self.cache.intern_many([{'product': 'openssh'}])
+        self.assertEqual(self.cache.hits, 1)
+
+    def test_ingest_links_results_to_fingerprints(self):
+        """测试入库时结果行引用去重后的指纹"""
+        task = ScanTask.objects.create(name='指纹任务', target='10.0.0.1', scan_type='SERVICE_DETECTION')
+        fingerprint = {'product': 'Apache httpd', 'version': '2.4.58', 'extrainfo': ''}
+        save_scan_results(task, [
+            {'ip_address': '10.0.0.1', 'port': port, 'state': 'open', 'fingerprint': fingerprint}
+            for port in (80, 8080, 8081)
+        ])
+
+        self.assertEqual(Fingerprint.objects.count(), 1)
+        self.assertEqual(
+            set(ScanResult.objects.values_list('fingerprint__data__product', flat=True)),
+            {'Apache httpd'},
+        )
@@ -0,0 +1,113 @@
+from unittest import mock
+
+import numpy as np
+from django.test import TestCase
+
+from scanner.geolocation import EARTH_RADIUS_KM, KM_PER_MS, CBGSolver, GeoGrid
+from scanner.models import GeoEstimate, RTTMeasurement, ScanTask, VantagePoint
+from scanner.scanners import RTTScanner
+from scanner.tasks import geolocate_targets, measure_vantage_rtt
+from scanner.vantage import dispatch_measurements
+
+VANTAGES = {
+    'beijing': (39.9, 116.4), 'shanghai': (31.2, 121.5), 'tokyo': (35.7, 139.7),
+    'singapore': (1.35, 103.8), 'frankfurt': (50.1, 8.7),
+}
+HONG_KONG, SAO_PAULO = (22.3, 114.2), (-23.5, -46.6)
+TARGETS = {'198.51.100.1': HONG_KONG, '198.51.100.2': SAO_PAULO}
+
+
+def distance_km(a, b):
+    lat1, lon1, lat2, lon2 = map(np.radians, (*a, *b))
+    cosine = np.sin(lat1) * np.sin(lat2) + np.cos(lat1) * np.cos(lat2) * np.cos(lon1 - lon2)
+    return float(np.arccos(np.clip(cosine, -1, 1)) * EARTH_RADIUS_KM)
+
+
+def simulated_rtt(vantage, target):
+    """实际线路绕行且含处理时延：RTT比光纤直线传播的下限大30%再加2ms"""
+    return distance_km(vantage, target) / KM_PER_MS * 1.3 + 2
+
+
+class FakeRTTScanner(RTTScanner):
+    """按当前探测点的位置模拟各目标的RTT"""
+
+    location = None
+
+    def _send_round(self, destinations, round_number):
+        return {
+            destination: simulated_rtt(self.location, TARGETS[destination]) + round_number * 0.5
+            for destination in destinations if destination in TARGETS
+        }
+
+
+class GeolocationTest(TestCase):
+    """多探测点RTT地理定位测试"""
+
+    def setUp(self):
+        self.vantages = {
+            name: VantagePoint.objects.create(name=name, latitude=latitude, longitude=longitude)
+            for name, (latitude, longitude) in VANTAGES.items()
+        }
+        self.task = ScanTask.objects.create(name='geo', target='198.51.100.0/30', scan_type='TCP_SCAN',
+                                            options={'vantage_points': 'all'}, result_summary={'open_ports': 0})
+
+    def test_solver(self):
+        names = list(VANTAGES)
+        rtts = np.array([[simulated_rtt(VANTAGES[name], HONG_KONG) for name in names],
+                         [np.nan] * len(names)])
+        rtts[0, names.index('frankfurt')] = np.nan
+        result = CBGSolver([VANTAGES[name] for name in names], GeoGrid(1.0)).solve(rtts)
+
+        error = distance_km(HONG_KONG, (result['latitude'][0], result['longitude'][0]))
+        self.assertLess(error, 500)
+        self.assertLessEqual(error, result['radius_km'][0])
+        self.assertEqual(result['vantage_count'].tolist(), [4, 0])
+        self.assertTrue(np.isnan(result['latitude'][1]))
+
+    def test_inconsistent_measurements(self):
+        """约束无交集时取最接近满足全部约束的位置"""
+        rtts = np.array([[1.0, 1.0]])
+        result = CBGSolver([VANTAGES['beijing'], VANTAGES['frankfurt']], GeoGrid(2.0)).solve(rtts)
+        self.assertFalse(np.isnan(result['latitude'][0]))
+        self.assertGreater(result['radius_km'][0], 0)
+
+    def test_queue(self):
+        self.assertEqual(self.vantages['tokyo'].queue, 'vantage.tokyo')
+
+    def test_dispatch(self):
+        self.vantages['frankfurt'].is_active = False
+        self.vantages['frankfurt'].save()
+        with mock.patch('scanner.vantage.chord') as chord:
+            self.assertEqual(dispatch_measurements(self.task, self.task.target), 4)
+        header = list(chord.call_args.args[0])
+        self.assertEqual(sorted(signature.options['queue'] for signature in header),
+                         ['vantage.beijing', 'vantage.shanghai', 'vantage.singapore', 'vantage.tokyo'])
+        self.assertEqual(chord.return_value.call_args.args[0].args, (self.task.id,))
+
+        self.task.options = {'vantage_points': ['tokyo', 'missing']}
+        with mock.patch('scanner.vantage.chord') as chord:
+            self.assertEqual(dispatch_measurements(self.task, self.task.target), 1)
+
+    def test_measure_and_locate(self):
+        counts = []
+        with mock.patch('scanner.tasks.RTTScanner', FakeRTTScanner):
+            for name, vantage in self.vantages.items():
+                FakeRTTScanner.location = VANTAGES[name]
+                counts.append(measure_vantage_rtt(self.task.id, vantage.id, self.task.target))
+        self.assertEqual(counts, [2] * len(VANTAGES))
+        measurement = RTTMeasurement.objects.get(task=self.task, vantage=self.vantages['tokyo'],
+                                                 ip_address='198.51.100.1')
+        self.assertAlmostEqual(measurement.rtt, simulated_rtt(VANTAGES['tokyo'], HONG_KONG))
+        self.assertEqual(measurement.samples, 3)
+        self.assertIsNotNone(VantagePoint.objects.get(name='tokyo').last_seen)
+
+        geolocate_targets(counts, self.task.id)
+        for ip, location in TARGETS.items():
+            estimate = GeoEstimate.objects.get(task=self.task, ip_address=ip)
+            self.assertEqual(estimate.vantage_count, len(VANTAGES))
+            self.assertLessEqual(distance_km(location, (estimate.latitude, estimate.longitude)),
+                                 estimate.radius_km + 1)
+        self.task.refresh_from_db()
+        self.assertEqual(self.task.result_summary['geolocation'],
+                         {'vantage_points': len(VANTAGES), 'measured': 10, 'located': 2})
+        self.assertEqual(self.task.result_summary['open_ports'], 0)
@@ -0,0 +1,74 @@
+from django.test import TestCase
+
+from scanner.ingest import save_topology
+from scanner.models import RouterInterface, ScanTask
+from scanner.topology import TopologyGraph, get_graph
+
+EDGES = [
+    ('S', 'A', 1.0), ('A', 'B', 1.0), ('A', 'C', 5.0), ('B', 'D', 1.0), ('C', 'D', 1.0),
+    ('D', 'V', 1.0), ('S', 'E', 10.0), ('E', 'V', 1.0), ('A', 'B', 3.0),
+]
+
+
+class TopologyGraphTest(TestCase):
+    """拓扑图查询测试"""
+
+    def setUp(self):
+        self.graph = TopologyGraph.from_edges(EDGES)
+
+    def test_structure(self):
+        """重复边合并，邻接按CSR保存"""
+        self.assertEqual(len(self.graph), 7)
+        self.assertEqual(self.graph.edge_count, 8)
+        self.assertEqual(sorted(self.graph.successors('A')), ['B', 'C'])
+        self.assertEqual(sorted(self.graph.predecessors('D')), ['B', 'C'])
+
+    def test_shortest_paths(self):
+        """跳数最少与RTT加权的最短路径"""
+        self.assertEqual(self.graph.shortest_path('S', 'V'), ['S', 'E', 'V'])
+        self.assertIsNone(self.graph.shortest_path('V', 'S'))
+        self.assertEqual(self.graph.weighted_path('S', 'V'), (4.0, ['S', 'A', 'B', 'D', 'V']))
+        with self.assertRaises(KeyError):
+            self.graph.shortest_path('S', 'missing')
+
+    def test_k_shortest_paths(self):
+        """前k条无环路径按权重升序"""
+        paths = self.graph.k_shortest_paths('S', 'V', 4)
+        self.assertEqual(paths, [
+            (4.0, ['S', 'A', 'B', 'D', 'V']),
+            (8.0, ['S', 'A', 'C', 'D', 'V']),
+            (11.0, ['S', 'E', 'V']),
+        ])
+
+    def test_dominators(self):
+        """必经上游节点"""
+        idom = self.graph.dominators('S')
+        self.assertEqual(idom['D'], 'A')
+        self.assertEqual(idom['V'], 'S')
+        self.assertIsNone(idom['S'])
+        self.assertEqual(self.graph.common_dominators('S', ['B', 'C']), ['S', 'A'])
+        self.assertEqual(self.graph.common_dominators('S', ['D', 'E']), ['S'])
+
+    def test_common_upstream(self):
+        """能到达所有目标的上游节点，离目标近的在前"""
+        self.assertEqual(self.graph.common_upstream(['B', 'C']), [('A', 1), ('S', 2)])
+        self.assertEqual(self.graph.common_upstream(['D', 'E']), [('S', 3)])
+
+    def test_task_graph_cache(self):
+        """任务图按RTT增量加权、合并别名，写入拓扑后缓存失效"""
+        task = ScanTask.objects.create(name='trace', target='203.0.113.0/24', scan_type='TRACEROUTE')
+        save_topology(task, [
+            {'source_ip': '10.0.0.1', 'destination_ip': '10.0.1.1', 'metadata': {'rtt': 2.0}},
+            {'source_ip': '10.0.1.2', 'destination_ip': '203.0.113.5', 'metadata': {'rtt': 9.5}},
+        ])
+        RouterInterface.objects.create(task=task, ip_address='10.0.1.2', router='10.0.1.1', evidence='ipid')
+
+        graph = get_graph(task)
+        self.assertIs(get_graph(task), graph)
+        self.assertEqual(graph.weighted_path('10.0.0.1', '203.0.113.5'),
+                         (9.5, ['10.0.0.1', '10.0.1.1', '203.0.113.5']))
+
+        save_topology(task, [{'source_ip': '203.0.113.5', 'destination_ip': '203.0.113.6', 'metadata': {}}])
+        refreshed = get_graph(task)
+        self.assertIsNot(refreshed, graph)
+        self.assertEqual(refreshed.shortest_path('10.0.0.1', '203.0.113.6')[-1], '203.0.113.6')
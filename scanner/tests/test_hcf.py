@@ -0,0 +1,80 @@
+import os
+import tempfile
+
+import numpy as np
+from django.test import TestCase, override_settings
+
+from scanner.ingest import save_scan_results
+from scanner.models import ScanTask
+from scanner.tracing import HCFTable, get_hcf_table, refresh_hcf_table
+from scanner.tracing.hcf import hop_counts, summarize
+
+
+class HopCountFilterTest(TestCase):
+    """跳数过滤测试"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.path = os.path.join(self.tmp.name, 'hcf.npz')
+
+        task = ScanTask.objects.create(name='ping', target='198.51.100.0/24', scan_type='PING_SWEEP')
+        save_scan_results(task, [
+            # 198.51.100.0/24：Linux主机11跳、Windows主机12跳
+            {'ip_address': '198.51.100.10', 'state': 'up', 'ttl': 53},
+            {'ip_address': '198.51.100.10', 'port': 22, 'state': 'open', 'ttl': 53},
+            {'ip_address': '198.51.100.20', 'state': 'up', 'ttl': 116},
+            # 203.0.113.0/24：路由器5跳
+            {'ip_address': '203.0.113.1', 'state': 'up', 'ttl': 250},
+            {'ip_address': '2001:db8::1', 'state': 'up', 'ttl': 60},
+            {'ip_address': '192.0.2.1', 'state': 'up'},
+        ])
+
+    def test_hop_counts(self):
+        """按不小于TTL的最小初始值推算跳数，非法TTL为-1"""
+        self.assertEqual(hop_counts(np.array([53, 116, 250, 30, 64, 0, 300])).tolist(),
+                         [11, 12, 5, 2, 0, -1, -1])
+
+    def test_build_from_scan_results(self):
+        """按网段汇总跳数范围，同一主机重复观测只计一次，IPv6和无TTL的结果被忽略"""
+        with override_settings(HCF_TABLE_PATH=self.path):
+            table = refresh_hcf_table()
+
+        self.assertEqual(len(table), 2)
+        self.assertEqual(table.low.tolist(), [11, 5])
+        self.assertEqual(table.high.tolist(), [12, 5])
+        self.assertEqual(table.samples.tolist(), [2, 1])
+        self.assertTrue(os.path.exists(self.path))
+
+    def test_check(self):
+        """跳数超出网段范围加容差的报文判定为伪造，未知网段不判定"""
+        with override_settings(HCF_TABLE_PATH=self.path):
+            refresh_hcf_table()
+            table = get_hcf_table()
+        sources = ['198.51.100.77', '198.51.100.77', '198.51.100.77', '203.0.113.9', '192.0.2.5', 'bad']
+        ttls = np.array([51, 45, 115, 240, 50, 50])
+        known, spoofed = table.check(sources, ttls)
+
+        self.assertEqual(known.tolist(), [True, True, True, True, False, False])
+        self.assertEqual(spoofed.tolist(), [False, True, False, True, False, False])
+
+        # 整数数组输入与字符串一致
+        addresses = np.array([0xC6336400 + 77, 0xCB007109], dtype=np.uint32)
+        _, spoofed = table.check(addresses, np.array([45, 250]))
+        self.assertEqual(spoofed.tolist(), [True, False])
+
+    def test_summarize_and_reload(self):
+        """API汇总按源地址计数，跳数表文件更新后重新加载"""
+        with override_settings(HCF_TABLE_PATH=self.path):
+            self.assertIsNone(summarize(['198.51.100.1'], [53]))
+            refresh_hcf_table()
+            first = get_hcf_table()
+            self.assertIs(get_hcf_table(), first)
+
+            result = summarize(['198.51.100.1', '198.51.100.1', '203.0.113.9'], [30, 30, 250])
+            self.assertEqual(result['spoofed'], 2)
+            self.assertEqual(result['spoofed_sources'], [{'ip': '198.51.100.1', 'packets': 2}])
+
+            HCFTable.build(np.zeros(0, dtype=np.uint32), np.zeros(0)).save(self.path)
+            os.utime(self.path, ns=(1, 1))
+            self.assertEqual(len(get_hcf_table()), 0)
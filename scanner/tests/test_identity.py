@@ -0,0 +1,91 @@
+from datetime import timedelta
+
+from django.test import TestCase
+from django.utils import timezone
+
+from scanner.fingerprints import fingerprint_cache
+from scanner.identity import device_addresses, update_identities
+from scanner.ingest import save_scan_results
+from scanner.models import HostIdentity, IdentityAddress, ScanResult, ScanTask
+from scanner.scanners.nmap_scanner import script_fingerprints
+
+SSH_KEY = 'rsa:f0:e6:11:22:33:44:55:66:77:88:99:aa:bb:cc:dd:ee'
+CERT = '123456789abcdef0123456789abcdef012345678'
+
+
+def device(ip, mac='', ssh=None, tls=None):
+    """一台开放 22、443 端口的设备"""
+    return [
+        {'ip_address': ip, 'mac_address': mac, 'port': 22, 'state': 'open', 'service': 'ssh',
+         'fingerprint': {'product': 'OpenSSH', **({'ssh_hostkey': [ssh]} if ssh else {})}},
+        {'ip_address': ip, 'mac_address': mac, 'port': 443, 'state': 'open', 'service': 'https',
+         'fingerprint': {'product': 'nginx', **({'tls_cert': tls} if tls else {})}},
+        {'ip_address': ip, 'mac_address': mac, 'port': 80, 'state': 'closed'},
+    ]
+
+
+class HostIdentityTest(TestCase):
+    """设备身份索引测试"""
+
+    def setUp(self):
+        # 指纹缓存是进程级的，测试回滚后缓存的主键不再有效
+        fingerprint_cache.clear()
+
+    def _scan(self, results, completed_at=None):
+        task = ScanTask.objects.create(name='身份任务', target='10.0.0.0/24', scan_type='TCP_SCAN')
+        save_scan_results(task, results)
+        if completed_at:
+            # 模拟导入的历史任务：任务和结果的时间一起前移
+            ScanTask.objects.filter(pk=task.pk).update(created_at=completed_at)
+            ScanResult.objects.filter(task=task).update(discovered_at=completed_at)
+        ScanTask.objects.filter(pk=task.pk).update(status='COMPLETED', completed_at=completed_at or timezone.now())
+        task.refresh_from_db()
+        return task, update_identities(task)
+
+    def test_same_device_across_addresses(self):
+        """测试设备换地址后仍归到同一身份"""
+        first, stats = self._scan(device('10.0.0.5', mac='AA-BB-CC-00-11-22', ssh=SSH_KEY, tls=CERT)
+                                  + device('10.0.0.6'))
+        self.assertEqual(stats, {'hosts': 2, 'identified': 1, 'updated': 1})
+        second, _ = self._scan(device('10.0.0.9', mac='aa:bb:cc:00:11:22', ssh=SSH_KEY, tls=CERT))
+
+        identity = HostIdentity.objects.get()
+        self.assertEqual(identity.mac_address, 'aa:bb:cc:00:11:22')
+        self.assertEqual(identity.ssh_hostkeys, [SSH_KEY])
+        self.assertEqual(identity.tls_certificates, [CERT])
+        self.assertEqual(identity.port_signature, '22/tcp,443/tcp')
+        self.assertEqual(identity.last_task, second)
+
+        addresses = device_addresses('10.0.0.5')
+        self.assertEqual(sorted(address.ip_address for address in addresses), ['10.0.0.5', '10.0.0.9'])
+        self.assertFalse(device_addresses('10.0.0.6').exists())
+
+    def test_distinct_devices_behind_nat(self):
+        """测试共用地址的不同设备各自成为身份"""
+        self._scan(device('192.0.2.1', ssh=SSH_KEY))
+        self._scan(device('192.0.2.1', tls=CERT))
+        self._scan(device('198.51.100.7', tls=CERT))
+        self.assertEqual(HostIdentity.objects.count(), 2)
+        self.assertEqual(sorted(address.ip_address for address in device_addresses('192.0.2.1')),
+                         ['192.0.2.1', '192.0.2.1', '198.51.100.7'])
+
+    def test_older_task_backfills_first_seen(self):
+        """测试重放更早的任务只前移首次发现时间"""
+        latest, _ = self._scan(device('10.0.0.5', ssh=SSH_KEY))
+        earlier = timezone.now() - timedelta(days=30)
+        self._scan(device('10.0.0.5', ssh=SSH_KEY), completed_at=earlier)
+
+        address = IdentityAddress.objects.get()
+        self.assertEqual(address.first_seen, earlier)
+        self.assertEqual(address.last_task, latest)
+        self.assertEqual(HostIdentity.objects.get().first_seen, earlier)
+
+    def test_script_fingerprints(self):
+        """测试从NSE脚本输出提取SSH密钥和证书指纹"""
+        scripts = {
+            'ssh-hostkey': '\n  3072 F0:E6:11:22:33:44:55:66:77:88:99:AA:BB:CC:DD:EE (RSA)',
+            'ssl-cert': 'Subject: commonName=example\nMD5:   0000 0000 0000 0000 0000 0000 0000 0000\n'
+                        'SHA-1: 1234 5678 9abc def0 1234 5678 9abc def0 1234 5678',
+        }
+        self.assertEqual(script_fingerprints(scripts), {'ssh_hostkey': [SSH_KEY], 'tls_cert': CERT})
+        self.assertEqual(script_fingerprints({}), {})
@@ -0,0 +1,174 @@
+import io
+import os
+import shutil
+import tempfile
+import tracemalloc
+from datetime import datetime, timezone
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from scanner.fingerprints import fingerprint_cache
+from scanner.importers import NmapXMLReader, detect_format, import_scan_file, port_spec
+from scanner.ingest import RESULT_COLUMNS, copy_rows, encode_results
+from scanner.models import ExposureSnapshot, HostIdentity, ScanHost, ScanResult, ScanTask
+from scanner.scanners.rangeset import IntervalSet
+
+START, HOST_END, FINISHED = 1600000000, 1600000100, 1600000200
+
+NMAP_XML = f'''<?xml version="1.0" encoding="UTF-8"?>
+<nmaprun scanner="nmap" args="nmap -sS -sV -p 22,80,443 -oX out.xml 192.0.2.0/24" start="{START}">
+<scaninfo type="syn" protocol="tcp" numservices="3" services="22,80,443"/>
+<host starttime="{START}" endtime="{HOST_END}"><status state="up" reason="arp-response" reason_ttl="0"/>
+<address addr="192.0.2.10" addrtype="ipv4"/>
+<address addr="AA:BB:CC:00:11:22" addrtype="mac" vendor="Example"/>
+<hostnames><hostname name="web.example" type="PTR"/></hostnames>
+<ports><extraports state="closed" count="1"/>
+<port protocol="tcp" portid="22"><state state="open" reason="syn-ack" reason_ttl="64"/>
+<service name="ssh" product="OpenSSH" version="8.2p1" extrainfo="Ubuntu" method="probed" conf="10"/>
+<script id="ssh-hostkey" output="&#xa;  3072 f0:e6:11:22:33:44:55:66:77:88:99:aa:bb:cc:dd:ee (RSA)"/></port>
+<port protocol="tcp" portid="443"><state state="filtered" reason="no-response" reason_ttl="0"/>
+<service name="https" method="table" conf="3"/></port>
+</ports>
+<os><osmatch name="Linux 5.4" accuracy="100"><osclass type="general purpose" vendor="Linux" osfamily="Linux" osgen="5.X" accuracy="100"/></osmatch></os>
+<times srtt="1500" rttvar="500" to="100000"/>
+</host>
+<host starttime="{START}" endtime="{HOST_END}"><status state="down" reason="no-response" reason_ttl="0"/>
+<address addr="192.0.2.11" addrtype="ipv4"/></host>
+<host starttime="{START}" endtime="{HOST_END}"><status state="up" reason="echo-reply" reason_ttl="60"/>
+<address addr="192.0.2.20" addrtype="ipv4"/></host>
+<runstats><finished time="{FINISHED}" timestr="" elapsed="200" exit="success"/><hosts up="2" down="1" total="3"/></runstats>
+</nmaprun>
+'''
+
+MASSCAN_JSON = '''[
+{   "ip": "198.51.100.7",   "timestamp": "1500000000", "ports": [ {"port": 80, "proto": "tcp", "status": "open", "reason": "syn-ack", "ttl": 54} ] },
+{   "ip": "198.51.100.7",   "timestamp": "1500000005", "ports": [ {"port": 80, "proto": "tcp", "service": {"name": "http", "banner": "nginx"} } ] },
+{   "ip": "198.51.100.9",   "timestamp": "1500000010", "ports": [ {"port": 8080, "proto": "tcp", "status": "open", "reason": "syn-ack", "ttl": 120} ] },
+not json
+]
+'''
+
+MASSCAN_LIST = '''#masscan
+open tcp 22 203.0.113.4 1400000000
+open udp 53 203.0.113.5 1400000060
+banner tcp 22 203.0.113.4 1400000001 ssh SSH-2.0-OpenSSH_7.4
+# end
+'''
+
+
+class ScanImportTest(TestCase):
+    """外部扫描结果导入测试"""
+
+    def setUp(self):
+        fingerprint_cache.clear()
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _write(self, name, content):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w', encoding='utf-8') as handle:
+            handle.write(content)
+        return path
+
+    def test_nmap_xml(self):
+        path = self._write('scan.xml', NMAP_XML)
+        self.assertEqual(detect_format(path), 'nmap-xml')
+        stats = import_scan_file(path)
+
+        self.assertEqual(stats['rows'], 3)
+        self.assertEqual(stats['hosts'], 2)
+        task = ScanTask.objects.get(id=stats['task_id'])
+        self.assertEqual(task.status, 'COMPLETED')
+        self.assertEqual(task.scan_type, 'SERVICE_DETECTION')
+        self.assertEqual(task.target, '192.0.2.10-192.0.2.20')
+        self.assertEqual(task.ports, '22,80,443')
+        self.assertEqual(task.created_at, datetime.fromtimestamp(START, tz=timezone.utc))
+        self.assertEqual(task.completed_at, datetime.fromtimestamp(FINISHED, tz=timezone.utc))
+        self.assertEqual(task.options['args'], 'nmap -sS -sV -p 22,80,443 -oX out.xml 192.0.2.0/24')
+
+        host = ScanHost.objects.get(task=task, ip_address='192.0.2.10')
+        self.assertEqual((host.hostname, host.mac_address, host.os_family, host.os_version),
+                         ('web.example', 'AA:BB:CC:00:11:22', 'Linux', '5.X'))
+        ssh = ScanResult.objects.for_task(task).get(port=22)
+        self.assertEqual((ssh.state, ssh.service, ssh.service_version, ssh.ttl, ssh.rtt),
+                         ('open', 'ssh', '8.2p1', 64, 1.5))
+        self.assertEqual(ssh.discovered_at, datetime.fromtimestamp(HOST_END, tz=timezone.utc))
+        self.assertEqual(ssh.fingerprint.data['ssh_hostkey'],
+                         ['rsa:f0:e6:11:22:33:44:55:66:77:88:99:aa:bb:cc:dd:ee'])
+        self.assertEqual(ScanResult.objects.for_task(task).count(), 3)
+
+        # 导入后合并进暴露面和设备身份索引
+        self.assertEqual(ExposureSnapshot.objects.get(port=22).first_seen, ssh.discovered_at)
+        self.assertEqual(HostIdentity.objects.get().mac_address, 'aa:bb:cc:00:11:22')
+
+    def test_masscan_json(self):
+        path = self._write('scan.json', MASSCAN_JSON)
+        stats = import_scan_file(path, name='masscan')
+        self.assertEqual((stats['rows'], stats['hosts'], stats['skipped']), (3, 2, 1))
+
+        task = ScanTask.objects.get(id=stats['task_id'])
+        self.assertEqual(task.name, 'masscan')
+        self.assertEqual(task.ports, '80,8080')
+        self.assertEqual(task.options['scanner'], 'masscan')
+        banner = ScanResult.objects.for_task(task).get(service='http')
+        self.assertEqual(banner.fingerprint.data, {'banner': 'nginx'})
+        self.assertEqual(ScanResult.objects.for_task(task).get(port=8080).ttl, 120)
+
+    def test_masscan_list(self):
+        path = self._write('scan.txt', MASSCAN_LIST)
+        self.assertEqual(detect_format(path), 'masscan-list')
+        stats = import_scan_file(path, post_process=False)
+        self.assertEqual(stats['rows'], 3)
+        task = ScanTask.objects.get(id=stats['task_id'])
+        self.assertEqual(ScanResult.objects.for_task(task).get(port=53).protocol, 'udp')
+        self.assertFalse(ExposureSnapshot.objects.exists())
+
+    def test_command(self):
+        paths = [self._write('a.xml', NMAP_XML), self._write('b.txt', MASSCAN_LIST)]
+        out = io.StringIO()
+        call_command('import_scans', *paths, '--workers', '2', stdout=out)
+        self.assertEqual(ScanTask.objects.filter(status='COMPLETED').count(), 2)
+        self.assertIn('共导入 6 条结果', out.getvalue())
+
+    def test_constant_memory(self):
+        """解析时只保留当前主机，内存峰值与主机数无关"""
+        host = ('<host starttime="1" endtime="2"><status state="up"/><address addr="10.0.{}.{}" addrtype="ipv4"/>'
+                '<ports><port protocol="tcp" portid="80"><state state="open" reason_ttl="64"/>'
+                '<service name="http"/></port></ports></host>\n')
+
+        def peak(count):
+            path = self._write(f'{count}.xml', '<nmaprun scanner="nmap" start="1">\n' + ''.join(
+                host.format(i >> 8 & 255, i & 255) for i in range(count)) + '</nmaprun>\n')
+            tracemalloc.start()
+            rows = sum(1 for _ in NmapXMLReader(path))
+            _, peak_bytes = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            self.assertEqual(rows, count)
+            return peak_bytes
+
+        self.assertLess(peak(20000), peak(1000) * 2)
+
+    def test_port_spec_truncation(self):
+        ports = IntervalSet.from_values(range(1, 2000, 2))
+        spec = port_spec(ports, limit=20)
+        self.assertEqual(spec, '1,3,5,7,9,11,13,15')
+        self.assertEqual(port_spec(IntervalSet.parse('1-1000,8080')), '1-1000,8080')
+
+    def test_encoded_columns(self):
+        """快速写入路径覆盖结果表的全部列"""
+        fields = {field.name for field in ScanResult._meta.concrete_fields if not field.primary_key}
+        self.assertEqual(set(RESULT_COLUMNS), fields)
+
+    def test_copy_rows(self):
+        task = ScanTask.objects.create(name='copy', target='10.0.0.1', scan_type='SYN_SCAN')
+        rows = encode_results(task, [{'ip_address': '10.0.0.1', 'port': 80, 'state': 'open',
+                                      'service_version': 'a\tb\\c'}], {'10.0.0.1': None}, [None])
+        fields = copy_rows(rows).rstrip('\n').split('\t')
+        self.assertEqual(len(fields), len(RESULT_COLUMNS))
+        self.assertEqual(fields[2], '\\\\x00000000000000000000ffff0a000001')
+        self.assertEqual(fields[4:6], ['6', '1'])
+        self.assertEqual(fields[7], 'a\\tb\\\\c')
+        self.assertEqual(fields[1], '\\N')
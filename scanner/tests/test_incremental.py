@@ -0,0 +1,57 @@
+from django.test import TestCase
+from django.utils import timezone
+
+from scanner.incremental import IncrementalScan, find_baseline
+from scanner.ingest import save_scan_results
+from scanner.models import ScanTask, ScanHost
+
+
+class IncrementalScanTest(TestCase):
+    """增量扫描测试"""
+
+    def setUp(self):
+        self.baseline = ScanTask.objects.create(
+            name='基线', target='10.0.0.0/24', scan_type='SERVICE_DETECTION', ports='1-1000'
+        )
+        save_scan_results(self.baseline, [
+            {'ip_address': '10.0.0.1', 'port': 22, 'state': 'open', 'service': 'ssh', 'hostname': 'a'},
+            {'ip_address': '10.0.0.2', 'port': 80, 'state': 'open', 'service': 'http'},
+        ])
+        self.baseline.status = 'COMPLETED'
+        self.baseline.completed_at = timezone.now()
+        self.baseline.save()
+
+        self.task = ScanTask.objects.create(
+            name='增量', target='10.0.0.0/24', scan_type='SERVICE_DETECTION', ports='1-1000', incremental=True
+        )
+        self.scanned = []
+
+    def _fake_scan(self, task, ips, exclusions=None, liveness=None):
+        self.scanned = sorted(ips)
+        return [{'ip_address': ip, 'port': 443, 'state': 'open', 'service': 'https'} for ip in ips]
+
+    def test_find_baseline(self):
+        """测试自动选择相同目标最近完成的任务"""
+        self.assertEqual(find_baseline(self.task), self.baseline)
+
+    def test_only_new_and_changed_hosts_rescanned(self):
+        """测试只完整扫描新增和变化的主机，未变化主机按引用沿用"""
+        plan = IncrementalScan(
+            self.task, self.baseline,
+            verify=lambda expected: {('10.0.0.1', 22, 'tcp')},
+            discover=lambda target, exclusions: {'10.0.0.1', '10.0.0.2', '10.0.0.3'},
+            scan=self._fake_scan,
+        )
+        results = plan.execute()
+        save_scan_results(self.task, results)
+        plan.carry_forward()
+
+        self.assertEqual(self.scanned, ['10.0.0.2', '10.0.0.3'])
+        carried = ScanHost.objects.get(task=self.task, ip_address='10.0.0.1')
+        self.assertEqual(carried.carried_from.task, self.baseline)
+        self.assertEqual(carried.hostname, 'a')
+        self.assertEqual(carried.results.count(), 0)
+
+        effective = set(self.task.effective_results().values_list('ip_address', 'port'))
+        self.assertEqual(effective, {('10.0.0.1', 22), ('10.0.0.2', 443), ('10.0.0.3', 443)})
+        self.assertEqual(plan.summary()['carried_hosts'], 1)
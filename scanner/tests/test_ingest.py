@@ -0,0 +1,73 @@
+from django.test import TestCase
+
+from scanner.ingest import save_scan_results
+from scanner.models import ScanTask, ScanHost, ScanResult
+from scanner.serializers import ScanResultSerializer
+
+
+class SaveScanResultsTest(TestCase):
+    """扫描结果入库测试"""
+
+    def setUp(self):
+        self.task = ScanTask.objects.create(
+            name='入库测试任务',
+            target='10.0.0.0/30',
+            scan_type='SERVICE_DETECTION'
+        )
+
+    def test_host_columns_stored_once_per_host(self):
+        """测试同一主机的多个端口只生成一条主机记录"""
+        results = [
+            {'ip_address': '10.0.0.1', 'hostname': 'web01', 'state': 'open', 'port': 80, 'protocol': 'tcp'},
+            {'ip_address': '10.0.0.1', 'hostname': 'web01', 'state': 'open', 'port': 443, 'protocol': 'tcp'},
+            {'ip_address': '10.0.0.2', 'state': 'open', 'port': 22, 'protocol': 'tcp'},
+        ]
+
+        saved = save_scan_results(self.task, results, batch_size=2)
+
+        self.assertEqual(saved, 3)
+        self.assertEqual(ScanHost.objects.filter(task=self.task).count(), 2)
+        web01 = ScanHost.objects.get(task=self.task, ip_address='10.0.0.1')
+        self.assertEqual(web01.hostname, 'web01')
+        self.assertEqual(web01.results.count(), 2)
+
+    def test_address_spellings_share_one_host(self):
+        """测试同一地址的不同写法归为一条主机记录，所有结果都关联到它"""
+        results = [
+            {'ip_address': '2001:DB8::1', 'hostname': 'v6host', 'state': 'open', 'port': 22},
+            {'ip_address': '2001:0db8:0000:0000:0000:0000:0000:0001', 'state': 'open', 'port': 80},
+            {'ip_address': '2001:db8::1', 'mac_address': 'aa:bb:cc:00:11:22', 'state': 'closed', 'port': 443},
+            {'ip_address': '::ffff:10.0.0.1', 'state': 'open', 'port': 22},
+            {'ip_address': '10.0.0.1', 'state': 'open', 'port': 80},
+        ]
+
+        save_scan_results(self.task, results)
+
+        hosts = ScanHost.objects.filter(task=self.task)
+        self.assertEqual(sorted(host.ip_address for host in hosts), ['10.0.0.1', '2001:db8::1'])
+        v6host = hosts.get(ip_address='2001:db8::1')
+        self.assertEqual((v6host.hostname, v6host.mac_address), ('v6host', 'aa:bb:cc:00:11:22'))
+        self.assertEqual(v6host.results.count(), 3)
+        self.assertEqual(hosts.get(ip_address='10.0.0.1').results.count(), 2)
+        self.assertFalse(ScanResult.objects.filter(task=self.task, host__isnull=True).exists())
+
+    def test_error_rows_are_skipped(self):
+        """测试扫描器报告的错误条目不入库"""
+        results = [
+            {'error': '目标地址不合法'},
+            {'ip_address': '10.0.0.1', 'port': 80, 'state': 'error', 'error': 'timeout'},
+            {'ip_address': '10.0.0.1', 'port': 81, 'state': 'closed'},
+        ]
+
+        self.assertEqual(save_scan_results(self.task, results), 1)
+
+    def test_serializer_keeps_flat_shape(self):
+        """测试序列化输出仍包含主机字段"""
+        save_scan_results(self.task, [
+            {'ip_address': '10.0.0.1', 'hostname': 'web01', 'os_family': 'Linux', 'state': 'open', 'port': 80},
+        ])
+        data = ScanResultSerializer(ScanResult.objects.get(task=self.task)).data
+
+        self.assertEqual(data['hostname'], 'web01')
+        self.assertEqual(data['os_family'], 'Linux')
+        self.assertEqual(data['os_version'], '')
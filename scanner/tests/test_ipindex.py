@@ -0,0 +1,89 @@
+import os
+import tempfile
+
+import numpy as np
+from django.test import TestCase
+
+from scanner.enrichment import IPIndex, enrich_task
+from scanner.enrichment.ipindex import read_csv
+from scanner.models import NetworkTopology, ScanHost, ScanTask
+
+DATA = """network,asn,organization,country
+10.0.0.0/8,64500,Example Backbone,US
+10.1.0.0/16,64501,Example Regional,DE
+10.1.2.0/24,64502,Example Customer,DE
+192.0.2.0/24,AS64503,Doc Net,JP
+2001:db8::/32,64504,Example V6,NL
+2001:db8:1::/48,64505,Example V6 Customer,NL
+2001:db8:2::/80,64506,Too Specific,NL
+"""
+
+
+class IPIndexTest(TestCase):
+    """离线IP归属索引测试"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.source = os.path.join(self.tmp.name, 'asn.csv')
+        with open(self.source, 'w', encoding='utf-8') as f:
+            f.write(DATA)
+        self.index = IPIndex.from_csv([self.source])
+
+    def test_longest_prefix_match(self):
+        """嵌套网段按最长前缀匹配"""
+        self.assertEqual(self.index.lookup('10.1.2.3'), (64502, 'Example Customer', 'DE'))
+        self.assertEqual(self.index.lookup('10.1.3.1'), (64501, 'Example Regional', 'DE'))
+        self.assertEqual(self.index.lookup('10.200.0.1'), (64500, 'Example Backbone', 'US'))
+        self.assertEqual(self.index.lookup('10.1.2.255'), (64502, 'Example Customer', 'DE'))
+        self.assertEqual(self.index.lookup('10.1.3.0'), (64501, 'Example Regional', 'DE'))
+        self.assertEqual(self.index.lookup('192.0.2.1')[0], 64503)
+        self.assertIsNone(self.index.lookup('8.8.8.8'))
+        self.assertIsNone(self.index.lookup('not-an-ip'))
+
+    def test_ipv6(self):
+        """IPv6按前64位匹配，长于/64的前缀被忽略"""
+        self.assertEqual(self.index.lookup('2001:db8:1::1')[0], 64505)
+        self.assertEqual(self.index.lookup('2001:db8:2::1')[0], 64504)
+        self.assertIsNone(self.index.lookup('2001:db9::1'))
+
+    def test_save_and_mmap_load(self):
+        """索引保存后以内存映射方式加载，结果一致"""
+        directory = os.path.join(self.tmp.name, 'index')
+        self.index.save(directory)
+        loaded = IPIndex.load(directory)
+        self.assertIsInstance(loaded.v4_starts, np.memmap)
+        ips = ['10.1.2.3', '2001:db8:1::1', '8.8.8.8', '192.0.2.9']
+        self.assertEqual(loaded.lookup_many(ips), self.index.lookup_many(ips))
+
+    def test_vectorized_lookup(self):
+        """整数数组批量查找"""
+        values = np.array([0x0A010203, 0x0A640001, 0x08080808], dtype=np.uint32)
+        records = self.index.lookup_ipv4(values)
+        self.assertEqual([self.index.records[i][0] if i >= 0 else None for i in records],
+                         [64502, 64500, None])
+
+    def test_range_columns(self):
+        """支持 start_ip/end_ip 区间格式的TSV"""
+        path = os.path.join(self.tmp.name, 'ranges.tsv')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write('range_start\trange_end\tAS_number\tcountry_code\tAS_description\n')
+            f.write('1.0.0.0\t1.0.0.255\t13335\tUS\tCLOUDFLARENET\n')
+            f.write('bad\trow\t1\tUS\tX\n')
+        entries = list(read_csv(path))
+        self.assertEqual(entries, [((4, 0x01000000, 0x010000FF), (13335, 'CLOUDFLARENET', 'US'))])
+
+    def test_enrich_task(self):
+        """批量补全任务主机和拓扑记录"""
+        task = ScanTask.objects.create(name='enrich', target='10.0.0.0/8', scan_type='SYN_SCAN')
+        ScanHost.objects.create(task=task, ip_address='10.1.2.3')
+        ScanHost.objects.create(task=task, ip_address='8.8.8.8')
+        link = NetworkTopology.objects.create(task=task, source_ip='10.1.2.3', destination_ip='192.0.2.1',
+                                              connection_type='hop')
+
+        self.assertEqual(enrich_task(task, self.index), {'hosts': 1, 'topology': 1})
+        host = ScanHost.objects.get(task=task, ip_address='10.1.2.3')
+        self.assertEqual((host.asn, host.as_org, host.country), (64502, 'Example Customer', 'DE'))
+        self.assertIsNone(ScanHost.objects.get(task=task, ip_address='8.8.8.8').asn)
+        link.refresh_from_db()
+        self.assertEqual(link.metadata['destination_owner']['country'], 'JP')
@@ -0,0 +1,143 @@
+from unittest.mock import patch
+
+from django.test import TestCase, override_settings
+
+from scanner.liveness import LivenessCache
+from scanner.models import ScanResult, ScanTask
+from scanner.scanners.scapy_scanner import ScapyScanner
+from scanner.tasks import run_scan_task
+from scanner.tests.fakes import FakeNetwork
+
+
+class FakeRedis:
+    """只实现位图缓存用到的命令"""
+
+    def __init__(self):
+        self.data = {}
+        self.expiry = {}
+
+    def pipeline(self, transaction=False):
+        return FakePipeline(self)
+
+    def setbit(self, key, offset, value):
+        bitmap = bytearray(self.data.get(key, b''))
+        index = offset >> 3
+        if len(bitmap) <= index:
+            bitmap.extend(b'\x00' * (index + 1 - len(bitmap)))
+        mask = 1 << (7 - (offset & 7))
+        bitmap[index] = bitmap[index] | mask if value else bitmap[index] & ~mask
+        self.data[key] = bytes(bitmap)
+
+    def expireat(self, key, when):
+        self.expiry[key] = when
+
+    def get(self, key):
+        return self.data.get(key)
+
+
+class FakePipeline:
+    def __init__(self, client):
+        self.client = client
+        self.calls = []
+
+    def __getattr__(self, name):
+        return lambda *args: self.calls.append((name, args))
+
+    def execute(self):
+        return [getattr(self.client, name)(*args) for name, args in self.calls]
+
+
+class LivenessCacheTest(TestCase):
+    """无响应地址缓存测试"""
+
+    def setUp(self):
+        self.redis = FakeRedis()
+        self.now = 1_000_000.0
+        self.cache = LivenessCache(self.redis, ttl=800, sample_rate=0.1,
+                                   rng=lambda: 0.5, clock=lambda: self.now)
+
+    def test_dead_addresses_skipped_and_counted(self):
+        """测试记录为无响应的地址被跳过，并统计命中率"""
+        self.cache.mark_dead(['10.1.2.3', '10.1.200.4'])
+        targets = self.cache.filter_targets(['10.1.2.3', '10.1.2.4', '10.1.200.4', '10.2.0.1'])
+
+        self.assertEqual(targets, ['10.1.2.4', '10.2.0.1'])
+        # 同一个/16只占一个位图
+        self.assertEqual(len(self.redis.data), 1)
+        stats = self.cache.stats()
+        self.assertEqual(stats['hits'], 2)
+        self.assertEqual(stats['skipped'], 2)
+        self.assertEqual(stats['hit_rate'], 0.5)
+
+    def test_sampling_and_revival(self):
+        """测试按采样率重新探测，探测到存活后清除记录"""
+        self.cache.mark_dead(['10.1.2.3'])
+        self.cache.rng = lambda: 0.05
+        self.assertEqual(self.cache.filter_targets(['10.1.2.3']), ['10.1.2.3'])
+        self.assertEqual(self.cache.stats()['sampled'], 1)
+
+        self.cache.mark_alive(['10.1.2.3'])
+        self.assertEqual(self.cache.dead_addresses(['10.1.2.3']), set())
+
+    def test_records_expire_with_bucket(self):
+        """测试记录在TTL之后不再生效，IPv6和无Redis时不做处理"""
+        self.cache.mark_dead(['10.1.2.3', '2001:db8::1'])
+        self.now += 800 + 2 * self.cache.bucket_seconds
+        self.assertEqual(self.cache.dead_addresses(['10.1.2.3', '2001:db8::1']), set())
+
+        disabled = LivenessCache()
+        self.assertEqual(disabled.filter_targets(['10.1.2.3']), ['10.1.2.3'])
+        self.assertFalse(disabled.stats()['enabled'])
+
+
+class ScannerLivenessTest(TestCase):
+    """扫描结果更新无响应缓存测试"""
+
+    def setUp(self):
+        self.cache = LivenessCache(FakeRedis(), ttl=800, sample_rate=0, clock=lambda: 1_000_000.0)
+        self.network = FakeNetwork(hosts=['10.1.0.1'], firewalled=['10.1.0.2'])
+
+    def _scan(self, ip, scan_type):
+        scanner = ScapyScanner(target=ip, ports='53,80', liveness=self.cache)
+        with self.network.patch():
+            return scanner.execute_scan(scan_type)
+
+    def test_only_silent_hosts_marked_dead(self):
+        """测试防火墙回复ICMP不可达的主机端口为过滤但不记为无响应，完全没有回复的才记录"""
+        firewalled = self._scan('10.1.0.2', 'SYN_SCAN')
+        self.assertEqual([row['state'] for row in firewalled], ['filtered', 'filtered'])
+        for scan_type in ('SYN_SCAN', 'UDP_SCAN'):
+            with self.subTest(scan_type=scan_type):
+                self._scan('10.1.0.2', scan_type)
+                self._scan('10.1.0.1', scan_type)
+                self._scan('10.1.0.3', scan_type)
+                self.assertEqual(self.cache.dead_addresses(['10.1.0.1', '10.1.0.2', '10.1.0.3']), {'10.1.0.3'})
+
+
+class TaskLivenessTest(TestCase):
+    """任务共用无响应缓存测试"""
+
+    def setUp(self):
+        self.cache = LivenessCache(FakeRedis(), ttl=800, sample_rate=0, clock=lambda: 1_000_000.0)
+        patcher = patch.object(LivenessCache, 'from_settings', return_value=self.cache)
+        self.from_settings = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @override_settings(SCAN_SHARD_COST=20)
+    def test_sharded_task_reports_hit_rate(self):
+        """测试分片执行的任务各分片共用一个缓存，命中统计写入结果摘要"""
+        self.cache.mark_dead(['10.0.0.6'])
+        task = ScanTask.objects.create(name='分片任务', target='10.0.0.0/29', ports='20-29', scan_type='SYN_SCAN',
+                                       options={'reverse_dns': False})
+        network = FakeNetwork(hosts=[f'10.0.0.{i}' for i in range(1, 6)])
+        with network.patch():
+            self.assertEqual(run_scan_task(task.id)['status'], 'completed')
+
+        task.refresh_from_db()
+        self.assertEqual(task.result_summary['shards'], 3)
+        self.assertEqual(self.from_settings.call_count, 1)
+        self.assertNotIn('10.0.0.6', {ip for ip, _ in network.probes})
+        self.assertEqual(ScanResult.objects.for_task(task).count(), 50)
+        stats = task.result_summary['liveness_cache']
+        self.assertEqual((stats['lookups'], stats['hits'], stats['skipped']), (6, 1, 1))
+        self.assertEqual(stats['hit_rate'], round(1 / 6, 4))
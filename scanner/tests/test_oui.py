@@ -0,0 +1,84 @@
+import os
+import tempfile
+
+from django.test import TestCase
+
+from scanner.enrichment import OUITable, fill_vendors, get_oui_table
+from scanner.enrichment.oui import parse_mac
+from scanner.ingest import save_scan_results
+from scanner.models import ScanHost, ScanTask
+
+REGISTRY = """Registry,Assignment,Organization Name,Organization Address
+MA-L,0050C2,IEEE Registration Authority,
+MA-M,0050C21,Example Medium Block,
+MA-S,0050C2123,Example Small Block,
+MA-L,000C29,"VMware, Inc.",
+"""
+
+
+class OUITableTest(TestCase):
+    """MAC厂商表测试"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        path = os.path.join(self.tmp.name, 'oui.csv')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(REGISTRY)
+        self.table = OUITable.from_csv([path])
+
+    def test_parse_mac(self):
+        """支持常见分隔写法，无效地址返回-1"""
+        self.assertEqual(parse_mac('00:0c:29:AA:BB:CC'), 0x000C29AABBCC)
+        self.assertEqual(parse_mac('00-0C-29-AA-BB-CC'), 0x000C29AABBCC)
+        self.assertEqual(parse_mac('000c.29aa.bbcc'), 0x000C29AABBCC)
+        self.assertEqual(parse_mac('00:0c:29'), -1)
+        self.assertEqual(parse_mac('zz:0c:29:aa:bb:cc'), -1)
+        self.assertEqual(parse_mac(None), -1)
+
+    def test_longest_block_wins(self):
+        """36位、28位、24位前缀按由长到短匹配"""
+        self.assertEqual(
+            self.table.lookup_many([
+                '00:50:C2:12:34:56',
+                '00:50:C2:1F:00:01',
+                '00:50:C2:FF:00:01',
+                '00:0C:29:01:02:03',
+                '11:22:33:44:55:66',
+                'invalid',
+            ]),
+            ['Example Small Block', 'Example Medium Block', 'IEEE Registration Authority',
+             'VMware, Inc.', '', ''],
+        )
+
+    def test_save_and_load(self):
+        """编译结果保存为单个文件后可重新加载"""
+        path = os.path.join(self.tmp.name, 'oui.npz')
+        self.table.save(path)
+        loaded = OUITable.load(path)
+        self.assertEqual(len(loaded), len(self.table))
+        self.assertEqual(loaded.lookup('00:50:C2:12:3F:FF'), 'Example Small Block')
+
+    def test_bundled_registry(self):
+        """未编译厂商表时使用内置登记表"""
+        with self.settings(OUI_TABLE_PATH=os.path.join(self.tmp.name, 'missing.npz')):
+            self.assertEqual(get_oui_table().lookup('00:50:56:00:00:01'), 'VMware, Inc.')
+
+    def test_fill_vendors(self):
+        """只补全缺少厂商的主机"""
+        host_attrs = {
+            '10.0.0.1': {'mac_address': '00:0c:29:aa:bb:cc'},
+            '10.0.0.2': {'mac_address': '00:0c:29:aa:bb:cd', 'vendor': 'Custom'},
+            '10.0.0.3': {},
+        }
+        self.assertEqual(fill_vendors(host_attrs, self.table), 1)
+        self.assertEqual(host_attrs['10.0.0.1']['vendor'], 'VMware, Inc.')
+        self.assertEqual(host_attrs['10.0.0.2']['vendor'], 'Custom')
+
+    def test_ingest_fills_vendor(self):
+        """入库时根据MAC地址补全主机厂商"""
+        task = ScanTask.objects.create(name='oui', target='10.0.0.0/24', scan_type='PING_SWEEP')
+        save_scan_results(task, [
+            {'ip_address': '10.0.0.1', 'state': 'up', 'mac_address': '08:00:27:12:34:56'},
+        ])
+        self.assertEqual(ScanHost.objects.get(task=task).vendor, 'PCS Systemtechnik GmbH')
@@ -0,0 +1,84 @@
+from datetime import datetime, timezone as dt_timezone
+from io import StringIO
+from unittest import skipUnless
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.utils import timezone
+
+from scanner import partitioning
+from scanner.models import ScanTask, ScanResult
+
+
+class PartitionHelperTest(TestCase):
+    """分区辅助函数测试"""
+
+    def test_add_months_crosses_year(self):
+        """测试跨年的月份偏移"""
+        start = datetime(2025, 11, 15, tzinfo=dt_timezone.utc)
+        self.assertEqual(partitioning.add_months(start, 2), datetime(2026, 1, 1, tzinfo=dt_timezone.utc))
+        self.assertEqual(partitioning.add_months(start, -11), datetime(2024, 12, 1, tzinfo=dt_timezone.utc))
+
+    def test_partition_name_round_trip(self):
+        """测试分区名与时间范围互相转换"""
+        name = partitioning.partition_name(datetime(2025, 12, 1, tzinfo=dt_timezone.utc))
+        self.assertEqual(name, 'scanner_scanresult_p202512')
+        start, end = partitioning.partition_bounds(name)
+        self.assertEqual(start, datetime(2025, 12, 1, tzinfo=dt_timezone.utc))
+        self.assertEqual(end, datetime(2026, 1, 1, tzinfo=dt_timezone.utc))
+        self.assertIsNone(partitioning.partition_bounds('scanner_scanresult_default'))
+
+    def test_command_is_noop_without_postgresql(self):
+        """测试非PostgreSQL数据库上命令直接跳过"""
+        if partitioning.partitioning_supported():
+            self.skipTest('PostgreSQL上不适用')
+        out = StringIO()
+        call_command('manage_result_partitions', stdout=out)
+        self.assertIn('不支持原生分区', out.getvalue())
+
+
+@skipUnless(partitioning.partitioning_supported(), '需要PostgreSQL')
+class PartitionConversionTest(TestCase):
+    """在PostgreSQL上转换已有数据的结果表"""
+
+    def _create(self, task, ip):
+        return ScanResult.objects.create(task=task, ip_address=ip, port=22, state='open')
+
+    def test_convert_populated_table(self):
+        """测试标识列主键的普通表转换后数据保留、新行继续取得递增的id，回滚后同样可写入"""
+        task = ScanTask.objects.create(name='分区任务', target='10.0.0.0/24', scan_type='SYN_SCAN')
+        # 测试库由迁移创建时已经分区，先还原为 0001 迁移的表结构
+        with connection.schema_editor() as editor:
+            partitioning.revert_to_plain(editor)
+        self.assertFalse(partitioning.is_partitioned())
+        old = [self._create(task, f'10.0.0.{i}') for i in range(1, 4)]
+
+        with connection.schema_editor() as editor:
+            partitioning.convert_to_partitioned(editor)
+        self.assertTrue(partitioning.is_partitioned())
+        self.assertTrue(partitioning.list_partitions())
+        new = self._create(task, '10.0.0.4')
+        self.assertGreater(new.id, max(row.id for row in old))
+        self.assertEqual(ScanResult.objects.filter(task=task).count(), 4)
+
+        with connection.schema_editor() as editor:
+            partitioning.revert_to_plain(editor)
+        self.assertFalse(partitioning.is_partitioned())
+        self.assertGreater(self._create(task, '10.0.0.5').id, new.id)
+        self.assertEqual(ScanResult.objects.filter(task=task).count(), 5)
+
+
+class ScanResultForTaskTest(TestCase):
+    """按任务限定结果查询测试"""
+
+    def test_for_task_bounds_by_task_window(self):
+        """测试结果查询附带任务时间窗口且不遗漏结果"""
+        task = ScanTask.objects.create(name='分区任务', target='10.0.0.1', scan_type='SYN_SCAN')
+        ScanResult.objects.create(task=task, ip_address='10.0.0.1', port=22, state='open')
+        task.completed_at = timezone.now()
+        task.save()
+
+        queryset = ScanResult.objects.for_task(task)
+        self.assertIn('discovered_at', str(queryset.query))
+        self.assertEqual(queryset.count(), 1)
@@ -0,0 +1,113 @@
+import os
+import tempfile
+from unittest.mock import patch
+
+import numpy as np
+from django.test import TestCase
+from scapy.all import ICMP, IP, TCP, UDP, Dot1Q, Ether, IPv6, Raw, wrpcap, wrpcapng
+
+from scanner.models import AttackFlow, TrafficCapture
+from scanner.tasks import ingest_traffic_capture
+from scanner.tracing import HCFTable
+from scanner.tracing.pcap import CaptureFormatError, read_capture
+
+ATTACKER, SPOOFER, VICTIM = '198.51.100.10', '192.0.2.7', '203.0.113.1'
+
+
+def packets():
+    frames = [
+        Ether() / IP(src=ATTACKER, dst=VICTIM, ttl=53) / TCP(dport=80),
+        Ether() / IP(src=ATTACKER, dst=VICTIM, ttl=53) / TCP(dport=80) / Raw(b'x' * 100),
+        Ether() / Dot1Q(vlan=7) / IP(src=ATTACKER, dst=VICTIM, ttl=45) / TCP(dport=80),
+        Ether() / IP(src=SPOOFER, dst=VICTIM, ttl=60) / UDP(dport=53),
+        Ether() / IP(src=SPOOFER, dst=VICTIM, ttl=60, proto=17, frag=10) / Raw(b'y' * 16),
+        Ether() / IP(src=SPOOFER, dst=VICTIM, ttl=60) / ICMP(),
+        Ether() / IPv6(src='2001:db8::1', dst='2001:db8::2') / TCP(dport=80),
+    ]
+    for i, frame in enumerate(frames):
+        frame.time = 1700000000 + i * 0.5
+    return frames
+
+
+def flow_map(flows):
+    return {(int(row['src']), int(row['dport']), int(row['proto'])): row for row in flows}
+
+
+def ip_int(ip):
+    return int.from_bytes(bytes(int(part) for part in ip.split('.')), 'big')
+
+
+class PcapIngestTest(TestCase):
+    """抓包流式导入测试"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.pcap = os.path.join(self.tmp.name, 'attack.pcap')
+        wrpcap(self.pcap, packets())
+
+    def test_pcap_flows(self):
+        """按 (源, 目的, 目的端口, 协议) 汇总，分片和ICMP目的端口为0，IPv6被跳过"""
+        flows, stats = read_capture(self.pcap)
+
+        self.assertEqual(stats['packets'], 7)
+        self.assertEqual(stats['skipped'], 1)
+        by_key = flow_map(flows)
+        self.assertEqual(set(by_key), {
+            (ip_int(ATTACKER), 80, 6), (ip_int(SPOOFER), 53, 17), (ip_int(SPOOFER), 0, 17), (ip_int(SPOOFER), 0, 1),
+        })
+        web = by_key[(ip_int(ATTACKER), 80, 6)]
+        self.assertEqual(int(web['packets']), 3)
+        self.assertEqual((int(web['ttl_min']), int(web['ttl_max'])), (45, 53))
+        self.assertEqual(int(web['bytes']), sum(len(frame) for frame in packets()[:3]))
+        self.assertAlmostEqual(float(web['first']), 1700000000.0, places=5)
+        self.assertAlmostEqual(float(web['last']), 1700000001.0, places=5)
+
+    def test_pcapng_and_raw_ip(self):
+        """pcapng文件和原始IP链路类型的结果与pcap一致"""
+        pcapng = os.path.join(self.tmp.name, 'attack.pcapng')
+        wrpcapng(pcapng, packets())
+        raw = os.path.join(self.tmp.name, 'raw.pcap')
+        wrpcap(raw, [frame[IP] for frame in packets()[:6]], linktype=101)
+
+        expected = flow_map(read_capture(self.pcap)[0])
+        for path in (pcapng, raw):
+            flows, _ = read_capture(path)
+            by_key = flow_map(flows)
+            self.assertEqual(set(by_key), set(expected))
+            self.assertEqual({key: int(row['packets']) for key, row in by_key.items()},
+                             {key: int(row['packets']) for key, row in expected.items()})
+
+    def test_chunked_compaction(self):
+        """分块读取并多次合并后与一次性汇总相同"""
+        expected = read_capture(self.pcap)[0]
+        with patch('scanner.tracing.pcap.COMPACT_ROWS', 1):
+            flows, _ = read_capture(self.pcap, chunk_size=2)
+        self.assertTrue(np.array_equal(flows, expected))
+
+    def test_hcf_flags_spoofed_packets(self):
+        """跳数与源网段不符的报文计入伪造报文数"""
+        hcf = HCFTable.build(np.array([ip_int(ATTACKER)], dtype=np.uint32), np.array([53]))
+        flows, _ = read_capture(self.pcap, hcf=hcf)
+        self.assertEqual(int(flow_map(flows)[(ip_int(ATTACKER), 80, 6)]['spoofed']), 1)
+
+    def test_task_saves_aggregates(self):
+        """后台任务写入流汇总和抓包统计，无法识别的文件标记为失败"""
+        capture = TrafficCapture.objects.create(name='attack', file_path=self.pcap)
+        ingest_traffic_capture(capture.id)
+
+        capture.refresh_from_db()
+        self.assertEqual(capture.status, 'COMPLETED')
+        self.assertEqual((capture.packets, capture.skipped_packets, capture.flow_count), (7, 1, 4))
+        flow = AttackFlow.objects.get(capture=capture, src_ip=ATTACKER)
+        self.assertEqual((flow.dst_ip, flow.dst_port, flow.protocol, flow.packets), (VICTIM, 80, 'tcp', 3))
+
+        bogus = os.path.join(self.tmp.name, 'bogus.pcap')
+        with open(bogus, 'wb') as f:
+            f.write(b'not a capture file')
+        with self.assertRaises(CaptureFormatError):
+            read_capture(bogus)
+        failed = TrafficCapture.objects.create(name='bogus', file_path=bogus)
+        ingest_traffic_capture(failed.id)
+        failed.refresh_from_db()
+        self.assertEqual(failed.status, 'FAILED')
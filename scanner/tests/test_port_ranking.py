@@ -0,0 +1,47 @@
+from django.core.cache import cache
+from django.test import TestCase
+
+from scanner.ingest import save_scan_results
+from scanner.models import ScanTask
+from scanner.port_ranking import (
+    DEFAULT_PORT_FREQUENCIES, get_port_ranking, order_ports, refresh_port_rankings
+)
+from scanner.scanners.base import BaseScanner
+
+
+class DummyScanner(BaseScanner):
+    def execute_scan(self, scan_type):
+        return []
+
+
+class PortRankingTest(TestCase):
+    """端口热度排序测试"""
+
+    def setUp(self):
+        cache.clear()
+
+    def test_default_table_when_cache_empty(self):
+        """测试缓存缺失时使用默认热度表"""
+        self.assertEqual(get_port_ranking('tcp'), DEFAULT_PORT_FREQUENCIES['tcp'])
+        self.assertEqual(order_ports([1, 22, 3389, 80, 2]), [80, 22, 3389, 1, 2])
+
+    def test_history_ranks_before_defaults(self):
+        """测试历史中常见的端口排在默认热度表之前"""
+        task = ScanTask.objects.create(name='热度', target='10.0.0.0/24', scan_type='SYN_SCAN')
+        save_scan_results(task, [
+            {'ip_address': f'10.0.0.{i}', 'port': 9200, 'state': 'open'} for i in range(1, 5)
+        ] + [{'ip_address': '10.0.0.1', 'port': 7000, 'state': 'open'}])
+        refresh_port_rankings()
+
+        ranking = get_port_ranking('tcp')
+        self.assertEqual(ranking[0], 9200)
+        # 样本不足的端口不参与排名
+        self.assertNotIn(7000, ranking)
+
+    def test_parse_ports_popularity_mode(self):
+        """测试扫描器在 popularity 模式下按热度返回端口"""
+        numeric = DummyScanner('10.0.0.1', ports='20-25,80')
+        popular = DummyScanner('10.0.0.1', ports='20-25,80', options={'port_order': 'popularity'})
+
+        self.assertEqual(numeric.parse_ports(), [20, 21, 22, 23, 24, 25, 80])
+        self.assertEqual(popular.parse_ports(), [80, 23, 21, 22, 25, 20, 24])
@@ -0,0 +1,64 @@
+from django.test import TestCase
+
+from scanner.scanners.rangeset import IntervalSet, TargetSet
+
+
+class IntervalSetTest(TestCase):
+    """区间集合测试"""
+
+    def test_parse_merges_and_indexes(self):
+        """测试解析时合并重叠区间，长度和下标访问不展开元素"""
+        ports = IntervalSet.parse('80,1-100,443,8000-8100')
+
+        self.assertEqual(ports.intervals, [(1, 100), (443, 443), (8000, 8100)])
+        self.assertEqual(len(ports), 202)
+        self.assertEqual(ports[100], 443)
+        self.assertEqual(ports[-1], 8100)
+        self.assertIn(8050, ports)
+        self.assertNotIn(444, ports)
+        with self.assertRaises(ValueError):
+            IntervalSet.parse('100-1')
+
+    def test_subtract(self):
+        """测试区间相减"""
+        ports = IntervalSet([(1, 100), (200, 300)])
+        excluded = IntervalSet([(50, 60), (90, 210), (300, 400)])
+
+        self.assertEqual(ports.subtract(excluded).intervals, [(1, 49), (61, 89), (211, 299)])
+
+    def test_permutation_covers_every_element_once(self):
+        """测试伪随机置换恰好覆盖每个元素一次，相同种子顺序一致"""
+        ports = IntervalSet.parse('1-50,100-149')
+        order = list(ports.permutation(seed=7))
+
+        self.assertEqual(sorted(order), list(ports))
+        self.assertNotEqual(order, list(ports))
+        self.assertEqual(order, list(ports.permutation(seed=7)))
+
+
+class TargetSetTest(TestCase):
+    """扫描目标集合测试"""
+
+    def test_large_network_stays_compact(self):
+        """测试/8网段不展开，主机范围与 hosts() 一致"""
+        targets = TargetSet.parse('10.0.0.0/8')
+
+        self.assertEqual(len(targets), 2 ** 24 - 2)
+        self.assertEqual(targets[0], '10.0.0.1')
+        self.assertEqual(targets[-1], '10.255.255.254')
+        self.assertEqual(len(targets.addresses.intervals), 1)
+
+    def test_mixed_targets_and_exclusion(self):
+        """测试混合目标解析和排除"""
+        targets = TargetSet.parse('192.168.1.0/30, 192.168.1.10-192.168.1.12 example.com 2001:db8::1')
+        self.assertEqual(
+            list(targets),
+            ['192.168.1.1', '192.168.1.2', '192.168.1.10', '192.168.1.11', '192.168.1.12',
+             '2001:db8::1', 'example.com'],
+        )
+
+        excluded = TargetSet.parse('192.168.1.11 192.168.1.2').addresses
+        self.assertEqual(
+            list(targets.exclude(excluded)),
+            ['192.168.1.1', '192.168.1.10', '192.168.1.12', '2001:db8::1', 'example.com'],
+        )
@@ -0,0 +1,91 @@
+import socket
+
+from django.core.cache import cache
+from django.test import TestCase
+
+from scanner.resolver import AsyncResolver, fill_hostnames, resolve_target
+
+ZONE = {
+    'example.com': ['93.184.216.34', '93.184.216.35'],
+    'www.example.com': ['93.184.216.34'],
+}
+PTR = {
+    '10.0.0.1': 'gateway.lan',
+}
+
+
+class FakeDNS:
+    """记录查询次数的假解析函数"""
+
+    def __init__(self):
+        self.forward_calls = []
+        self.reverse_calls = []
+
+    def getaddrinfo(self, name, port, family=0, type=0):
+        self.forward_calls.append(name)
+        if name not in ZONE:
+            raise socket.gaierror(socket.EAI_NONAME, 'Name or service not known')
+        return [(socket.AF_INET, type, 6, '', (address, 0)) for address in ZONE[name]]
+
+    def gethostbyaddr(self, ip):
+        self.reverse_calls.append(ip)
+        if ip not in PTR:
+            raise socket.herror(1, 'Unknown host')
+        return PTR[ip], [], [ip]
+
+
+class ResolverTest(TestCase):
+    """域名解析测试"""
+
+    def setUp(self):
+        cache.clear()
+        self.dns = FakeDNS()
+        self.resolver = AsyncResolver(concurrency=4, getaddrinfo=self.dns.getaddrinfo,
+                                      gethostbyaddr=self.dns.gethostbyaddr)
+
+    def test_resolve_and_cache(self):
+        """批量正向解析，重复查询命中缓存"""
+        result = self.resolver.resolve(['example.com', 'missing.invalid', 'example.com'])
+        self.assertEqual(result['example.com'], ['93.184.216.34', '93.184.216.35'])
+        self.assertEqual(result['missing.invalid'], [])
+        self.assertEqual(sorted(self.dns.forward_calls), ['example.com', 'missing.invalid'])
+
+        # 新的解析器实例共享同一缓存，失败结果也被缓存
+        resolver = AsyncResolver(getaddrinfo=self.dns.getaddrinfo)
+        self.assertEqual(resolver.resolve(['example.com', 'missing.invalid'])['example.com'][0], '93.184.216.34')
+        self.assertEqual(len(self.dns.forward_calls), 2)
+        self.assertEqual(resolver.stats(), {'lookups': 2, 'cache_hits': 2})
+
+    def test_resolve_target(self):
+        """目标中的域名替换为第一个地址，解析失败的域名被去掉"""
+        target, names = resolve_target('10.0.0.0/30, example.com missing.invalid', self.resolver)
+        self.assertEqual(target, '10.0.0.0/30 93.184.216.34')
+        self.assertEqual(names, {'93.184.216.34': 'example.com'})
+
+        self.assertEqual(resolve_target('10.0.0.1', self.resolver), ('10.0.0.1', {}))
+        self.assertEqual(self.dns.forward_calls, ['example.com', 'missing.invalid'])
+
+    def test_fill_hostnames(self):
+        """优先使用目标域名，其余有响应的地址反向解析，已有主机名不覆盖"""
+        results = [
+            {'ip_address': '93.184.216.34', 'port': 80, 'state': 'filtered'},
+            {'ip_address': '10.0.0.1', 'port': 22, 'state': 'open'},
+            {'ip_address': '10.0.0.2', 'port': 22, 'state': 'open', 'hostname': 'known.lan'},
+            {'ip_address': '10.0.0.3', 'port': 22, 'state': 'closed'},
+            {'ip_address': '10.0.0.4', 'state': 'up'},
+            {'ip_address': '10.0.0.5', 'port': 22, 'state': 'filtered'},
+            {'ip_address': '10.0.0.6', 'port': 53, 'state': 'open|filtered'},
+            {'ip_address': '10.0.0.7', 'port': 22, 'state': 'filtered'},
+            {'ip_address': '10.0.0.7', 'port': 80, 'state': 'closed'},
+        ]
+        filled = fill_hostnames(results, {'93.184.216.34': 'example.com'}, self.resolver)
+        self.assertEqual(filled, 2)
+        self.assertEqual([row.get('hostname') for row in results],
+                         ['example.com', 'gateway.lan', 'known.lan', None, None, None, None, None, None])
+        self.assertEqual(sorted(self.dns.reverse_calls), ['10.0.0.1', '10.0.0.3', '10.0.0.4', '10.0.0.7'])
+
+    def test_reverse_disabled(self):
+        """关闭反向解析时不发出查询"""
+        results = [{'ip_address': '10.0.0.1', 'port': 22, 'state': 'open'}]
+        self.assertEqual(fill_hostnames(results, resolver=self.resolver, reverse=False), 0)
+        self.assertEqual(self.dns.reverse_calls, [])
@@ -0,0 +1,142 @@
+from datetime import timedelta
+from unittest.mock import patch
+
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from scanner.fingerprints import fingerprint_cache
+from scanner.models import ScanResult, ScanTask
+from scanner.scheduling import classify, dispatch, estimate_cost, reclaim_stale, submit
+from scanner.tasks import run_scan_task
+from scanner.tests.fakes import FakeNetwork
+
+
+class Dispatched:
+    """记录放入Celery队列的任务，代替 run_scan_task.delay"""
+
+    def __init__(self):
+        self.ids = []
+
+    def __call__(self, task_id):
+        self.ids.append(task_id)
+
+
+@override_settings(SCAN_SCHEDULER_SLOTS=3, SCAN_INTERACTIVE_SLOTS=1, SCAN_INTERACTIVE_COST=20000)
+class SchedulerTest(TestCase):
+    """扫描任务调度测试"""
+
+    def setUp(self):
+        fingerprint_cache.clear()
+        self.alice = User.objects.create_user('alice')
+        self.bob = User.objects.create_user('bob')
+        self.dispatched = Dispatched()
+        patcher = patch('scanner.tasks.run_scan_task.delay', self.dispatched)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _task(self, user=None, target='10.0.0.0/16', ports='1-1000', scan_type='SYN_SCAN', **kwargs):
+        kwargs.setdefault('options', {'reverse_dns': False})
+        return ScanTask.objects.create(name='调度任务', target=target, ports=ports, scan_type=scan_type,
+                                       created_by=user, **kwargs)
+
+    def test_estimate_and_classify(self):
+        """测试按 地址数×端口数×扫描类型 估计开销并归类"""
+        self.assertEqual(estimate_cost(self._task(target='10.0.0.0/24')), 254 * 1000)
+        self.assertEqual(estimate_cost(self._task(target='10.0.0.0/24', scan_type='FULL_SCAN')), 254 * 1000 * 6)
+        self.assertEqual(estimate_cost(self._task(target='10.0.0.1 example.com', scan_type='TRACEROUTE')), 60)
+        self.assertEqual(classify(500), 'INTERACTIVE')
+        self.assertEqual(classify(500, 'BULK'), 'BULK')
+        self.assertEqual(classify(10 ** 6, 'INTERACTIVE'), 'NORMAL')
+
+    def test_reserved_slots_and_fair_share(self):
+        """测试交互任务使用保留槽位，空出的槽位优先给运行开销少的用户"""
+        first, second, third = (submit(self._task(self.alice)) for _ in range(3))
+        waiting = submit(self._task(self.bob))
+        quick = submit(self._task(self.bob, target='10.0.0.1', ports='22,80,443'))
+
+        self.assertEqual(quick.priority, 'INTERACTIVE')
+        self.assertEqual(self.dispatched.ids, [first.id, second.id, quick.id])
+
+        ScanTask.objects.filter(pk=first.pk).update(status='COMPLETED')
+        self.assertEqual(dispatch(), [waiting.id])
+        self.assertEqual(dispatch(), [])
+        third.refresh_from_db()
+        self.assertIsNone(third.dispatched_at)
+
+    @override_settings(SCAN_SCHEDULER_SLOTS=1, SCAN_INTERACTIVE_SLOTS=0, SCAN_PRIORITY_AGING=1800)
+    def test_aging(self):
+        """测试排队时间长的低优先级任务逐级提升"""
+        self._task(status='RUNNING')
+        old = self._task(priority='BULK', queued_at=timezone.now() - timedelta(hours=2))
+        self._task(priority='NORMAL', queued_at=timezone.now())
+        ScanTask.objects.filter(status='RUNNING').update(status='COMPLETED')
+        self.assertEqual(dispatch(), [old.id])
+
+    @override_settings(SCAN_SCHEDULER_SLOTS=2, SCAN_INTERACTIVE_SLOTS=0, SCAN_HEARTBEAT_TIMEOUT=600)
+    def test_stale_running_tasks_reclaimed(self):
+        """测试工作进程退出后失去心跳的运行中任务判为失败，空出的槽位调度排队的任务"""
+        now = timezone.now()
+        started = now - timedelta(hours=2)
+        lost = self._task(self.alice, status='RUNNING', started_at=started, heartbeat_at=now)
+        busy = self._task(self.alice, status='RUNNING', started_at=started, heartbeat_at=now)
+        waiting = submit(self._task(self.bob))
+        self.assertEqual(self.dispatched.ids, [])
+
+        ScanTask.objects.filter(pk=lost.pk).update(heartbeat_at=now - timedelta(minutes=11))
+        ScanTask.objects.filter(pk=busy.pk).update(heartbeat_at=now - timedelta(minutes=9))
+        self.assertEqual(dispatch(), [waiting.id])
+        lost.refresh_from_db()
+        busy.refresh_from_db()
+        self.assertEqual((lost.status, busy.status), ('FAILED', 'RUNNING'))
+
+        # 没有心跳记录的任务按开始时间判断
+        ScanTask.objects.filter(pk=busy.pk).update(heartbeat_at=None)
+        self.assertEqual(reclaim_stale(), [busy.id])
+
+    @override_settings(SCAN_SCHEDULER_SLOTS=1, SCAN_INTERACTIVE_SLOTS=0, SCAN_SHARD_COST=20)
+    def test_preempt_at_shard_boundary(self):
+        """测试长任务在分片边界让出，之后从未完成的分片继续"""
+        long_task = submit(self._task(self.alice, target='10.0.0.0/29', ports='20-29'), priority='NORMAL')
+        quick = submit(self._task(self.bob, target='10.0.0.100', ports='22'))
+        self.assertEqual(self.dispatched.ids, [long_task.id])
+
+        network = FakeNetwork(hosts=[f'10.0.0.{i}' for i in range(1, 7)], open_ports=[('10.0.0.3', 22)])
+        with network.patch():
+            result = run_scan_task(long_task.id)
+        self.assertEqual(result['status'], 'preempted')
+        long_task.refresh_from_db()
+        self.assertEqual((long_task.status, long_task.preemptions), ('PENDING', 1))
+        self.assertIsNotNone(long_task.heartbeat_at)
+        self.assertEqual(len(network.probes), 20)
+        self.assertEqual(self.dispatched.ids, [long_task.id, quick.id])
+
+        ScanTask.objects.filter(pk=quick.pk).update(status='COMPLETED')
+        with network.patch():
+            self.assertEqual(run_scan_task(long_task.id)['status'], 'completed')
+        long_task.refresh_from_db()
+        self.assertEqual(long_task.status, 'COMPLETED')
+        self.assertEqual(len(network.probes), 60)
+        self.assertEqual(len(set(network.probes)), 60)
+        results = ScanResult.objects.for_task(long_task)
+        self.assertEqual(results.count(), 60)
+        self.assertEqual(list(results.filter(state='open').values_list('ip_address', 'port')), [('10.0.0.3', 22)])
+        self.assertEqual(long_task.result_summary['shards'], 3)
+        self.assertEqual(long_task.result_summary['scheduling']['preemptions'], 1)
+
+    @override_settings(SCAN_SHARD_COST=40)
+    def test_sharded_scans_with_scapy(self):
+        """测试SYN和UDP任务按分片用真实的Scapy扫描器完成"""
+        network = FakeNetwork(hosts=['10.0.0.1', '10.0.0.5'], open_ports=[('10.0.0.5', 53)],
+                              firewalled=['10.0.0.2'])
+        for scan_type, shards in (('SYN_SCAN', 2), ('UDP_SCAN', 6)):
+            task = submit(self._task(self.alice, target='10.0.0.0/29', ports='50-59', scan_type=scan_type))
+            with network.patch():
+                self.assertEqual(run_scan_task(task.id)['status'], 'completed')
+            task.refresh_from_db()
+            self.assertEqual(task.status, 'COMPLETED')
+            self.assertEqual(task.result_summary['shards'], shards)
+            results = ScanResult.objects.for_task(task)
+            self.assertEqual(results.count(), 60)
+            self.assertEqual(set(results.values_list('ip_address', flat=True)), {f'10.0.0.{i}' for i in range(1, 7)})
+            self.assertEqual(list(results.filter(state='open').values_list('ip_address', 'port')), [('10.0.0.5', 53)])
@@ -1,8 +1,9 @@
 import pytest
 from django.test import TestCase
 from unittest.mock import patch, MagicMock
-from scanner.models import ScanTask
+from scanner.models import ScanResult, ScanTask
 from scanner.tasks import run_scan_task, cleanup_old_tasks
+from scanner.tests.fakes import FakeNetwork
 
 class ScanTaskTest(TestCase):
     """扫描任务测试"""
@@ -11,7 +12,8 @@ class ScanTaskTest(TestCase):
         self.task = ScanTask.objects.create(
             name='集成测试任务',
             target='127.0.0.1',
-            scan_type='SYN_SCAN'
+            scan_type='SYN_SCAN',
+            options={'reverse_dns': False}
         )
     
     @patch('scanner.tasks.ScapyScanner')
@@ -38,6 +40,31 @@ class ScanTaskTest(TestCase):
         self.assertEqual(results.count(), 1)
         self.assertEqual(results.first().port, 80)
     
+    def test_run_scan_task_network_target(self):
+        """测试网段目标的全部探测在一轮 sr() 中发出"""
+        ScanTask.objects.filter(pk=self.task.pk).update(target='10.0.0.0/29', ports='22,80')
+        network = FakeNetwork(hosts=['10.0.0.1', '10.0.0.2'], open_ports=[('10.0.0.1', 22)])
+        with network.patch():
+            result = run_scan_task(self.task.id)
+
+        self.assertEqual(result['status'], 'completed')
+        self.assertEqual(len(network.probes), 12)
+        self.assertEqual(network.rounds, 1)
+        results = ScanResult.objects.filter(task=self.task)
+        self.assertEqual({row.ip_address for row in results}, {f'10.0.0.{i}' for i in range(1, 7)})
+        self.assertEqual([(row.ip_address, row.port) for row in results.filter(state='open')], [('10.0.0.1', 22)])
+        self.assertEqual(results.filter(state='closed').count(), 3)
+
+    @patch('scanner.scanners.scapy_scanner.ScapyScanner.PROBE_BATCH_SIZE', 4)
+    def test_run_scan_task_probe_batches(self):
+        """测试每轮 sr() 的探测数不超过上限，每批包含若干地址的全部端口"""
+        ScanTask.objects.filter(pk=self.task.pk).update(target='10.0.0.0/29', ports='22,80')
+        network = FakeNetwork(hosts=['10.0.0.1'])
+        with network.patch():
+            self.assertEqual(run_scan_task(self.task.id)['status'], 'completed')
+        self.assertEqual(network.rounds, 3)
+        self.assertEqual(len(set(network.probes)), 12)
+
     def test_run_scan_task_invalid_id(self):
         """测试无效任务ID"""
         result = run_scan_task(99999)  # 不存在的ID
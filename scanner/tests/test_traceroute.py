@@ -0,0 +1,89 @@
+from unittest.mock import patch
+
+from django.test import TestCase
+
+from scanner.models import NetworkTopology, ScanTask
+from scanner.scanners.traceroute import Reply, TracerouteScanner
+from scanner.tasks import run_scan_task
+
+SOURCE = '10.0.0.1'
+R1, R2, R3, R4, R5 = '192.168.0.1', '100.64.0.1', '198.51.100.1', '198.51.100.2', '198.51.100.3'
+D1, D2, D3 = '203.0.113.10', '203.0.113.20', '203.0.113.30'
+
+# 目标 -> 按TTL排列的响应地址，None表示该跳无响应
+PATHS = {
+    D1: [R1, R2, R3, R4, D1],
+    D2: [R1, R2, R3, R5, D2],
+    D3: [R1, R2, R3] + [None] * 10,
+}
+
+
+class FakeTraceroute(TracerouteScanner):
+    """按预设路径应答的路由跟踪，记录每个探测"""
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault('options', {'source': SOURCE, 'start_ttl': 3})
+        super().__init__(*args, **kwargs)
+        self.sent = []
+
+    def _send_round(self, probes):
+        replies = {}
+        for destination, ttl in probes:
+            self.sent.append((destination, ttl))
+            path = PATHS[destination]
+            ip = path[ttl - 1] if ttl <= len(path) else None
+            if ip:
+                reached = ip == destination
+                replies[destination] = Reply(ip, ttl * 1.5, reached, 64 - ttl, reached)
+        return replies
+
+
+class TracerouteTest(TestCase):
+    """并行路由跟踪测试"""
+
+    def test_doubletree_stops_on_shared_hops(self):
+        """共享的近端路径只由第一个目标回溯一次"""
+        scanner = FakeTraceroute(target=f'{D1} {D2} {D3}')
+        results = scanner.execute_scan('TRACEROUTE')
+
+        self.assertEqual(sorted(row['ip_address'] for row in results), [D1, D2])
+        self.assertEqual(sorted(ttl for dst, ttl in scanner.sent if dst == D1), [1, 2, 3, 4, 5])
+        self.assertEqual(sorted(ttl for dst, ttl in scanner.sent if dst == D2), [3, 4, 5])
+        # 连续3跳无响应后停止
+        self.assertEqual(sorted(ttl for dst, ttl in scanner.sent if dst == D3), [3, 4, 5, 6])
+        self.assertEqual(scanner.stats()['probes_sent'], 12)
+
+    def test_edges(self):
+        """相邻响应跳组成去重的有向边"""
+        scanner = FakeTraceroute(target=f'{D1} {D2} {D3}')
+        scanner.execute_scan('TRACEROUTE')
+        edges = {(edge['source_ip'], edge['destination_ip']): edge['metadata'] for edge in scanner.edges()}
+
+        self.assertEqual(set(edges), {
+            (SOURCE, R1), (R1, R2), (R2, R3), (R3, R4), (R4, D1), (R3, R5), (R5, D2),
+        })
+        self.assertEqual(edges[(R4, D1)]['ttl'], 5)
+        self.assertEqual(edges[(R4, D1)]['rtt'], 7.5)
+        self.assertEqual(edges[(R1, R2)]['gap'], 0)
+
+    def test_excluded_and_named_targets_skipped(self):
+        """排除范围内的地址和域名不做路由跟踪"""
+        from scanner.scanners.rangeset import IntervalSet, address_range
+
+        scanner = FakeTraceroute(target=f'{D1} {D2} example.com',
+                                 exclusions=IntervalSet([address_range(D2)]))
+        scanner.execute_scan('TRACEROUTE')
+        self.assertEqual({dst for dst, _ in scanner.sent}, {D1})
+
+    @patch('scanner.tasks.TracerouteScanner', FakeTraceroute)
+    def test_task_saves_topology(self):
+        """路由跟踪任务把发现的边写入网络拓扑"""
+        task = ScanTask.objects.create(name='trace', target=f'{D1} {D2}', scan_type='TRACEROUTE',
+                                       options={'source': SOURCE, 'start_ttl': 3, 'alias_resolution': False,
+                                                'reverse_dns': False})
+        result = run_scan_task(task.id)
+
+        self.assertEqual(result['status'], 'completed')
+        self.assertEqual(NetworkTopology.objects.filter(task=task, connection_type='traceroute').count(), 7)
+        task.refresh_from_db()
+        self.assertEqual(task.result_summary['traceroute']['reached'], 2)
@@ -0,0 +1,8 @@
+"""
+网络拓扑分析
+路由跟踪结果的后处理：接口别名解析和路径查询
+"""
+from .aliases import alias_map, collapse_edges, resolve_aliases
+from .graph import TopologyGraph, get_graph, invalidate_graph
+
+__all__ = ['alias_map', 'collapse_edges', 'resolve_aliases', 'TopologyGraph', 'get_graph', 'invalidate_graph']
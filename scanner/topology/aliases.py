@@ -0,0 +1,286 @@
+"""
+路由器别名解析
+路由跟踪发现的是路由器接口，同一台路由器的多个接口需要合并为一个节点，拓扑才不会虚增。
+
+两类证据（MIDAR/Ally的思路）：
+- IP-ID时间序列：多数路由器所有接口共用一个IP-ID计数器。按轮并行探测全部接口采集 (时间, IP-ID)，
+  两个接口的样本合并后仍满足单调且增长不超过速度上限（单调边界测试），则判定为同一计数器；
+- 共同源地址：探测一个接口，端口不可达应答却来自另一个地址，两者属于同一台路由器。
+
+候选对不做O(n²)枚举：先按计数器速度排序，只在速度相近的滑动窗口内配对，
+再要求两者跳数相差不超过1，并排除路径上相邻的接口（相邻接口必然分属不同路由器）。
+"""
+import logging
+import time
+from collections import defaultdict
+from typing import Callable, Dict, FrozenSet, Iterable, Iterator, List, Optional, Set, Tuple
+
+from django.db import transaction
+
+from ..fields import ip_to_int
+from .graph import invalidate_graph
+
+logger = logging.getLogger(__name__)
+
+IPID_SPACE = 65536
+
+# 相邻两个样本之间IP-ID增量超过该值视为随机或按流分配，不能用于别名判定
+MAX_STEP = IPID_SPACE // 2
+
+MIN_SAMPLES = 4
+
+# 单调边界测试的容差：速度估计误差比例、应答时间与IP-ID分配时间的偏差（秒）、固定余量
+VELOCITY_TOLERANCE = 0.5
+TIMING_JITTER = 0.05
+BOUND_SLACK = 16
+
+# 候选配对的速度窗口：相对误差和绝对误差（每秒）
+WINDOW_RATIO = 0.2
+WINDOW_ABSOLUTE = 1.0
+
+Sample = Tuple[float, int]
+
+
+def ipid_velocity(samples: List[Sample]) -> Optional[float]:
+    """
+    IP-ID计数器每秒增长量
+
+    样本不足、计数器不变或增量看起来随机时返回None，这类接口不参与IP-ID判定。
+    """
+    if len(samples) < MIN_SAMPLES:
+        return None
+    samples = sorted(samples)
+    total = 0
+    for (_, first), (_, second) in zip(samples, samples[1:]):
+        delta = (second - first) % IPID_SPACE
+        if delta > MAX_STEP:
+            return None
+        total += delta
+    duration = samples[-1][0] - samples[0][0]
+    if total == 0 or duration <= 0:
+        return None
+    return total / duration
+
+
+def monotonic_bounds_test(samples: List[Sample], velocity: float) -> bool:
+    """
+    合并后的样本按时间排序，相邻样本的IP-ID增量（模2^16）都不超过速度允许的上限
+
+    来自不同计数器的样本交错后，总会在某处出现远超上限的跳变。
+    """
+    merged = sorted(samples)
+    for (t1, first), (t2, second) in zip(merged, merged[1:]):
+        bound = velocity * (t2 - t1 + TIMING_JITTER) * (1 + VELOCITY_TOLERANCE) + BOUND_SLACK
+        if (second - first) % IPID_SPACE > bound:
+            return False
+    return True
+
+
+def candidate_pairs(interfaces: Dict[str, Tuple[int, float]],
+                    adjacent: Set[FrozenSet[str]] = frozenset(),
+                    max_hop_difference: int = 1) -> Iterator[Tuple[str, str]]:
+    """
+    生成待测试的接口对
+
+    Args:
+        interfaces: 接口 -> (跳数, IP-ID速度)
+        adjacent: 路径上相邻的接口对
+        max_hop_difference: 允许的最大跳数差
+    """
+    ordered = sorted(interfaces.items(), key=lambda item: item[1][1])
+    for i, (first, (first_hops, first_velocity)) in enumerate(ordered):
+        limit = first_velocity * (1 + WINDOW_RATIO) + WINDOW_ABSOLUTE
+        for second, (second_hops, second_velocity) in ordered[i + 1:]:
+            if second_velocity > limit:
+                break
+            if abs(first_hops - second_hops) > max_hop_difference:
+                continue
+            if frozenset((first, second)) in adjacent:
+                continue
+            yield first, second
+
+
+class _Groups:
+    """接口分组（并查集），组内样本合并保存以便整组做单调边界测试"""
+
+    def __init__(self):
+        self.parent: Dict[str, str] = {}
+
+    def find(self, ip: str) -> str:
+        self.parent.setdefault(ip, ip)
+        while self.parent[ip] != ip:
+            self.parent[ip] = self.parent[self.parent[ip]]
+            ip = self.parent[ip]
+        return ip
+
+    def union(self, first: str, second: str) -> str:
+        first, second = self.find(first), self.find(second)
+        if first != second:
+            self.parent[second] = first
+        return first
+
+    def groups(self) -> List[Set[str]]:
+        members = defaultdict(set)
+        for ip in self.parent:
+            members[self.find(ip)].add(ip)
+        return [group for group in members.values() if len(group) > 1]
+
+
+class AliasProber:
+    """
+    按轮并行探测接口，采集IP-ID样本和应答源地址
+
+    Args:
+        options: 任务选项，alias_rounds、alias_interval、timeout、probe_protocol
+        sleep: 轮间等待函数，测试时可替换
+    """
+
+    def __init__(self, options: Dict = None, sleep: Callable[[float], None] = time.sleep):
+        options = options or {}
+        self.rounds = options.get('alias_rounds', 8)
+        self.interval = options.get('alias_interval', 1.0)
+        self.timeout = options.get('timeout', 2)
+        self.probe_protocol = options.get('probe_protocol', 'udp')
+        self.sleep = sleep
+
+        self.samples: Dict[str, List[Sample]] = defaultdict(list)
+        self.source_aliases: Set[Tuple[str, str]] = set()
+
+    def _send_round(self, targets: List[str]) -> Dict[str, Tuple[float, int, str]]:
+        """发出一轮探测，返回 接口 -> (应答时间, IP-ID, 应答源地址)"""
+        from scapy.all import sr
+        from scapy.layers.inet import ICMP, IP, UDP
+
+        from ..scanners.traceroute import TRACE_DPORT, TRACE_SPORT
+
+        if self.probe_protocol == 'icmp':
+            packets = [IP(dst=target) / ICMP(id=TRACE_SPORT) for target in targets]
+        else:
+            # 发往不太可能监听的高端口，路由器以端口不可达应答
+            packets = [IP(dst=target) / UDP(sport=TRACE_SPORT, dport=TRACE_DPORT) for target in targets]
+        answered, _ = sr(packets, timeout=self.timeout, verbose=0)
+        return {sent.dst: (received.time, received.id, received.src) for sent, received in answered}
+
+    def collect(self, targets: Iterable[str]):
+        targets = list(targets)
+        for round_number in range(self.rounds):
+            started = time.time()
+            for target, (at, ipid, source) in self._send_round(targets).items():
+                self.samples[target].append((at, ipid))
+                if source != target:
+                    self.source_aliases.add((target, source))
+            if round_number < self.rounds - 1:
+                self.sleep(max(0.0, self.interval - (time.time() - started)))
+
+
+def interface_distances(task) -> Tuple[Dict[str, int], Set[FrozenSet[str]]]:
+    """从任务的拓扑边得到每个接口的跳数和路径上相邻的接口对"""
+    from ..models import NetworkTopology
+
+    distances: Dict[str, int] = {}
+    adjacent: Set[FrozenSet[str]] = set()
+    rows = NetworkTopology.objects.filter(task=task).values_list('source_ip', 'destination_ip', 'metadata')
+    for source, destination, metadata in rows:
+        adjacent.add(frozenset((source, destination)))
+        ttl = (metadata or {}).get('ttl')
+        if not ttl:
+            continue
+        source_ttl = ttl - (metadata.get('gap') or 0) - 1
+        for ip, hops in ((destination, ttl), (source, source_ttl)):
+            # 跳数为0的是扫描点自身
+            if hops > 0:
+                distances[ip] = min(hops, distances.get(ip, hops))
+    return distances, adjacent
+
+
+def find_aliases(distances: Dict[str, int], adjacent: Set[FrozenSet[str]],
+                 prober: AliasProber) -> Tuple[List[Set[str]], Set[str]]:
+    """
+    根据采集到的样本判定别名
+
+    Returns:
+        (接口分组, 有共同源地址证据的接口)
+    """
+    groups = _Groups()
+    group_samples: Dict[str, List[Sample]] = {}
+    velocities: Dict[str, float] = {}
+    interfaces = {}
+    for ip, hops in distances.items():
+        velocity = ipid_velocity(prober.samples.get(ip, []))
+        if velocity is not None:
+            velocities[ip] = velocity
+            interfaces[ip] = (hops, velocity)
+            group_samples[ip] = list(prober.samples[ip])
+
+    tested = 0
+    for first, second in candidate_pairs(interfaces, adjacent):
+        first_root, second_root = groups.find(first), groups.find(second)
+        if first_root == second_root:
+            continue
+        tested += 1
+        # 整组样本一起测试，避免传递合并把不同计数器串到一起
+        merged = group_samples[first_root] + group_samples[second_root]
+        velocity = max(velocities[first_root], velocities[second_root])
+        if monotonic_bounds_test(merged, velocity):
+            root = groups.union(first_root, second_root)
+            group_samples[root] = merged
+            velocities[root] = velocity
+
+    source_evidence = set()
+    for probed, source in prober.source_aliases:
+        groups.union(probed, source)
+        source_evidence.update((probed, source))
+
+    found = groups.groups()
+    logger.info(f"别名解析：{len(distances)} 个接口，测试 {tested} 对，合并为 {len(found)} 台多接口路由器")
+    return found, source_evidence
+
+
+def save_aliases(task, groups: List[Set[str]], source_evidence: Set[str] = frozenset()) -> int:
+    """替换任务的别名记录，返回写入的接口数"""
+    from ..models import RouterInterface
+
+    objects = []
+    for group in groups:
+        router = min(group, key=ip_to_int)
+        evidence = 'source' if group & source_evidence else 'ipid'
+        objects.extend(
+            RouterInterface(task=task, ip_address=ip, router=router, evidence=evidence) for ip in group
+        )
+    with transaction.atomic():
+        RouterInterface.objects.filter(task=task).delete()
+        RouterInterface.objects.bulk_create(objects, batch_size=1000)
+    invalidate_graph(task.id)
+    return len(objects)
+
+
+def resolve_aliases(task, prober: AliasProber = None) -> List[Set[str]]:
+    """对路由跟踪任务发现的接口做别名解析并保存结果"""
+    distances, adjacent = interface_distances(task)
+    if len(distances) < 2:
+        return []
+    prober = prober or AliasProber(task.options)
+    prober.collect(sorted(distances, key=ip_to_int))
+    groups, source_evidence = find_aliases(distances, adjacent, prober)
+    save_aliases(task, groups, source_evidence)
+    return groups
+
+
+def alias_map(task=None) -> Dict[str, str]:
+    """接口 -> 路由器标识；不指定任务时汇总所有任务，较新的结果优先"""
+    from ..models import RouterInterface
+
+    rows = RouterInterface.objects.all() if task is None else RouterInterface.objects.filter(task=task)
+    return dict(rows.order_by('created_at', 'id').values_list('ip_address', 'router'))
+
+
+def collapse_edges(edges: Iterable[Tuple[str, str]], aliases: Dict[str, str]) -> List[Tuple[str, str]]:
+    """把边的两端替换为路由器标识，去掉合并后产生的自环和重复边"""
+    collapsed = []
+    seen = set()
+    for source, destination in edges:
+        edge = (aliases.get(source, source), aliases.get(destination, destination))
+        if edge[0] != edge[1] and edge not in seen:
+            seen.add(edge)
+            collapsed.append(edge)
+    return collapsed
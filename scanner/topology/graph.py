@@ -0,0 +1,422 @@
+"""
+拓扑图查询
+任务的 NetworkTopology 边载入内存，IP按整数编号，邻接关系以CSR（压缩稀疏行）数组保存，
+路径查询直接在数组上进行，不再每一跳查询一次数据库。
+
+图按任务缓存在进程内，版本号保存在共享缓存中：拓扑或别名写入后调用 invalidate_graph，
+各进程下次查询时发现版本变化即重新载入。
+"""
+import heapq
+import logging
+import time
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = 'topology:version:{task_id}'
+
+# 缺少RTT时边的权重，以及RTT差为负（抖动）时的最小权重（毫秒）
+DEFAULT_WEIGHT = 1.0
+MIN_WEIGHT = 0.01
+
+_graph_cache: Dict[int, Tuple[object, 'TopologyGraph']] = {}
+
+Path = List[str]
+
+
+def _csr(count: int, sources: np.ndarray, targets: np.ndarray,
+         weights: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    order = np.lexsort((targets, sources))
+    indptr = np.zeros(count + 1, dtype=np.int64)
+    np.cumsum(np.bincount(sources, minlength=count), out=indptr[1:])
+    return indptr, targets[order], weights[order]
+
+
+class TopologyGraph:
+    """
+    有向拓扑图
+
+    Args:
+        nodes: 节点编号 -> IP
+        sources, targets, weights: 边数组（节点编号、节点编号、权重）
+    """
+
+    def __init__(self, nodes: List[str], sources: np.ndarray, targets: np.ndarray, weights: np.ndarray):
+        self.nodes = list(nodes)
+        self.index = {ip: i for i, ip in enumerate(self.nodes)}
+        count = len(self.nodes)
+        self.indptr, self.indices, self.weights = _csr(count, sources, targets, weights)
+        self.rindptr, self.rindices, _ = _csr(count, targets, sources, weights)
+        # Dijkstra和支配树在Python列表上逐个访问比numpy标量快得多
+        self._lists = None
+
+    @classmethod
+    def from_edges(cls, edges: Iterable[Tuple[str, str, float]]) -> 'TopologyGraph':
+        """由 (源IP, 目的IP, 权重) 构造，重复的边保留最小权重，自环被丢弃"""
+        index: Dict[str, int] = {}
+        sources, targets, weights = [], [], []
+        for source, target, weight in edges:
+            if source == target:
+                continue
+            sources.append(index.setdefault(source, len(index)))
+            targets.append(index.setdefault(target, len(index)))
+            weights.append(weight)
+
+        sources = np.array(sources, dtype=np.int64)
+        targets = np.array(targets, dtype=np.int64)
+        weights = np.array(weights, dtype=np.float64)
+        if len(sources):
+            order = np.lexsort((weights, targets, sources))
+            sources, targets, weights = sources[order], targets[order], weights[order]
+            first = np.ones(len(sources), dtype=bool)
+            first[1:] = (sources[1:] != sources[:-1]) | (targets[1:] != targets[:-1])
+            sources, targets, weights = sources[first], targets[first], weights[first]
+        return cls(list(index), sources, targets, weights)
+
+    @classmethod
+    def for_task(cls, task, collapse_aliases: bool = True) -> 'TopologyGraph':
+        """
+        载入任务的拓扑
+
+        边权重为该跳增加的往返时间：终点RTT减去起点RTT（起点为扫描点时按0计）。
+        collapse_aliases 为True时同一路由器的接口合并为一个节点。
+        """
+        from ..models import NetworkTopology
+        from .aliases import alias_map
+
+        rows = list(
+            NetworkTopology.objects.filter(task=task).order_by()
+            .values_list('source_ip', 'destination_ip', 'metadata')
+        )
+        aliases = alias_map(task) if collapse_aliases else {}
+
+        rtt: Dict[str, float] = {}
+        for _, destination, metadata in rows:
+            value = (metadata or {}).get('rtt')
+            if value is not None:
+                destination = aliases.get(destination, destination)
+                rtt[destination] = min(value, rtt.get(destination, value))
+
+        def edges():
+            for source, destination, metadata in rows:
+                source = aliases.get(source, source)
+                destination = aliases.get(destination, destination)
+                if destination in rtt:
+                    weight = max(rtt[destination] - rtt.get(source, 0.0), MIN_WEIGHT)
+                else:
+                    weight = DEFAULT_WEIGHT
+                yield source, destination, weight
+
+        return cls.from_edges(edges())
+
+    def __len__(self) -> int:
+        return len(self.nodes)
+
+    @property
+    def edge_count(self) -> int:
+        return len(self.indices)
+
+    def _node(self, ip: str) -> int:
+        try:
+            return self.index[ip]
+        except KeyError:
+            raise KeyError(f"拓扑中没有节点: {ip}")
+
+    def _adjacency(self):
+        if self._lists is None:
+            self._lists = (self.indptr.tolist(), self.indices.tolist(), self.weights.tolist(),
+                           self.rindptr.tolist(), self.rindices.tolist())
+        return self._lists
+
+    def successors(self, ip: str) -> List[str]:
+        i = self._node(ip)
+        return [self.nodes[j] for j in self.indices[self.indptr[i]:self.indptr[i + 1]]]
+
+    def predecessors(self, ip: str) -> List[str]:
+        i = self._node(ip)
+        return [self.nodes[j] for j in self.rindices[self.rindptr[i]:self.rindptr[i + 1]]]
+
+    # ---------- 广度优先 ----------
+
+    def bfs(self, source: str, reverse: bool = False, target: str = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        按层向量化的广度优先搜索
+
+        Returns:
+            (跳数数组, 前驱数组)，不可达为-1；指定 target 时到达后提前结束
+        """
+        indptr, indices = (self.rindptr, self.rindices) if reverse else (self.indptr, self.indices)
+        start = self._node(source)
+        stop = self._node(target) if target is not None else -1
+        distance = np.full(len(self.nodes), -1, dtype=np.int64)
+        parent = np.full(len(self.nodes), -1, dtype=np.int64)
+        distance[start] = 0
+        frontier = np.array([start], dtype=np.int64)
+        level = 0
+        while len(frontier):
+            if stop >= 0 and distance[stop] >= 0:
+                break
+            level += 1
+            begins, ends = indptr[frontier], indptr[frontier + 1]
+            lengths = ends - begins
+            total = int(lengths.sum())
+            if total == 0:
+                break
+            # 把各节点的邻接区间拼接成一个下标数组
+            offsets = np.repeat(begins - np.cumsum(lengths) + lengths, lengths) + np.arange(total)
+            neighbors = indices[offsets]
+            parents = np.repeat(frontier, lengths)
+            fresh = distance[neighbors] < 0
+            neighbors, first = np.unique(neighbors[fresh], return_index=True)
+            distance[neighbors] = level
+            parent[neighbors] = parents[fresh][first]
+            frontier = neighbors
+        return distance, parent
+
+    def _walk(self, parent, target: int) -> Path:
+        """沿前驱（数组或字典）回溯出路径"""
+        path = []
+        while target >= 0:
+            path.append(self.nodes[target])
+            target = parent[target]
+        return path[::-1]
+
+    def shortest_path(self, source: str, target: str) -> Optional[Path]:
+        """跳数最少的路径，不可达返回None"""
+        distance, parent = self.bfs(source, target=target)
+        end = self._node(target)
+        if distance[end] < 0:
+            return None
+        return self._walk(parent, end)
+
+    # ---------- 加权最短路径 ----------
+
+    def _reaches(self, end: int) -> bytearray:
+        """能到达 end 的节点标记；加权搜索只在这些节点上展开，其余分支不可能通向终点"""
+        distance, _ = self.bfs(self.nodes[end], reverse=True)
+        return bytearray((distance >= 0).astype(np.uint8).tobytes())
+
+    def _dijkstra(self, start: int, end: int = -1, banned_nodes: Set[int] = frozenset(),
+                  banned_edges: Set[Tuple[int, int]] = frozenset(),
+                  allowed: bytearray = None) -> Tuple[Dict[int, float], Dict[int, int]]:
+        indptr, indices, weights, _, _ = self._adjacency()
+        distance = {start: 0.0}
+        parent = {start: -1}
+        done = set()
+        heap = [(0.0, start)]
+        while heap:
+            cost, node = heapq.heappop(heap)
+            if node in done:
+                continue
+            done.add(node)
+            if node == end:
+                break
+            for k in range(indptr[node], indptr[node + 1]):
+                neighbor = indices[k]
+                if allowed is not None and not allowed[neighbor]:
+                    continue
+                if neighbor in banned_nodes or (node, neighbor) in banned_edges:
+                    continue
+                candidate = cost + weights[k]
+                if candidate < distance.get(neighbor, float('inf')):
+                    distance[neighbor] = candidate
+                    parent[neighbor] = node
+                    heapq.heappush(heap, (candidate, neighbor))
+        return distance, parent
+
+    def weighted_path(self, source: str, target: str) -> Optional[Tuple[float, Path]]:
+        """按RTT增量加权的最短路径，返回 (总权重, 路径)"""
+        start, end = self._node(source), self._node(target)
+        distance, parent = self._dijkstra(start, end, allowed=self._reaches(end))
+        if end not in distance:
+            return None
+        return distance[end], self._walk(parent, end)
+
+    def k_shortest_paths(self, source: str, target: str, k: int = 3) -> List[Tuple[float, Path]]:
+        """
+        权重最小的k条无环路径（Yen算法）
+
+        Returns:
+            按总权重升序的 (总权重, 路径) 列表
+        """
+        start, end = self._node(source), self._node(target)
+        allowed = self._reaches(end)
+        distance, parent = self._dijkstra(start, end, allowed=allowed)
+        if end not in distance:
+            return []
+
+        def node_path(parent_map, node):
+            path = []
+            while node >= 0:
+                path.append(node)
+                node = parent_map[node]
+            return path[::-1]
+
+        found = [(distance[end], node_path(parent, end))]
+        candidates: List[Tuple[float, Tuple[int, ...]]] = []
+        seen = {tuple(found[0][1])}
+        while len(found) < k:
+            _, last = found[-1]
+            for i in range(len(last) - 1):
+                spur, root = last[i], last[:i + 1]
+                banned_edges = {
+                    (path[i], path[i + 1]) for _, path in found
+                    if len(path) > i + 1 and path[:i + 1] == root
+                }
+                spur_distance, spur_parent = self._dijkstra(spur, end, set(root[:-1]), banned_edges, allowed)
+                if end not in spur_distance:
+                    continue
+                path = root[:-1] + node_path(spur_parent, end)
+                key = tuple(path)
+                if key in seen:
+                    continue
+                seen.add(key)
+                cost = sum(self._weight(a, b) for a, b in zip(path, path[1:]))
+                heapq.heappush(candidates, (cost, key))
+            if not candidates:
+                break
+            cost, path = heapq.heappop(candidates)
+            found.append((cost, list(path)))
+        return [(cost, [self.nodes[i] for i in path]) for cost, path in found]
+
+    def _weight(self, source: int, target: int) -> float:
+        """单条边的权重，每行的邻接节点已排序，二分查找"""
+        indptr, indices, weights, _, _ = self._adjacency()
+        k = bisect_left(indices, target, indptr[source], indptr[source + 1])
+        return weights[k]
+
+    # ---------- 支配关系 ----------
+
+    def dominators(self, root: str) -> Dict[str, Optional[str]]:
+        """
+        从 root 出发的直接支配者（Cooper-Harvey-Kennedy迭代算法）
+
+        节点X支配Y表示从root到Y的每条路径都经过X；攻击溯源中即为必经的上游跳。
+
+        Returns:
+            可达节点 -> 直接支配者，root对应None
+        """
+        start = self._node(root)
+        idom = self._idom(start)
+        return {
+            self.nodes[node]: (self.nodes[dominator] if node != start else None)
+            for node, dominator in idom.items()
+        }
+
+    def _idom(self, start: int) -> Dict[int, int]:
+        indptr, indices, _, rindptr, rindices = self._adjacency()
+
+        # 迭代DFS求后序编号，未访问为-1
+        number = [-1] * len(self.nodes)
+        postorder = []
+        visited = bytearray(len(self.nodes))
+        visited[start] = 1
+        stack = [(start, indptr[start])]
+        while stack:
+            node, k = stack[-1]
+            if k < indptr[node + 1]:
+                stack[-1] = (node, k + 1)
+                neighbor = indices[k]
+                if not visited[neighbor]:
+                    visited[neighbor] = 1
+                    stack.append((neighbor, indptr[neighbor]))
+            else:
+                stack.pop()
+                number[node] = len(postorder)
+                postorder.append(node)
+
+        idom = [-1] * len(self.nodes)
+        idom[start] = start
+
+        def intersect(a, b):
+            while a != b:
+                while number[a] < number[b]:
+                    a = idom[a]
+                while number[b] < number[a]:
+                    b = idom[b]
+            return a
+
+        changed = True
+        order = postorder[::-1][1:]
+        while changed:
+            changed = False
+            for node in order:
+                new = -1
+                for k in range(rindptr[node], rindptr[node + 1]):
+                    predecessor = rindices[k]
+                    if idom[predecessor] >= 0:
+                        new = predecessor if new < 0 else intersect(predecessor, new)
+                if new >= 0 and idom[node] != new:
+                    idom[node] = new
+                    changed = True
+        return {node: idom[node] for node in postorder}
+
+    def common_dominators(self, root: str, targets: Iterable[str]) -> Path:
+        """所有目标共同的必经上游节点，从root向下排列（含root）"""
+        start = self._node(root)
+        idom = self._idom(start)
+        common = None
+        for target in targets:
+            node = self._node(target)
+            if node not in idom:
+                return []
+            chain = []
+            while node != start:
+                node = idom[node]
+                chain.append(node)
+            chain = chain[::-1]
+            if common is None:
+                common = chain
+            else:
+                length = 0
+                while length < min(len(common), len(chain)) and common[length] == chain[length]:
+                    length += 1
+                common = common[:length]
+        return [self.nodes[node] for node in (common or [])]
+
+    def common_upstream(self, targets: Iterable[str]) -> List[Tuple[str, int]]:
+        """
+        能到达所有目标的上游节点
+
+        Returns:
+            (节点, 到各目标的最大跳数) 列表，离目标最近的排在前面
+        """
+        combined = None
+        for target in targets:
+            distance, _ = self.bfs(target, reverse=True)
+            distance[self._node(target)] = -1
+            if combined is None:
+                combined = distance
+            else:
+                combined = np.where((combined >= 0) & (distance >= 0), np.maximum(combined, distance), -1)
+        if combined is None:
+            return []
+        reachable = np.flatnonzero(combined >= 0)
+        order = reachable[np.argsort(combined[reachable], kind='stable')]
+        return [(self.nodes[node], int(combined[node])) for node in order]
+
+
+def invalidate_graph(task_id: int):
+    """任务的拓扑或别名发生写入后调用，使各进程缓存的图失效"""
+    cache.set(VERSION_KEY.format(task_id=task_id), time.time_ns(), None)
+
+
+def get_graph(task) -> TopologyGraph:
+    """读取任务的拓扑图，缓存的版本与共享版本号一致时直接复用"""
+    key = VERSION_KEY.format(task_id=task.id)
+    # 版本号缺失（从未写入或缓存被清空）时先补一个，避免与进程内旧图的空版本号相等
+    cache.add(key, time.time_ns(), None)
+    version = cache.get(key)
+    cached = _graph_cache.get(task.id)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    started = time.time()
+    graph = TopologyGraph.for_task(task)
+    _graph_cache[task.id] = (version, graph)
+    logger.info(f"载入任务 {task.id} 拓扑图：{len(graph)} 个节点，{graph.edge_count} 条边，"
+                f"耗时 {time.time() - started:.2f} 秒")
+    return graph
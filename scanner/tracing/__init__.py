@@ -0,0 +1,13 @@
+"""
+攻击溯源
+利用扫描积累的网络特征分析攻击流量的来源
+"""
+from .correlation import ScannedIndex, correlate_capture
+from .hcf import HCFTable, get_hcf_table, refresh_hcf_table
+from .pcap import ingest_capture, read_capture
+
+__all__ = [
+    'ScannedIndex', 'correlate_capture',
+    'HCFTable', 'get_hcf_table', 'refresh_hcf_table',
+    'ingest_capture', 'read_capture',
+]
@@ -0,0 +1,250 @@
+"""
+攻击源关联
+回答“这些攻击源里哪些扫描过、上面开放了什么”：
+
+- 当前暴露面按IPv4地址编译为有序数组（附开放端口数），整批攻击源一次 searchsorted 完成匹配；
+- 最近一次路由跟踪的拓扑按 /24 网段汇总离扫描点的最少跳数，作为攻击源的拓扑距离；
+- 扫描过的攻击源按 开放端口数、拓扑距离、报文数 排序，只对排在前面的候选再查询一次端口明细。
+
+整个过程对数据库只有几次流式读取，与攻击源数量无关。
+"""
+import logging
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from ..enrichment.ipindex import ipv4_ints
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LIMIT = 1000
+DEFAULT_PREFIX_LENGTH = 24
+
+# 拓扑中找不到的攻击源按该跳数排序（排在有拓扑距离的之后）
+UNKNOWN_HOPS = 255
+
+
+def _read_ipv4(rows, batch_size: int, columns: int) -> Tuple[np.ndarray, List[np.ndarray]]:
+    """
+    分批读取 (IP, 数值...) 行，丢弃非IPv4地址
+
+    Returns:
+        (uint32地址数组, 各数值列的int64数组)
+    """
+    addresses, values = [], [[] for _ in range(columns)]
+    batch: List[tuple] = []
+
+    def flush():
+        converted, is_v4 = ipv4_ints([row[0] for row in batch])
+        addresses.append(converted[is_v4])
+        for i in range(columns):
+            values[i].append(np.array([row[i + 1] for row in batch], dtype=np.int64)[is_v4])
+        batch.clear()
+
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+    if not addresses:
+        return np.zeros(0, dtype=np.uint32), [np.zeros(0, dtype=np.int64) for _ in range(columns)]
+    return np.concatenate(addresses), [np.concatenate(column) for column in values]
+
+
+class ScannedIndex:
+    """
+    扫描过的IPv4地址索引
+
+    Args:
+        addresses: 升序、无重复的地址数组
+        open_ports: 各地址当前开放的端口数
+    """
+
+    def __init__(self, addresses: np.ndarray, open_ports: np.ndarray):
+        self.addresses = addresses
+        self.open_ports = open_ports
+
+    @classmethod
+    def build(cls, addresses: np.ndarray, is_open: np.ndarray) -> 'ScannedIndex':
+        """由暴露面的每个端点 (地址, 是否开放) 编译"""
+        unique, inverse = np.unique(np.asarray(addresses, dtype=np.uint32), return_inverse=True)
+        open_ports = np.bincount(inverse, weights=is_open, minlength=len(unique)).astype(np.int32)
+        return cls(unique, open_ports)
+
+    @classmethod
+    def from_exposure(cls, batch_size: int = 10000) -> 'ScannedIndex':
+        """读取当前暴露面"""
+        from ..models import ExposureSnapshot
+
+        rows = ExposureSnapshot.objects.order_by().values_list('ip_address', 'state').iterator(chunk_size=batch_size)
+        addresses, (is_open,) = _read_ipv4(((ip, state == 'open') for ip, state in rows), batch_size, 1)
+        return cls.build(addresses, is_open)
+
+    def __len__(self) -> int:
+        return len(self.addresses)
+
+    def lookup(self, addresses: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """uint32地址数组 -> (是否扫描过, 开放端口数)"""
+        addresses = np.asarray(addresses, dtype=np.uint32)
+        if len(self.addresses) == 0:
+            return np.zeros(len(addresses), dtype=bool), np.zeros(len(addresses), dtype=np.int32)
+        position = np.minimum(np.searchsorted(self.addresses, addresses), len(self.addresses) - 1)
+        scanned = self.addresses[position] == addresses
+        return scanned, np.where(scanned, self.open_ports[position], 0)
+
+
+class PrefixHops:
+    """
+    网段 -> 离扫描点的最少跳数
+
+    Args:
+        keys: 升序的网段号
+        hops: 各网段内拓扑节点的最少跳数
+    """
+
+    def __init__(self, keys: np.ndarray, hops: np.ndarray, prefix_length: int = DEFAULT_PREFIX_LENGTH):
+        self.keys = keys
+        self.hops = hops
+        self.prefix_length = prefix_length
+
+    @classmethod
+    def from_graph(cls, graph, prefix_length: int = DEFAULT_PREFIX_LENGTH) -> 'PrefixHops':
+        """从拓扑图中没有上游的节点（扫描点）出发做广度优先搜索"""
+        distance = np.full(len(graph), -1, dtype=np.int64)
+        roots = np.flatnonzero(np.diff(graph.rindptr) == 0)
+        for root in roots:
+            reached, _ = graph.bfs(graph.nodes[root])
+            better = (reached >= 0) & ((distance < 0) | (reached < distance))
+            distance[better] = reached[better]
+
+        addresses, is_v4 = ipv4_ints(graph.nodes)
+        keep = is_v4 & (distance >= 0)
+        keys = addresses[keep] >> np.uint32(32 - prefix_length)
+        hops = distance[keep]
+        if len(keys) == 0:
+            return cls(keys, hops.astype(np.int16), prefix_length)
+        order = np.lexsort((hops, keys))
+        keys, hops = keys[order], hops[order]
+        first = np.r_[True, keys[1:] != keys[:-1]]
+        return cls(keys[first], hops[first].astype(np.int16), prefix_length)
+
+    def lookup(self, addresses: np.ndarray) -> np.ndarray:
+        """uint32地址数组 -> 跳数，所在网段不在拓扑中时为-1"""
+        addresses = np.asarray(addresses, dtype=np.uint32)
+        if len(self.keys) == 0:
+            return np.full(len(addresses), -1, dtype=np.int16)
+        keys = addresses >> np.uint32(32 - self.prefix_length)
+        position = np.minimum(np.searchsorted(self.keys, keys), len(self.keys) - 1)
+        return np.where(self.keys[position] == keys, self.hops[position], -1).astype(np.int16)
+
+
+def correlate(sources: np.ndarray, packets: np.ndarray, spoofed: np.ndarray, index: ScannedIndex,
+              prefix_hops: PrefixHops = None) -> Dict[str, np.ndarray]:
+    """
+    攻击源与扫描结果关联
+
+    Args:
+        sources, packets, spoofed: 每个流的源地址、报文数、疑似伪造报文数（同一源可出现多次）
+
+    Returns:
+        扫描过的攻击源，按 开放端口数降序、拓扑跳数升序、报文数降序 排列的各列数组，
+        另含 source_count（去重后的攻击源数）
+    """
+    unique, inverse = np.unique(np.asarray(sources, dtype=np.uint32), return_inverse=True)
+    totals = np.bincount(inverse, weights=packets, minlength=len(unique)).astype(np.int64)
+    spoofed_totals = np.bincount(inverse, weights=spoofed, minlength=len(unique)).astype(np.int64)
+
+    scanned, open_ports = index.lookup(unique)
+    hit = np.flatnonzero(scanned)
+    addresses, open_ports = unique[hit], open_ports[hit]
+    totals, spoofed_totals = totals[hit], spoofed_totals[hit]
+    hops = prefix_hops.lookup(addresses) if prefix_hops is not None else np.full(len(hit), -1, dtype=np.int16)
+
+    order = np.lexsort((-totals, np.where(hops >= 0, hops, UNKNOWN_HOPS), -open_ports))
+    return {
+        'source_count': len(unique),
+        'addresses': addresses[order],
+        'open_ports': open_ports[order],
+        'hops': hops[order],
+        'packets': totals[order],
+        'spoofed': spoofed_totals[order],
+    }
+
+
+def latest_topology_task():
+    from ..models import ScanTask
+
+    return (ScanTask.objects.filter(scan_type='TRACEROUTE', status='COMPLETED')
+            .order_by('-completed_at').first())
+
+
+def _int_to_ipv4(value: int) -> str:
+    return '.'.join(str(value >> shift & 0xFF) for shift in (24, 16, 8, 0))
+
+
+def _candidate_details(addresses: List[str]) -> Dict[str, List[Dict]]:
+    """候选攻击源当前开放的端口，一次查询"""
+    from ..models import ExposureSnapshot
+
+    details: Dict[str, List[Dict]] = {ip: [] for ip in addresses}
+    rows = (ExposureSnapshot.objects.filter(ip_address__in=addresses, state='open')
+            .order_by('ip_address', 'port').values_list('ip_address', 'port', 'protocol', 'service'))
+    for ip, port, protocol, service in rows:
+        details[ip].append({'port': port, 'protocol': protocol, 'service': service})
+    return details
+
+
+def correlate_capture(capture, topology_task=None, limit: int = DEFAULT_LIMIT, index: ScannedIndex = None):
+    """
+    生成抓包的攻击源关联报告
+
+    Args:
+        topology_task: 计算拓扑距离用的路由跟踪任务，默认为最近完成的一次
+        limit: 报告中保留的候选数
+        index: 已编译的扫描地址索引，批量处理多个抓包时可复用
+    """
+    from ..enrichment import get_ip_index
+    from ..models import AttackFlow, CorrelationReport
+    from ..topology import get_graph
+
+    rows = (AttackFlow.objects.filter(capture=capture).order_by()
+            .values_list('src_ip', 'packets', 'spoofed_packets').iterator(chunk_size=10000))
+    sources, (packets, spoofed) = _read_ipv4(rows, 10000, 2)
+
+    index = index if index is not None else ScannedIndex.from_exposure()
+    topology_task = topology_task or latest_topology_task()
+    prefix_hops = PrefixHops.from_graph(get_graph(topology_task)) if topology_task else None
+    result = correlate(sources, packets, spoofed, index, prefix_hops)
+
+    top = [_int_to_ipv4(int(value)) for value in result['addresses'][:limit]]
+    details = _candidate_details(top)
+    ip_index = get_ip_index()
+    owners = ip_index.lookup_many(top) if ip_index is not None else [None] * len(top)
+
+    candidates = []
+    for i, ip in enumerate(top):
+        hops = int(result['hops'][i])
+        asn, as_org, country = owners[i] or (0, '', '')
+        candidates.append({
+            'ip': ip,
+            'packets': int(result['packets'][i]),
+            'spoofed_packets': int(result['spoofed'][i]),
+            'open_ports': details[ip],
+            'hops': hops if hops >= 0 else None,
+            'asn': asn or None,
+            'as_org': as_org,
+            'country': country,
+        })
+
+    report = CorrelationReport.objects.create(
+        capture=capture,
+        topology_task=topology_task,
+        source_count=result['source_count'],
+        scanned_count=len(result['addresses']),
+        exposed_count=int((result['open_ports'] > 0).sum()),
+        candidates=candidates,
+    )
+    logger.info(f"抓包 {capture.name} 关联完成：{report.source_count} 个攻击源，"
+                f"{report.scanned_count} 个扫描过，{report.exposed_count} 个有开放端口")
+    return report
@@ -0,0 +1,235 @@
+"""
+跳数过滤（Hop-Count Filtering）
+伪造源地址的报文TTL通常与真实来源到本地的跳数对不上。扫描结果中记录了各主机应答的TTL，
+按常见初始TTL（32、64、128、255）推算出跳数，按源网段汇总为 网段 -> 跳数范围 的有序数组表；
+检查攻击流量时整批按网段二分查找，跳数超出范围（加容差）的报文判定为疑似伪造。
+
+只处理IPv4：IPv6攻击源没有参考跳数，检查结果为未知。
+"""
+import logging
+import os
+from datetime import timedelta
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Sequence, Tuple, Union
+
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+
+from ..enrichment.ipindex import ipv4_ints
+
+logger = logging.getLogger(__name__)
+
+# 常见操作系统和网络设备的初始TTL，升序
+INITIAL_TTLS = np.array([32, 64, 128, 255], dtype=np.int16)
+
+DEFAULT_PREFIX_LENGTH = 24
+DEFAULT_WINDOW_DAYS = 30
+
+# 路由变化和负载均衡会让同一来源的跳数前后相差一两跳
+DEFAULT_TOLERANCE = 1
+
+# 表文件路径 -> (修改时间, 表)
+_table_cache: Dict[str, Tuple[int, 'HCFTable']] = {}
+
+
+def hop_counts(ttls: np.ndarray) -> np.ndarray:
+    """
+    观测TTL推算经过的跳数：取不小于TTL的最小初始值相减
+
+    TTL为0或大于255时返回-1。
+    """
+    ttls = np.asarray(ttls, dtype=np.int16)
+    position = np.minimum(np.searchsorted(INITIAL_TTLS, ttls), len(INITIAL_TTLS) - 1)
+    hops = INITIAL_TTLS[position] - ttls
+    return np.where((ttls > 0) & (ttls <= 255), hops, -1)
+
+
+def _as_ipv4(sources: Union[np.ndarray, Sequence[str]]) -> Tuple[np.ndarray, np.ndarray]:
+    """源地址（整数数组或字符串序列） -> (uint32数组, 是否为IPv4)"""
+    if isinstance(sources, np.ndarray) and sources.dtype.kind in 'ui':
+        return sources.astype(np.uint32, copy=False), np.ones(len(sources), dtype=bool)
+    return ipv4_ints(list(sources))
+
+
+class HCFTable:
+    """
+    网段跳数表
+
+    Args:
+        keys: 升序的网段号（地址右移 32 - prefix_length 位）
+        low, high: 各网段观测到的最小、最大跳数
+        samples: 各网段参与统计的主机数
+        prefix_length: 网段前缀长度
+    """
+
+    def __init__(self, keys: np.ndarray, low: np.ndarray, high: np.ndarray, samples: np.ndarray,
+                 prefix_length: int = DEFAULT_PREFIX_LENGTH):
+        self.keys = keys
+        self.low = low
+        self.high = high
+        self.samples = samples
+        self.prefix_length = prefix_length
+
+    @classmethod
+    def build(cls, addresses: np.ndarray, ttls: np.ndarray,
+              prefix_length: int = DEFAULT_PREFIX_LENGTH) -> 'HCFTable':
+        """由 (IPv4整数, 观测TTL) 数组编译，同一主机的重复观测只计一次"""
+        hops = hop_counts(ttls)
+        valid = hops >= 0
+        pairs = np.unique(
+            np.asarray(addresses, dtype=np.uint64)[valid] << np.uint64(8) | hops[valid].astype(np.uint64)
+        )
+        addresses = (pairs >> np.uint64(8)).astype(np.uint32)
+        hops = (pairs & np.uint64(0xFF)).astype(np.uint8)
+
+        keys = addresses >> np.uint32(32 - prefix_length)
+        if len(keys) == 0:
+            empty = np.zeros(0, dtype=np.uint8)
+            return cls(keys, empty, empty, np.zeros(0, dtype=np.uint32), prefix_length)
+        # pairs已按地址排序，网段号同样有序
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+        new_host = np.r_[True, addresses[1:] != addresses[:-1]].astype(np.uint32)
+        return cls(
+            keys[starts],
+            np.minimum.reduceat(hops, starts),
+            np.maximum.reduceat(hops, starts),
+            np.add.reduceat(new_host, starts).astype(np.uint32),
+            prefix_length,
+        )
+
+    def save(self, path: str):
+        """写入单个 .npz 文件，先写临时文件再改名"""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(path.name + '.tmp.npz')
+        np.savez_compressed(tmp, keys=self.keys, low=self.low, high=self.high, samples=self.samples,
+                            prefix_length=np.array(self.prefix_length))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> 'HCFTable':
+        with np.load(path, allow_pickle=False) as data:
+            return cls(data['keys'], data['low'], data['high'], data['samples'], int(data['prefix_length']))
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def expected(self, addresses: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        uint32地址数组 -> (是否有参考值, 最小跳数, 最大跳数)
+        """
+        addresses = np.asarray(addresses, dtype=np.uint32)
+        count = len(addresses)
+        if len(self.keys) == 0:
+            zeros = np.zeros(count, dtype=np.int16)
+            return np.zeros(count, dtype=bool), zeros, zeros
+        keys = addresses >> np.uint32(32 - self.prefix_length)
+        position = np.minimum(np.searchsorted(self.keys, keys), len(self.keys) - 1)
+        known = self.keys[position] == keys
+        return known, self.low[position].astype(np.int16), self.high[position].astype(np.int16)
+
+    def check(self, sources: Union[np.ndarray, Sequence[str]], ttls: np.ndarray,
+              tolerance: int = DEFAULT_TOLERANCE) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        批量检查报文的源地址与TTL是否相符
+
+        Args:
+            sources: 源地址，uint32数组或IP字符串序列
+            ttls: 报文到达时的TTL
+            tolerance: 跳数范围两端放宽的跳数
+
+        Returns:
+            (是否有参考跳数, 是否疑似伪造)；没有参考跳数的报文不判定为伪造
+        """
+        addresses, is_v4 = _as_ipv4(sources)
+        hops = hop_counts(ttls)
+        known, low, high = self.expected(addresses)
+        known &= is_v4 & (hops >= 0)
+        spoofed = known & ((hops < low - tolerance) | (hops > high + tolerance))
+        return known, spoofed
+
+
+def observations(since=None, batch_size: int = 10000) -> Tuple[np.ndarray, np.ndarray]:
+    """读取扫描结果中带TTL的IPv4观测，返回 (地址数组, TTL数组)"""
+    from ..models import ScanResult
+
+    queryset = ScanResult.objects.filter(ttl__isnull=False)
+    if since is not None:
+        queryset = queryset.filter(discovered_at__gte=since)
+    rows = queryset.order_by().values_list('ip_address', 'ttl').iterator(chunk_size=batch_size)
+
+    addresses, ttls = [], []
+    batch_ips, batch_ttls = [], []
+
+    def flush():
+        values, is_v4 = ipv4_ints(batch_ips)
+        addresses.append(values[is_v4])
+        ttls.append(np.array(batch_ttls, dtype=np.int16)[is_v4])
+        batch_ips.clear()
+        batch_ttls.clear()
+
+    for ip, ttl in rows:
+        batch_ips.append(ip)
+        batch_ttls.append(ttl)
+        if len(batch_ips) >= batch_size:
+            flush()
+    if batch_ips:
+        flush()
+    if not addresses:
+        return np.zeros(0, dtype=np.uint32), np.zeros(0, dtype=np.int16)
+    return np.concatenate(addresses), np.concatenate(ttls)
+
+
+def refresh_hcf_table(window_days: int = None, path: str = None) -> HCFTable:
+    """用最近的扫描结果重新编译跳数表并写入 HCF_TABLE_PATH"""
+    window_days = window_days or getattr(settings, 'HCF_WINDOW_DAYS', DEFAULT_WINDOW_DAYS)
+    prefix_length = getattr(settings, 'HCF_PREFIX_LENGTH', DEFAULT_PREFIX_LENGTH)
+    path = path or settings.HCF_TABLE_PATH
+
+    addresses, ttls = observations(since=timezone.now() - timedelta(days=window_days))
+    table = HCFTable.build(addresses, ttls, prefix_length)
+    table.save(path)
+    logger.info(f"跳数表已更新：{len(addresses)} 条TTL观测，{len(table)} 个网段")
+    return table
+
+
+def get_hcf_table() -> Optional[HCFTable]:
+    """读取跳数表，文件更新后自动重新加载；尚未编译时返回None"""
+    path = str(getattr(settings, 'HCF_TABLE_PATH', '') or '')
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+    cached = _table_cache.get(path)
+    if cached is None or cached[0] != mtime:
+        try:
+            cached = (mtime, HCFTable.load(path))
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"跳数表加载失败: {e}")
+            return None
+        _table_cache[path] = cached
+    return cached[1]
+
+
+def summarize(sources: Sequence[str], ttls: Iterable[int], table: HCFTable = None,
+              tolerance: int = DEFAULT_TOLERANCE) -> Optional[Dict]:
+    """检查一批报文并汇总各源地址的判定结果，供API使用；跳数表未编译时返回None"""
+    table = table or get_hcf_table()
+    if table is None:
+        return None
+    sources = list(sources)
+    ttls = np.array(list(ttls), dtype=np.int16)
+    known, spoofed = table.check(sources, ttls, tolerance)
+    flagged: Dict[str, int] = {}
+    for i in np.flatnonzero(spoofed):
+        flagged[sources[i]] = flagged.get(sources[i], 0) + 1
+    return {
+        'total': len(sources),
+        'known': int(known.sum()),
+        'spoofed': int(spoofed.sum()),
+        'spoofed_sources': [
+            {'ip': ip, 'packets': packets}
+            for ip, packets in sorted(flagged.items(), key=lambda item: -item[1])
+        ],
+    }
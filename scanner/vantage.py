@@ -0,0 +1,64 @@
+"""
+多探测点测量
+每个探测点运行一个只消费自己队列的Celery worker（见 run_vantage_agent 命令），
+任务把同一组目标的RTT测量分发到选中的各个队列，全部返回后再汇总做地理定位。
+"""
+import logging
+from typing import Dict, List
+
+from celery import chord
+from django.db import transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+def select_vantage_points(task) -> List:
+    """
+    任务选项 vantage_points 为探测点名称列表，或 'all' 表示全部启用的探测点
+    """
+    from .models import VantagePoint
+
+    selected = task.options.get('vantage_points')
+    vantage_points = VantagePoint.objects.filter(is_active=True)
+    if selected != 'all':
+        vantage_points = vantage_points.filter(name__in=selected or [])
+    return list(vantage_points)
+
+
+def dispatch_measurements(task, target: str) -> int:
+    """
+    把RTT测量分发到各探测点的队列，全部完成后排队地理定位
+
+    Returns:
+        分发的探测点数
+    """
+    from .tasks import geolocate_targets, measure_vantage_rtt
+
+    vantage_points = select_vantage_points(task)
+    if not vantage_points:
+        logger.warning(f"任务 {task.id} 没有可用的探测点，跳过RTT测量")
+        return 0
+    chord(
+        measure_vantage_rtt.s(task.id, vantage.id, target).set(queue=vantage.queue)
+        for vantage in vantage_points
+    )(geolocate_targets.s(task.id))
+    logger.info(f"任务 {task.id} 的RTT测量已分发到 {len(vantage_points)} 个探测点")
+    return len(vantage_points)
+
+
+def save_measurements(task, vantage, results: List[Dict]) -> int:
+    """替换探测点在该任务下的测量结果"""
+    from .models import RTTMeasurement
+
+    measurements = [
+        RTTMeasurement(task=task, vantage=vantage, ip_address=result['ip_address'],
+                       rtt=result['rtt'], samples=result.get('samples', 1))
+        for result in results
+    ]
+    with transaction.atomic():
+        RTTMeasurement.objects.filter(task=task, vantage=vantage).delete()
+        RTTMeasurement.objects.bulk_create(measurements, batch_size=1000)
+    vantage.last_seen = timezone.now()
+    vantage.save(update_fields=['last_seen'])
+    return len(measurements)
@@ -154,6 +154,17 @@ else:
         }
     }
 
+# 无响应地址缓存（Redis位图），Redis不可用时不启用
+LIVENESS_CACHE_URL = 'redis://localhost:6379/2' if REDIS_AVAILABLE else None
+LIVENESS_CACHE_TTL = 7 * 24 * 3600  # 无响应记录保留7天
+LIVENESS_SAMPLE_RATE = 0.05  # 缓存命中的地址仍有5%会被重新探测
+
+# 域名解析（正向解析扫描目标、反向解析发现的主机），结果写入默认缓存
+DNS_RESOLVER_CONCURRENCY = 64
+DNS_RESOLVER_TIMEOUT = 3.0
+DNS_CACHE_TTL = 3600
+DNS_NEGATIVE_CACHE_TTL = 300
+
 # Celery配置
 CELERY_BROKER_URL = 'redis://localhost:6379/0'
 CELERY_RESULT_BACKEND = 'redis://localhost:6379/0'
@@ -163,6 +174,56 @@ CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = 'Asia/Shanghai'
 CELERY_BROKER_CONNECTION_RETRY_ON_STARTUP = True
 
+# 定时任务
+CELERY_BEAT_SCHEDULE = {
+    # 每天重新计算端口热度排名，供 port_order=popularity 的扫描使用
+    'refresh-port-rankings': {
+        'task': 'scanner.tasks.refresh_port_rankings',
+        'schedule': 24 * 3600,
+    },
+    # 每天用最近的TTL观测重新编译跳数过滤表，供伪造源地址检测使用
+    'refresh-hcf-table': {
+        'task': 'scanner.tasks.refresh_hcf_table',
+        'schedule': 24 * 3600,
+    },
+    # 合并扫描中等待超时或来源任务已失败的订阅区域改为自行补扫
+    'release-stale-regions': {
+        'task': 'scanner.tasks.release_stale_regions',
+        'schedule': 600,
+    },
+    # 补充调度排队的扫描任务（正常情况下任务提交和结束时即会调度）
+    'dispatch-scan-tasks': {
+        'task': 'scanner.tasks.dispatch_scan_tasks',
+        'schedule': 60,
+    },
+}
+PORT_RANKING_WINDOW_DAYS = 90
+
+# 重叠扫描合并：在此时间（秒）内开始的相同类型任务之间共享重叠的探测，0 表示不合并
+SCAN_COALESCE_WINDOW = 600
+# 订阅的结果超过此时间（秒）仍未送达时自行补扫
+SCAN_COALESCE_TIMEOUT = 3600
+
+# 扫描任务调度：同时运行的任务数（与Celery工作进程并发数一致），其中保留给交互类任务的槽位数
+SCAN_SCHEDULER_SLOTS = 8
+SCAN_INTERACTIVE_SLOTS = 2
+SCAN_INTERACTIVE_COST = 20000  # 交互类任务的开销上限（探测数 × 扫描类型权重）
+SCAN_SHARD_COST = 100000  # 每个分片的开销，分片之间可让出工作进程
+SCAN_PRIORITY_AGING = 1800  # 排队每满此时间（秒）优先级提升一级
+SCAN_DISPATCH_TIMEOUT = 600  # 调度后超过此时间（秒）仍未开始的任务重新排队
+SCAN_HEARTBEAT_TIMEOUT = 3600  # 运行中超过此时间（秒）没有心跳的任务判为失败，释放槽位
+
+# 离线IP归属索引目录，由 build_ip_index 命令编译生成
+IP_INDEX_PATH = BASE_DIR / 'data' / 'ipindex'
+
+# MAC厂商表，由 build_oui_table 命令编译；不存在时使用内置的精简登记表
+OUI_TABLE_PATH = BASE_DIR / 'data' / 'oui.npz'
+
+# 跳数过滤表：按 /HCF_PREFIX_LENGTH 网段汇总最近 HCF_WINDOW_DAYS 天扫描结果的TTL
+HCF_TABLE_PATH = BASE_DIR / 'data' / 'hcf.npz'
+HCF_PREFIX_LENGTH = 24
+HCF_WINDOW_DAYS = 30
+
 # 如果Redis不可用，使用内存作为后备
 if not REDIS_AVAILABLE:
     CELERY_BROKER_URL = 'memory://'